@@ -0,0 +1,124 @@
+from amaranth import *
+
+from coreblocks.params import GenParams
+from coreblocks.interface.layouts import FuncUnitLayouts, ROBLayouts
+from transactron import Method, Methods, Provided, Required, TModule, Transaction, def_method
+from transactron.lib.metrics import HwCounter
+from transactron.utils import popcount
+from transactron.utils.amaranth_ext import one_hot_mux
+
+__all__ = ["ResultCollector"]
+
+
+class ResultCollector(Elaboratable):
+    """
+    Multi-port result collector. It gathers results from a number of result
+    ports (one per functional unit) and distributes them to the announcement
+    lanes. In each cycle, the oldest (in program order) available results are
+    sent to the lanes - the oldest one to lane 0, the second oldest to lane 1
+    and so on - so a long-latency unit does not block a short one.
+
+    Each port behaves like a `Forwarder`: a pushed result is forwarded to a lane
+    in the same cycle if possible, otherwise it is buffered and the port is not
+    ready until the buffered result is announced.
+
+    Attributes
+    ----------
+    push_result : Methods, provided
+        Result ports, one per result source.
+    get_result : Methods, provided
+        Announcement lanes. Lane `k` returns the `k`-th oldest available result.
+    rob_get_indices : Method, required
+        Used to compute the age of the results.
+    """
+
+    push_result: Provided[Methods]
+    get_result: Provided[Methods]
+    rob_get_indices: Required[Method]
+
+    def __init__(self, *, gen_params: GenParams, ports: int, lanes: int):
+        """
+        Parameters
+        ----------
+        gen_params : GenParams
+            Core generation parameters.
+        ports : int
+            Number of result ports.
+        lanes : int
+            Number of announcement lanes.
+        """
+        self.gen_params = gen_params
+        self.ports = ports
+        self.lanes = lanes
+
+        layout = gen_params.get(FuncUnitLayouts).push_result
+        self.push_result = Methods(ports, i=layout)
+        self.get_result = Methods(lanes, o=layout)
+        self.rob_get_indices = Method(o=gen_params.get(ROBLayouts).get_indices)
+
+        self.perf_port_conflicts = HwCounter(
+            "backend.result_collector.port_conflicts",
+            "Number of cycles in which a result was ready, but no announcement lane was available",
+        )
+
+    def elaborate(self, platform):
+        m = TModule()
+
+        m.submodules += [self.perf_port_conflicts]
+
+        layout = self.gen_params.get(FuncUnitLayouts).push_result
+
+        buffers = [Signal(layout, reset_less=True) for _ in range(self.ports)]
+        buffers_valid = [Signal() for _ in range(self.ports)]
+
+        # results available in this cycle: buffered or pushed
+        results = [Signal(layout) for _ in range(self.ports)]
+        results_valid = [Signal() for _ in range(self.ports)]
+        results_taken = [Signal() for _ in range(self.ports)]
+
+        rob_start_idx = Signal(self.gen_params.rob_entries_bits)
+        with Transaction().always_body(m):
+            m.d.comb += rob_start_idx.eq(self.rob_get_indices(m).start)
+
+        for i in range(self.ports):
+
+            @def_method(m, self.push_result[i], ready=~buffers_valid[i])
+            def _(arg):
+                m.d.av_comb += results[i].eq(arg)
+                m.d.comb += results_valid[i].eq(1)
+
+            with m.If(buffers_valid[i]):
+                m.d.av_comb += results[i].eq(buffers[i])
+                m.d.comb += results_valid[i].eq(1)
+
+            m.d.sync += buffers[i].eq(results[i])
+            m.d.sync += buffers_valid[i].eq(results_valid[i] & ~results_taken[i])
+
+        ages = [(result.rob_id - rob_start_idx).as_unsigned()[: self.gen_params.rob_entries_bits] for result in results]
+
+        # number of available results older than the given one
+        ranks = [Signal(range(self.ports)) for _ in range(self.ports)]
+        for i in range(self.ports):
+            m.d.comb += ranks[i].eq(
+                popcount(Cat(results_valid[j] & (ages[j] < ages[i]) for j in range(self.ports) if j != i))
+            )
+
+        for k in range(self.lanes):
+            selected = Signal(self.ports)
+            m.d.comb += selected.eq(Cat(results_valid[i] & (ranks[i] == k) for i in range(self.ports)))
+
+            @def_method(m, self.get_result[k], ready=selected.any())
+            def _():
+                for i in range(self.ports):
+                    with m.If(selected[i]):
+                        m.d.comb += results_taken[i].eq(1)
+                return one_hot_mux([(selected[i], results[i]) for i in range(self.ports)])
+
+            for i in range(self.ports):
+                self.push_result[i].schedule_before(self.get_result[k])
+
+        with Transaction(name="perf").always_body(m):
+            with m.If(Cat(results_valid[i] & (ranks[i] >= self.lanes) for i in range(self.ports)).any()):
+                self.perf_port_conflicts.incr(m)
+
+        return m
@@ -17,7 +17,7 @@ from transactron.evlog import EventSource
 from transactron.utils import DependencyContext, HardwareLogger, count_trailing_zeros, OneHotMux, popcount
 from transactron.lib.metrics import *
 
-from coreblocks.telemetry import RobFlush, RobRetire
+from coreblocks.telemetry import RobBulkFlush, RobFlush, RobRetire
 
 from coreblocks.params.genparams import GenParams
 from coreblocks.arch import ExceptionCause, HPMEvent, PrivilegeLevel
@@ -48,6 +48,7 @@ class Retirement(Elaboratable):
         self.gen_params = gen_params
         self.rob_peek = Method(o=gen_params.get(ROBLayouts).peek_layout)
         self.rob_retire = Method(i=gen_params.get(ROBLayouts).retire_layout)
+        self.rob_flush = Method(o=gen_params.get(ROBLayouts).flush_layout)
         self.r_rat_commit = Methods(
             gen_params.retirement_superscalarity,
             i=gen_params.get(RATLayouts).rrat_commit_in,
@@ -57,7 +58,9 @@ class Retirement(Elaboratable):
             o=gen_params.get(RATLayouts).rrat_peek_out,
         )
         self.free_rf_put = Methods(gen_params.retirement_superscalarity, i=[("ident", range(gen_params.phys_regs))])
+        self.free_rf_replace = Method(i=[("mask", gen_params.phys_regs)])
         self.rf_free = Methods(gen_params.retirement_superscalarity, i=gen_params.get(RFLayouts).rf_free)
+        self.rf_free_mask = Method(i=gen_params.get(RFLayouts).rf_free_mask)
         self.exception_cause_get = Method(o=gen_params.get(ExceptionInformationRegisterLayouts).get)
         self.exception_cause_clear = Method()
         self.c_rat_restore = Method(i=gen_params.get(RATLayouts).crat_flush_restore_in)
@@ -66,10 +69,15 @@ class Retirement(Elaboratable):
             i=gen_params.get(CoreInstructionCounterLayouts).decrement_in,
             o=gen_params.get(CoreInstructionCounterLayouts).decrement_out,
         )
+        self.instr_flush = Method(
+            i=gen_params.get(CoreInstructionCounterLayouts).flush_in,
+            o=gen_params.get(CoreInstructionCounterLayouts).decrement_out,
+        )
         self.trap_entry = Method(i=[("cause", gen_params.isa.xlen)], o=[("target_priv", PrivilegeLevel)])
         interrupt_controller_layouts = gen_params.get(InternalInterruptControllerLayouts)
         self.async_interrupt_cause = Method(o=interrupt_controller_layouts.interrupt_cause)
         self.checkpoint_tag_free = Method()
+        self.checkpoint_tag_free_all = Method(o=gen_params.get(RATLayouts).crat_free_all_tags_out)
 
         self.pure_active_count = Signal(range(gen_params.retirement_superscalarity + 1))
         self.instret_csr = CSRRegister(None, gen_params, width=64, fu_read_map=lambda _, v: v + self.pure_active_count)
@@ -347,27 +355,55 @@ class Retirement(Elaboratable):
                         m.d.sync += ftq_commit_ptr.eq(last_commit_ftq_ptr)
 
             with m.State("TRAP_FLUSH"):
-                with Transaction(name="Retirement_FLUSH").body(m):
-                    # Flush entire core
-                    self.rob_retire(m, count=retire_count)
+                if self.gen_params.fast_trap_flush:
+                    with Transaction(name="Retirement_FLUSH").body(m):
+                        # Flush entire ROB at once. Tags and registers of the flushed instructions
+                        # are freed in bulk when resuming.
+                        flushed = self.rob_flush(m)
+                        evlog.emit(m, RobBulkFlush.hw(count=flushed.count))
+                        log.debug(m, True, "Flushed {} instructions", flushed.count)
 
-                    with m.If(free_tag):
-                        self.checkpoint_tag_free(m)
-                        m.d.sync += last_retired_tag.eq(last_retired_tag + 1)
+                        core_empty = self.instr_flush(m, count=flushed.count)
 
-                    core_empty = self.instr_decrement(m, count=retire_count)
+                        with m.If(core_empty):
+                            m.next = "TRAP_RESUME"
+                else:
+                    with Transaction(name="Retirement_FLUSH").body(m):
+                        # Flush entire core
+                        self.rob_retire(m, count=retire_count)
 
-                    for i in range(self.gen_params.retirement_superscalarity):
-                        with m.If(i < retire_count):
-                            flush_instr(i, rob_entries.entries[i])
+                        with m.If(free_tag):
+                            self.checkpoint_tag_free(m)
+                            m.d.sync += last_retired_tag.eq(last_retired_tag + 1)
 
-                    with m.If(core_empty):
-                        m.next = "TRAP_RESUME"
+                        core_empty = self.instr_decrement(m, count=retire_count)
+
+                        for i in range(self.gen_params.retirement_superscalarity):
+                            with m.If(i < retire_count):
+                                flush_instr(i, rob_entries.entries[i])
+
+                        with m.If(core_empty):
+                            m.next = "TRAP_RESUME"
 
             with m.State("TRAP_RESUME"):
                 with Transaction(name="Retirement_RESUME").body(m):
                     # Resume core operation
-                    self.c_rat_restore(m, entries=self.r_rat_peek(m).entries)
+                    rrat_entries = self.r_rat_peek(m).entries
+                    self.c_rat_restore(m, entries=rrat_entries)
+
+                    if self.gen_params.fast_trap_flush:
+                        # The core is empty, so every physical register not mapped in R-RAT is free
+                        used_regs = Signal(self.gen_params.phys_regs)
+                        m.d.av_comb += used_regs.eq(
+                            Cat(
+                                Cat(rp == reg_id for rp in rrat_entries).any()
+                                for reg_id in range(self.gen_params.phys_regs)
+                            )
+                        )
+                        self.free_rf_replace(m, mask=~used_regs & ~1)  # rp0 is reserved
+                        self.rf_free_mask(m, mask=~used_regs)
+                        m.d.sync += last_retired_tag.eq(self.checkpoint_tag_free_all(m).tag)
+
                     self.perf_trap_latency.stop(m)
                     log.debug(m, True, "Resuming core from the retirement")
 
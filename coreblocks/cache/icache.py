@@ -8,6 +8,7 @@ from amaranth.utils import exact_log2
 
 from transactron.core import def_method, Priority, TModule
 from transactron import Method, Transaction
+from transactron.evlog import EventSource
 from coreblocks.params import ICacheParameters
 from coreblocks.interface.layouts import ICacheLayouts
 from transactron.utils import OneHotMux, assign, logging
@@ -15,6 +16,7 @@ from transactron.lib import *
 from coreblocks.peripherals.bus_adapter import BusMasterInterface
 
 from coreblocks.cache.iface import CacheInterface, CacheRefillerInterface
+from coreblocks.telemetry import ICacheMiss
 from transactron.utils.transactron_helpers import make_layout
 
 __all__ = [
@@ -23,6 +25,7 @@ __all__ = [
 ]
 
 log = logging.HardwareLogger("frontend.icache")
+evlog = EventSource("frontend.icache")
 
 
 class ICacheBypass(Elaboratable, CacheInterface):
@@ -211,6 +214,7 @@ class ICache(Elaboratable, CacheInterface):
                 aligned_addr = self.serialize_addr(req_addr) & ~((1 << self.params.offset_bits) - 1)
                 log.debug(m, True, "Refilling line 0x{:x}", aligned_addr)
                 self.refiller.start_refill(m, paddr=aligned_addr)
+                evlog.emit(m, ICacheMiss.hw(paddr=aligned_addr))
 
         @def_method(m, self.accept_res)
         def _():
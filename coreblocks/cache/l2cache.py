@@ -0,0 +1,295 @@
+from amaranth import *
+from amaranth.lib.data import StructLayout
+from amaranth.lib.wiring import Component, In, Out, connect, flipped
+import amaranth.lib.memory as memory
+from amaranth.utils import exact_log2
+
+from transactron import Transaction, TModule
+from transactron.lib import HwCounter
+from transactron.utils import OneHotMux, logging
+
+from coreblocks.func_blocks.fu.lsu.pma import PMAChecker
+from coreblocks.params import GenParams, L2CacheParameters
+from coreblocks.peripherals.wishbone import WishboneArbiter, WishboneInterface
+
+__all__ = ["L2Cache"]
+
+log = logging.HardwareLogger("l2cache")
+
+
+class L2Cache(Component):
+    """A unified, set-associative L2 cache.
+
+    The cache is shared by multiple Wishbone masters (e.g. the instruction and the data bus
+    of the core), which are arbitrated by a `WishboneArbiter`, and accesses the memory
+    through a single Wishbone bus. It is a write-back, write-allocate cache, which handles
+    one request at a time. Accesses to memory which is not cacheable according to the PMAs
+    are passed through to the memory bus.
+
+    The replacement policy is the same as in the `ICache`: a single global counter selects
+    the way to be replaced.
+
+    Attributes
+    ----------
+    masters: list of WishboneInterface
+        Interfaces of the masters using the cache.
+    mem_wb: WishboneInterface
+        Memory bus.
+    """
+
+    masters: list[WishboneInterface]
+    mem_wb: WishboneInterface
+
+    def __init__(self, gen_params: GenParams, params: L2CacheParameters, num_masters: int):
+        """
+        Parameters
+        ----------
+        gen_params : GenParams
+            Core generation parameters, used for the bus and the PMA configuration.
+        params : L2CacheParameters
+            Parameters of the cache.
+        num_masters : int
+            Number of the masters using the cache.
+        """
+        self.gen_params = gen_params
+        self.params = params
+        self.wb_params = gen_params.wb_params
+
+        super().__init__(
+            {
+                "masters": In(WishboneInterface(self.wb_params).signature).array(num_masters),
+                "mem_wb": Out(WishboneInterface(self.wb_params).signature),
+            }
+        )
+
+        self.tag_layout = StructLayout({"valid": 1, "dirty": 1, "tag": self.params.tag_bits})
+
+        self.perf_loads = HwCounter("l2cache.loads", "Number of cacheable requests to the L2 Cache")
+        self.perf_hits = HwCounter("l2cache.hits")
+        self.perf_misses = HwCounter("l2cache.misses")
+        self.perf_writebacks = HwCounter("l2cache.writebacks", "Number of dirty lines written back to memory")
+        self.perf_bypasses = HwCounter("l2cache.bypasses", "Number of requests to memory which is not cacheable")
+
+    def elaborate(self, platform):
+        m = TModule()
+
+        m.submodules += [
+            self.perf_loads,
+            self.perf_hits,
+            self.perf_misses,
+            self.perf_writebacks,
+            self.perf_bypasses,
+        ]
+
+        params = self.params
+        sel_width = self.wb_params.data_width // self.wb_params.granularity
+        all_sel = C(1).replicate(sel_width)
+
+        m.submodules.arbiter = arbiter = WishboneArbiter(self.wb_params, len(self.masters))
+        for master, arbiter_master in zip(self.masters, arbiter.masters):
+            connect(m.top_module, flipped(master), arbiter_master)
+        bus = arbiter.slave_wb
+
+        m.submodules.pma_checker = pma_checker = PMAChecker(self.gen_params)
+        m.d.comb += pma_checker.paddr.eq(bus.adr << exact_log2(params.word_width_bytes))
+
+        # Memories
+        tag_rd_index = Signal(params.index_bits)
+        tag_rd_data = [Signal(self.tag_layout) for _ in range(params.num_of_ways)]
+        tag_wr_index = Signal(params.index_bits)
+        tag_wr_data = Signal(self.tag_layout)
+        tag_wr_en = Signal(params.num_of_ways)
+
+        data_rd_addr = Signal(params.index_bits + params.offset_bits)
+        data_rd_data = [Signal(params.word_width) for _ in range(params.num_of_ways)]
+        data_wr_addr = Signal(params.index_bits + params.offset_bits)
+        data_wr_data = Signal(params.word_width)
+        data_wr_way = Signal(params.num_of_ways)
+        data_wr_sel = Signal(sel_width)
+
+        for i in range(params.num_of_ways):
+            tag_mem = memory.Memory(shape=self.tag_layout, depth=params.num_of_sets, init=[])
+            tag_wp = tag_mem.write_port()
+            tag_rp = tag_mem.read_port(transparent_for=[tag_wp])
+            m.submodules[f"tag_mem_{i}"] = tag_mem
+
+            m.d.comb += [
+                tag_rd_data[i].eq(tag_rp.data),
+                tag_rp.addr.eq(tag_rd_index),
+                tag_wp.addr.eq(tag_wr_index),
+                tag_wp.data.eq(tag_wr_data),
+                tag_wp.en.eq(tag_wr_en[i]),
+            ]
+
+            data_mem = memory.Memory(shape=params.word_width, depth=params.num_of_sets * params.words_in_line, init=[])
+            data_wp = data_mem.write_port(granularity=self.wb_params.granularity)
+            data_rp = data_mem.read_port(transparent_for=[data_wp])
+            m.submodules[f"data_mem_{i}"] = data_mem
+
+            m.d.comb += [
+                data_rd_data[i].eq(data_rp.data),
+                data_rp.addr.eq(data_rd_addr),
+                data_wp.addr.eq(data_wr_addr),
+                data_wp.data.eq(data_wr_data),
+                data_wp.en.eq(Mux(data_wr_way[i], data_wr_sel, 0)),
+            ]
+
+        # Request handled by the cache
+        req_adr = Signal(self.wb_params.addr_width)
+        req_offset = req_adr[: params.offset_bits]
+        req_index = req_adr[params.offset_bits : params.offset_bits + params.index_bits]
+        req_tag = req_adr[params.offset_bits + params.index_bits :]
+
+        # The sets are read at the address from the bus when idle, otherwise at the address of the request
+        m.d.comb += tag_rd_index.eq(req_index)
+        m.d.comb += data_rd_addr.eq(Cat(req_offset, req_index))
+
+        way_selector = Signal(params.num_of_ways, init=1)
+        victim_tag = Signal(params.tag_bits)
+        refilled = Signal()
+        word_counter = Signal(range(params.words_in_line))
+        last_word = word_counter == params.words_in_line - 1
+
+        hits = Signal(params.num_of_ways)
+        m.d.comb += hits.eq(Cat(tag.valid & (tag.tag == req_tag) for tag in tag_rd_data))
+
+        load = Signal()
+        hit = Signal()
+        miss = Signal()
+        writeback = Signal()
+        bypass = Signal()
+
+        with Transaction().always_body(m):
+            self.perf_loads.incr(m, enable_call=load)
+            self.perf_hits.incr(m, enable_call=hit)
+            self.perf_misses.incr(m, enable_call=miss)
+            self.perf_writebacks.incr(m, enable_call=writeback)
+            self.perf_bypasses.incr(m, enable_call=bypass)
+
+        with m.FSM():
+            with m.State("IDLE"):
+                m.d.comb += tag_rd_index.eq(bus.adr[params.offset_bits :])
+                m.d.comb += data_rd_addr.eq(bus.adr)
+
+                with m.If(bus.cyc & bus.stb):
+                    m.d.sync += req_adr.eq(bus.adr)
+                    m.d.sync += refilled.eq(0)
+                    with m.If(pma_checker.result.cacheable):
+                        m.d.comb += load.eq(1)
+                        m.next = "LOOKUP"
+                    with m.Else():
+                        m.d.comb += bypass.eq(1)
+                        m.next = "BYPASS"
+
+            with m.State("LOOKUP"):
+                with m.If(hits.any()):
+                    m.d.comb += hit.eq(~refilled)
+                    m.d.comb += bus.ack.eq(1)
+                    m.d.comb += bus.dat_r.eq(OneHotMux.create(m, zip(hits, data_rd_data)))
+
+                    with m.If(bus.we):
+                        m.d.comb += [
+                            data_wr_addr.eq(Cat(req_offset, req_index)),
+                            data_wr_data.eq(bus.dat_w),
+                            data_wr_way.eq(hits),
+                            data_wr_sel.eq(bus.sel),
+                            tag_wr_index.eq(req_index),
+                            tag_wr_data.valid.eq(1),
+                            tag_wr_data.dirty.eq(1),
+                            tag_wr_data.tag.eq(req_tag),
+                            tag_wr_en.eq(hits),
+                        ]
+
+                    m.next = "IDLE"
+                with m.Else():
+                    m.d.comb += miss.eq(1)
+
+                    victim = Signal(self.tag_layout)
+                    m.d.comb += victim.eq(OneHotMux.create(m, zip(way_selector, tag_rd_data)))
+                    m.d.sync += victim_tag.eq(victim.tag)
+                    m.d.sync += word_counter.eq(0)
+
+                    with m.If(victim.valid & victim.dirty):
+                        log.debug(
+                            m, True, "Writing back line 0x{:x}", Cat(C(0, params.offset_bits), req_index, victim.tag)
+                        )
+                        m.next = "WRITEBACK_READ"
+                    with m.Else():
+                        m.next = "REFILL"
+
+            with m.State("WRITEBACK_READ"):
+                # Waits for the word of the victim line to be read
+                m.d.comb += data_rd_addr.eq(Cat(word_counter, req_index))
+                m.next = "WRITEBACK"
+
+            with m.State("WRITEBACK"):
+                m.d.comb += data_rd_addr.eq(Cat(word_counter, req_index))
+                m.d.comb += [
+                    self.mem_wb.cyc.eq(1),
+                    self.mem_wb.stb.eq(1),
+                    self.mem_wb.we.eq(1),
+                    self.mem_wb.adr.eq(Cat(word_counter, req_index, victim_tag)),
+                    self.mem_wb.dat_w.eq(OneHotMux.create(m, zip(way_selector, data_rd_data))),
+                    self.mem_wb.sel.eq(all_sel),
+                ]
+
+                # Errors on write-back can't be reported to anyone, the data is lost
+                with m.If(self.mem_wb.ack | self.mem_wb.err):
+                    m.d.sync += word_counter.eq(word_counter + 1)
+                    with m.If(last_word):
+                        m.d.comb += writeback.eq(1)
+                        m.next = "REFILL"
+                    with m.Else():
+                        m.next = "WRITEBACK_READ"
+
+            with m.State("REFILL"):
+                m.d.comb += [
+                    self.mem_wb.cyc.eq(1),
+                    self.mem_wb.stb.eq(1),
+                    self.mem_wb.we.eq(0),
+                    self.mem_wb.adr.eq(Cat(word_counter, req_index, req_tag)),
+                    self.mem_wb.sel.eq(all_sel),
+                ]
+
+                m.d.comb += tag_wr_index.eq(req_index)
+                m.d.comb += tag_wr_data.tag.eq(req_tag)
+
+                with m.If(self.mem_wb.err):
+                    # The line is partially overwritten, so it is invalidated
+                    m.d.comb += tag_wr_en.eq(way_selector)
+                    m.d.comb += bus.err.eq(1)
+                    m.next = "IDLE"
+                with m.Elif(self.mem_wb.ack):
+                    m.d.comb += [
+                        data_wr_addr.eq(Cat(word_counter, req_index)),
+                        data_wr_data.eq(self.mem_wb.dat_r),
+                        data_wr_way.eq(way_selector),
+                        data_wr_sel.eq(all_sel),
+                    ]
+                    m.d.sync += word_counter.eq(word_counter + 1)
+
+                    with m.If(last_word):
+                        m.d.comb += tag_wr_data.valid.eq(1)
+                        m.d.comb += tag_wr_en.eq(way_selector)
+                        m.d.sync += way_selector.eq(way_selector.rotate_left(1))
+                        m.d.sync += refilled.eq(1)
+                        m.next = "LOOKUP"
+
+            with m.State("BYPASS"):
+                m.d.comb += [
+                    self.mem_wb.cyc.eq(bus.cyc),
+                    self.mem_wb.stb.eq(bus.stb),
+                    self.mem_wb.we.eq(bus.we),
+                    self.mem_wb.adr.eq(bus.adr),
+                    self.mem_wb.dat_w.eq(bus.dat_w),
+                    self.mem_wb.sel.eq(bus.sel),
+                    bus.dat_r.eq(self.mem_wb.dat_r),
+                    bus.ack.eq(self.mem_wb.ack),
+                    bus.err.eq(self.mem_wb.err),
+                    bus.rty.eq(self.mem_wb.rty),
+                ]
+
+                with m.If(self.mem_wb.ack | self.mem_wb.err | self.mem_wb.rty):
+                    m.next = "IDLE"
+
+        return m
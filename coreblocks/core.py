@@ -8,11 +8,12 @@ from coreblocks.priv.traps.instr_counter import CoreInstructionCounter
 from coreblocks.func_blocks.interface.func_blocks_unifier import FuncBlocksUnifier
 from coreblocks.priv.traps.interrupt_controller import ISA_RESERVED_INTERRUPTS, InternalInterruptController
 from transactron.core import TModule, Method, def_method
-from transactron.lib import CrossbarConnectTrans
+from transactron.lib import ConnectTrans
 from coreblocks.interface.layouts import *
 from coreblocks.interface.keys import (
     CSRInstancesKey,
     CommonBusDataKey,
+    DataBusLockKey,
     InstructionAddressTranslatorBackingDeviceKey,
     DataAddressTranslatorBackingDeviceKey,
     RVVIHartCollectorKey,
@@ -28,9 +29,10 @@ from coreblocks.frontend.frontend import CoreFrontend
 from coreblocks.priv.traps.exception import ExceptionInformationRegister
 from coreblocks.scheduler.scheduler import Scheduler
 from coreblocks.backend.announcement import ResultAnnouncement
+from coreblocks.backend.result_collector import ResultCollector
 from coreblocks.backend.retirement import Retirement
 from coreblocks.peripherals.bus_adapter import WishboneMasterAdapter
-from coreblocks.peripherals.wishbone import WishboneMaster, WishboneInterface
+from coreblocks.peripherals.wishbone import WishboneMaster, PipelinedWishboneMaster, WishboneInterface
 from coreblocks.priv.vmem.tlb import FullyAssociativeTLB, SetAssociativeTLB
 from coreblocks.priv.vmem.walker import PageTableWalker
 from transactron.lib.metrics import HwMetricsEnabledKey, TaggedCounter
@@ -68,7 +70,13 @@ class Core(Component):
         super().__init__(signature)
 
         self.wb_master_instr = WishboneMaster(self.gen_params.wb_params, "instr")
-        self.wb_master_data = WishboneMaster(self.gen_params.wb_params, "data")
+        self.wb_master_data: WishboneMaster | PipelinedWishboneMaster
+        if self.gen_params.data_bus_max_requests > 1:
+            self.wb_master_data = PipelinedWishboneMaster(
+                self.gen_params.wb_params, max_req=self.gen_params.data_bus_max_requests
+            )
+        else:
+            self.wb_master_data = WishboneMaster(self.gen_params.wb_params, "data")
 
         self.bus_master_instr_adapter = WishboneMasterAdapter(self.wb_master_instr)
         self.bus_master_data_adapter = WishboneMasterAdapter(
@@ -78,6 +86,9 @@ class Core(Component):
 
         self.dm.add_dependency(CommonBusDataKey(), self.bus_master_data_adapter.ports[0])
 
+        self.data_bus_lock = Signal()
+        self.dm.add_dependency(DataBusLockKey(), self.data_bus_lock)
+
         self.ptw = None
         self.l2_tlb = None
         self.l1i_tlb = None
@@ -88,6 +99,8 @@ class Core(Component):
                 self.gen_params,
                 entries=self.gen_params.tlb_config.l2tlb_entries,
                 ways=self.gen_params.tlb_config.l2tlb_ways,
+                superpage_entries=self.gen_params.tlb_config.l2tlb_superpage_entries,
+                superpage_ways=self.gen_params.tlb_config.l2tlb_superpage_ways,
                 backing_resolver=self.ptw,
                 perf_name_prefix="mmu.tlb.l2",
                 ports=2,
@@ -157,7 +170,12 @@ class Core(Component):
         m.submodules += [self.announcement_counter]
 
         connect(m.top_module, flipped(self.wb_instr), self.wb_master_instr.wb_master)
-        connect(m.top_module, flipped(self.wb_data), self.wb_master_data.wb_master)
+        if isinstance(self.wb_master_data, PipelinedWishboneMaster):
+            connect(m.top_module, flipped(self.wb_data), self.wb_master_data.wb)
+            m.d.comb += self.wb_master_data.wb.lock.eq(self.data_bus_lock)
+        else:
+            connect(m.top_module, flipped(self.wb_data), self.wb_master_data.wb_master)
+            m.d.comb += self.wb_master_data.wb_master.lock.eq(self.data_bus_lock)
 
         m.submodules.wb_master_instr = self.wb_master_instr
         m.submodules.wb_master_data = self.wb_master_data
@@ -233,25 +251,41 @@ class Core(Component):
         with Transaction().always_body(m):
             self.announcement_counter.incr(m, tag=sum(method.run for method in announce_result))
 
-        m.submodules.announcement_connector = CrossbarConnectTrans.create(
-            self.func_blocks_unifier.get_result, announce_result
+        result_ports = self.func_blocks_unifier.get_result
+        m.submodules.result_collector = result_collector = ResultCollector(
+            gen_params=self.gen_params, ports=len(result_ports), lanes=len(announce_result)
         )
+        result_collector.rob_get_indices.provide(rob.get_indices)
+        for i, result_port in enumerate(result_ports):
+            m.submodules[f"result_port_connector_{i}"] = ConnectTrans.create(
+                result_port, result_collector.push_result[i]
+            )
+        for i, announcement_push in enumerate(announce_result):
+            m.submodules[f"announcement_connector_{i}"] = ConnectTrans.create(
+                result_collector.get_result[i], announcement_push
+            )
 
         m.submodules.retirement = retirement = self.retirement
         retirement.rob_peek.provide(rob.peek)
         retirement.rob_retire.provide(rob.retire)
+        retirement.rob_flush.provide(rob.flush)
         retirement.r_rat_commit.provide(rrat.commit)
         retirement.r_rat_peek.provide(rrat.peek)
         retirement.free_rf_put.provide(rf_allocator.free)
+        retirement.free_rf_replace.provide(rf_allocator.replace)
         retirement.rf_free.provide(rf.free)
+        if self.gen_params.fast_trap_flush:
+            retirement.rf_free_mask.provide(rf.free_mask)
         retirement.exception_cause_get.provide(self.exception_information_register.get)
         retirement.exception_cause_clear.provide(self.exception_information_register.clear)
         retirement.c_rat_restore.provide(crat.flush_restore)
         retirement.fetch_redirect.provide(self.frontend.redirect)
         retirement.instr_decrement.provide(core_counter.decrement)
+        retirement.instr_flush.provide(core_counter.flush)
         retirement.trap_entry.provide(self.interrupt_controller.entry)
         retirement.async_interrupt_cause.provide(self.interrupt_controller.interrupt_cause)
         retirement.checkpoint_tag_free.provide(crat.free_tag)
+        retirement.checkpoint_tag_free_all.provide(crat.free_all_tags)
 
         m.submodules.func_blocks_unifier = self.func_blocks_unifier
 
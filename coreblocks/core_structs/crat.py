@@ -5,7 +5,7 @@ from amaranth.utils import ceil_log2
 from transactron.core import *
 from transactron.utils import logging
 from transactron.lib.connectors import Pipe
-from transactron.lib.metrics import HwExpHistogram
+from transactron.lib.metrics import HwCounter, HwExpHistogram, HwMetric
 from transactron.lib.simultaneous import condition
 from transactron.lib.storage import MemoryBank
 from transactron.utils import DependencyContext, assign, cyclic_mask, mod_incr, popcount
@@ -38,6 +38,10 @@ class CheckpointRAT(Elaboratable):
         Associated checkpoints are freed too.
         This method accepts no arguments, because all tags must be freed in-order, so call means freeing
         oldest issued tag.
+    free_all_tags: Method
+        Free all tags except the most recently issued one, together with associated checkpoints.
+        Used after a hard flush which removed instructions from the core without freeing their tags.
+        Returns the tag which remains allocated.
     get_active_tags: Method
         Gets bit array of tags that are currently active.
         If bit is set it means that a tag is on a valid
@@ -82,9 +86,21 @@ class CheckpointRAT(Elaboratable):
         self.dm.add_dependency(RollbackKey(), self.rollback)
 
         self.free_tag = Method()
+        self.free_all_tags = Method(o=layouts.crat_free_all_tags_out)
         self.get_active_tags = Method(o=layouts.get_active_tags_out)
         self.dm.add_dependency(ActiveTagsKey(), self.get_active_tags)
 
+        self.perf_recovery_latency = HwExpHistogram(
+            "backend.mispredict.recovery_latency",
+            description="Cycles from a misprediction rollback to tagging the first correct-path instruction",
+            bucket_count=9,
+            sample_width=8,
+        )
+        self.perf_frat_restore_stall = HwCounter(
+            "backend.mispredict.frat_restore_stall",
+            "Number of cycles a correct-path instruction waited for the FRAT restore after a rollback",
+        )
+
     def elaborate(self, platform):
         m = TModule()
 
@@ -105,9 +121,11 @@ class CheckpointRAT(Elaboratable):
         checkpointed_tags = Signal(2**self.gen_params.tag_bits, init=0)
 
         storage = MemoryBank(shape=self.frat.shape(), depth=self.gen_params.checkpoint_count)
-        tag_map = MemoryBank(
-            shape=range(self.gen_params.checkpoint_count),
-            depth=2**self.gen_params.tag_bits,
+        # Kept in registers, so that the checkpoint of a rollback target is known in the rollback cycle.
+        # It is safe, because a checkpoint is mapped when its branch is renamed, long before it can be resolved.
+        tag_map = Array(
+            Signal(range(self.gen_params.checkpoint_count), name=f"tag_map_{i}")
+            for i in range(2**self.gen_params.tag_bits)
         )
 
         rollback_just_started = Signal()
@@ -160,7 +178,7 @@ class CheckpointRAT(Elaboratable):
             checkpoint = allocate_checkpoint(m)
 
             m.d.comb += checkpointed_tags_set_mask.eq(1 << from_tag)
-            tag_map.write(m, addr=from_tag, data=checkpoint)
+            m.d.sync += tag_map[from_tag].eq(checkpoint)
 
             return checkpoint
 
@@ -258,6 +276,12 @@ class CheckpointRAT(Elaboratable):
 
         frat_tag_in_next_cycle = Signal(self.gen_params.tag_bits)
 
+        # Cycles since the last rollback, saturating. Reset by `rollback`.
+        recovery_cycles = Signal(self.perf_recovery_latency.sample_width)
+        if HwMetric.metrics_enabled():
+            with m.If(~recovery_cycles.all()):
+                m.d.sync += recovery_cycles.eq(recovery_cycles + 1)
+
         @def_method(m, self.tag)
         def _(rollback_tag: Value, rollback_tag_v: Value, commit_checkpoint: Value):
             instr_rollback_tag = rollback_tag
@@ -296,6 +320,7 @@ class CheckpointRAT(Elaboratable):
                     # and a valid instruction from newly fetched path is currently waiting
                     # (invalid instructions from scheduler were flushed).
                     m.d.av_comb += stall.eq(1)
+                    self.perf_frat_restore_stall.incr(m)
                 with m.Elif(rollback_target_valid & rollback_frat_ready):
                     # FRAT has correct checkpoint loaded (currently or in next cycle) and scheduler
                     # finished flushing. Resume normal operation.
@@ -307,6 +332,7 @@ class CheckpointRAT(Elaboratable):
                     m.d.sync += rollback_just_started.eq(0)
                     m.d.sync += next_tag_increment.eq(commit_checkpoint)
                     m.d.av_comb += out_commit_checkpoint.eq(commit_checkpoint)
+                    self.perf_recovery_latency.add(m, recovery_cycles)
                 with m.Else():
                     # Instructions from old speculation path that should be flushed. FRAT has writes locked,
                     # and tags are already marked as non-active.
@@ -332,15 +358,25 @@ class CheckpointRAT(Elaboratable):
         # Rollback RAT restore memory access pipeline
         # --------------------------------------------
 
-        rollback_tag_s1 = Signal(self.gen_params.tag_bits)
-        rollback_tag_s2 = frat_tag_in_next_cycle
+        rollback_tag_s1 = frat_tag_in_next_cycle
 
         active_tags_reset_mask_0 = Signal.like(active_tags, init=0)
+        checkpointed_tags_reset_mask_0 = Signal.like(checkpointed_tags)
 
         @def_method(m, self.rollback)
         def _(tag: Value, ftq_ptr: Value, pc: Value):
-            tag_map.read_req(m, addr=tag)
-            m.d.sync += rollback_tag_s1.eq(tag)
+            rollback_checkpoint_id = tag_map[tag]
+
+            # Delete suffix of used checkpoints on wrong speculation path, including currently
+            # restored checkpoint that will no longer be used.
+            m.d.sync += checkpoints_head.eq(rollback_checkpoint_id)
+            m.d.sync += checkpoints_full.eq(0)
+            # Rollback target tag still remains active, but without checkpoint
+            m.d.comb += checkpointed_tags_reset_mask_0.eq(1 << tag)
+
+            storage.read_req(m, addr=rollback_checkpoint_id)
+            m.d.sync += rollback_tag_s1.eq(tag)  # `CRAT.tag` unblock condition (= frat_tag_in_next_cycle)
+            m.d.sync += recovery_cycles.eq(1)
 
             # Invalidate tags on wrong speculaton path (suffix), but don't free them for instruction validity tracking.
             # This must happen immediately for side fx control.
@@ -372,25 +408,11 @@ class CheckpointRAT(Elaboratable):
             m.d.sync += frat_lock.eq(1)
             m.d.sync += frat_unlock_tag.eq(1 << self.gen_params.tag_bits)  # lock to non-existent tag
 
-        checkpointed_tags_reset_mask_0 = Signal.like(checkpointed_tags)
-        with Transaction().body(m):
-            rollback_checkpoint_id = tag_map.read_resp(m)
-
-            # Delete suffix of used checkpoints on wrong speculation path, including currently
-            # restored checkpoint that will no longer be used.
-            m.d.sync += checkpoints_head.eq(rollback_checkpoint_id)
-            m.d.sync += checkpoints_full.eq(0)
-            # Rollback target tag still remains active, but without checkpoint
-            m.d.comb += checkpointed_tags_reset_mask_0.eq(1 << rollback_target_tag)
-
-            storage.read_req(m, addr=rollback_checkpoint_id)
-            m.d.sync += rollback_tag_s2.eq(rollback_tag_s1)  # `CRAT.tag` unblock condition (= frat_tag_in_next_cycle)
-
         with Transaction().body(m):
             rollback_frat = storage.read_resp(m)
             m.d.sync += assign(self.frat, rollback_frat.data)  # (frat is locked)
-            m.d.sync += last_rollback_finished.eq((rollback_target_tag == rollback_tag_s2) & ~self.rollback.run)
-            log.debug(m, True, "frat restored to rollback tag 0x{:x}", rollback_tag_s2)
+            m.d.sync += last_rollback_finished.eq((rollback_target_tag == rollback_tag_s1) & ~self.rollback.run)
+            log.debug(m, True, "frat restored to rollback tag 0x{:x}", rollback_tag_s1)
 
         # --------------
         # Retiring tags
@@ -426,6 +448,29 @@ class CheckpointRAT(Elaboratable):
             log.debug(m, True, "freed tag 0x{:x}", freed_tag)
             log.assertion(m, (tags_tail + 1) != tags_head, "tag free underflow")
 
+        @def_method(m, self.free_all_tags)
+        def _():
+            youngest_tag = Signal(self.gen_params.tag_bits)
+            m.d.av_comb += youngest_tag.eq(tags_head - 1)
+
+            m.d.comb += active_tags_reset_mask_1.eq(~(1 << youngest_tag))
+            m.d.comb += checkpointed_tags_reset_mask_1.eq(~(1 << youngest_tag))
+            m.d.sync += tags_tail.eq(youngest_tag)
+
+            # The checkpoint of the youngest tag (if present) is the last allocated one, keep it.
+            with m.If(((checkpointed_tags & active_tags) & (1 << youngest_tag)).any()):
+                m.d.sync += checkpoints_tail.eq(
+                    Mux(checkpoints_head == 0, self.gen_params.checkpoint_count - 1, checkpoints_head - 1)
+                )
+            with m.Else():
+                m.d.sync += checkpoints_tail.eq(checkpoints_head)
+            m.d.sync += checkpoints_full.eq(0)
+
+            log.debug(m, True, "freed all tags up to 0x{:x}", youngest_tag)
+            return {"tag": youngest_tag}
+
+        self.free_all_tags.add_conflict(self.free_tag)
+
         # -----
         # Misc
         # -----
@@ -492,7 +537,8 @@ class CheckpointRAT(Elaboratable):
         )
 
         m.submodules.storage = storage
-        m.submodules.tag_map = tag_map
+        m.submodules.perf_recovery_latency = self.perf_recovery_latency
+        m.submodules.perf_frat_restore_stall = self.perf_frat_restore_stall
         m.submodules.create_checkpoint_pipe = create_checkpoint_pipe
 
         return m
@@ -1,13 +1,13 @@
 from amaranth import *
 from amaranth.lib.data import ArrayLayout
 from amaranth.lib import memory
-from transactron import Methods, Transaction, def_methods, TModule
+from transactron import Method, Methods, Transaction, def_method, def_methods, TModule
 from transactron.utils.amaranth_ext.elaboratables import OneHotMux
 from coreblocks.interface.keys import RVVIHartCollectorKey
 from coreblocks.interface.layouts import RFLayouts
 from coreblocks.params import GenParams
 from transactron.utils import DependencyContext, logging
-from transactron.lib.metrics import HwExpHistogram, TaggedLatencyMeasurer
+from transactron.lib.metrics import HwExpHistogram, HwMetric, TaggedLatencyMeasurer
 from transactron.lib.storage import MemoryBank
 from transactron.utils.amaranth_ext.functions import popcount
 
@@ -30,12 +30,27 @@ class RegisterFile(Elaboratable):
             write_ports=write_ports,
             read_on_resp=True,
         )
-        self.valids = Array(Signal(init=k == 0) for k in range(2**gen_params.phys_regs_bits))
+        # Bulk invalidation (`free_mask`) needs the valid bits in registers, otherwise they are kept in a memory.
+        self.bulk_free = gen_params.fast_trap_flush
+        if self.bulk_free:
+            self.valids = Array(Signal(init=k == 0) for k in range(2**gen_params.phys_regs_bits))
+        else:
+            self.valids_mem = MemoryBank(
+                memory_type=gen_params.multiport_memory_type,
+                shape=1,
+                depth=2**gen_params.phys_regs_bits,
+                read_ports=read_ports,
+                write_ports=write_ports + free_ports,
+                read_on_resp=True,
+            )
 
         self.read_req = Methods(read_ports, i=layouts.rf_read_in)
         self.read_resp = Methods(read_ports, i=layouts.rf_read_in, o=layouts.rf_read_out)
         self.write = Methods(write_ports, i=layouts.rf_write)
         self.free = Methods(free_ports, i=layouts.rf_free)
+        if self.bulk_free:
+            self.free_mask = Method(i=layouts.rf_free_mask)
+            """Invalidates the registers selected by the mask. Available only with `fast_trap_flush`."""
 
         self.perf_rf_valid_time = TaggedLatencyMeasurer(
             "struct.rf.valid_time",
@@ -55,6 +70,23 @@ class RegisterFile(Elaboratable):
         m = TModule()
 
         m.submodules += [self.entries, self.perf_rf_valid_time, self.perf_num_valid]
+        if not self.bulk_free:
+            m.submodules.valids_mem = self.valids_mem
+
+        check_valids = self.bulk_free or self.gen_params.extra_verification
+        if self.bulk_free:
+            valids_check = self.valids
+        elif check_valids:
+            # Copy of the valid bits kept in the memory, used only for verification.
+            valids_check = Array(Signal() for _ in range(self.gen_params.phys_regs))
+
+        def set_valid(k: int, reg_id: Value, valid: int):
+            if self.bulk_free:
+                m.d.sync += self.valids[reg_id].eq(valid)
+            else:
+                self.valids_mem.write[k](m, addr=reg_id, data=valid)
+                if check_valids:
+                    m.d.sync += valids_check[reg_id].eq(valid)
 
         being_written = Signal(ArrayLayout(self.gen_params.phys_regs_bits, len(self.write)))
         written_value = Signal(ArrayLayout(self.gen_params.isa.xlen, len(self.write)))
@@ -62,6 +94,8 @@ class RegisterFile(Elaboratable):
         @def_methods(m, self.read_req)
         def _(k: int, reg_id: Value):
             self.entries.read_req[k](m, addr=reg_id)
+            if not self.bulk_free:
+                self.valids_mem.read_req[k](m, addr=reg_id)
 
         @def_methods(m, self.read_resp)
         def _(k: int, reg_id: Value):
@@ -76,22 +110,47 @@ class RegisterFile(Elaboratable):
                 [(reg_written[i], written_value[i]) for i in range(len(self.write))],
                 self.entries.read_resp[k](m).data,
             )
+            if self.bulk_free:
+                valid = self.valids[reg_id]
+            else:
+                valid = self.valids_mem.read_resp[k](m).data | (reg_id == 0)
             return {
                 "reg_val": reg_val,
-                "valid": forward | self.valids[reg_id],
+                "valid": forward | valid,
             }
 
         rvvi = DependencyContext.get().get_optional_dependency(RVVIHartCollectorKey())
 
+        # Registers freed by `free_mask` don't stop the valid time measurement, it is stopped on the next `free`.
+        if self.bulk_free and HwMetric.metrics_enabled():
+            measured = Array(Signal() for _ in range(2**self.gen_params.phys_regs_bits))
+
+        def start_measurement(k: int, reg_id: Value):
+            if self.bulk_free and HwMetric.metrics_enabled():
+                with m.If(~measured[reg_id]):
+                    self.perf_rf_valid_time.start[k](m, slot=reg_id)
+                    m.d.sync += measured[reg_id].eq(1)
+            else:
+                self.perf_rf_valid_time.start[k](m, slot=reg_id)
+
+        def stop_measurement(k: int, reg_id: Value):
+            if self.bulk_free and HwMetric.metrics_enabled():
+                with m.If(measured[reg_id]):
+                    self.perf_rf_valid_time.stop[k](m, slot=reg_id)
+                    m.d.sync += measured[reg_id].eq(0)
+            else:
+                self.perf_rf_valid_time.stop[k](m, slot=reg_id)
+
         @def_methods(m, self.write)
         def _(k: int, reg_id: Value, reg_val: Value):
             m.d.comb += being_written[k].eq(reg_id)
             m.d.av_comb += written_value[k].eq(reg_val)
             with m.If(reg_id != 0):
-                log.assertion(m, ~self.valids[reg_id], "Valid register {} written", reg_id)
+                if check_valids:
+                    log.assertion(m, ~valids_check[reg_id], "Valid register {} written", reg_id)
                 self.entries.write[k](m, addr=reg_id, data=reg_val)
-                m.d.sync += self.valids[reg_id].eq(1)
-                self.perf_rf_valid_time.start[k](m, slot=reg_id)
+                set_valid(k, reg_id, 1)
+                start_measurement(k, reg_id)
 
                 if rvvi is not None:
                     rvvi.register_reg_write[k](m, reg_id=reg_id, reg_val=reg_val)
@@ -99,9 +158,22 @@ class RegisterFile(Elaboratable):
         @def_methods(m, self.free)
         def _(k: int, reg_id: Value):
             with m.If(reg_id != 0):
-                log.assertion(m, self.valids[reg_id], "Invalid register {} freed", reg_id)
-                m.d.sync += self.valids[reg_id].eq(0)
-                self.perf_rf_valid_time.stop[k](m, slot=reg_id)
+                if check_valids:
+                    log.assertion(m, valids_check[reg_id], "Invalid register {} freed", reg_id)
+                set_valid(len(self.write) + k, reg_id, 0)
+                stop_measurement(k, reg_id)
+
+        if self.bulk_free:
+
+            @def_method(m, self.free_mask)
+            def _(mask: Value):
+                for reg_id in range(1, 2**self.gen_params.phys_regs_bits):
+                    with m.If(mask[reg_id]):
+                        m.d.sync += self.valids[reg_id].eq(0)
+
+            # Simultaneous writes and frees of single registers would be overridden.
+            for method in [*self.write, *self.free]:
+                self.free_mask.add_conflict(method)
 
         # It is assumed that two simultaneous write calls never write the same physical register.
         for k1, m1 in enumerate(self.write):
@@ -128,10 +200,15 @@ class RegisterFile(Elaboratable):
                 )
 
         if self.perf_num_valid.metrics_enabled():
-            num_valid = Signal(self.gen_params.phys_regs_bits + 1)
-            m.d.comb += num_valid.eq(
-                popcount(Cat(self.valids[reg_id] for reg_id in range(2**self.gen_params.phys_regs_bits)))
-            )
+            num_valid = Signal(self.gen_params.phys_regs_bits + 1, init=1)
+            if self.bulk_free:
+                m.d.comb += num_valid.eq(
+                    popcount(Cat(self.valids[reg_id] for reg_id in range(2**self.gen_params.phys_regs_bits)))
+                )
+            else:
+                written = popcount(Cat(method.run & (method.data_in.reg_id != 0) for method in self.write))
+                freed = popcount(Cat(method.run & (method.data_in.reg_id != 0) for method in self.free))
+                m.d.sync += num_valid.eq(num_valid + written - freed)
             with Transaction(name="perf").always_body(m):
                 self.perf_num_valid.add(m, num_valid)
 
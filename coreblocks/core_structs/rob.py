@@ -1,9 +1,11 @@
 from functools import reduce
 import operator
 from amaranth import *
-from transactron import Method, Methods, Transaction, def_method, TModule, def_methods
+from amaranth.lib import data
+from transactron import Method, Methods, Priority, Transaction, def_method, TModule, def_methods
 from transactron.lib.fifo import WideFifo
-from transactron.utils import logging
+from transactron.utils import logging, mod_incr, popcount
+from transactron.utils.amaranth_ext import rotate_left, rotate_vec_left, rotate_vec_right
 from transactron.lib.metrics import *
 from coreblocks.interface.layouts import ROBLayouts
 from coreblocks.params import GenParams
@@ -33,11 +35,20 @@ class ReorderBuffer(Elaboratable):
         Marks instruction as completed. Used by the announcement module.
     retire : Method
         Removes instructions from the ROB. Used by the retirement module.
+    flush : Method
+        Removes all instructions from the ROB at once. Ready only when all
+        of them are done. Returns the number of removed instructions. Used
+        by the retirement module to flush the core on a trap.
     peek : Method
         Returns the front of the ROB without removing instructions.
     get_indices : Method
         Returns the `rob_id` of the oldest instruction in the ROB and the
         first `rob_id` after the newest instruction in the ROB.
+
+    The status of the instructions (done, pure, exception) is kept in
+    synchronous memories banked the same way as the instruction data, so
+    that large ROBs can be placed in block RAM. Each bank has a single
+    read port, which prefetches the status of the next oldest instructions.
     """
 
     def __init__(self, gen_params: GenParams, mark_done_ports: int) -> None:
@@ -55,9 +66,7 @@ class ReorderBuffer(Elaboratable):
         self.mark_done = Methods(mark_done_ports, i=layouts.mark_done_layout)
         self.peek = Method(o=layouts.peek_layout)
         self.retire = Method(i=layouts.retire_layout)
-        self.done = Array(Signal() for _ in range(2**self.params.rob_entries_bits))
-        self.pure = Array(Signal() for _ in range(2**self.params.rob_entries_bits))
-        self.exception = Array(Signal() for _ in range(2**self.params.rob_entries_bits))
+        self.flush = Method(o=layouts.flush_layout)
         self.data = WideFifo(
             shape=layouts.data_layout,
             depth=2**self.params.rob_entries_bits,
@@ -105,16 +114,72 @@ class ReorderBuffer(Elaboratable):
         end_idx = Value.cast(self.data.write_idx)
 
         start_idx_plus = [Signal.like(start_idx) for _ in range(self.params.retirement_superscalarity)]
-        end_idx_plus = [Signal.like(end_idx) for _ in range(self.params.retirement_superscalarity)]
         for i in range(len(start_idx_plus)):
             m.d.comb += start_idx_plus[i].eq(start_idx + i)
-            m.d.comb += end_idx_plus[i].eq(end_idx + i)
 
         m.submodules.data = self.data
 
+        # number of entries in the ROB and number of entries which are not done yet
+        count = Signal(range(2**self.params.rob_entries_bits + 1))
+        pending = Signal.like(count)
+        put_count = Signal(range(self.params.frontend_superscalarity + 1))
+        retire_count = Signal(range(self.params.retirement_superscalarity + 1))
+        flush_count = Signal.like(count)
+        m.d.sync += count.eq(count + put_count - retire_count)
+        m.d.sync += pending.eq(pending + put_count - popcount(Cat(method.run for method in self.mark_done)))
+
+        # Instruction status memories, one bank per `WideFifo` column. The status is initialized by `put`,
+        # so it doesn't need to be cleared on retirement. Each bank is written by one `put` lane
+        # and by all `mark_done` ports.
+        col_count = self.data.col_count
+        row_count = self.data.row_count
+        status_layout = data.StructLayout({"done": 1, "pure": 1, "exception": 1})
+        status_banks = [
+            self.params.multiport_memory_type(shape=status_layout, depth=row_count, init=[]) for _ in range(col_count)
+        ]
+        for i, bank in enumerate(status_banks):
+            m.submodules[f"status{i}"] = bank
+        put_ports = [bank.write_port() for bank in status_banks]
+        mark_done_ports = [[bank.write_port() for bank in status_banks] for _ in self.mark_done]
+        read_ports = [
+            bank.read_port(transparent_for=[put_ports[i]] + [ports[i] for ports in mark_done_ports])
+            for i, bank in enumerate(status_banks)
+        ]
+
+        def as_idx(rob_id: Value):
+            return self.data.idx_layout(rob_id)
+
+        # The read ports are addressed with the oldest instructions of the next cycle.
+        start = as_idx(start_idx)
+        next_start = Signal(self.data.idx_layout)
+        with m.If(start.col + retire_count >= col_count):
+            m.d.comb += next_start.row.eq(mod_incr(start.row, row_count))
+            m.d.comb += next_start.col.eq(start.col + retire_count - col_count)
+        with m.Else():
+            m.d.comb += next_start.row.eq(start.row)
+            m.d.comb += next_start.col.eq(start.col + retire_count)
+        with m.If(self.flush.run):
+            m.d.comb += next_start.eq(0)
+
+        for i, port in enumerate(read_ports):
+            m.d.comb += port.addr.eq(Mux(i >= next_start.col, next_start.row, mod_incr(next_start.row, row_count)))
+
+        head_status = [Signal(status_layout) for _ in range(self.params.retirement_superscalarity)]
+
+        # Shadow copies of the status bits, used only for verification.
+        if self.params.extra_verification:
+            done_check = Array(Signal() for _ in range(2**self.params.rob_entries_bits))
+            pure_check = Array(Signal() for _ in range(2**self.params.rob_entries_bits))
+
         with Transaction().body(m):
             peek_ret = self.data.peek(m)
 
+        head = rotate_vec_right([port.data for port in read_ports], start.col)
+        for i in range(self.params.retirement_superscalarity):
+            # status of the entries past the end of the ROB is stale
+            with m.If(i < peek_ret.count):
+                m.d.comb += head_status[i].eq(head[i])
+
         @def_method(m, self.peek, nonexclusive=True)
         def _():
             entries = []
@@ -123,35 +188,49 @@ class ReorderBuffer(Elaboratable):
                     {
                         "rob_data": peek_ret.data[i],
                         "rob_id": start_idx_plus[i],
-                        "exception": self.exception[start_idx_plus[i]],
-                        "done": self.done[start_idx_plus[i]],
-                        "pure": self.pure[start_idx_plus[i]],
+                        "exception": head_status[i].exception,
+                        "done": head_status[i].done,
+                        "pure": head_status[i].pure,
                     }
                 )
             return {"count": peek_ret.count, "entries": entries}
 
-        @def_method(m, self.retire, ready=self.done[start_idx])
+        @def_method(m, self.retire, ready=head_status[0].done)
         def _(count: int):
             retire_ok = reduce(
                 operator.and_,
-                [self.done[start_idx_plus[i]] | (i >= count) for i in range(self.params.retirement_superscalarity)],
+                [head_status[i].done | (i >= count) for i in range(self.params.retirement_superscalarity)],
             )
             log.assertion(m, (count <= peek_ret.count) & retire_ok, "retire called with invalid count {}", count)
-            self.perf_rob_wait_time.stop(m, count=count)
             self.perf_rob_retire_count.incr(m, tag=count)
             self.data.read(m, count=count)
-            for i in range(self.params.retirement_superscalarity):
-                with m.If(i < count):
-                    m.d.sync += self.done[start_idx_plus[i]].eq(0)
+            m.d.comb += retire_count.eq(count)
+            if self.params.extra_verification:
+                for i in range(self.params.retirement_superscalarity):
+                    with m.If(i < count):
+                        m.d.sync += done_check[start_idx_plus[i]].eq(0)
 
         @def_method(m, self.put)
         def _(count: int, entries):
             self.perf_rob_wait_time.start(m, count=count)
             self.perf_rob_put_count.incr(m, tag=count)
             self.data.write(m, count=count, data=[entry.rob_data for entry in entries])
-            for i in range(self.params.retirement_superscalarity):
-                with m.If(i < count):
-                    m.d.sync += self.pure[end_idx_plus[i]].eq(entries[i].pure)
+            m.d.comb += put_count.eq(count)
+
+            end = as_idx(end_idx)
+            ens = Signal(col_count)
+            m.d.comb += ens.eq(Cat(i < count for i in range(col_count)))
+            m.d.comb += Cat(port.en for port in put_ports).eq(rotate_left(ens, end.col))
+            pures = [entry.pure for entry in entries] + [C(0)] * (col_count - self.params.frontend_superscalarity)
+            for i, (port, pure) in enumerate(zip(put_ports, rotate_vec_left(pures, end.col))):
+                m.d.av_comb += port.addr.eq(Mux(i >= end.col, end.row, mod_incr(end.row, row_count)))
+                m.d.av_comb += port.data.eq(Cat(C(0), pure, C(0)))  # done, pure, exception
+
+            if self.params.extra_verification:
+                for i in range(self.params.frontend_superscalarity):
+                    with m.If(i < count):
+                        m.d.sync += pure_check[(end_idx + i)[: len(end_idx)]].eq(entries[i].pure)
+
             entries = []
             for i in range(self.params.frontend_superscalarity):
                 rob_id = (end_idx + i)[: len(end_idx)]
@@ -163,21 +242,53 @@ class ReorderBuffer(Elaboratable):
         # could mark fields in ROB as done when they shouldn't.
         @def_methods(m, self.mark_done)
         def _(k: int, rob_id: Value, exception):
-            log.assertion(m, ~self.done[rob_id], "mark_done called on already done ROB entry {}", rob_id)
-            m.d.sync += self.done[rob_id].eq(1)
-            m.d.sync += self.pure[rob_id].eq(~exception)
-            m.d.sync += self.exception[rob_id].eq(exception)
-            log.error(
-                m,
-                exception & self.pure[rob_id],
-                "pure instruction caused an exception at ROB id {}",
-                rob_id,
-            )
+            idx = as_idx(rob_id)
+            for i, port in enumerate(mark_done_ports[k]):
+                m.d.comb += port.en.eq(idx.col == i)
+                m.d.av_comb += port.addr.eq(idx.row)
+                m.d.av_comb += port.data.eq(Cat(C(1), ~exception, exception))  # done, pure, exception
+
+            if self.params.extra_verification:
+                log.assertion(m, ~done_check[rob_id], "mark_done called on already done ROB entry {}", rob_id)
+                m.d.sync += done_check[rob_id].eq(1)
+                log.error(
+                    m,
+                    exception & pure_check[rob_id],
+                    "pure instruction caused an exception at ROB id {}",
+                    rob_id,
+                )
+
+        @def_method(m, self.flush, ready=(pending == 0) & (count != 0))
+        def _():
+            m.d.comb += flush_count.eq(count)
+            self.data.clear(m)
+            m.d.sync += count.eq(0)
+            if self.params.extra_verification:
+                for i in range(2**self.params.rob_entries_bits):
+                    m.d.sync += done_check[i].eq(0)
+            return {"count": count}
+
+        # A new instruction can't be inserted when the ROB is cleared.
+        self.flush.add_conflict(self.put, Priority.LEFT)
 
         @def_method(m, self.get_indices, nonexclusive=True)
         def _():
             return {"start": start_idx, "end": end_idx}
 
+        if HwMetric.metrics_enabled():
+            # Instructions removed from the ROB whose wait time is not recorded yet. At most
+            # `retirement_superscalarity` of them can be recorded in a cycle, so the ones removed
+            # by a flush are recorded in the following cycles.
+            superscalarity = self.params.retirement_superscalarity
+            to_stop = Signal(range(2**self.params.rob_entries_bits + 2))
+            stop_count = Signal(range(superscalarity + 1))
+            m.d.comb += stop_count.eq(
+                Mux(to_stop + retire_count > superscalarity, superscalarity, to_stop + retire_count)
+            )
+            m.d.sync += to_stop.eq(to_stop + retire_count + flush_count - stop_count)
+            with Transaction(name="perf_wait_time").body(m, ready=stop_count != 0):
+                self.perf_rob_wait_time.stop(m, count=stop_count)
+
         if self.perf_rob_size.metrics_enabled():
             rob_size = Signal(self.params.rob_entries_bits)
             m.d.comb += rob_size.eq((end_idx - start_idx)[0 : self.params.rob_entries_bits])
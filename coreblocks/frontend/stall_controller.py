@@ -2,6 +2,7 @@ from typing import Sequence
 
 from amaranth import *
 
+from transactron.evlog import EventSource
 from transactron.utils import OneHotMux, logging
 from transactron.lib.metrics import *
 from transactron.utils import popcount, DependencyContext, MethodStruct
@@ -11,8 +12,10 @@ from transactron import *
 from coreblocks.params import *
 from coreblocks.interface.layouts import *
 from coreblocks.interface.keys import CoreStateKey, UnsafeInstructionResolvedKey
+from coreblocks.telemetry import FrontendResume, FrontendStall
 
 log = logging.HardwareLogger("frontend.stall_ctrl")
+evlog = EventSource("frontend.stall_ctrl")
 
 
 class StallController(Elaboratable):
@@ -84,6 +87,7 @@ class StallController(Elaboratable):
 
             with m.If((exception.valid | core_state.flushing) & ~stalled_exception):
                 log.debug(m, True, "Stalling frontend - pending exception on speculative path")
+                evlog.emit(m, FrontendStall.hw(cause="exception"))
                 m.d.sync += stalled_exception.eq(1)
                 self.frontend_flush(m)
 
@@ -92,6 +96,7 @@ class StallController(Elaboratable):
                 # * exception got rolled-back, redirect needs to be called from rollback
                 # * retirement finished flushing the core - it will also call the redirect
                 log.debug(m, True, "Removing frontend exception stalled state - exception got invalidated")
+                evlog.emit(m, FrontendResume.hw(cause="exception"))
                 m.d.sync += stalled_exception.eq(0)
 
         def resume_combiner(m: Module, args: Sequence[MethodStruct], runs: Value) -> AssignArg:
@@ -102,6 +107,7 @@ class StallController(Elaboratable):
         @def_method(m, self._resume_from_unsafe, nonexclusive=True, combiner=resume_combiner)
         def _(ftq_ptr, pc):
             log.info(m, True, "Unsafe instruction resolved to pc=0x{:x}", pc)
+            evlog.emit(m, FrontendResume.hw(cause="unsafe"))
 
             self.redirect_frontend(m, ftq_ptr=ftq_ptr, pc=pc)
 
@@ -109,6 +115,7 @@ class StallController(Elaboratable):
         def _():
             log.assertion(m, ~stalled_unsafe, "Can't be stalled twice because of an unsafe instruction")
             log.info(m, True, "Stalling frontend - unsafe instruction")
+            evlog.emit(m, FrontendStall.hw(cause="unsafe"))
             m.d.sync += stalled_unsafe.eq(1)
 
         @def_method(m, self.on_redirect_frontend)
@@ -50,8 +50,8 @@ class CSRUnit(FuncBlock, Elaboratable):
         Method from standard RS interface. Puts instruction in reserved place.
     update: Method
         Method from standard RS interface. Receives announcements of computed register values.
-    get_result: Method
-        Method from standard RS func block interface. Used to receive instruction result and pass
+    get_result: Methods
+        Single method from standard RS func block interface. Used to receive instruction result and pass
         it to the next pipeline stage.
     """
 
@@ -71,7 +71,7 @@ class CSRUnit(FuncBlock, Elaboratable):
         self.select = Method(o=self.csr_layouts.rs.select_out)
         self.insert = Method(i=self.csr_layouts.rs.insert_in)
         self.update = Methods(gen_params.announcement_superscalarity, i=self.csr_layouts.rs.update_in)
-        self.get_result = Method(o=self.fu_layouts.push_result)
+        self.get_result = Methods(1, o=self.fu_layouts.push_result)
 
         self.regfile: dict[int, RegisteredCSRProtocol] = {}
 
@@ -212,7 +212,7 @@ class CSRUnit(FuncBlock, Elaboratable):
         flush_instr = Signal()
         m.d.comb += flush_instr.eq(~active_tags[instr.tag])
 
-        @def_method(m, self.get_result, done | (ready_to_process & flush_instr))
+        @def_method(m, self.get_result[0], done | (ready_to_process & flush_instr))
         def _():
             m.d.sync += reserved.eq(0)
             m.d.sync += instr.valid.eq(0)
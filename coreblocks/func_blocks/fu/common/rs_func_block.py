@@ -6,7 +6,7 @@ from .rs import RS, RSBase
 from coreblocks.scheduler.wakeup_select import WakeupSelect
 from transactron import Method, Methods, TModule
 from coreblocks.func_blocks.interface.func_protocols import FuncUnit, FuncBlock
-from transactron.lib import Collector, Connect, BasicFifo
+from transactron.lib import Connect, BasicFifo
 from coreblocks.arch import OpType
 from coreblocks.interface.layouts import RSInterfaceLayouts, RSLayouts, FuncUnitLayouts
 from coreblocks.telemetry import func_unit_kind
@@ -27,8 +27,9 @@ class RSFuncBlock(FuncBlock, Elaboratable):
         RS select method.
     update: Methods
         RS update methods.
-    get_result: Method
-        Method used for getting single result out of one of the FUs. It uses
+    get_result: Methods
+        Methods used for getting results out of the FUs, one per FU, so that
+        results from different FUs can be announced in the same cycle. They use
         layout described by `FuncUnitLayouts`.
     """
 
@@ -65,7 +66,7 @@ class RSFuncBlock(FuncBlock, Elaboratable):
         self.insert = Method(i=self.rs_layouts.rs.insert_in)
         self.select = Method(o=self.rs_layouts.rs.select_out)
         self.update = Methods(gen_params.announcement_superscalarity, i=self.rs_layouts.rs.update_in)
-        self.get_result = Method(o=self.fu_layouts.push_result)
+        self.get_result = Methods(len(self.func_units), o=self.fu_layouts.push_result)
 
     def elaborate(self, platform):
         m = TModule()
@@ -78,8 +79,6 @@ class RSFuncBlock(FuncBlock, Elaboratable):
             ready_for=(optypes for _, optypes, _ in self.func_units),
         )
 
-        targets: list[Method] = []
-
         for n, (func_unit, _, result_fifo) in enumerate(self.func_units):
             wakeup_select = WakeupSelect(
                 gen_params=self.gen_params,
@@ -97,14 +96,11 @@ class RSFuncBlock(FuncBlock, Elaboratable):
             m.submodules[f"wakeup_select_{n}"] = wakeup_select
             m.submodules[f"connector_{n}"] = connector
             func_unit.push_result.provide(connector.write)
-            targets.append(connector.read)
-
-        m.submodules.collector = collector = Collector.create(targets)
+            self.get_result[n].provide(connector.read)
 
         self.insert.provide(self.rs.insert)
         self.select.provide(self.rs.select)
         self.update.provide(self.rs.update)
-        self.get_result.provide(collector.method)
 
         return m
 
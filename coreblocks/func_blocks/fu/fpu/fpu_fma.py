@@ -0,0 +1,368 @@
+from amaranth import *
+from amaranth.lib import data
+from transactron import TModule, Method, Transaction, def_method
+from transactron.utils.transactron_helpers import from_method_layout
+from coreblocks.func_blocks.fu.fpu.fpu_common import (
+    RoundingModes,
+    FPUParams,
+    create_data_input_layout,
+    create_output_layout,
+    FPUCommonValues,
+)
+from coreblocks.func_blocks.fu.fpu.fpu_error_module import FPUErrorModule
+from coreblocks.func_blocks.fu.fpu.fpu_rounding_module import FPURounding
+from transactron.utils.amaranth_ext import count_leading_zeros
+from coreblocks.func_blocks.fu.unsigned_multiplication.fast_recursive import FastRecursiveMul
+
+
+class FPUFMAMethodLayout:
+    """FPU fused multiply-add module method layout
+
+    Parameters
+    ----------
+    fpu_params; FPUParams
+        FPU parameters
+    """
+
+    def __init__(self, *, fpu_params: FPUParams):
+        self.fma_in_layout = [
+            ("op_1", create_data_input_layout(fpu_params)),
+            ("op_2", create_data_input_layout(fpu_params)),
+            ("op_3", create_data_input_layout(fpu_params)),
+            ("rounding_mode", RoundingModes),
+            ("negate_product", 1),
+            ("negate_addend", 1),
+        ]
+        """
+        | Input layout for fused multiply-add
+        | op_1 - layout containing data of the first factor
+        | op_2 - layout containing data of the second factor
+        | op_3 - layout containing data of the addend
+        | rounding_mode - selected rounding mode
+        | negate_product - if set, the product op_1 * op_2 is negated
+        | negate_addend - if set, the addend op_3 is negated
+        | FMADD, FMSUB, FNMSUB and FNMADD correspond to (negate_product, negate_addend)
+          equal to (0, 0), (0, 1), (1, 0) and (1, 1) respectively.
+        | op_1, op_2 and op_3 are created using
+          :meth:`create_data_input_layout <coreblocks.func_blocks.fu.fpu.fpu_common.create_data_input_layout>`
+        """
+        self.fma_out_layout = create_output_layout(fpu_params)
+        """
+        Output layout for fused multiply-add. Created using
+        :meth:`create_output_layout <coreblocks.func_blocks.fu.fpu.fpu_common.create_output_layout>`
+        """
+
+
+class FPUFMAModule(Elaboratable):
+    """
+    | FPU fused multiply-add top module
+    | Computes (-1)^negate_product * op_1 * op_2 + (-1)^negate_addend * op_3
+      with a single rounding. The datapath is divided into three parts:
+    | 1. Multiplication - subnormal factors are normalized and their significands are
+      multiplied exactly, producing a 2p bit product.
+    | 2. Alignment and addition - the addend is placed p+2 bits above the product and shifted
+      right by the exponent difference. Bits shifted out of the datapath are gathered into
+      a sticky bit which takes part in the addition, so the sum is exact up to the sticky bit.
+      If the addend is so large that the product lies entirely below the round position,
+      the product is kept two bits below the addend, which yields the same round and sticky bits.
+    | 3. Normalization and rounding - the sum is normalized (limiting the shift so that
+      the exponent does not fall below the minimum one) and rounded once using
+      :class:`rounding module <coreblocks.func_blocks.fu.fpu.fpu_rounding_module.FPURounding>`.
+    | The module is fully pipelined and accepts one request per cycle. Registers are placed
+      after the rounding part, after the multiplication if pipeline_depth >= 2 and after
+      the addition if pipeline_depth >= 3. Any additional stages are placed after the
+      multiplication, so that they can be retimed into the multiplier by the synthesis tool.
+
+    Parameters
+    ----------
+    fpu_params: FPUParams
+        FPU parameters
+    pipeline_depth: int
+        Number of register stages, must be at least 1.
+
+    Attributes
+    ----------
+    fma_request: Method
+        Transactional method for issuing fused multiply-add.
+        Takes
+        :meth:`fma_in_layout <coreblocks.func_blocks.fu.fpu.fpu_fma.FPUFMAMethodLayout.fma_in_layout>`
+        as argument.
+    fma_response: Method
+        Transactional method for getting the result of the oldest issued operation.
+        Returns result as
+        :meth:`fma_out_layout <coreblocks.func_blocks.fu.fpu.fpu_fma.FPUFMAMethodLayout.fma_out_layout>`.
+    """
+
+    def __init__(self, *, fpu_params: FPUParams, pipeline_depth: int = 3):
+        if pipeline_depth < 1:
+            raise ValueError("FMA pipeline depth must be at least 1")
+
+        self.fpu_params = fpu_params
+        self.pipeline_depth = pipeline_depth
+        self.method_layouts = FPUFMAMethodLayout(fpu_params=self.fpu_params)
+        self.common_values = FPUCommonValues(self.fpu_params)
+        self.fma_request = Method(i=self.method_layouts.fma_in_layout)
+        self.fma_response = Method(o=self.method_layouts.fma_out_layout)
+
+    def elaborate(self, platform):
+        m = TModule()
+
+        p = self.fpu_params.sig_width
+        max_exp = self.common_values.max_exp
+        bias = self.common_values.bias
+        # width of the addition datapath: p bits of the addend, two bits of gap and 2p bits of the product
+        sum_width = 3 * p + 2
+        exp_shape = signed(self.fpu_params.exp_width + sum_width.bit_length() + 2)
+
+        m.submodules.rounding_module = rounding_module = FPURounding(fpu_params=self.fpu_params)
+        m.submodules.exception_module = exception_module = FPUErrorModule(fpu_params=self.fpu_params)
+        m.submodules.multiplier = multiplier = FastRecursiveMul(p, p // 2)
+
+        special_layout = data.StructLayout(
+            {
+                "is_nan": 1,
+                "is_inf": 1,
+                "inf_sign": 1,
+                "invalid": 1,
+            }
+        )
+        in_layout = from_method_layout(self.method_layouts.fma_in_layout)
+        mul_layout = data.StructLayout(
+            {
+                "prod": 2 * p,
+                "addend": p,
+                "prod_exp": exp_shape,
+                "addend_exp": exp_shape,
+                "prod_sign": 1,
+                "addend_sign": 1,
+                "prod_zero": 1,
+                "addend_zero": 1,
+                "special": special_layout,
+                "rounding_mode": RoundingModes,
+            }
+        )
+        add_layout = data.StructLayout(
+            {
+                # magnitude of the sum, bit 0 is the sticky bit of the addend
+                "mag": sum_width + 1,
+                "exp": exp_shape,
+                "sign": 1,
+                "zero_sign": 1,
+                "special": special_layout,
+                "rounding_mode": RoundingModes,
+            }
+        )
+        out_layout = from_method_layout(self.method_layouts.fma_out_layout)
+
+        advance = Signal()
+        taken = Signal()
+
+        out_valid = Signal()
+        out_data = Signal(out_layout)
+
+        m.d.comb += advance.eq(~out_valid | taken)
+
+        def stage_register(value, valid: Value):
+            reg = Signal(value.shape())
+            reg_valid = Signal()
+            with m.If(advance):
+                m.d.sync += reg.eq(value)
+                m.d.sync += reg_valid.eq(valid)
+            return reg, reg_valid
+
+        in_valid = Signal()
+        in_data = Signal(in_layout)
+
+        @def_method(m, self.fma_request, ready=advance)
+        def _(arg):
+            m.d.av_comb += in_data.eq(arg)
+            m.d.comb += in_valid.eq(1)
+
+        # Multiplication
+        op_1 = in_data.op_1
+        op_2 = in_data.op_2
+        op_3 = in_data.op_3
+        mul_res = Signal(mul_layout)
+
+        prod_sign = op_1.sign ^ op_2.sign ^ in_data.negate_product
+        addend_sign = op_3.sign ^ in_data.negate_addend
+
+        op_1_norm_shift = Signal(range(p + 1))
+        op_2_norm_shift = Signal(range(p + 1))
+        m.d.comb += op_1_norm_shift.eq(count_leading_zeros(op_1.sig))
+        m.d.comb += op_2_norm_shift.eq(count_leading_zeros(op_2.sig))
+        m.d.comb += multiplier.i1.eq(op_1.sig << op_1_norm_shift)
+        m.d.comb += multiplier.i2.eq(op_2.sig << op_2_norm_shift)
+
+        # Exponents 0 and 1 represent the same exponent emin
+        op_1_exp = Mux(op_1.exp == 0, 1, op_1.exp) - op_1_norm_shift
+        op_2_exp = Mux(op_2.exp == 0, 1, op_2.exp) - op_2_norm_shift
+        op_3_exp = Mux(op_3.exp == 0, 1, op_3.exp)
+
+        prod_inf = op_1.is_inf | op_2.is_inf
+        bad_inf_mul = (op_1.is_inf & op_2.is_zero) | (op_2.is_inf & op_1.is_zero)
+        inf_sub = prod_inf & op_3.is_inf & (prod_sign ^ addend_sign)
+        is_nan = op_1.is_nan | op_2.is_nan | op_3.is_nan | bad_inf_mul | inf_sub
+        is_any_snan = (
+            ((~op_1.sig[-2]) & op_1.is_nan) | ((~op_2.sig[-2]) & op_2.is_nan) | ((~op_3.sig[-2]) & op_3.is_nan)
+        )
+
+        m.d.comb += [
+            mul_res.prod.eq(multiplier.r),
+            mul_res.addend.eq(op_3.sig),
+            # Biased exponents of the least significant bit of the addition datapath,
+            # when it is aligned to the product or to the addend respectively
+            mul_res.prod_exp.eq(op_1_exp + op_2_exp - bias - 2 * p + 2),
+            mul_res.addend_exp.eq(op_3_exp - 3 * p - 1),
+            mul_res.prod_sign.eq(prod_sign),
+            mul_res.addend_sign.eq(addend_sign),
+            mul_res.prod_zero.eq(op_1.is_zero | op_2.is_zero),
+            mul_res.addend_zero.eq(op_3.is_zero),
+            mul_res.special.is_nan.eq(is_nan),
+            mul_res.special.is_inf.eq(~is_nan & (prod_inf | op_3.is_inf)),
+            mul_res.special.inf_sign.eq(Mux(prod_inf, prod_sign, addend_sign)),
+            mul_res.special.invalid.eq(is_any_snan | bad_inf_mul | inf_sub),
+            mul_res.rounding_mode.eq(in_data.rounding_mode),
+        ]
+
+        add_in, add_in_valid = mul_res, in_valid
+        if self.pipeline_depth >= 2:
+            for _ in range(max(1, self.pipeline_depth - 2)):
+                add_in, add_in_valid = stage_register(add_in, add_in_valid)
+
+        # Alignment and addition
+        add_res = Signal(add_layout)
+
+        exp_diff = Signal(exp_shape)
+        align_shift = Signal(range(sum_width + 1))
+        m.d.comb += exp_diff.eq(add_in.prod_exp - add_in.addend_exp)
+        m.d.comb += add_res.exp.eq(add_in.prod_exp)
+        with m.If(add_in.prod_zero | (~add_in.addend_zero & (exp_diff < 0))):
+            m.d.comb += align_shift.eq(0)
+            m.d.comb += add_res.exp.eq(add_in.addend_exp)
+        with m.Elif(add_in.addend_zero | (exp_diff > sum_width)):
+            m.d.comb += align_shift.eq(sum_width)
+        with m.Else():
+            m.d.comb += align_shift.eq(exp_diff)
+
+        # p additional bits at the bottom catch the bits shifted out of the datapath
+        aligned_addend = Signal(sum_width + p)
+        m.d.comb += aligned_addend.eq(Cat(C(0, 3 * p + 2), add_in.addend) >> align_shift)
+        addend_sticky = aligned_addend[:p].any()
+
+        eff_sub = add_in.prod_sign ^ add_in.addend_sign
+        lhs = Cat(C(0, 1), add_in.prod)
+        rhs = Cat(addend_sticky, aligned_addend[p:])
+        sum_res = Signal(signed(sum_width + 2))
+        m.d.comb += sum_res.eq(Mux(eff_sub, lhs - rhs, lhs + rhs))
+
+        m.d.comb += [
+            add_res.mag.eq(Mux(sum_res < 0, -sum_res, sum_res)),
+            add_res.sign.eq(Mux(sum_res < 0, add_in.addend_sign, add_in.prod_sign)),
+            # sign of an exact zero result
+            add_res.zero_sign.eq(Mux(eff_sub, add_in.rounding_mode == RoundingModes.ROUND_DOWN, add_in.prod_sign)),
+            add_res.special.eq(add_in.special),
+            add_res.rounding_mode.eq(add_in.rounding_mode),
+        ]
+
+        round_in, round_in_valid = add_res, add_in_valid
+        if self.pipeline_depth >= 3:
+            round_in, round_in_valid = stage_register(round_in, round_in_valid)
+
+        # Normalization and rounding
+        round_res = Signal(out_layout)
+
+        sum_mag = round_in.mag[1:]
+        lead_pos = Signal(range(sum_width))
+        lead_exp = Signal(exp_shape)
+        norm_pos = Signal(exp_shape)
+        m.d.comb += lead_pos.eq(sum_width - 1 - count_leading_zeros(sum_mag))
+        m.d.comb += lead_exp.eq(round_in.exp + lead_pos)
+
+        norm_exp = Signal(self.fpu_params.exp_width)
+        with m.If(lead_exp >= 1):
+            m.d.comb += norm_pos.eq(lead_pos)
+            m.d.comb += norm_exp.eq(lead_exp)
+        with m.Else():
+            # subnormal result, the normalization shift is limited by the minimum exponent
+            m.d.comb += norm_pos.eq(1 - round_in.exp)
+            m.d.comb += norm_exp.eq(0)
+
+        norm_shift = Signal(exp_shape)
+        m.d.comb += norm_shift.eq(sum_width - 1 - norm_pos)
+        padded_mag = Cat(C(0, p + 2), round_in.mag)
+        norm_mag = Signal(len(padded_mag))
+        with m.If(norm_shift >= 0):
+            m.d.comb += norm_mag.eq(padded_mag << norm_shift[: (len(padded_mag) - 1).bit_length()])
+        with m.Elif(norm_shift < -(p + 2)):
+            m.d.comb += norm_mag.eq(padded_mag >> (p + 2))
+        with m.Else():
+            m.d.comb += norm_mag.eq(padded_mag >> (-norm_shift)[: (p + 2).bit_length()])
+
+        overflow = lead_exp >= max_exp
+        is_zero = round_in.mag == 0
+
+        with Transaction(name="FMA_round").body(m):
+            rounding_response = rounding_module.rounding_request(
+                m,
+                sign=round_in.sign,
+                sig=norm_mag[-p:],
+                exp=norm_exp,
+                round_bit=norm_mag[-p - 1],
+                sticky_bit=norm_mag[: -p - 1].any(),
+                rounding_mode=round_in.rounding_mode,
+            )
+
+            exc_sig = Signal(p)
+            exc_exp = Signal(self.fpu_params.exp_width)
+            exc_sign = Signal()
+            inexact = Signal()
+            with m.If(round_in.special.is_nan):
+                m.d.av_comb += exc_sign.eq(0)
+                m.d.av_comb += exc_exp.eq(max_exp)
+                m.d.av_comb += exc_sig.eq(self.common_values.canonical_nan_sig)
+            with m.Elif(round_in.special.is_inf):
+                m.d.av_comb += exc_sign.eq(round_in.special.inf_sign)
+                m.d.av_comb += exc_exp.eq(max_exp)
+                m.d.av_comb += exc_sig.eq(2 ** (p - 1))
+            with m.Elif(is_zero):
+                m.d.av_comb += exc_sign.eq(round_in.zero_sign)
+                m.d.av_comb += exc_exp.eq(0)
+                m.d.av_comb += exc_sig.eq(0)
+            with m.Elif(overflow):
+                m.d.av_comb += exc_sign.eq(round_in.sign)
+                m.d.av_comb += exc_exp.eq(max_exp)
+                m.d.av_comb += exc_sig.eq(2 ** (p - 1))
+                m.d.av_comb += inexact.eq(1)
+            with m.Else():
+                m.d.av_comb += exc_sign.eq(round_in.sign)
+                m.d.av_comb += exc_exp.eq(rounding_response.exp)
+                m.d.av_comb += inexact.eq(rounding_response.inexact)
+                with m.If(rounding_response.exp == max_exp):
+                    m.d.av_comb += exc_sig.eq(2 ** (p - 1))
+                with m.Else():
+                    m.d.av_comb += exc_sig.eq(rounding_response.sig)
+
+            error_response = exception_module.error_checking_request(
+                m,
+                sign=exc_sign,
+                sig=exc_sig,
+                exp=exc_exp,
+                rounding_mode=round_in.rounding_mode,
+                inexact=inexact,
+                invalid_operation=round_in.special.invalid,
+                division_by_zero=0,
+                input_inf=round_in.special.is_inf,
+            )
+            m.d.av_comb += round_res.eq(error_response)
+
+        with m.If(advance):
+            m.d.sync += out_data.eq(round_res)
+            m.d.sync += out_valid.eq(round_in_valid)
+
+        @def_method(m, self.fma_response, ready=out_valid)
+        def _():
+            m.d.comb += taken.eq(1)
+            return out_data
+
+        return m
@@ -6,9 +6,10 @@ from transactron.lib import ConnectTrans, Pipe, BasicFifo, condition
 from transactron.utils import logging, DependencyContext
 
 from coreblocks.arch import OpType
-from coreblocks.arch.isa_consts import ExceptionCause
+from coreblocks.arch.isa_consts import ExceptionCause, PAGE_SIZE_LOG
 from coreblocks.func_blocks.fu.lsu.lsu_requester import LSURequester
 from coreblocks.func_blocks.fu.lsu.pma import PMAChecker
+from coreblocks.func_blocks.fu.lsu.store_buffer import StoreBuffer
 from coreblocks.priv.pmp import PMPChecker, PMPOperationMode
 from coreblocks.func_blocks.interface.func_protocols import FuncUnit
 from coreblocks.interface.keys import (
@@ -16,10 +17,11 @@ from coreblocks.interface.keys import (
     CommonBusDataKey,
     ExceptionReportKey,
     SideFxGuardKey,
+    StoreBufferEmptyKey,
 )
 from coreblocks.interface.layouts import FuncUnitLayouts, LSULayouts, AddressTranslationLayouts
 from coreblocks.params import *
-from coreblocks.peripherals.bus_adapter import BusMasterInterface
+from coreblocks.peripherals.bus_adapter import BusMasterInterface, CommonBusMasterMethodLayout
 from coreblocks.priv.vmem.translation import AddressTranslator, AddressTranslatorMode
 
 __all__ = ["LSUDummy", "LSUComponent"]
@@ -27,12 +29,44 @@ __all__ = ["LSUDummy", "LSUComponent"]
 
 class LSUDummy(FuncUnit, Elaboratable):
     """
-    Very simple LSU, which serializes all stores and loads.
+    Very simple LSU, which performs all stores and loads in order.
     It isn't fully compliant with RiscV spec. Doesn't support checking if
-    address is in correct range. Addresses have to be aligned.
+    address is in correct range. Addresses have to be aligned, unless
+    `split_misaligned` is set.
+
+    With `split_misaligned`, misaligned accesses to memory which isn't MMIO
+    are split into two aligned bus requests. When the access crosses a page
+    boundary, both pages are translated. Misaligned MMIO accesses still
+    raise an exception.
+
+    Atomic memory operations (`OpType.ATOMIC_MEMORY_OP`) are performed in
+    a single pass, as a read-modify-write of the bus word. They are not
+    exposed in `LSUComponent`, but used by `LSUAtomicWrapper`.
+
+    Atomic memory operations to regions without the `atomic` physical memory
+    attribute raise an access fault.
+
+    Optionally, stores to write-combining memory are put in a `StoreBuffer`
+    and finish without waiting for the bus. Loads are then forwarded from
+    the buffered stores. Other accesses to memory which isn't write-combining
+    or idempotent, MMIO accesses and fences wait until the buffer is empty.
+    Bus errors of buffered stores aren't reported as exceptions.
+
+    Up to `max_outstanding` bus requests can be in flight. Loads from
+    idempotent memory are issued speculatively, one per cycle, so with a pipelined data bus
+    their latencies overlap. Bus responses arrive in order, but loads which
+    don't need the bus (forwarded or faulting) finish without waiting for
+    the older ones.
     """
 
-    def __init__(self, gen_params: GenParams, bus: BusMasterInterface) -> None:
+    def __init__(
+        self,
+        gen_params: GenParams,
+        bus: BusMasterInterface,
+        store_buffer_entries: int = 0,
+        split_misaligned: bool = False,
+        max_outstanding: int = 2,
+    ) -> None:
         """
         Parameters
         ----------
@@ -40,6 +74,12 @@ class LSUDummy(FuncUnit, Elaboratable):
             Parameters to be used during processor generation.
         bus : BusMasterInterface
             An instance of the bus master for interfacing with the data bus.
+        store_buffer_entries : int
+            Number of entries of the store buffer. Zero disables the store buffer.
+        split_misaligned : bool
+            Perform misaligned accesses to memory which isn't MMIO, instead of raising an exception.
+        max_outstanding : int
+            Maximum number of requests waiting for the bus response.
         """
 
         self.gen_params = gen_params
@@ -54,11 +94,18 @@ class LSUDummy(FuncUnit, Elaboratable):
         self.push_result = Method(i=self.fu_layouts.push_result)
 
         self.bus = bus
+        self.split_misaligned = split_misaligned
+        self.max_outstanding = max_outstanding
 
         self.log = logging.HardwareLogger("backend.lsu.dummylsu")
 
         self.addr_translator = AddressTranslator(self.gen_params, mode=AddressTranslatorMode.LSU)
 
+        self.store_buffer = None
+        if store_buffer_entries:
+            self.store_buffer = StoreBuffer(self.gen_params, self.bus, store_buffer_entries)
+            self.dependency_manager.add_dependency(StoreBufferEmptyKey(), self.store_buffer.empty)
+
     def elaborate(self, platform):
         m = TModule()
 
@@ -67,17 +114,32 @@ class LSUDummy(FuncUnit, Elaboratable):
         request_tag = Signal(self.gen_params.tag_bits)
         request_side_fx = Signal()
         is_load = Signal()
+        is_fence = Signal()
+        is_atomic = Signal()
 
         m.submodules.addr_translator = self.addr_translator
         m.submodules.pma_checker = pma_checker = PMAChecker(self.gen_params)
         m.submodules.pmp_checker = pmp_checker = PMPChecker(self.gen_params, mode=PMPOperationMode.LSU)
-        m.submodules.requester = requester = LSURequester(self.gen_params, self.bus)
+        m.submodules.requester = requester = LSURequester(self.gen_params, self.bus, self.max_outstanding)
+        if self.store_buffer is not None:
+            m.submodules.store_buffer = self.store_buffer
+
+        if self.split_misaligned:
+            m.submodules.pma_checker_hi = pma_checker_hi = PMAChecker(self.gen_params)
+            m.submodules.pmp_checker_hi = pmp_checker_hi = PMPChecker(self.gen_params, mode=PMPOperationMode.LSU)
+
+        xlen = self.gen_params.isa.xlen
+        mask_len = xlen // self.bus.params.granularity
 
         m.submodules.requests = requests = BasicFifo(self.fu_layouts.issue, 2)
-        m.submodules.translator_in = translator_in = Pipe(self.translator_layouts.request)
-        m.submodules.translated = translated = BasicFifo(self.translator_layouts.accept, 2)
+        if self.split_misaligned:
+            translator_in = Pipe([("addr", xlen), ("is_store", 1), ("page_cross", 1)])
+        else:
+            translator_in = Pipe(self.translator_layouts.request)
+        m.submodules.translator_in = translator_in
+        m.submodules.translated = translated = BasicFifo(self.lsu_layouts.translated, 2)
         m.submodules.results_noop = results_noop = BasicFifo(self.lsu_layouts.accept, 2)
-        m.submodules.issued = issued = BasicFifo(self.fu_layouts.issue, 2)
+        m.submodules.issued = issued = BasicFifo(self.fu_layouts.issue, self.max_outstanding)
         m.submodules.issued_noop = issued_noop = BasicFifo(self.fu_layouts.issue, 2)
 
         @def_method(m, self.issue)
@@ -85,19 +147,96 @@ class LSUDummy(FuncUnit, Elaboratable):
             self.log.debug(
                 m, 1, "issue rob_id={} funct3={} op_type={}", arg.rob_id, arg.exec_fn.funct3, arg.exec_fn.op_type
             )
-            is_fence = arg.exec_fn.op_type == OpType.FENCE
+            issued_fence = arg.exec_fn.op_type == OpType.FENCE
             addr = Signal(self.gen_params.isa.xlen)
             m.d.av_comb += addr.eq(arg.s1_val + arg.imm)
 
-            with m.If(~is_fence):
-                translator_in.write(m, addr=addr, is_store=arg.exec_fn.op_type == OpType.STORE)
+            with m.If(~issued_fence):
+                if self.split_misaligned:
+                    page_cross = Signal()
+                    bytes_mask = requester.prepare_bytes_mask(m, arg.exec_fn.funct3, addr)
+                    m.d.av_comb += page_cross.eq(addr[2:PAGE_SIZE_LOG].all() & bytes_mask[mask_len:].any())
+                    translator_in.write(
+                        m, addr=addr, is_store=arg.exec_fn.op_type != OpType.LOAD, page_cross=page_cross
+                    )
+                else:
+                    translator_in.write(m, addr=addr, is_store=arg.exec_fn.op_type != OpType.LOAD)
+            if self.store_buffer is not None:
+                # Fences wait in order for the older stores to be written.
                 requests.write(m, arg)
-            with m.Else():
-                results_noop.write(m, data=0, exception=0, cause=0, addr=0)
-                issued_noop.write(m, arg)
+            else:
+                with m.If(~issued_fence):
+                    requests.write(m, arg)
+                with m.Else():
+                    results_noop.write(m, data=0, exception=0, cause=0, addr=0)
+                    issued_noop.write(m, arg)
 
-        m.submodules += ConnectTrans.create(translator_in.read, self.addr_translator.request)
-        m.submodules += ConnectTrans.create(self.addr_translator.accept, translated.write)
+        if self.split_misaligned:
+            # Accesses crossing a page boundary are translated twice, the second time for the next page.
+            m.submodules.translation_parts = translation_parts = BasicFifo([("page_cross", 1)], 2)
+            hi_translation = Signal()
+            hi_translation_req = Signal(self.translator_layouts.request)
+
+            with Transaction().body(m, ready=~hi_translation):
+                req = translator_in.read(m)
+                self.addr_translator.request(m, addr=req.addr, is_store=req.is_store)
+                translation_parts.write(m, page_cross=req.page_cross)
+                with m.If(req.page_cross):
+                    m.d.sync += hi_translation.eq(1)
+                    m.d.sync += hi_translation_req.addr.eq((req.addr & ~3) + 4)
+                    m.d.sync += hi_translation_req.is_store.eq(req.is_store)
+
+            with Transaction().body(m, ready=hi_translation):
+                self.addr_translator.request(m, hi_translation_req)
+                m.d.sync += hi_translation.eq(0)
+
+            lo_translated = Signal()
+            lo_translation = Signal(self.translator_layouts.accept)
+
+            with Transaction().body(m):
+                res = self.addr_translator.accept(m)
+                part = translation_parts.peek(m)
+                lo_fault = lo_translation.page_fault | lo_translation.access_fault
+                with m.If(part.page_cross & ~lo_translated):
+                    m.d.sync += lo_translation.eq(res)
+                    m.d.sync += lo_translated.eq(1)
+                with m.Elif(part.page_cross):
+                    translation_parts.read(m)
+                    m.d.sync += lo_translated.eq(0)
+                    translated.write(
+                        m,
+                        vaddr=lo_translation.vaddr,
+                        paddr=lo_translation.paddr,
+                        paddr_hi=res.paddr,
+                        page_fault=Mux(lo_fault, lo_translation.page_fault, res.page_fault),
+                        access_fault=Mux(lo_fault, lo_translation.access_fault, res.access_fault),
+                        fault_hi=~lo_fault,
+                    )
+                with m.Else():
+                    translation_parts.read(m)
+                    translated.write(
+                        m,
+                        vaddr=res.vaddr,
+                        paddr=res.paddr,
+                        paddr_hi=(res.paddr & ~3) + 4,
+                        page_fault=res.page_fault,
+                        access_fault=res.access_fault,
+                        fault_hi=0,
+                    )
+        else:
+            m.submodules += ConnectTrans.create(translator_in.read, self.addr_translator.request)
+
+            with Transaction().body(m):
+                res = self.addr_translator.accept(m)
+                translated.write(
+                    m,
+                    vaddr=res.vaddr,
+                    paddr=res.paddr,
+                    paddr_hi=(res.paddr & ~3) + 4,
+                    page_fault=res.page_fault,
+                    access_fault=res.access_fault,
+                    fault_hi=0,
+                )
 
         with Transaction().always_body(m):
             active_tags = self.dependency_manager.get_dependency(ActiveTagsKey())(m).active_tags
@@ -105,27 +244,76 @@ class LSUDummy(FuncUnit, Elaboratable):
         # Issues load/store requests when the instruction is known, is a LOAD/STORE, and just before commit.
         # Memory loads can be issued speculatively.
         flush = Signal()
-        pmas = pma_checker.result
-        can_reorder = is_load & ~pmas["mmio"]
+        mmio = Signal()
+        idempotent = Signal()
+        write_combining = Signal()
+        can_reorder = is_load & idempotent
         want_issue = request_side_fx | can_reorder
         m.d.comb += flush.eq(~active_tags[request_tag])
 
-        do_issue = ~flush & want_issue
-        with Transaction().body(m, ready=do_issue):
+        # Requests which would be reordered with the buffered stores wait until they are written.
+        store_buffer_ready = Signal()
+        buffered = Signal()
+        forwarded = Signal()
+        forwarded_data = Signal(self.gen_params.isa.xlen)
+        # Set when the request is finished without accessing the bus.
+        bypass = Signal()
+        buffered_store = Signal(CommonBusMasterMethodLayout(self.bus.params).request_write_layout)
+        # Writes to the bus by the store buffer and by the requester can't be in flight together,
+        # as the responses wouldn't be told apart.
+        bus_stores = Signal(range(requester.depth + 1))
+        bus_store_issued = Signal()
+        bus_store_accepted = Signal()
+        m.d.sync += bus_stores.eq(bus_stores + bus_store_issued - bus_store_accepted)
+
+        if self.store_buffer is None:
+            m.d.comb += store_buffer_ready.eq(1)
+
+        do_issue = ~flush & want_issue & ~is_fence & store_buffer_ready
+        with Transaction().body(m, ready=do_issue & ~bypass):
             arg = requests.read(m)
             translated_req = translated.read(m)
             paddr = translated_req.paddr
             addr = translated_req.vaddr
 
+            funct3 = arg.exec_fn.funct3
+            aligned = requester.check_align(m, funct3, paddr)
+            bytes_mask = requester.prepare_bytes_mask(m, funct3, paddr)
+            # Set when the access spans two bus words.
+            split = Signal()
+            m.d.av_comb += split.eq(bytes_mask[mask_len:].any())
+
             m.d.av_comb += pma_checker.paddr.eq(paddr)
             m.d.av_comb += pmp_checker.paddr.eq(paddr)
+            if self.split_misaligned:
+                m.d.av_comb += pma_checker_hi.paddr.eq(translated_req.paddr_hi)
+                m.d.av_comb += pmp_checker_hi.paddr.eq(translated_req.paddr_hi)
+                m.d.av_comb += mmio.eq(pma_checker.result.mmio | (split & pma_checker_hi.result.mmio))
+                m.d.av_comb += idempotent.eq(
+                    pma_checker.result.idempotent & (~split | pma_checker_hi.result.idempotent)
+                )
+                m.d.av_comb += write_combining.eq(
+                    pma_checker.result.write_combining & (~split | pma_checker_hi.result.write_combining)
+                )
+            else:
+                m.d.av_comb += mmio.eq(pma_checker.result.mmio)
+                m.d.av_comb += idempotent.eq(pma_checker.result.idempotent)
+                m.d.av_comb += write_combining.eq(pma_checker.result.write_combining)
             m.d.av_comb += is_load.eq(arg.exec_fn.op_type == OpType.LOAD)
+            m.d.av_comb += is_fence.eq(arg.exec_fn.op_type == OpType.FENCE)
+            m.d.av_comb += is_atomic.eq(arg.exec_fn.op_type == OpType.ATOMIC_MEMORY_OP)
             m.d.av_comb += request_rob_id.eq(arg.rob_id)
             m.d.av_comb += request_tag.eq(arg.tag)
             # TODO: refactor with peek
 
+            split_allowed = Signal()
+            if self.split_misaligned:
+                m.d.av_comb += split_allowed.eq(~mmio & ~is_atomic)
+
             exception = Signal()
             cause = Signal(ExceptionCause)
+            # Set when the exception is caused by the second bus word of a split access.
+            fault_hi = Signal()
 
             with m.If(translated_req.page_fault):
                 m.d.av_comb += exception.eq(1)
@@ -141,32 +329,102 @@ class LSUDummy(FuncUnit, Elaboratable):
             with m.Elif(~is_load & ~pmp_checker.result.w):
                 m.d.av_comb += exception.eq(1)
                 m.d.av_comb += cause.eq(ExceptionCause.STORE_ACCESS_FAULT)
+            with m.Elif(is_atomic & ~pmp_checker.result.r):
+                m.d.av_comb += exception.eq(1)
+                m.d.av_comb += cause.eq(ExceptionCause.STORE_ACCESS_FAULT)
+            with m.Elif(is_atomic & aligned & ~pma_checker.result.atomic):
+                # Misaligned atomic operations raise the misaligned exception in the requester.
+                m.d.av_comb += exception.eq(1)
+                m.d.av_comb += cause.eq(ExceptionCause.STORE_ACCESS_FAULT)
+            if self.split_misaligned:
+                with m.Elif(split & split_allowed & is_load & ~pmp_checker_hi.result.r):
+                    m.d.av_comb += exception.eq(1)
+                    m.d.av_comb += cause.eq(ExceptionCause.LOAD_ACCESS_FAULT)
+                with m.Elif(split & split_allowed & ~is_load & ~pmp_checker_hi.result.w):
+                    m.d.av_comb += exception.eq(1)
+                    m.d.av_comb += cause.eq(ExceptionCause.STORE_ACCESS_FAULT)
+            m.d.av_comb += fault_hi.eq(
+                Mux(
+                    translated_req.page_fault | translated_req.access_fault,
+                    translated_req.fault_hi,
+                    split_allowed & Mux(is_load, pmp_checker.result.r, pmp_checker.result.w),
+                )
+            )
+            fault_addr = Mux(fault_hi, (addr & ~3) + 4, addr)
+
+            if self.store_buffer is not None:
+                fwd_mask = bytes_mask[:mask_len] & self.store_buffer.lookup_mask
+                can_access = aligned | split_allowed
+                m.d.av_comb += self.store_buffer.lookup_addr.eq(paddr >> 2)
+
+                with m.If(mmio | split | is_atomic | Mux(is_load, ~idempotent, ~write_combining)):
+                    m.d.av_comb += store_buffer_ready.eq(self.store_buffer.empty)
+                with m.Elif(is_load):
+                    # Loads partially covered by the buffered stores wait for them to be written.
+                    m.d.av_comb += store_buffer_ready.eq((fwd_mask == 0) | (fwd_mask == bytes_mask[:mask_len]))
+                    m.d.av_comb += forwarded.eq(can_access & (fwd_mask != 0))
+                    m.d.av_comb += forwarded_data.eq(
+                        requester.postprocess_load_data(m, funct3, self.store_buffer.lookup_data, paddr)
+                    )
+                with m.Else():
+                    m.d.av_comb += store_buffer_ready.eq(
+                        (~self.store_buffer.full | self.store_buffer.lookup_mergeable) & (bus_stores == 0)
+                    )
+                    m.d.av_comb += buffered.eq(can_access)
+
+                m.d.av_comb += bypass.eq(~exception & (buffered | forwarded))
+                m.d.av_comb += buffered_store.addr.eq(paddr >> 2)
+                m.d.av_comb += buffered_store.data.eq(
+                    requester.prepare_data_to_save(m, funct3, arg.s2_val, paddr)[:xlen]
+                )
+                m.d.av_comb += buffered_store.sel.eq(bytes_mask[:mask_len])
 
             with m.If(~exception):
                 res = requester.issue(
                     m,
                     paddr=paddr,
+                    paddr_hi=translated_req.paddr_hi,
                     vaddr=addr,
                     data=arg.s2_val,
                     funct3=arg.exec_fn.funct3,
+                    funct7=arg.exec_fn.funct7,
                     store=~is_load,
+                    split_misaligned=split_allowed,
+                    atomic=is_atomic,
                 )
                 with m.If(res["exception"]):
                     issued_noop.write(m, arg)
                     results_noop.write(m, data=0, exception=1, cause=res["cause"], addr=addr)
                 with m.Else():
                     issued.write(m, arg)
+                    m.d.comb += bus_store_issued.eq(~is_load)
             with m.Else():
                 issued_noop.write(m, arg)
-                results_noop.write(m, data=0, exception=1, cause=cause, addr=addr)
+                results_noop.write(m, data=0, exception=1, cause=cause, addr=fault_addr)
+
+        if self.store_buffer is not None:
+            # Buffered stores and forwarded loads don't wait for the bus.
+            with Transaction().body(m, ready=do_issue & bypass):
+                arg = requests.read(m)
+                translated_req = translated.read(m)
+                with m.If(buffered):
+                    self.store_buffer.write(m, buffered_store)
+                issued_noop.write(m, arg)
+                results_noop.write(m, data=forwarded_data, exception=0, cause=0, addr=translated_req.vaddr)
 
         # Handles flushed instructions as a no-op.
-        with Transaction().body(m, ready=flush):
+        with Transaction().body(m, ready=flush & ~is_fence):
             arg = requests.read(m)
             translated.read(m)
             results_noop.write(m, data=0, exception=0, cause=0, addr=0)
             issued_noop.write(m, arg)
 
+        if self.store_buffer is not None:
+            with Transaction().body(m, ready=is_fence & (self.store_buffer.empty | flush)):
+                arg = requests.read(m)
+                results_noop.write(m, data=0, exception=0, cause=0, addr=0)
+                issued_noop.write(m, arg)
+
         with Transaction().body(m):
             arg = Signal(self.fu_layouts.issue)
             res = Signal(self.lsu_layouts.accept)
@@ -174,6 +432,7 @@ class LSUDummy(FuncUnit, Elaboratable):
                 with branch(True):
                     m.d.comb += res.eq(requester.accept(m))
                     m.d.comb += arg.eq(issued.read(m))
+                    m.d.comb += bus_store_accepted.eq(arg.exec_fn.op_type != OpType.LOAD)
                 with branch(True):
                     m.d.comb += res.eq(results_noop.read(m))
                     m.d.comb += arg.eq(issued_noop.read(m))
@@ -203,10 +462,14 @@ class LSUDummy(FuncUnit, Elaboratable):
 
 @dataclass(frozen=True)
 class LSUComponent(FunctionalComponentParams):
+    store_buffer_entries: int = 0
+    split_misaligned: bool = False
+    max_outstanding: int = 2
+
     def get_module(self, gen_params: GenParams) -> FuncUnit:
         connections = DependencyContext.get()
         bus_master = connections.get_dependency(CommonBusDataKey())
-        unit = LSUDummy(gen_params, bus_master)
+        unit = LSUDummy(gen_params, bus_master, self.store_buffer_entries, self.split_misaligned, self.max_outstanding)
         return unit
 
     def get_decoder_manager(self):  # type: ignore
@@ -1,13 +1,15 @@
 from amaranth import *
 from amaranth_types import ModuleLike
-from transactron import Method, def_method, TModule
+from transactron import Method, Transaction, def_method, TModule
 from transactron.lib.simultaneous import condition
-from transactron.utils import logging
+from transactron.utils import DependencyContext, logging
 from transactron.lib import BasicFifo
+from transactron.lib.metrics import HwCounter
 
 from coreblocks.params import *
-from coreblocks.arch import Funct3, ExceptionCause
-from coreblocks.peripherals.bus_adapter import BusMasterInterface
+from coreblocks.arch import Funct3, Funct7, ExceptionCause
+from coreblocks.peripherals.bus_adapter import BusMasterInterface, CommonBusMasterMethodLayout
+from coreblocks.interface.keys import DataBusLockKey, ReservationValidKey
 from coreblocks.interface.layouts import CommonLayoutFields, LSULayouts
 
 
@@ -16,6 +18,20 @@ class LSURequester(Elaboratable):
     Bus request logic for the load/store unit. Its job is to interface
     between the LSU and the bus.
 
+    Misaligned accesses raise an exception, unless `split_misaligned` is set
+    in the request. Then an access which spans two bus words is split into
+    two aligned bus requests, to `paddr` and `paddr_hi`, and the results
+    are merged.
+
+    Atomic memory operations are performed as a bus read followed by a bus
+    write of the computed value. Next requests are issued only after the
+    write, so that they are not reordered with the atomic operation.
+    The data bus is locked (`DataBusLockKey`) until the operation finishes,
+    so that other harts can't access the memory in between. SC is performed
+    as an atomic operation too: the write is done only if the reservation
+    (`ReservationValidKey`) is still valid when the read finishes, and the
+    result is 0 on success and 1 on failure.
+
     Attributes
     ----------
     issue : Method
@@ -45,52 +61,93 @@ class LSURequester(Elaboratable):
         self.issue = Method(i=lsu_layouts.issue, o=lsu_layouts.issue_out)
         self.accept = Method(o=lsu_layouts.accept)
 
+        self.perf_split = HwCounter(
+            "backend.lsu.split_accesses", "Number of misaligned accesses split into two bus requests"
+        )
+
         self.log = logging.HardwareLogger("backend.lsu.requester")
 
     def prepare_bytes_mask(self, m: ModuleLike, funct3: Value, addr: Value) -> Signal:
+        """Mask of the accessed bytes of two consecutive bus words, starting with the word containing `addr`."""
         mask_len = self.gen_params.isa.xlen // self.bus.params.granularity
-        mask = Signal(mask_len)
+        mask = Signal(2 * mask_len)
         with m.Switch(funct3):
             with m.Case(Funct3.B, Funct3.BU):
                 m.d.av_comb += mask.eq(0x1 << addr[0:2])
             with m.Case(Funct3.H, Funct3.HU):
-                m.d.av_comb += mask.eq(0x3 << (addr[1] << 1))
+                m.d.av_comb += mask.eq(0x3 << addr[0:2])
             with m.Case(Funct3.W):
-                m.d.av_comb += mask.eq(0xF)
+                m.d.av_comb += mask.eq(0xF << addr[0:2])
         return mask
 
     def postprocess_load_data(self, m: ModuleLike, funct3: Value, raw_data: Value, addr: Value):
-        data = Signal.like(raw_data)
+        """Extracts the loaded value from `raw_data`, which can span two consecutive bus words."""
+        data = Signal(self.gen_params.isa.xlen)
+        shifted = Signal.like(raw_data)
+        m.d.av_comb += shifted.eq(raw_data >> (addr[0:2] << 3))
         with m.Switch(funct3):
             with m.Case(Funct3.B, Funct3.BU):
                 tmp = Signal(8)
-                m.d.av_comb += tmp.eq((raw_data >> (addr[0:2] << 3)) & 0xFF)
+                m.d.av_comb += tmp.eq(shifted)
                 with m.If(funct3 == Funct3.B):
                     m.d.av_comb += data.eq(tmp.as_signed())
                 with m.Else():
                     m.d.av_comb += data.eq(tmp)
             with m.Case(Funct3.H, Funct3.HU):
                 tmp = Signal(16)
-                m.d.av_comb += tmp.eq((raw_data >> (addr[1] << 4)) & 0xFFFF)
+                m.d.av_comb += tmp.eq(shifted)
                 with m.If(funct3 == Funct3.H):
                     m.d.av_comb += data.eq(tmp.as_signed())
                 with m.Else():
                     m.d.av_comb += data.eq(tmp)
             with m.Default():
-                m.d.av_comb += data.eq(raw_data)
+                m.d.av_comb += data.eq(shifted)
         return data
 
     def prepare_data_to_save(self, m: ModuleLike, funct3: Value, raw_data: Value, addr: Value):
-        data = Signal.like(raw_data)
+        """Data of two consecutive bus words, starting with the word containing `addr`."""
+        data = Signal(2 * len(raw_data))
         with m.Switch(funct3):
             with m.Case(Funct3.B):
                 m.d.av_comb += data.eq(raw_data[0:8] << (addr[0:2] << 3))
             with m.Case(Funct3.H):
-                m.d.av_comb += data.eq(raw_data[0:16] << (addr[1] << 4))
+                m.d.av_comb += data.eq(raw_data[0:16] << (addr[0:2] << 3))
             with m.Default():
-                m.d.av_comb += data.eq(raw_data)
+                m.d.av_comb += data.eq(raw_data << (addr[0:2] << 3))
         return data
 
+    def atomic_op_res(self, m: ModuleLike, funct7: Value, v1: Value, v2: Value):
+        """Value written to memory by an atomic memory operation, for memory value `v1` and operand `v2`."""
+        ret = Signal(self.gen_params.isa.xlen)
+
+        cmp = Signal()
+        ucmp = Signal()
+        m.d.av_comb += cmp.eq(v1.as_signed() < v2.as_signed())
+        m.d.av_comb += ucmp.eq(v1.as_unsigned() < v2.as_unsigned())
+
+        # aq and rl bits are ignored, as the accesses are not reordered
+        with m.Switch(funct7 & ~0b11):
+            with m.Case(Funct7.AMOSWAP, Funct7.SC):
+                m.d.av_comb += ret.eq(v2)
+            with m.Case(Funct7.AMOADD):
+                m.d.av_comb += ret.eq(v1 + v2)
+            with m.Case(Funct7.AMOXOR):
+                m.d.av_comb += ret.eq(v1 ^ v2)
+            with m.Case(Funct7.AMOAND):
+                m.d.av_comb += ret.eq(v1 & v2)
+            with m.Case(Funct7.AMOOR):
+                m.d.av_comb += ret.eq(v1 | v2)
+            with m.Case(Funct7.AMOMIN):
+                m.d.av_comb += ret.eq(Mux(cmp, v1, v2))
+            with m.Case(Funct7.AMOMAX):
+                m.d.av_comb += ret.eq(Mux(cmp, v2, v1))
+            with m.Case(Funct7.AMOMINU):
+                m.d.av_comb += ret.eq(Mux(ucmp, v1, v2))
+            with m.Case(Funct7.AMOMAXU):
+                m.d.av_comb += ret.eq(Mux(ucmp, v2, v1))
+
+        return ret
+
     def check_align(self, m: TModule, funct3: Value, addr: Value):
         aligned = Signal()
         with m.Switch(funct3):
@@ -105,45 +162,118 @@ class LSURequester(Elaboratable):
     def elaborate(self, platform):
         m = TModule()
 
+        m.submodules.perf_split = self.perf_split
+
+        xlen = self.gen_params.isa.xlen
+        mask_len = xlen // self.bus.params.granularity
+
         layouts = self.gen_params.get(CommonLayoutFields)
         m.submodules.args_fifo = args_fifo = BasicFifo(
             [
                 layouts.vaddr,
                 layouts.paddr,
+                layouts.data,
                 ("funct3", Funct3),
+                ("funct7", Funct7),
                 ("store", 1),
+                ("split", 1),
+                ("atomic", 1),
             ],
             self.depth,
         )
 
-        @def_method(m, self.issue)
-        def _(paddr: Value, vaddr: Value, data: Value, funct3: Value, store: Value):
+        # Second request of a split access, sent in the cycle after the first one.
+        hi_pending = Signal()
+        hi_request = Signal(CommonBusMasterMethodLayout(self.bus.params).request_write_layout)
+        hi_store = Signal()
+
+        # Set from issuing an atomic operation until its write is issued.
+        atomic_pending = Signal()
+        # Set from issuing an atomic operation until it is accepted. It is registered like the
+        # bus requests, so it is asserted together with the read of the atomic operation.
+        atomic_locked = Signal()
+        # Set when the write of SC isn't performed, because the reservation was lost.
+        sc_failed = Signal()
+
+        dm = DependencyContext.get()
+        bus_lock = dm.get_optional_dependency(DataBusLockKey())
+        if bus_lock is not None:
+            m.d.comb += bus_lock.eq(atomic_locked)
+        reservation_valid = dm.get_optional_dependency(ReservationValidKey())
+        if reservation_valid is None:
+            reservation_valid = C(1)
+
+        def is_sc(funct7: Value) -> Value:
+            return (funct7 & ~0b11) == Funct7.SC
+
+        # Response to the first request of a split access, or to the read of an atomic operation.
+        lo_valid = Signal()
+        lo_data = Signal(self.bus.params.data_width)
+        lo_err = Signal()
+
+        @def_method(m, self.issue, ready=~hi_pending & ~atomic_pending)
+        def _(
+            paddr: Value,
+            paddr_hi: Value,
+            vaddr: Value,
+            data: Value,
+            funct3: Value,
+            funct7: Value,
+            store: Value,
+            split_misaligned: Value,
+            atomic: Value,
+        ):
             exception = Signal()
             cause = Signal(ExceptionCause)
 
             aligned = self.check_align(m, funct3, paddr)
             bytes_mask = self.prepare_bytes_mask(m, funct3, paddr)
             bus_data = self.prepare_data_to_save(m, funct3, data, paddr)
+            valid = aligned | (split_misaligned & ~atomic)
+            split = Signal()
+            m.d.av_comb += split.eq(bytes_mask[mask_len:].any())
 
             self.log.debug(
                 m,
                 1,
-                "issue addr=0x{:08x} data=0x{:08x} funct3={} store={} aligned={}",
+                "issue addr=0x{:08x} data=0x{:08x} funct3={} store={} aligned={} split={} atomic={}",
                 vaddr,
                 data,
                 funct3,
                 store,
                 aligned,
+                valid & split,
+                atomic,
             )
 
             with condition(m, nonblocking=True) as branch:
-                with branch(aligned & store):
-                    self.bus.request_write(m, addr=paddr >> 2, data=bus_data, sel=bytes_mask)
-                with branch(aligned & ~store):
-                    self.bus.request_read(m, addr=paddr >> 2, sel=bytes_mask)
+                with branch(valid & store & ~atomic):
+                    self.bus.request_write(m, addr=paddr >> 2, data=bus_data[:xlen], sel=bytes_mask[:mask_len])
+                with branch(valid & (~store | atomic)):
+                    self.bus.request_read(m, addr=paddr >> 2, sel=bytes_mask[:mask_len])
 
-            with m.If(aligned):
-                args_fifo.write(m, paddr=paddr, vaddr=vaddr, funct3=funct3, store=store)
+            with m.If(valid):
+                args_fifo.write(
+                    m,
+                    paddr=paddr,
+                    vaddr=vaddr,
+                    data=data,
+                    funct3=funct3,
+                    funct7=funct7,
+                    store=store,
+                    split=split,
+                    atomic=atomic,
+                )
+                with m.If(atomic):
+                    m.d.sync += atomic_pending.eq(1)
+                    m.d.sync += atomic_locked.eq(1)
+                with m.If(split):
+                    self.perf_split.incr(m)
+                    m.d.sync += hi_pending.eq(1)
+                    m.d.sync += hi_store.eq(store)
+                    m.d.sync += hi_request.addr.eq(paddr_hi >> 2)
+                    m.d.sync += hi_request.data.eq(bus_data[xlen:])
+                    m.d.sync += hi_request.sel.eq(bytes_mask[mask_len:])
             with m.Else():
                 m.d.av_comb += exception.eq(1)
                 m.d.av_comb += cause.eq(
@@ -152,33 +282,96 @@ class LSURequester(Elaboratable):
 
             return {"exception": exception, "cause": cause}
 
-        @def_method(m, self.accept)
+        with Transaction().body(m, ready=hi_pending):
+            with condition(m) as branch:
+                with branch(hi_store):
+                    self.bus.request_write(m, hi_request)
+                with branch(~hi_store):
+                    self.bus.request_read(m, addr=hi_request.addr, sel=hi_request.sel)
+            m.d.sync += hi_pending.eq(0)
+
+        # Response to the first request of a split access is kept until the second one arrives.
+        # For atomic operations, it is the read value.
+        with Transaction().body(m, ready=~lo_valid):
+            request_args = args_fifo.peek(m)
+            with condition(m) as branch:
+                with branch(request_args.split & request_args.store):
+                    fetched = self.bus.get_write_response(m)
+                    m.d.sync += lo_err.eq(fetched.err)
+                with branch((request_args.split & ~request_args.store) | request_args.atomic):
+                    fetched = self.bus.get_read_response(m)
+                    m.d.sync += lo_err.eq(fetched.err)
+                    m.d.sync += lo_data.eq(fetched.data)
+                    with m.If(request_args.atomic & fetched.err):
+                        m.d.sync += atomic_pending.eq(0)
+            m.d.sync += lo_valid.eq(1)
+
+        with Transaction().body(m, ready=atomic_pending & lo_valid):
+            request_args = args_fifo.peek(m)
+            sc_fail = is_sc(request_args.funct7) & ~reservation_valid
+            with m.If(~sc_fail):
+                self.bus.request_write(
+                    m,
+                    addr=request_args.paddr >> 2,
+                    data=self.atomic_op_res(m, request_args.funct7, lo_data, request_args.data),
+                    sel=(1 << mask_len) - 1,
+                )
+            m.d.sync += sc_failed.eq(sc_fail)
+            m.d.sync += atomic_pending.eq(0)
+
+        multipart = args_fifo.head.split | args_fifo.head.atomic
+
+        @def_method(m, self.accept, ready=~multipart | (lo_valid & ~atomic_pending))
         def _():
             data = Signal(self.gen_params.isa.xlen)
             exception = Signal()
             cause = Signal(ExceptionCause)
+            bus_err = Signal()
             err = Signal()
+            addr = Signal(self.gen_params.isa.xlen)
 
             request_args = args_fifo.read(m)
             self.log.debug(m, 1, "accept data=0x{:08x} exception={} cause={}", data, exception, cause)
 
+            # An atomic operation with a failed read doesn't write, neither does a failed SC.
+            atomic_failed = request_args.atomic & (lo_err | sc_failed)
+
             with condition(m) as branch:
-                with branch(request_args.store):
+                with branch(atomic_failed):
+                    pass
+                with branch(request_args.store & ~atomic_failed):
                     fetched = self.bus.get_write_response(m)
-                    m.d.comb += err.eq(fetched.err)
+                    m.d.comb += bus_err.eq(fetched.err)
                 with branch():
                     fetched = self.bus.get_read_response(m)
-                    m.d.comb += err.eq(fetched.err)
+                    m.d.comb += bus_err.eq(fetched.err)
+                    raw_data = Mux(request_args.split, Cat(lo_data, fetched.data), fetched.data)
+                    # Unguarded, as atomic operations also return the read value.
                     m.d.top_comb += data.eq(
-                        self.postprocess_load_data(m, request_args.funct3, fetched.data, request_args.paddr)
+                        Mux(
+                            request_args.atomic,
+                            Mux(is_sc(request_args.funct7), sc_failed, lo_data),
+                            self.postprocess_load_data(m, request_args.funct3, raw_data, request_args.paddr),
+                        )
                     )
 
+            m.d.av_comb += err.eq(bus_err | ((request_args.split | request_args.atomic) & lo_err))
+            # The fault is reported at the address of the faulting part of the access.
+            m.d.av_comb += addr.eq(
+                Mux(request_args.split & ~lo_err & bus_err, (request_args.vaddr & ~3) + 4, request_args.vaddr)
+            )
+            with m.If(request_args.split | request_args.atomic):
+                m.d.sync += lo_valid.eq(0)
+            with m.If(request_args.atomic):
+                m.d.sync += atomic_locked.eq(0)
+                m.d.sync += sc_failed.eq(0)
+
             with m.If(err):
                 m.d.av_comb += exception.eq(1)
                 m.d.av_comb += cause.eq(
                     Mux(request_args.store, ExceptionCause.STORE_ACCESS_FAULT, ExceptionCause.LOAD_ACCESS_FAULT)
                 )
 
-            return {"data": data, "exception": exception, "cause": cause, "addr": request_args.vaddr}
+            return {"data": data, "exception": exception, "cause": cause, "addr": addr}
 
         return m
@@ -1,6 +1,5 @@
 from dataclasses import dataclass
-from functools import reduce
-from operator import or_
+from typing import Optional
 from amaranth import *
 from amaranth.lib import data
 from amaranth_types import HasElaborate
@@ -15,6 +14,9 @@ class PMARegion:
     Data class for physical memory attributes contiguous region of memory. Region of memory
     includes both start and end address.
 
+    Attributes not given explicitly are derived from `mmio`: MMIO regions have none of them,
+    other regions have all of them, like the memory outside of any region.
+
     Attributes
     ----------
     start : int
@@ -23,16 +25,59 @@ class PMARegion:
         Defines end of region, end address is included in the region.
     mmio : bool
         Value True for this field indicates that memory region is MMIO.
+    cacheable : bool, optional
+        Memory in the region can be cached.
+    idempotent : bool, optional
+        Reads from the region have no side effects, so they can be performed speculatively.
+    write_combining : bool, optional
+        Writes to the region can be buffered and merged.
+    atomic : bool, optional
+        The region supports atomic memory operations.
     """
 
     start: int
     end: int
     mmio: bool = False
+    cacheable: Optional[bool] = None
+    idempotent: Optional[bool] = None
+    write_combining: Optional[bool] = None
+    atomic: Optional[bool] = None
+
+    def __post_init__(self):
+        for name in ["cacheable", "idempotent", "write_combining", "atomic"]:
+            if getattr(self, name) is None:
+                setattr(self, name, not self.mmio)
+
+    def attributes(self) -> dict[str, bool]:
+        return {name: bool(getattr(self, name)) for name in PMALayout().members}
 
 
 class PMALayout(data.StructLayout):
     def __init__(self):
-        super().__init__({"mmio": unsigned(1)})
+        super().__init__(
+            {
+                "mmio": unsigned(1),
+                "cacheable": unsigned(1),
+                "idempotent": unsigned(1),
+                "write_combining": unsigned(1),
+                "atomic": unsigned(1),
+            }
+        )
+
+
+def _range_patterns(start: int, end: int, width: int) -> list[str]:
+    """Splits the address range into the smallest number of aligned power of two blocks,
+    given as `m.Case` patterns."""
+    patterns = []
+    while start <= end:
+        size = start & -start if start else 1 << width
+        while start + size - 1 > end:
+            size >>= 1
+        wildcards = size.bit_length() - 1
+        prefix = format(start >> wildcards, f"0{width - wildcards}b") if width > wildcards else ""
+        patterns.append(prefix + "-" * wildcards)
+        start += size
+    return patterns
 
 
 class PMAChecker(Elaboratable):
@@ -40,6 +85,10 @@ class PMAChecker(Elaboratable):
     Implementation of physical memory attributes checker. It may or may not be a part of LSU.
     This is a combinational circuit with return value read from `result` output.
 
+    The regions are decoded by a single switch, with the adjacent regions with the same attributes
+    merged, and every region split into aligned power of two blocks, matched on the address prefix.
+    Addresses outside of the regions have the attributes of a non-MMIO region.
+
     Attributes
     ----------
     paddr : Signal
@@ -49,26 +98,38 @@ class PMAChecker(Elaboratable):
     """
 
     def __init__(self, gen_params: GenParams) -> None:
-        # poor man's interval list
         self.segments = gen_params.pma
+        self.addr_bits = gen_params.phys_addr_bits
         self.result = Signal(PMALayout())
-        self.paddr = Signal(gen_params.phys_addr_bits)
+        self.paddr = Signal(self.addr_bits)
 
-    def elaborate(self, platform) -> HasElaborate:
-        m = TModule()
-
-        outputs = [Signal(PMALayout()) for _ in self.segments]
+        self.default = PMARegion(0, 2**self.addr_bits - 1).attributes()
 
-        # zero output if paddr not in region, propagate value if paddr in region
-        for i, segment in enumerate(self.segments):
+    def decode_ranges(self) -> list[tuple[int, int, dict[str, bool]]]:
+        """Non-overlapping address ranges, with attributes other than the default ones."""
+        ranges: list[tuple[int, int, dict[str, bool]]] = []
+        for segment in sorted(self.segments, key=lambda segment: segment.start):
             start = segment.start
-            end = segment.end
+            end = min(segment.end, 2**self.addr_bits - 1)
+            if start > end:
+                continue
+            if ranges and start <= ranges[-1][1]:
+                raise ValueError(f"Overlapping PMA regions at 0x{start:x}")
+            attributes = segment.attributes()
+            if ranges and ranges[-1][1] + 1 == start and ranges[-1][2] == attributes:
+                ranges[-1] = (ranges[-1][0], end, attributes)
+            else:
+                ranges.append((start, end, attributes))
+        return [r for r in ranges if r[2] != self.default]
 
-            # check if paddr in region
-            with m.If((self.paddr >= start) & (self.paddr <= end)):
-                m.d.comb += outputs[i].eq(segment.mmio)
+    def elaborate(self, platform) -> HasElaborate:
+        m = TModule()
 
-        # OR all outputs
-        m.d.comb += self.result.eq(reduce(or_, [Value.cast(o) for o in outputs], 0))
+        with m.Switch(self.paddr):
+            for start, end, attributes in self.decode_ranges():
+                with m.Case(*_range_patterns(start, end, self.addr_bits)):
+                    m.d.comb += self.result.eq(PMALayout().const(attributes))
+            with m.Default():
+                m.d.comb += self.result.eq(PMALayout().const(self.default))
 
         return m
@@ -0,0 +1,163 @@
+from amaranth import *
+from transactron import Method, Transaction, def_method, TModule
+from transactron.utils import logging
+
+from coreblocks.params import *
+from coreblocks.peripherals.bus_adapter import BusMasterInterface, CommonBusMasterMethodLayout
+
+__all__ = ["StoreBuffer"]
+
+
+class StoreBuffer(Elaboratable):
+    """
+    Buffer of committed stores, which are written to the bus in the background.
+
+    Stores are written oldest first. A store to a bus word, which is already
+    buffered and not sent to the bus yet, is merged into the existing entry.
+    Entries are kept until the bus acknowledges the write, so the lookup
+    sees also the stores which are in flight. Bus errors of the buffered
+    stores can't be reported precisely, so they are only logged.
+
+    The lookup is a combinational circuit, with the bus word address set on
+    `lookup_addr` and the results read from the other `lookup_*` signals.
+
+    Attributes
+    ----------
+    write : Method
+        Inserts a store into the buffer. Its layout is the same as the layout
+        of `request_write` of the bus. The caller has to ensure that the store
+        can be accepted, using `full` and `lookup_mergeable`.
+    lookup_addr : Signal, in
+        Bus word address to look up.
+    lookup_data : Signal, out
+        Data of the buffered stores to `lookup_addr`, the youngest store winning.
+    lookup_mask : Signal, out
+        Bytes of `lookup_data` written by the buffered stores.
+    lookup_mergeable : Signal, out
+        Set when a store to `lookup_addr` can be merged into an existing entry.
+    full : Signal, out
+        Set when all entries are used.
+    empty : Signal, out
+        Set when all buffered stores are written.
+    """
+
+    def __init__(self, gen_params: GenParams, bus: BusMasterInterface, entries: int) -> None:
+        """
+        Parameters
+        ----------
+        gen_params : GenParams
+            Parameters to be used during processor generation.
+        bus : BusMasterInterface
+            An instance of the bus master for interfacing with the data bus.
+        entries : int
+            Number of buffered bus words.
+        """
+        self.gen_params = gen_params
+        self.bus = bus
+        self.entries = entries
+
+        self.granularity = bus.params.granularity
+        self.sel_width = bus.params.data_width // bus.params.granularity
+
+        self.write = Method(i=CommonBusMasterMethodLayout(bus.params).request_write_layout)
+
+        self.lookup_addr = Signal(bus.params.addr_width)
+        self.lookup_data = Signal(bus.params.data_width)
+        self.lookup_mask = Signal(self.sel_width)
+        self.lookup_mergeable = Signal()
+        self.full = Signal()
+        self.empty = Signal()
+
+        self.log = logging.HardwareLogger("backend.lsu.store_buffer")
+
+    def elaborate(self, platform):
+        m = TModule()
+
+        n = self.entries
+        params = self.bus.params
+
+        addrs = Array(Signal(params.addr_width) for _ in range(n))
+        datas = Array(Signal(params.data_width) for _ in range(n))
+        sels = Array(Signal(self.sel_width) for _ in range(n))
+
+        # Entries are a circular queue, starting at `head`. The `in_flight` oldest ones are sent to the bus.
+        head = Signal(range(n))
+        count = Signal(range(n + 1))
+        in_flight = Signal(range(n + 1))
+
+        push = Signal()
+        issue = Signal()
+        retire = Signal()
+
+        def wrap(idx: Value) -> Value:
+            return Mux(idx >= n, idx - n, idx)
+
+        tail = Signal(range(n))
+        m.d.comb += tail.eq(wrap(head + count))
+
+        age = [Signal(range(n), name=f"age{i}") for i in range(n)]
+        for i in range(n):
+            m.d.comb += age[i].eq(Mux(head <= i, i - head, i + n - head))
+
+        m.d.comb += self.full.eq(count == n)
+        m.d.comb += self.empty.eq(count == 0)
+
+        # The entry which is the next to be sent is not reported as mergeable, so that
+        # the caller doesn't depend on whether it is sent in the same cycle.
+        m.d.comb += self.lookup_mergeable.eq(
+            Cat((age[i] > in_flight) & (age[i] < count) & (addrs[i] == self.lookup_addr) for i in range(n)).any()
+        )
+
+        # Forwarding - younger stores override the bytes of the older ones.
+        for k in range(n):
+            idx = Signal(range(n), name=f"lookup_idx{k}")
+            m.d.comb += idx.eq(wrap(head + k))
+            entry_data = Signal(params.data_width, name=f"lookup_data{k}")
+            entry_sel = Signal(self.sel_width, name=f"lookup_sel{k}")
+            m.d.comb += [entry_data.eq(datas[idx]), entry_sel.eq(sels[idx])]
+            with m.If((k < count) & (addrs[idx] == self.lookup_addr)):
+                for b in range(self.sel_width):
+                    with m.If(entry_sel[b]):
+                        m.d.comb += self.lookup_data.word_select(b, self.granularity).eq(
+                            entry_data.word_select(b, self.granularity)
+                        )
+                        m.d.comb += self.lookup_mask[b].eq(1)
+
+        @def_method(m, self.write)
+        def _(addr, data, sel):
+            merge = Signal(n)
+            for i in range(n):
+                m.d.av_comb += merge[i].eq((age[i] >= in_flight + issue) & (age[i] < count) & (addrs[i] == addr))
+
+            self.log.debug(m, 1, "write addr=0x{:08x} data=0x{:08x} sel={:04b} merge={}", addr, data, sel, merge.any())
+
+            with m.If(merge.any()):
+                for i in range(n):
+                    with m.If(merge[i]):
+                        for b in range(self.sel_width):
+                            with m.If(sel[b]):
+                                m.d.sync += (
+                                    datas[i].word_select(b, self.granularity).eq(data.word_select(b, self.granularity))
+                                )
+                        m.d.sync += sels[i].eq(sels[i] | sel)
+            with m.Else():
+                m.d.sync += [addrs[tail].eq(addr), datas[tail].eq(data), sels[tail].eq(sel)]
+                m.d.comb += push.eq(1)
+
+        with Transaction().body(m, ready=in_flight < count):
+            idx = Signal(range(n))
+            m.d.av_comb += idx.eq(wrap(head + in_flight))
+            self.bus.request_write(m, addr=addrs[idx], data=datas[idx], sel=sels[idx])
+            m.d.comb += issue.eq(1)
+
+        with Transaction().body(m, ready=in_flight != 0):
+            resp = self.bus.get_write_response(m)
+            self.log.warning(m, resp.err, "bus error on buffered store addr=0x{:08x}", addrs[head])
+            m.d.comb += retire.eq(1)
+
+        m.d.sync += in_flight.eq(in_flight + issue - retire)
+        m.d.sync += count.eq(count + push - retire)
+        with m.If(retire):
+            m.d.sync += head.eq(wrap(head + 1))
+
+        return m
@@ -29,6 +29,7 @@ from coreblocks.interface.keys import (
     FlushICacheKey,
     WaitForInterruptResumeKey,
     SFenceVMAKey,
+    StoreBufferEmptyKey,
 )
 from coreblocks.func_blocks.interface.func_protocols import FuncUnit
 
@@ -103,6 +104,7 @@ class PrivilegedFuncUnit(FuncUnitBase[PrivilegedFn]):
         flush_icache = self.dm.get_dependency(FlushICacheKey())
         sfence_vma = self.dm.get_optional_dependency(SFenceVMAKey())
         resume_core = self.dm.get_dependency(UnsafeInstructionResolvedKey())
+        store_buffer_empty = self.dm.get_optional_dependency(StoreBufferEmptyKey())
 
         if sfence_vma is not None:
             m.submodules += sfence_vma[1]
@@ -121,7 +123,14 @@ class PrivilegedFuncUnit(FuncUnitBase[PrivilegedFn]):
                 ftq_ptr.eq(arg.ftq_ptr),
             ]
 
-        with Transaction().body(m, ready=instr_valid & ~finished):
+        # Instruction fetch and page table walks have to see the stores buffered by the LSU.
+        stores_written = Signal()
+        m.d.comb += stores_written.eq(
+            (store_buffer_empty if store_buffer_empty is not None else 1)
+            | ~((instr_fn == PrivilegedFn.Fn.FENCEI) | (instr_fn == PrivilegedFn.Fn.SFENCEVMA))
+        )
+
+        with Transaction().body(m, ready=instr_valid & ~finished & stores_written):
             side_fx_guard = self.dm.get_dependency(SideFxGuardKey())
             side_fx_guard(m, rob_id=instr_rob, tag=instr_tag, require_done=0)
             m.d.sync += finished.eq(1)
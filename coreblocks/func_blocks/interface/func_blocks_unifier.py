@@ -18,7 +18,7 @@ class FuncBlocksUnifier(Elaboratable):
     ):
         self.rs_blocks = [block.get_module(gen_params) for block in blocks]
 
-        self.get_result = [block.get_result for block in self.rs_blocks]
+        self.get_result = [method for block in self.rs_blocks for method in block.get_result]
 
         self.update = Methods(gen_params.announcement_superscalarity, i=self.rs_blocks[0].update.layout_in)
 
@@ -18,4 +18,4 @@ class FuncBlock(HasElaborate, Protocol):
     insert: Method
     select: Method
     update: Methods
-    get_result: Method
+    get_result: Methods
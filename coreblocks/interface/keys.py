@@ -8,6 +8,7 @@ from transactron import Method, TModule
 from coreblocks.peripherals.bus_adapter import BusMasterInterface
 from coreblocks.func_blocks.csr.csr_protocol import RegisteredCSRProtocol
 from amaranth import Signal
+from amaranth.lib.data import View
 
 if TYPE_CHECKING:
     from coreblocks.priv.csr.csr_instances import CSRInstances  # noqa: F401
@@ -29,6 +30,7 @@ __all__ = [
     "CoreStateKey",
     "CSRListKey",
     "FlushICacheKey",
+    "StoreBufferEmptyKey",
     "SFenceVMAKey",
     "InstructionAddressTranslatorBackingDeviceKey",
     "DataAddressTranslatorBackingDeviceKey",
@@ -37,6 +39,9 @@ __all__ = [
     "InstructionTaggedCounterKey",
     "ActiveTagsKey",
     "RVVIHartCollectorKey",
+    "DataBusLockKey",
+    "ReservationValidKey",
+    "StoreSnoopKey",
 ]
 
 
@@ -125,6 +130,13 @@ class FlushICacheKey(SimpleKey[Method]):
     pass
 
 
+@dataclass(frozen=True)
+class StoreBufferEmptyKey(SimpleKey[Signal]):
+    """Set when the committed stores buffered by the LSU are written to memory."""
+
+    pass
+
+
 @dataclass(frozen=True)
 class SFenceVMAKey(UnifierKey, unifier=MethodProduct.create):
     """
@@ -184,3 +196,33 @@ class ActiveTagsKey(SimpleKey[Method]):
 @dataclass(frozen=True)
 class RVVIHartCollectorKey(SimpleKey["RVVIHartCollector"]):
     pass
+
+
+@dataclass(frozen=True)
+class DataBusLockKey(SimpleKey[Signal]):
+    """
+    Drives the Wishbone LOCK signal of the data bus. While it is set, the bus stays granted to the core,
+    so that the memory isn't accessed by other harts. Used by the LSU to perform atomic operations.
+    """
+
+    pass
+
+
+@dataclass(frozen=True)
+class ReservationValidKey(SimpleKey[Signal]):
+    """
+    Set while the LR/SC reservation of the hart is valid. SC is performed by the LSU as an atomic operation,
+    which writes the memory only if the reservation is still valid after the data bus is locked.
+    """
+
+    pass
+
+
+@dataclass(frozen=True)
+class StoreSnoopKey(SimpleKey[View]):
+    """
+    Stores to the memory performed by other harts, which invalidate the LR/SC reservation.
+    Expected layout is `LSULayouts.store_snoop`.
+    """
+
+    pass
@@ -388,6 +388,7 @@ class RFLayouts:
         self.rf_free = make_layout(fields.reg_id)
         self.rf_read_out = make_layout(fields.reg_val, self.valid)
         self.rf_write = make_layout(fields.reg_id, fields.reg_val)
+        self.rf_free_mask = make_layout(("mask", gen_params.phys_regs))
 
 
 class RATLayouts:
@@ -436,6 +437,7 @@ class RATLayouts:
         self.crat_tag_out = make_layout(fields.tag, fields.tag_increment, fields.commit_checkpoint)
 
         self.crat_flush_restore_in = make_layout(self.entries)
+        self.crat_free_all_tags_out = make_layout(fields.tag)
 
 
 class ROBLayouts:
@@ -472,6 +474,9 @@ class ROBLayouts:
         self.retire_count: LayoutListField = ("count", range(gen_params.retirement_superscalarity + 1))
         """Number of ROB entries to retire."""
 
+        self.flush_count: LayoutListField = ("count", range(2**gen_params.rob_entries_bits + 1))
+        """Number of ROB entries removed by a flush."""
+
         self.peek_data = make_layout(
             self.rob_data,
             fields.rob_id,
@@ -489,6 +494,8 @@ class ROBLayouts:
 
         self.retire_layout = make_layout(self.retire_count)
 
+        self.flush_layout = make_layout(self.flush_count)
+
         self.mark_done_layout = make_layout(
             fields.rob_id,
             fields.exception,
@@ -882,12 +889,44 @@ class LSULayouts:
 
         self.store: LayoutListField = ("store", 1)
 
-        self.issue = make_layout(fields.paddr, fields.vaddr, fields.data, fields.funct3, self.store)
+        self.paddr_hi: LayoutListField = ("paddr_hi", gen_params.phys_addr_bits)
+        """Physical address of the bus word following the one containing `paddr`."""
+
+        self.split_misaligned: LayoutListField = ("split_misaligned", 1)
+        """Misaligned access is split into aligned bus requests instead of raising an exception."""
+
+        self.atomic: LayoutListField = ("atomic", 1)
+        """Access is an atomic read-modify-write, with the operation selected by `funct7`."""
+
+        self.issue = make_layout(
+            fields.paddr,
+            self.paddr_hi,
+            fields.vaddr,
+            fields.data,
+            fields.funct3,
+            fields.funct7,
+            self.store,
+            self.split_misaligned,
+            self.atomic,
+        )
+
+        self.translated = make_layout(
+            fields.vaddr,
+            fields.paddr,
+            self.paddr_hi,
+            ("page_fault", 1),
+            ("access_fault", 1),
+            ("fault_hi", 1),
+        )
+        """Translated address of an access, which can span two pages. `fault_hi` is set when the fault
+        is caused by the page of `paddr_hi`."""
 
         self.issue_out = make_layout(fields.exception, fields.cause)
 
         self.accept = make_layout(fields.data, fields.exception, fields.cause, fields.addr)
 
+        self.store_snoop = make_layout(("valid", 1), fields.paddr)
+        """Physical address of a store performed by another hart."""
 
 class CSRRegisterLayouts:
     """Layouts used in the control and status registers."""
@@ -988,6 +1027,7 @@ class CoreInstructionCounterLayouts:
         self.increment_in = [("count", range(gen_params.frontend_superscalarity + 1))]
         self.decrement_in = [("count", range(gen_params.retirement_superscalarity + 1))]
         self.decrement_out = [("empty", 1)]
+        self.flush_in = [("count", range(2**gen_params.rob_entries_bits + 1))]
 
 
 class PrivUnitLayouts:
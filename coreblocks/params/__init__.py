@@ -1,5 +1,6 @@
 from .genparams import *  # noqa: F401
 from .fu_params import *  # noqa: F401
 from .icache_params import *  # noqa: F401
+from .l2cache_params import *  # noqa: F401
 from .instr import *  # noqa: F401
 from .vmem_params import *  # noqa: F401
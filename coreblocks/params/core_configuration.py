@@ -1,9 +1,12 @@
 from collections.abc import Collection
 
 import dataclasses
+import enum
+import functools
+import hashlib
 from dataclasses import dataclass, field
 
-from typing import Self
+from typing import Any, Self
 from transactron.utils.typing import type_self_kwargs_as
 from amaranth_types.memory import AbstractMemoryConstructor
 from amaranth.lib.memory import Memory
@@ -75,6 +78,8 @@ class _CoreConfigurationDataClass:
         The value of the MARCHID CSR.
     mimpid: int
         The value of the MIMPID CSR.
+    hart_id: int
+        The value of the MHARTID CSR.
     debug_signals: bool
         Enable debug signals (for example hardware metrics etc). If disabled, none of them will be synthesized.
     with_rvvi: bool
@@ -91,6 +96,9 @@ class _CoreConfigurationDataClass:
         Numer of tags is 2**tag_bits. Tag space fits unique monotonic checkpoint ids of all instructions
         currently in core, including instructions from already rolled-back checkpoints, that didn't leave the
         pipeline yet. Tag space size must be greater that checkpoint count.
+    fast_trap_flush: bool
+        On a trap, drop the whole ROB at once (as soon as all its instructions finished execution) and restore
+        the free register list from RRAT, instead of flushing the ROB one retirement group per cycle.
     icache_enable: bool
         Enable instruction cache. If disabled, requests are bypassed directly to the bus.
     icache_ways: int
@@ -99,10 +107,25 @@ class _CoreConfigurationDataClass:
         Log of the number of sets of the instruction cache.
     icache_line_bytes_log: int
         Log of the cache line size (in bytes).
+    l2cache_enable: bool
+        Enable the unified L2 cache in `Socks`. The instruction and data buses of the core are then
+        connected to the L2 cache, and the memory is accessed only through the `wb_data` bus of `Socks`.
+    l2cache_ways: int
+        Associativity of the L2 cache.
+    l2cache_sets_bits: int
+        Log of the number of sets of the L2 cache.
+    l2cache_line_bytes_log: int
+        Log of the L2 cache line size (in bytes).
     fetch_block_bytes_log: int
         Log of the size of the fetch block (in bytes).
     ftq_size_log: int
         Log of the number of entries in the Fetch Target Queue
+    data_bus_max_requests: int
+        Maximum number of requests in flight on the data bus. If greater than one, the data bus uses
+        Pipelined Wishbone, so the slaves connected to it must support it.
+    reservation_set_bytes_log: int
+        Log of the size of LR/SC reservation sets (in bytes). Must be between 2 and 12, so that
+        the reservation sets are within a page.
     instr_buffer_size: int
         Size of the instruction buffer.
     interrupt_custom_count: int
@@ -121,6 +144,9 @@ class _CoreConfigurationDataClass:
         Number of writable ASID bits in SATP.
     supported_vm_schemes: Collection[SatpMode]
         SATP MODE values accepted by this core.
+    hardware_a_d_update: bool
+        Implement Svadu: the page table walker sets the A and D bits of PTEs, when enabled by `menvcfg.ADUE`.
+        Otherwise, or when `menvcfg.ADUE` is cleared, missing A and D bits raise page faults (Svade).
     phys_addr_bits: int | None
         Width of physical addresses in bits. If not set, defaults to 34 for RV32 if supported_vm_schemes has
         SV32 enabled, 32 for RV32 with only BARE mode and 56 for RV64.
@@ -164,6 +190,7 @@ class _CoreConfigurationDataClass:
 
     marchid: int = 44
     mimpid: int = 0
+    hart_id: int = 0
 
     debug_signals: bool = True
     with_rvvi: bool = False
@@ -179,14 +206,24 @@ class _CoreConfigurationDataClass:
     checkpoint_count: int = 16
     tag_bits: int = 5
 
+    fast_trap_flush: bool = True
+
     icache_enable: bool = True
     icache_ways: int = 2
     icache_sets_bits: int = 7
     icache_line_bytes_log: int = 5
 
+    l2cache_enable: bool = False
+    l2cache_ways: int = 4
+    l2cache_sets_bits: int = 8
+    l2cache_line_bytes_log: int = 5
+
     fetch_block_bytes_log: int = 2
     ftq_size_log: int = 4
 
+    data_bus_max_requests: int = 1
+    reservation_set_bytes_log: int = 5
+
     instr_buffer_size: int = 4
 
     interrupt_custom_count: int = 16
@@ -198,6 +235,7 @@ class _CoreConfigurationDataClass:
 
     asidlen: int | None = None
     supported_vm_schemes: Collection[SatpMode] = (SatpMode.BARE, SatpMode.SV32)
+    hardware_a_d_update: bool = False
     phys_addr_bits: int | None = None
     hpm_counters_count: int = 0
 
@@ -220,7 +258,40 @@ class _CoreConfigurationDataClass:
     )  # default I/O region used in LiteX coreblocks
 
 
+def _canonical(value: Any) -> Any:
+    """Converts a configuration value to nested tuples of builtin values,
+    which have a stable `repr` and compare by contents."""
+    if isinstance(value, type) or (callable(value) and hasattr(value, "__qualname__")):
+        return f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, enum.Enum):
+        return (_canonical(type(value)), value.value)
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted((_canonical(v) for v in value), key=repr))
+    if isinstance(value, dict):
+        return tuple(sorted(((_canonical(k), _canonical(v)) for k, v in value.items()), key=repr))
+    if isinstance(value, functools.partial):
+        return (_canonical(value.func), _canonical(value.args), _canonical(value.keywords))
+    if dataclasses.is_dataclass(value):
+        fields = {f.name: getattr(value, f.name) for f in dataclasses.fields(value)}
+        return (_canonical(type(value)), _canonical(fields))
+    return (_canonical(type(value)), _canonical(vars(value)))
+
+
 class CoreConfiguration(_CoreConfigurationDataClass):
     @type_self_kwargs_as(_CoreConfigurationDataClass.__init__)
     def replace(self, **kwargs) -> Self:
         return dataclasses.replace(self, **kwargs)
+
+    def fingerprint(self) -> str:
+        """Hash of the contents of the configuration.
+
+        Unlike the configuration objects, which contain e.g. decoder objects
+        compared by identity, fingerprints are equal for equal configurations,
+        also between Python processes. They can be used to identify artifacts
+        built from a configuration.
+        """
+        return hashlib.sha256(repr(_canonical(self)).encode()).hexdigest()[:16]
@@ -4,6 +4,7 @@ from amaranth.utils import ceil_log2, exact_log2
 
 from coreblocks.arch.isa import ISA, Extension
 from .icache_params import ICacheParameters
+from .l2cache_params import L2CacheParameters
 from .vmem_params import VirtualMemoryParameters
 from .fu_params import extensions_supported
 from ..peripherals.wishbone import WishboneParameters
@@ -62,6 +63,7 @@ class GenParams(DependentCache):
             supervisor_mode=cfg.supervisor_mode,
             asidlen=cfg.asidlen,
             supported_schemes=cfg.supported_vm_schemes,
+            hardware_a_d_update=cfg.hardware_a_d_update,
         )
 
         self.icache_params = ICacheParameters(
@@ -74,6 +76,15 @@ class GenParams(DependentCache):
             enable=cfg.icache_enable,
         )
 
+        self.l2cache_params = L2CacheParameters(
+            addr_width=self.wb_params.addr_width,
+            word_width=self.wb_params.data_width,
+            num_of_ways=cfg.l2cache_ways,
+            num_of_sets_bits=cfg.l2cache_sets_bits,
+            line_bytes_log=cfg.l2cache_line_bytes_log,
+            enable=cfg.l2cache_enable,
+        )
+
         self.debug_signals_enabled = cfg.debug_signals
 
         # Verification temporally disabled
@@ -98,6 +109,14 @@ class GenParams(DependentCache):
         self.ftq_size_log = cfg.ftq_size_log
         self.ftq_size = 2**cfg.ftq_size_log
 
+        self.data_bus_max_requests = cfg.data_bus_max_requests
+        if self.data_bus_max_requests < 1:
+            raise ValueError("Data bus must allow at least one request in flight")
+
+        self.reservation_set_bytes_log = cfg.reservation_set_bytes_log
+        if not 2 <= self.reservation_set_bytes_log <= 12:
+            raise ValueError("Reservation sets must be between a word and a page")
+
         self.frontend_superscalarity = cfg.frontend_superscalarity
         self.announcement_superscalarity = cfg.announcement_superscalarity
         self.retirement_superscalarity = cfg.retirement_superscalarity
@@ -110,6 +129,8 @@ class GenParams(DependentCache):
         self.tag_count = 2**cfg.tag_bits
         assert cfg.checkpoint_count < 2**cfg.tag_bits
 
+        self.fast_trap_flush = cfg.fast_trap_flush
+
         self.min_instr_width_bytes = 2 if cfg.compressed or cfg.zcb else 4
         self.min_instr_width_bytes_log = exact_log2(self.min_instr_width_bytes)
 
@@ -143,6 +164,12 @@ class GenParams(DependentCache):
             raise ValueError("L2 TLB ways must be positive")
         if self.tlb_config.l2tlb_entries % self.tlb_config.l2tlb_ways != 0:
             raise ValueError("L2 TLB entries must be divisible by L2 TLB ways")
+        if self.tlb_config.l2tlb_superpage_entries <= 0:
+            raise ValueError("L2 TLB superpage entries must be positive")
+        if self.tlb_config.l2tlb_superpage_ways <= 0:
+            raise ValueError("L2 TLB superpage ways must be positive")
+        if self.tlb_config.l2tlb_superpage_entries % self.tlb_config.l2tlb_superpage_ways != 0:
+            raise ValueError("L2 TLB superpage entries must be divisible by L2 TLB superpage ways")
 
         if self.hpm_counters_count < 0 or self.hpm_counters_count > 29:
             raise ValueError("HPM counters count must be in range [0, 29]")
@@ -167,6 +194,7 @@ class GenParams(DependentCache):
 
         self.marchid = cfg.marchid
         self.mimpid = cfg.mimpid
+        self.hart_id = cfg.hart_id
 
         self.multiport_memory_type = cfg.multiport_memory_type
 
@@ -0,0 +1,56 @@
+class L2CacheParameters:
+    """Parameters of the L2 Cache.
+
+    Parameters
+    ----------
+    addr_width : int
+        Length of the bus addresses (in bits). The bus is addressed with words.
+    word_width : int
+        Width of the bus data (in bits).
+    num_of_ways : int
+        Associativity of the cache.
+    num_of_sets_bits : int
+        Log of the number of cache sets.
+    line_bytes_log : int
+        Log of the size of a single cache line in bytes.
+    enable : bool
+        Enable the L2 cache.
+    """
+
+    def __init__(
+        self,
+        *,
+        addr_width,
+        word_width,
+        num_of_ways,
+        num_of_sets_bits,
+        line_bytes_log,
+        enable=True,
+    ):
+        self.addr_width = addr_width
+        self.word_width = word_width
+        self.num_of_ways = num_of_ways
+        self.num_of_sets_bits = num_of_sets_bits
+        self.line_bytes_log = line_bytes_log
+        self.enable = enable
+        self.num_of_sets = 2**num_of_sets_bits
+        self.line_size_bytes = 2**line_bytes_log
+
+        self.word_width_bytes = word_width // 8
+        self.words_in_line = self.line_size_bytes // self.word_width_bytes
+
+        if not enable:
+            return
+
+        if self.words_in_line < 1:
+            raise ValueError("The L2 cache line size must be not smaller than the bus word size.")
+
+        if num_of_ways < 1:
+            raise ValueError("The L2 cache must have at least one way.")
+
+        self.offset_bits = (self.words_in_line - 1).bit_length()
+        self.index_bits = num_of_sets_bits
+        self.tag_bits = self.addr_width - self.offset_bits - self.index_bits
+
+        if self.tag_bits < 0:
+            raise ValueError("The L2 cache is larger than the address space.")
@@ -23,6 +23,12 @@ class TLBCacheConfiguration:
     l2tlb_ways: int = 8
     """Number of L2 TLB ways (must divide l2tlb_entries)"""
 
+    l2tlb_superpage_entries: int = 16
+    """Number of L2 TLB entries for each superpage size"""
+
+    l2tlb_superpage_ways: int = 4
+    """Number of L2 TLB ways for each superpage size (must divide l2tlb_superpage_entries)"""
+
 
 class VirtualMemoryParameters:
     """Parameters for virtual memory support."""
@@ -46,6 +52,7 @@ class VirtualMemoryParameters:
         supervisor_mode: bool = False,
         asidlen: int | None = None,
         supported_schemes: Collection[SatpMode] = (SatpMode.BARE,),
+        hardware_a_d_update: bool = False,
     ):
         self.supported_schemes = frozenset(supported_schemes)
 
@@ -92,8 +99,11 @@ class VirtualMemoryParameters:
         )
         self.tlb_size_class_bits = self.max_tlb_size_class.bit_length()
 
+        if hardware_a_d_update and not self.supported_non_bare_schemes:
+            raise ValueError("Hardware A/D bit updates require a virtual memory scheme other than BARE")
+
         # Should be True when Svade is not supported or Svadu is supported
-        self.supports_auto_a_d_management = False
+        self.supports_auto_a_d_management = hardware_a_d_update
 
     @property
     def supported_non_bare_schemes(self) -> Collection[SatpMode]:
@@ -3,7 +3,7 @@ from typing import Protocol
 
 from amaranth import *
 
-from coreblocks.peripherals.wishbone import WishboneMaster
+from coreblocks.peripherals.wishbone import WishboneMaster, PipelinedWishboneMaster
 from coreblocks.peripherals.axi_lite import AXILiteMaster
 
 from transactron import Method, Methods, def_method, TModule, def_methods
@@ -113,8 +113,9 @@ class WishboneMasterAdapter(Elaboratable):
 
     Parameters
     ----------
-    bus: WishboneMaster
-        Specific Wishbone master module which is to be adapted.
+    bus: WishboneMaster | PipelinedWishboneMaster
+        Specific Wishbone master module which is to be adapted. For a pipelined master,
+        up to `max_req` requests are in flight, and their responses are returned in order.
 
     port_count: int
         Number of ports to be created for the bus adapter. Each port will have its own set
@@ -133,9 +134,10 @@ class WishboneMasterAdapter(Elaboratable):
         and responses. The number of interfaces is equal to `port_count`.
     """
 
-    def __init__(self, bus: WishboneMaster, port_count: int = 1):
+    def __init__(self, bus: WishboneMaster | PipelinedWishboneMaster, port_count: int = 1):
         self.bus = bus
         self.params = self.bus.wb_params
+        self.depth = bus.max_req if isinstance(bus, PipelinedWishboneMaster) else 4
 
         self.method_layouts = CommonBusMasterMethodLayout(self.params)
 
@@ -172,6 +174,7 @@ class WishboneMasterAdapter(Elaboratable):
             port_count=2 * self.port_count,
             serialized_req_method=self.bus.request,
             serialized_resp_method=self.bus.result,
+            depth=self.depth,
         )
         m.submodules.bus_serializer = bus_serializer
 
@@ -321,9 +321,10 @@ class WishboneMuxer(Component):
         to a slave. This signal is a Wishbone TGA (address tag), so it needs to be valid and held every time Wishbone
         STB is asserted.
         Number of create slabve interfaces is determied from `ssel_tga` bit width.
-        Note that if Pipelined Wishbone implementation is used, then before starting any new request with
-        different `ssel_tga` value, all pending request have to be finished (and `stall` cleared). Holding new requests
-        should be implemented in block that controlls `ssel_tga` signal, before the Wishbone Master.
+    max_pending: int
+        Maximum number of pending requests of a Pipelined Wishbone master. If greater than one, a request
+        with a different `ssel_tga` value than the pending requests is stalled until all of them are finished,
+        so that the responses from different slaves are not reordered. Defaults to 1, for standard Wishbone.
 
     Attributes
     ----------
@@ -336,7 +337,7 @@ class WishboneMuxer(Component):
     master_wb: WishboneInterface
     slaves: list[WishboneInterface]
 
-    def __init__(self, wb_params: WishboneParameters, ssel_tga: Signal):
+    def __init__(self, wb_params: WishboneParameters, ssel_tga: Signal, *, max_pending: int = 1):
         self.num_slaves = ssel_tga.shape().width
         super().__init__(
             {
@@ -345,6 +346,7 @@ class WishboneMuxer(Component):
             }
         )
         self.sselTGA = ssel_tga
+        self.max_pending = max_pending
 
         self.txn_sel = Signal(self.num_slaves)
         self.txn_sel_r = Signal(self.num_slaves)
@@ -356,6 +358,24 @@ class WishboneMuxer(Component):
 
         m.d.sync += self.prev_stb.eq(self.master_wb.stb)
 
+        # Set when a request to another slave has to wait for the pending requests.
+        hold = Signal()
+        # Slave which sends the responses.
+        resp_sel = Signal(self.num_slaves)
+        m.d.comb += resp_sel.eq(self.sselTGA)
+        if self.max_pending > 1:
+            pending = Signal(range(self.max_pending + 1))
+            pending_sel = Signal(self.num_slaves)
+            req_start = self.master_wb.cyc & self.master_wb.stb & ~self.master_wb.stall
+            req_finish = self.master_wb.ack | self.master_wb.err | self.master_wb.rty
+
+            m.d.comb += hold.eq((pending != 0) & (self.sselTGA != pending_sel))
+            m.d.sync += pending.eq(pending + req_start - req_finish)
+            with m.If(req_start):
+                m.d.sync += pending_sel.eq(self.sselTGA)
+            with m.If(pending != 0):
+                m.d.comb += resp_sel.eq(pending_sel)
+
         for i in range(len(self.slaves)):
             # connect all M->S signals except stb
             # workaround for the lack of selective connecting in wiring
@@ -367,7 +387,7 @@ class WishboneMuxer(Component):
             # deasserting STB in a block request.
 
             # use stb as a slave selector singal
-            m.d.comb += self.slaves[i].stb.eq(self.sselTGA[i] & self.master_wb.stb)
+            m.d.comb += self.slaves[i].stb.eq(self.sselTGA[i] & self.master_wb.stb & ~hold)
 
         # bus termination signals S->M should be ORed
         m.d.comb += self.master_wb.ack.eq(reduce(operator.or_, [self.slaves[i].ack for i in range(len(self.slaves))]))
@@ -375,10 +395,12 @@ class WishboneMuxer(Component):
         m.d.comb += self.master_wb.rty.eq(reduce(operator.or_, [self.slaves[i].rty for i in range(len(self.slaves))]))
         # mux S->M data
         # workaround for the lack of selective connecting in wiring
-        for n in ["dat_r", "stall"]:
-            m.d.comb += getattr(self.master_wb, n).eq(
-                OneHotMux.create(m, [(self.sselTGA[i], getattr(self.slaves[i], n)) for i in range(len(self.slaves))])
-            )
+        m.d.comb += self.master_wb.dat_r.eq(
+            OneHotMux.create(m, [(resp_sel[i], self.slaves[i].dat_r) for i in range(len(self.slaves))])
+        )
+        m.d.comb += self.master_wb.stall.eq(
+            hold | OneHotMux.create(m, [(self.sselTGA[i], self.slaves[i].stall) for i in range(len(self.slaves))])
+        )
         return m
 
 
@@ -388,6 +410,7 @@ class WishboneArbiter(Component):
 
     Connects multiple masters to one slave.
     Bus is requested by asserting CYC signal and is granted to masters in a round robin manner.
+    The bus stays granted to a master while it asserts LOCK, also between its bus cycles.
 
     Parameters
     ----------
@@ -402,6 +425,8 @@ class WishboneArbiter(Component):
         Slave inteface.
     masters: list of WishboneInterface
         List of master interfaces.
+    grant: Signal, out
+        Index of the master, to which the bus is granted.
     """
 
     slave_wb: WishboneInterface
@@ -420,6 +445,8 @@ class WishboneArbiter(Component):
         self.arb_enable = Signal()
         self.req_signal = Signal(num_masters)
 
+        self.grant = Signal(range(num_masters))
+
     def elaborate(self, platform):
         m = TModule()
 
@@ -434,7 +461,10 @@ class WishboneArbiter(Component):
         # If selcted master is active, disable rr request input to preserve grant signal and correct rr state.
         # prev_cyc is used to select next master in new bus cycle, if previously selected master asserts cyc at the
         # same time as another one
-        m.d.comb += self.arb_enable.eq((~master_array[m.submodules.rr.grant].cyc) | (~self.prev_cyc))
+        # A locked bus isn't arbitrated.
+        granted_master = master_array[m.submodules.rr.grant]
+        m.d.comb += self.arb_enable.eq(~granted_master.lock & (~granted_master.cyc | ~self.prev_cyc))
+        m.d.comb += self.grant.eq(m.submodules.rr.grant)
 
         for i in range(len(self.masters)):
             # mux S->M termination signals
@@ -457,14 +487,134 @@ class WishboneArbiter(Component):
                     for n in ["dat_w", "cyc", "lock", "adr", "we", "sel", "stb"]:
                         m.d.comb += getattr(self.slave_wb, n).eq(getattr(self.masters[i], n))
 
-        # Disable slave when round robin is not valid at start of new request
-        # This prevents chaning grant and muxes during Wishbone cycle
-        with m.If((~m.submodules.rr.valid) & self.arb_enable):
+        # Disable slave when the grant can change in the next cycle (round robin is not valid yet, or it can select
+        # another master at the start of a new request). This prevents chaning grant and muxes during Wishbone cycle
+        with m.If(self.arb_enable):
             m.d.comb += self.slave_wb.stb.eq(0)
 
         return m
 
 
+class WishboneClassicBridge(Component):
+    """Wishbone classic bridge.
+
+    Connects a Pipelined Wishbone master to a standard Wishbone slave. A request is held on the slave
+    interface until it is terminated, and `stall` is asserted in the meantime.
+
+    Parameters
+    ----------
+    wb_params: WishboneParameters
+        Parameters for bus generation.
+
+    Attributes
+    ----------
+    master_wb: WishboneInterface
+        Pipelined master interface.
+    slave_wb: WishboneInterface
+        Standard slave interface.
+    """
+
+    master_wb: WishboneInterface
+    slave_wb: WishboneInterface
+
+    def __init__(self, wb_params: WishboneParameters):
+        super().__init__(
+            {
+                "master_wb": In(WishboneInterface(wb_params).signature),
+                "slave_wb": Out(WishboneInterface(wb_params).signature),
+            }
+        )
+
+    def elaborate(self, platform):
+        m = TModule()
+
+        busy = Signal()
+        finish = Signal()
+
+        m.d.comb += finish.eq(busy & (self.slave_wb.ack | self.slave_wb.err | self.slave_wb.rty))
+        m.d.comb += self.master_wb.stall.eq(busy)
+
+        with m.If(self.master_wb.cyc & self.master_wb.stb & ~busy):
+            m.d.sync += busy.eq(1)
+            # workaround for the lack of selective connecting in wiring
+            for n in ["dat_w", "adr", "we", "sel"]:
+                m.d.sync += getattr(self.slave_wb, n).eq(getattr(self.master_wb, n))
+        with m.If(finish):
+            m.d.sync += busy.eq(0)
+
+        m.d.comb += self.slave_wb.cyc.eq(busy)
+        m.d.comb += self.slave_wb.stb.eq(busy)
+        m.d.comb += self.slave_wb.rst.eq(self.master_wb.rst)
+        # The bus stays locked between the requests
+        m.d.comb += self.slave_wb.lock.eq(self.master_wb.lock)
+
+        m.d.comb += self.master_wb.dat_r.eq(self.slave_wb.dat_r)
+        for n in ["ack", "err", "rty"]:
+            m.d.comb += getattr(self.master_wb, n).eq(busy & getattr(self.slave_wb, n))
+
+        return m
+
+
+class WishbonePipelineRegister(Component):
+    """Wishbone pipeline register.
+
+    Registers the requests of a Pipelined Wishbone master, so that the `stall` signal seen by the master
+    doesn't depend combinationally on the request. This is required when the slave stalls based on
+    the request address (e.g. `WishboneMuxer` with multiple pending requests), because the readiness
+    of the transactional `PipelinedWishboneMaster` can't depend on the request. Responses are passed
+    through. A request can be accepted in every cycle in which the slave is not stalling.
+
+    Parameters
+    ----------
+    wb_params: WishboneParameters
+        Parameters for bus generation.
+
+    Attributes
+    ----------
+    master_wb: WishboneInterface
+        Pipelined master interface.
+    slave_wb: WishboneInterface
+        Pipelined slave interface.
+    """
+
+    master_wb: WishboneInterface
+    slave_wb: WishboneInterface
+
+    def __init__(self, wb_params: WishboneParameters):
+        super().__init__(
+            {
+                "master_wb": In(WishboneInterface(wb_params).signature),
+                "slave_wb": Out(WishboneInterface(wb_params).signature),
+            }
+        )
+
+    def elaborate(self, platform):
+        m = TModule()
+
+        valid = Signal()
+
+        m.d.comb += self.master_wb.stall.eq(valid & self.slave_wb.stall)
+
+        with m.If(self.master_wb.cyc & self.master_wb.stb & ~self.master_wb.stall):
+            m.d.sync += valid.eq(1)
+            # workaround for the lack of selective connecting in wiring
+            for n in ["dat_w", "adr", "we", "sel"]:
+                m.d.sync += getattr(self.slave_wb, n).eq(getattr(self.master_wb, n))
+        with m.Elif(~self.slave_wb.stall):
+            m.d.sync += valid.eq(0)
+
+        m.d.comb += self.slave_wb.cyc.eq(self.master_wb.cyc | valid)
+        m.d.comb += self.slave_wb.stb.eq(valid)
+        m.d.comb += self.slave_wb.rst.eq(self.master_wb.rst)
+        m.d.comb += self.slave_wb.lock.eq(self.master_wb.lock)
+
+        m.d.comb += self.master_wb.dat_r.eq(self.slave_wb.dat_r)
+        for n in ["ack", "err", "rty"]:
+            m.d.comb += getattr(self.master_wb, n).eq(getattr(self.slave_wb, n))
+
+        return m
+
+
 class WishboneMemorySlave(Component):
     """Wishbone slave with memory
     Wishbone slave interface with addressable memory underneath.
@@ -473,6 +623,9 @@ class WishboneMemorySlave(Component):
     ----------
     wb_params: WishboneParameters
         Parameters for bus generation.
+    pipelined: bool
+        Use Pipelined Wishbone. A request can then be accepted in every cycle, and it is
+        responded to in the next one. Defaults to False.
     **kwargs: dict
         Keyword arguments for the underlying Amaranth's `Memory`. If `width` and `depth`
         are not specified, then they're inferred from `wb_params`: `data_width` becomes
@@ -486,8 +639,9 @@ class WishboneMemorySlave(Component):
 
     bus: WishboneInterface
 
-    def __init__(self, wb_params: WishboneParameters, **kwargs):
+    def __init__(self, wb_params: WishboneParameters, *, pipelined: bool = False, **kwargs):
         super().__init__({"bus": In(WishboneInterface(wb_params).signature)})
+        self.pipelined = pipelined
         if "shape" not in kwargs:
             kwargs["shape"] = wb_params.data_width
         if kwargs["shape"] not in (8, 16, 32, 64):
@@ -507,6 +661,26 @@ class WishboneMemorySlave(Component):
         wrport = self.mem.write_port(granularity=self.granularity)
         rdport = self.mem.read_port()
 
+        if self.pipelined:
+            resp_valid = Signal()
+            resp_err = Signal()
+
+            with m.If(self.bus.stb & self.bus.cyc):
+                with m.If(~self.bus.we):
+                    m.d.comb += rdport.addr.eq(self.bus.adr)
+                with m.Elif(self.bus.adr < self.mem.depth):
+                    m.d.comb += wrport.addr.eq(self.bus.adr)
+                    m.d.comb += wrport.en.eq(self.bus.sel)
+                    m.d.comb += wrport.data.eq(self.bus.dat_w)
+            m.d.sync += resp_valid.eq(self.bus.stb & self.bus.cyc)
+            m.d.sync += resp_err.eq(~self.bus.we & (self.bus.adr >= self.mem.depth))
+
+            m.d.comb += self.bus.dat_r.eq(rdport.data)
+            m.d.comb += self.bus.ack.eq(resp_valid & ~resp_err)
+            m.d.comb += self.bus.err.eq(resp_valid & resp_err)
+
+            return m
+
         with m.FSM():
             with m.State("Start"):
                 with m.If(self.bus.stb & self.bus.cyc):
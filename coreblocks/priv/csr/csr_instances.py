@@ -69,7 +69,7 @@ class MachineModeCSRRegisters(Elaboratable):
         self.mvendorid = CSRRegister(CSRAddress.MVENDORID, gen_params, init=0)
         self.marchid = CSRRegister(CSRAddress.MARCHID, gen_params, init=gen_params.marchid)
         self.mimpid = CSRRegister(CSRAddress.MIMPID, gen_params, init=gen_params.mimpid)
-        self.mhartid = CSRRegister(CSRAddress.MHARTID, gen_params, init=0)
+        self.mhartid = CSRRegister(CSRAddress.MHARTID, gen_params, init=gen_params.hart_id)
         self.mscratch = CSRRegister(CSRAddress.MSCRATCH, gen_params)
         self.mconfigptr = CSRRegister(CSRAddress.MCONFIGPTR, gen_params, init=0)
 
@@ -279,6 +279,7 @@ class MachineModeCSRRegisters(Elaboratable):
         self, gen_params: GenParams, menvcfg: Optional[AliasedCSR], menvcfgh: Optional[AliasedCSR]
     ):
         self.menvcfg_fiom = None
+        self.menvcfg_adue = None
         if menvcfg is None:
             return
 
@@ -286,6 +287,14 @@ class MachineModeCSRRegisters(Elaboratable):
         self.menvcfg_fiom = CSRRegister(None, gen_params, width=1, ro_bits=1 if fiom_ro else 0)
         menvcfg.add_field(MenvcfgFieldOffsets.FIOM, self.menvcfg_fiom)
 
+        if gen_params.vmem_params.supports_auto_a_d_management:
+            self.menvcfg_adue = CSRRegister(None, gen_params, width=1)
+            if gen_params.isa.xlen == 32:
+                assert menvcfgh is not None
+                menvcfgh.add_field(MenvcfgFieldOffsets.ADUE - menvcfg.width, self.menvcfg_adue)
+            else:
+                menvcfg.add_field(MenvcfgFieldOffsets.ADUE, self.menvcfg_adue)
+
     def _mtvec_fields_implementation(self, gen_params: GenParams, mtvec: AliasedCSR):
         def filter_legal_mode(m: TModule, v: Value):
             legal = Signal(1)
@@ -22,12 +22,18 @@ class CoreInstructionCounter(Elaboratable):
     last instruction in core and no new instruction is fetched).
     """
 
+    flush: Provided[Method]
+    """Decrements the counter by the number of instructions removed by a ROB flush.
+    Returns the same value as `decrement`.
+    """
+
     def __init__(self, gen_params: GenParams):
         self.gen_params = gen_params
 
         layouts = gen_params.get(CoreInstructionCounterLayouts)
         self.increment = Method(i=layouts.increment_in)
         self.decrement = Method(i=layouts.decrement_in, o=layouts.decrement_out)
+        self.flush = Method(i=layouts.flush_in, o=layouts.decrement_out)
 
     def elaborate(self, platform) -> TModule:
         m = TModule()
@@ -35,7 +41,7 @@ class CoreInstructionCounter(Elaboratable):
         counter = Signal(self.gen_params.rob_entries_bits + 1)
         counter_next = Signal.like(counter)
         incr_value = Signal(self.increment.layout_in.members["count"])
-        decr_value = Signal(self.decrement.layout_in.members["count"])
+        decr_value = Signal(self.flush.layout_in.members["count"])
 
         m.d.comb += counter_next.eq(counter + incr_value - decr_value)
         m.d.sync += counter.eq(counter_next)
@@ -51,6 +57,13 @@ class CoreInstructionCounter(Elaboratable):
             m.d.comb += decr_value.eq(count)
             return counter_next == 0
 
+        @def_method(m, self.flush)
+        def _(count):
+            m.d.comb += decr_value.eq(count)
+            return counter_next == 0
+
+        self.flush.add_conflict(self.decrement)
+
         log.debug(m, counter_next != counter, "{} instructions in core", counter)
 
         return m
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from amaranth import *
 from amaranth.lib.data import StructLayout, ArrayLayout, View
@@ -9,10 +10,9 @@ from transactron.utils import DependencyContext, assign, mod_incr, OneHotMux
 from transactron.lib import (
     BasicFifo,
     Forwarder,
-    Pipe,
     HwCounter,
     FIFOLatencyMeasurer,
-    Serializer,
+    TaggedLatencyMeasurer,
     Semaphore,
 )
 
@@ -360,7 +360,34 @@ class FullyAssociativeTLB(Elaboratable):
         return m
 
 
+class TLBTag(StructLayout):
+    """Part of a TLB entry kept in registers, used for flushing whole ASIDs."""
+
+    def __init__(self, gen_params: GenParams):
+        super().__init__(
+            {
+                "asid": gen_params.vmem_params.asidlen,
+                "g": 1,
+            }
+        )
+
+
 class SetAssociativeTLB(Elaboratable):
+    """Set associative TLB, meant for the L2 TLB.
+
+    Every size class has a separate set associative array, indexed by the VPN bits just above
+    the page offset of the size class, so that a lookup checks all size classes in parallel.
+    The superpage arrays are usually smaller than the base page array.
+
+    The valid bits and the ASID tags of the entries are kept in registers. This allows flushing
+    all entries, or all entries of an ASID, in a single cycle. A flush of a single address checks
+    the corresponding sets of all arrays, and takes two cycles.
+
+    The ports are handled independently, each of them can have a single request in flight.
+    A request from one port can hit while a request from the other port waits for the backing
+    resolver, but only one refill is in progress at a time.
+    """
+
     def __init__(
         self,
         gen_params: GenParams,
@@ -369,35 +396,61 @@ class SetAssociativeTLB(Elaboratable):
         ways: int,
         ports: int,
         backing_resolver: TLBBackingDevice,
+        superpage_entries: Optional[int] = None,
+        superpage_ways: Optional[int] = None,
         perf_name_prefix: str = "mmu.tlb",
     ):
-        if entries <= 0:
-            raise ValueError("entries must be positive")
-        if ways <= 0:
-            raise ValueError("ways must be positive")
-        if entries % ways != 0:
-            raise ValueError("entries must be divisible by ways")
+        """
+        Parameters
+        ----------
+        entries : int
+            Number of entries for base pages.
+        ways : int
+            Number of ways for base pages.
+        superpage_entries : int, optional
+            Number of entries of each superpage size class. Defaults to `entries`.
+        superpage_ways : int, optional
+            Number of ways of each superpage size class. Defaults to `ways`.
+        """
+        if superpage_entries is None:
+            superpage_entries = entries
+        if superpage_ways is None:
+            superpage_ways = ways
+
+        for prefix, e, w in [("", entries, ways), ("superpage_", superpage_entries, superpage_ways)]:
+            if e <= 0:
+                raise ValueError(f"{prefix}entries must be positive")
+            if w <= 0:
+                raise ValueError(f"{prefix}ways must be positive")
+            if e % w != 0:
+                raise ValueError(f"{prefix}entries must be divisible by {prefix}ways")
+
+        if ports <= 0:
+            raise ValueError("the number of ports of TLB must be positive")
 
         self.gen_params = gen_params
-        self.entries = entries
-        self.ways = ways
-        self.sets = entries // ways
         self.ports = ports
         self.backing_resolver = backing_resolver
         self.layout = gen_params.get(AddressTranslationLayouts)
         self.perf_name_prefix = perf_name_prefix
 
+        superpage_classes = gen_params.vmem_params.max_tlb_size_class
+        self.class_ways = [ways] + [superpage_ways] * superpage_classes
+        self.class_sets = [entries // ways] + [superpage_entries // superpage_ways] * superpage_classes
+
         self.request = Methods(ports, i=self.layout.tlb_request)
         self.accept = Methods(ports, o=self.layout.tlb_accept)
         self.sfence_vma = Method(i=self.layout.sfence_vma)
         self.dm = DependencyContext.get()
         self.dm.add_dependency(SFenceVMAKey(), self.sfence_vma)
 
-        self.perf_loads = HwCounter(f"{self.perf_name_prefix}.loads", "Number of requests to the TLB")
-        self.perf_hits = HwCounter(f"{self.perf_name_prefix}.hits")
-        self.perf_misses = HwCounter(f"{self.perf_name_prefix}.misses")
+        self.perf_loads = HwCounter(f"{self.perf_name_prefix}.loads", "Number of requests to the TLB", ways=ports)
+        self.perf_hits = HwCounter(f"{self.perf_name_prefix}.hits", ways=ports)
+        self.perf_misses = HwCounter(f"{self.perf_name_prefix}.misses", ways=ports)
         self.perf_flushes = HwCounter(f"{self.perf_name_prefix}.flushes")
-        self.perf_latency = FIFOLatencyMeasurer(f"{self.perf_name_prefix}.latency", slots_number=2, max_latency=500)
+        self.perf_latency = TaggedLatencyMeasurer(
+            f"{self.perf_name_prefix}.latency", slots_number=ports, max_latency=500, ways=ports
+        )
 
         self.ports_allocated = 0
 
@@ -432,227 +485,209 @@ class SetAssociativeTLB(Elaboratable):
 
         csr = self.dm.get_dependency(CSRInstancesKey())
 
+        size_classes = range(self.gen_params.vmem_params.max_tlb_size_class + 1)
         vpn_bits = self.gen_params.vmem_params.max_tlb_vpn_bits
         asid_bits = self.gen_params.vmem_params.asidlen
-        set_index_bits = (self.sets - 1).bit_length()
 
         current_asid = Signal(asid_bits)
         m.d.comb += current_asid.eq(csr.s_mode.satp_asid)
 
-        m.submodules.cam = cam = TLBCAM(self.gen_params, self.ways)
-
-        m.submodules.mem = mem = memory.Memory(
-            shape=ArrayLayout(TLBEntry(self.gen_params), self.ways), depth=self.sets, init=[]
-        )
-        set_rd = mem.read_port()
-        set_wr = mem.write_port()
-        m.d.comb += cam.ways_data.eq(set_rd.data)
-
-        m.submodules.rd_mem = rd_mem = memory.Memory(shape=cam.replacement_rr_index.shape(), depth=self.sets, init=[])
-        rd_rd = rd_mem.read_port()
-        rd_wr = rd_mem.write_port()
-        m.d.comb += cam.replacement_rr_index.eq(rd_rd.data)
-
-        m.submodules.fwd = fwd = Forwarder(self.layout.tlb_accept)
-
-        flushing = Signal(init=1)
-        refill_in_progress = Signal()
-
-        m.submodules.request_pipe = request_pipe = Pipe(self.layout.tlb_request)
-
-        requested_set = Signal(set_index_bits)
-        requested_class = Signal(self.gen_params.vmem_params.tlb_size_class_bits)
-
         def vpn_to_set_idx(vpn, size_class):
             bits_per_level = SatpMode.bits_per_page_table_level(self.gen_params.isa.xlen)
             return vpn.word_select(size_class, bits_per_level)
 
-        request = Method(i=self.layout.tlb_request)
-        accept = Method(o=self.layout.tlb_accept)
+        mems = []
+        rr_mems = []
+        for size_class in size_classes:
+            ways, sets = self.class_ways[size_class], self.class_sets[size_class]
+            mem = memory.Memory(shape=ArrayLayout(TLBEntry(self.gen_params), ways), depth=sets, init=[])
+            rr_mem = memory.Memory(shape=range(ways), depth=sets, init=[])
+            m.submodules[f"mem_{size_class}"] = mem
+            m.submodules[f"rr_mem_{size_class}"] = rr_mem
+            mems.append(mem)
+            rr_mems.append(rr_mem)
+
+        set_wrs = [mem.write_port() for mem in mems]
+        rr_wrs = [rr_mem.write_port() for rr_mem in rr_mems]
+        valids = [Signal(sets * ways) for ways, sets in zip(self.class_ways, self.class_sets)]
+        tags = [
+            Signal(ArrayLayout(TLBTag(self.gen_params), sets * ways))
+            for ways, sets in zip(self.class_ways, self.class_sets)
+        ]
 
-        m.submodules.port_serializer = port_serializer = Serializer(
-            port_count=self.ports,
-            serialized_req_method=request,
-            serialized_resp_method=accept,
-        )
+        def add_cam(name: str, size_class: int, read_vpn: Value, vpn: Value, asid: Value) -> TLBCAM:
+            """Creates a CAM for a set of the given size class. The set for `read_vpn` is read,
+            and matched in the next cycle against `vpn`, which should be the `read_vpn` from
+            the previous cycle."""
+            ways = self.class_ways[size_class]
+            m.submodules[name] = cam = TLBCAM(self.gen_params, ways)
 
-        for port in range(self.ports):
-            self.request[port].provide(port_serializer.serialize_in[port])
-            self.accept[port].provide(port_serializer.serialize_out[port])
+            set_rd = mems[size_class].read_port(transparent_for=[set_wrs[size_class]])
+            rr_rd = rr_mems[size_class].read_port(transparent_for=[rr_wrs[size_class]])
+            m.d.comb += set_rd.addr.eq(vpn_to_set_idx(read_vpn, size_class))
+            m.d.comb += rr_rd.addr.eq(vpn_to_set_idx(read_vpn, size_class))
 
-        @def_method(m, request, ready=~flushing)
-        def _(vpn, is_store):
-            self.perf_loads.incr(m)
-            self.perf_latency.start(m)
+            set_idx = Signal(range(self.class_sets[size_class]))
+            m.d.comb += set_idx.eq(vpn_to_set_idx(vpn, size_class))
 
-            set_idx = vpn_to_set_idx(vpn, 0)
-            m.d.sync += requested_set.eq(set_idx)
-            m.d.sync += requested_class.eq(0)
+            m.d.comb += cam.ways_data.eq(set_rd.data)
+            for way in range(ways):
+                m.d.comb += cam.ways_data[way].valid.eq(valids[size_class].bit_select(set_idx * ways + way, 1))
+            m.d.comb += cam.replacement_rr_index.eq(rr_rd.data)
+            m.d.comb += cam.checked_vpn.eq(vpn)
+            m.d.comb += cam.checked_asid.eq(asid)
 
-            m.d.comb += set_rd.addr.eq(set_idx)
-            m.d.comb += set_rd.en.eq(1)
+            return cam
 
-            m.d.sync += cam.checked_asid.eq(current_asid)
-            m.d.sync += cam.checked_vpn.eq(vpn)
+        flushing = Signal()
+        busy = Signal(self.ports)
+        refill_pending = Signal(self.ports)
 
-            request_pipe.write(m, vpn=vpn, is_store=is_store)
+        for port in range(self.ports):
+            m.submodules[f"fwd_{port}"] = fwd = Forwarder(self.layout.tlb_accept)
 
-        with Transaction(name="TLBLookup").body(m, ready=~refill_in_progress):
-            req = request_pipe.peek(m)
+            # `busy` is set between request and accept, `waiting` until the result is known
+            waiting = Signal()
+            vpn_req = Signal(vpn_bits)
+            is_store_req = Signal()
+            read_vpn = Signal(vpn_bits)
+            m.d.comb += read_vpn.eq(vpn_req)
+
+            cams = [
+                add_cam(f"cam_{port}_{size_class}", size_class, read_vpn, vpn_req, current_asid)
+                for size_class in size_classes
+            ]
+
+            hits = Signal(len(cams))
+            m.d.comb += hits.eq(Cat(cam.full_match.any() for cam in cams))
+            matched_entry = Signal(TLBEntry(self.gen_params))
+            m.d.comb += matched_entry.eq(
+                OneHotMux.create(m, [(hits[i], cam.matched_entry) for i, cam in enumerate(cams)], priority=True)
+            )
 
-            miss = Signal()
             ask_backing = Signal()
-
-            m.d.av_comb += miss.eq(~cam.full_match.any())
-
+            m.d.comb += ask_backing.eq(~hits.any())
             if self.gen_params.vmem_params.supports_auto_a_d_management:
-                if ~miss & req.is_store & ~cam.matched_entry.permissions.d:
-                    m.d.av_comb += ask_backing.eq(1)
-
-            max_class = self.gen_params.vmem_params.max_tlb_size_class
-            with m.If(miss & (requested_class == max_class)):
-                m.d.av_comb += ask_backing.eq(1)
+                with m.If(is_store_req & ~matched_entry.permissions.d):
+                    m.d.comb += ask_backing.eq(1)
 
-            with m.If(ask_backing):
-                self.perf_misses.incr(m)
-                m.d.sync += refill_in_progress.eq(1)
-                self.backing_resolver.request(m, vpn=req.vpn, is_store=req.is_store)
-            with m.Elif(miss & (requested_class < max_class)):
-                set_idx = vpn_to_set_idx(req.vpn, requested_class + 1)
-                m.d.sync += requested_set.eq(set_idx)
-                m.d.sync += requested_class.eq(requested_class + 1)
-
-                m.d.comb += set_rd.addr.eq(set_idx)
-                m.d.comb += set_rd.en.eq(1)
-            with m.Else():
-                request_pipe.read(m)
-                self.perf_hits.incr(m)
-
-                fwd.write(
-                    m,
-                    result=AddressTranslationLayouts.TLBResult.HIT,
-                    permissions=cam.matched_entry.permissions,
-                    ppn=cam.matched_entry.ppn,
-                    size_class=cam.matched_entry.size_class,
-                )
-
-        refill_set_idx = Signal(set_index_bits)
-        refill_response = Signal(self.layout.tlb_accept)
-
-        with m.FSM():
-            with m.State("IDLE"):
-                with Transaction().body(m):
-                    req = request_pipe.peek(m)
-                    resp = self.backing_resolver.accept(m)
+            @def_method(m, self.request[port], ready=~busy[port] & ~flushing)
+            def _(vpn, is_store):
+                self.perf_loads.incr[port](m)
+                self.perf_latency.start[port](m, slot=port)
 
-                    set_idx = vpn_to_set_idx(req.vpn, resp.size_class)
-                    m.d.sync += refill_set_idx.eq(set_idx)
-                    m.d.sync += refill_response.eq(resp)
+                m.d.comb += read_vpn.eq(vpn)
+                m.d.sync += [
+                    busy[port].eq(1),
+                    waiting.eq(1),
+                    vpn_req.eq(vpn),
+                    is_store_req.eq(is_store),
+                ]
 
-                    m.d.comb += set_rd.addr.eq(set_idx)
-                    m.d.comb += rd_rd.addr.eq(set_idx)
-                    m.d.comb += set_rd.en.eq(1)
-                    m.d.comb += rd_rd.en.eq(1)
+            self.sfence_vma.add_conflict(self.request[port], Priority.LEFT)
 
-                    with m.If(resp.result == AddressTranslationLayouts.TLBResult.HIT):
-                        m.next = "REFILL"
-                    with m.Else():
-                        request_pipe.read(m)
-                        fwd.write(m, resp)
-                        m.d.sync += refill_in_progress.eq(0)
-
-            with m.State("REFILL"):
-                with Transaction().body(m):
-                    req = request_pipe.read(m)
+            with m.If(waiting & ~refill_pending[port]):
+                with m.If(ask_backing):
+                    with Transaction(name=f"RequestRefill_{port}").body(m, ready=~refill_pending.any()):
+                        self.perf_misses.incr[port](m)
+                        self.backing_resolver.request(m, vpn=vpn_req, is_store=is_store_req)
+                        m.d.sync += refill_pending[port].eq(1)
+                with m.Else():
+                    with Transaction(name=f"TLBHit_{port}").body(m):
+                        self.perf_hits.incr[port](m)
+                        m.d.sync += waiting.eq(0)
+
+                        fwd.write(
+                            m,
+                            result=AddressTranslationLayouts.TLBResult.HIT,
+                            permissions=matched_entry.permissions,
+                            ppn=matched_entry.ppn,
+                            size_class=matched_entry.size_class,
+                        )
 
-                    fwd.write(m, refill_response)
-                    m.d.sync += refill_in_progress.eq(0)
+            with m.If(refill_pending[port]):
+                with Transaction(name=f"Refill_{port}").body(m):
+                    resp = self.backing_resolver.accept(m)
+                    fwd.write(m, resp)
+                    m.d.sync += refill_pending[port].eq(0)
+                    m.d.sync += waiting.eq(0)
 
                     new_entry = Signal(TLBEntry(self.gen_params))
                     m.d.top_comb += [
                         new_entry.valid.eq(1),
                         new_entry.asid.eq(current_asid),
-                        new_entry.vpn.eq(req.vpn),
-                        new_entry.ppn.eq(refill_response.ppn),
-                        new_entry.size_class.eq(refill_response.size_class),
-                        new_entry.permissions.eq(refill_response.permissions),
+                        new_entry.vpn.eq(vpn_req),
+                        new_entry.ppn.eq(resp.ppn),
+                        new_entry.size_class.eq(resp.size_class),
+                        new_entry.permissions.eq(resp.permissions),
                     ]
 
-                    m.d.comb += rd_wr.data.eq(cam.next_replacement_rr_index)
-                    m.d.comb += rd_wr.addr.eq(refill_set_idx)
-                    m.d.comb += set_wr.addr.eq(refill_set_idx)
-                    m.d.comb += set_wr.data.eq(set_rd.data)
-                    m.d.comb += set_wr.data[cam.replace_candidate].eq(new_entry)
-
-                    with m.If(refill_response.result == AddressTranslationLayouts.TLBResult.HIT):
-                        m.d.comb += rd_wr.en.eq(1)
-                        m.d.comb += set_wr.en.eq(1)
-
-                    m.next = "IDLE"
+                    # The sets for the requested VPN are still read, so the replacement is done right away
+                    with m.If(resp.result == AddressTranslationLayouts.TLBResult.HIT):
+                        with m.Switch(resp.size_class):
+                            for size_class, cam in zip(size_classes, cams):
+                                with m.Case(size_class):
+                                    ways = self.class_ways[size_class]
+                                    set_idx = vpn_to_set_idx(vpn_req, size_class)
+
+                                    m.d.comb += set_wrs[size_class].addr.eq(set_idx)
+                                    m.d.comb += set_wrs[size_class].data.eq(cam.ways_data)
+                                    m.d.comb += set_wrs[size_class].data[cam.replace_candidate].eq(new_entry)
+                                    m.d.comb += set_wrs[size_class].en.eq(1)
+
+                                    m.d.comb += rr_wrs[size_class].addr.eq(set_idx)
+                                    m.d.comb += rr_wrs[size_class].data.eq(cam.next_replacement_rr_index)
+                                    m.d.comb += rr_wrs[size_class].en.eq(1)
+
+                                    entry_idx = Signal(range(self.class_sets[size_class] * ways))
+                                    m.d.comb += entry_idx.eq(set_wrs[size_class].addr * ways + cam.replace_candidate)
+                                    m.d.sync += valids[size_class].bit_select(entry_idx, 1).eq(1)
+                                    m.d.sync += tags[size_class][entry_idx].asid.eq(current_asid)
+                                    m.d.sync += tags[size_class][entry_idx].g.eq(resp.permissions.g)
 
-        @def_method(m, accept)
-        def _():
-            self.perf_latency.stop(m)
-            return fwd.read(m)
+            @def_method(m, self.accept[port])
+            def _():
+                self.perf_latency.stop[port](m, slot=port)
+                m.d.sync += busy[port].eq(0)
+                return fwd.read(m)
 
-        # the flush after reset will start with garbage data in the CAM, but we do not care, as
-        # it is a full flush and will invalidate all entries from the first set. Following set flushes
-        # will have correct data
         flush_vpn = Signal(vpn_bits)
-        flush_all_vaddrs = Signal(init=1)
-        flush_all_asids = Signal(init=1)
-        flush_set = Signal(set_index_bits)
-        flush_size_class = Signal(self.gen_params.vmem_params.tlb_size_class_bits)
-        flush_fetched = Signal()
+        flush_asid = Signal(asid_bits)
+        flush_all_asids = Signal()
+        flush_read_vpn = Signal(vpn_bits)
+        m.d.comb += flush_read_vpn.eq(flush_vpn)
+
+        flush_cams = [
+            add_cam(f"flush_cam_{size_class}", size_class, flush_read_vpn, flush_vpn, flush_asid)
+            for size_class in size_classes
+        ]
 
-        @def_method(m, self.sfence_vma, ready=~flushing & ~request_pipe.read.ready & ~refill_in_progress)
+        @def_method(m, self.sfence_vma, ready=~flushing & ~busy.any())
         def _(vaddr, asid, all_vaddrs, all_asids):
             self.perf_flushes.incr(m)
 
-            m.d.sync += flushing.eq(1)
-            m.d.sync += cam.checked_asid.eq(asid)
-            m.d.sync += cam.checked_vpn.eq(vaddr >> PAGE_SIZE_LOG)
-            m.d.sync += flush_vpn.eq(vaddr >> PAGE_SIZE_LOG)
-            m.d.sync += flush_all_vaddrs.eq(all_vaddrs)
-            m.d.sync += flush_all_asids.eq(all_asids)
-
-            m.d.sync += flush_set.eq(Mux(all_vaddrs, 0, vpn_to_set_idx(vaddr >> PAGE_SIZE_LOG, 0)))
-            m.d.sync += flush_fetched.eq(0)
-            m.d.sync += flush_size_class.eq(0)
-
-            m.d.comb += set_rd.addr.eq(flush_set)
-            m.d.comb += set_rd.en.eq(1)
-
-        self.sfence_vma.add_conflict(request, Priority.LEFT)
-
-        with m.If(flushing):
-            m.d.comb += set_wr.data.eq(set_rd.data)
-            for way in range(self.ways):
-                with m.If((flush_all_asids | cam.asid_match[way]) & (flush_all_vaddrs | cam.addr_match[way])):
-                    m.d.comb += set_wr.data[way].valid.eq(0)
-
-            m.d.comb += set_wr.addr.eq(flush_set)
-            m.d.comb += set_wr.en.eq(1)
-
-            next_flush_set = Signal(set_index_bits)
-            flush_done = Signal()
-
-            with m.If(flush_all_vaddrs):
-                m.d.comb += next_flush_set.eq(flush_set + 1)
-                m.d.comb += flush_done.eq(flush_set == self.sets - 1)
+            with m.If(all_vaddrs):
+                for size_class in size_classes:
+                    flushed = Signal.like(valids[size_class])
+                    for i in range(len(flushed)):
+                        tag = tags[size_class][i]
+                        m.d.comb += flushed[i].eq(all_asids | (~tag.g & (tag.asid == asid)))
+                    m.d.sync += valids[size_class].eq(valids[size_class] & ~flushed)
             with m.Else():
-                m.d.comb += next_flush_set.eq(vpn_to_set_idx(flush_vpn, flush_size_class + 1))
-                m.d.sync += flush_size_class.eq(flush_size_class + 1)
+                m.d.sync += flushing.eq(1)
+                m.d.sync += flush_vpn.eq(vaddr >> PAGE_SIZE_LOG)
+                m.d.sync += flush_asid.eq(asid)
+                m.d.sync += flush_all_asids.eq(all_asids)
+                m.d.comb += flush_read_vpn.eq(vaddr >> PAGE_SIZE_LOG)
 
-                with m.If(flush_size_class == self.gen_params.vmem_params.max_tlb_size_class):
-                    m.d.comb += flush_done.eq(1)
-
-            m.d.sync += flush_set.eq(next_flush_set)
-
-            m.d.comb += set_rd.addr.eq(next_flush_set)
-            m.d.comb += set_rd.en.eq(1)
-
-            with m.If(flush_done):
-                m.d.sync += flushing.eq(0)
+        with m.If(flushing):
+            m.d.sync += flushing.eq(0)
+            for size_class, cam in zip(size_classes, flush_cams):
+                ways = self.class_ways[size_class]
+                set_idx = Signal(range(self.class_sets[size_class]))
+                m.d.comb += set_idx.eq(vpn_to_set_idx(flush_vpn, size_class))
+                for way in range(ways):
+                    with m.If((flush_all_asids | cam.asid_match[way]) & cam.addr_match[way]):
+                        m.d.sync += valids[size_class].bit_select(set_idx * ways + way, 1).eq(0)
 
         return m
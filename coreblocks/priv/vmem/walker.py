@@ -114,7 +114,11 @@ class PageTableWalker(TLBBackingDevice, Elaboratable):
     - SV48: 64-bit virtual addresses, 4-level page table
     - SV57: 64-bit virtual addresses, 5-level page table
 
-    Implements Svade semantics (exception on missing A/D bits).
+    Implements Svade semantics (exception on missing A/D bits). With `hardware_a_d_update`
+    configured and `menvcfg.ADUE` set, implements Svadu instead: the A bit, and for stores
+    the D bit, of the leaf PTE are set by the walker. The leaf PTE is written back right after
+    it is read, before any other walk. A PMP violation or a bus error on the write raises
+    an access fault.
     """
 
     def __init__(self, gen_params: GenParams, bus: BusMasterInterface) -> None:
@@ -153,6 +157,22 @@ class PageTableWalker(TLBBackingDevice, Elaboratable):
         accessed = Signal()
         permissions = Signal(self.layout.permissions)
 
+        # Leaf PTE, with the A/D bits to be written back (Svadu).
+        hw_a_d_update = Signal()
+        if self.gen_params.vmem_params.supports_auto_a_d_management:
+            assert csr.m_mode.menvcfg_adue is not None
+            m.d.comb += hw_a_d_update.eq(csr.m_mode.menvcfg_adue.value)
+        leaf_pte = Signal(pte_layout)
+        leaf_pte_addr = Signal(self.gen_params.phys_addr_bits)
+        leaf_pte_writable = Signal()
+
+        ppn_misaligned = Signal()
+        with m.Switch(walk_level):
+            for level in range(max_levels):
+                with m.Case(level):
+                    level_vpn_bits = bits_per_level * level
+                    m.d.comb += ppn_misaligned.eq(ppn[:level_vpn_bits].any())
+
         vpn_index = Signal(bits_per_level)
         m.d.comb += [
             vpn_index.eq(walk_vpn.word_select(walk_level, bits_per_level)),
@@ -211,7 +231,16 @@ class PageTableWalker(TLBBackingDevice, Elaboratable):
                         m.next = "DONE"
                     with m.Elif(pte.is_leaf()):
                         log.debug(m, 1, "Leaf PTE found for VPN {:x}, PPN {:x}", walk_vpn, pte.ppn)
-                        m.next = "DONE"
+                        m.d.sync += [
+                            leaf_pte.eq(pte),
+                            leaf_pte_addr.eq(pte_addr),
+                            leaf_pte_writable.eq(pmp_checker.result.w),
+                        ]
+                        # Stores to pages which aren't writable fault anyway, so their PTEs are not updated.
+                        with m.If(hw_a_d_update & Mux(is_store, pte.W & ~(pte.A & pte.D), ~pte.A)):
+                            m.next = "UPDATE"
+                        with m.Else():
+                            m.next = "DONE"
                     with m.Elif(walk_level == 0):
                         log.debug(m, 1, "Non-leaf PTE at lowest level for VPN {:x}", walk_vpn)
                         m.d.sync += page_fault.eq(1)
@@ -220,6 +249,33 @@ class PageTableWalker(TLBBackingDevice, Elaboratable):
                         log.debug(m, 1, "Non-leaf PTE for VPN {:x}, descending to next level", walk_vpn)
                         m.d.sync += walk_level.eq(walk_level - 1)
                         m.next = "ISSUE"
+            with m.State("UPDATE"):
+                with m.If(ppn_misaligned):
+                    m.next = "DONE"
+                with m.Elif(~leaf_pte_writable):
+                    log.debug(m, 1, "PMP check failed for PTE update at address {:x}", leaf_pte_addr)
+                    m.d.sync += access_fault.eq(1)
+                    m.next = "DONE"
+                with m.Else():
+                    with Transaction().body(m):
+                        updated_pte = Signal(pte_layout)
+                        m.d.av_comb += updated_pte.eq(leaf_pte)
+                        m.d.av_comb += updated_pte.A.eq(1)
+                        with m.If(is_store):
+                            m.d.av_comb += updated_pte.D.eq(1)
+                            m.d.sync += permissions.d.eq(1)
+                        m.d.sync += accessed.eq(1)
+
+                        log.debug(m, 1, "Updating A/D bits of PTE at address {:x}", leaf_pte_addr)
+                        self.bus.request_write(m, addr=leaf_pte_addr[offset_bits:], data=updated_pte.as_value(), sel=~0)
+                        m.next = "UPDATE_RESP"
+            with m.State("UPDATE_RESP"):
+                with Transaction().body(m):
+                    resp = self.bus.get_write_response(m)
+                    with m.If(resp.err):
+                        log.debug(m, 1, "Bus error while updating PTE at address {:x}", leaf_pte_addr)
+                        m.d.sync += access_fault.eq(1)
+                    m.next = "DONE"
 
         @def_method(m, self.request, ready=fsm.ongoing("IDLE"))
         def _(arg):
@@ -244,13 +300,6 @@ class PageTableWalker(TLBBackingDevice, Elaboratable):
         def _():
             result = Signal(AddressTranslationLayouts.TLBResult, init=AddressTranslationLayouts.TLBResult.HIT)
 
-            ppn_misaligned = Signal()
-            with m.Switch(walk_level):
-                for level in range(max_levels):
-                    with m.Case(level):
-                        level_vpn_bits = bits_per_level * level
-                        m.d.comb += ppn_misaligned.eq(ppn[:level_vpn_bits].any())
-
             with m.If(access_fault):
                 m.d.av_comb += result.eq(AddressTranslationLayouts.TLBResult.ACCESS_FAULT)
             with m.Elif(page_fault | ppn_misaligned):
@@ -258,8 +307,6 @@ class PageTableWalker(TLBBackingDevice, Elaboratable):
             with m.Elif(~accessed | (is_store & ~permissions.d)):
                 # Svade semantics: if A/D bits are not properly set, treat it as a page fault
                 m.d.av_comb += result.eq(AddressTranslationLayouts.TLBResult.PAGE_FAULT)
-                # TODO: implement non Svade once LSU gets real atomic support
-                #  -> just a CAS on last PTE with A/D bits set, and if it fails, restart the walk
             with m.Else():
                 m.d.av_comb += result.eq(AddressTranslationLayouts.TLBResult.HIT)
 
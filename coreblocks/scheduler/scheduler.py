@@ -15,7 +15,7 @@ from coreblocks.interface.layouts import RATLayouts, RFLayouts, ROBLayouts, RSFu
 from coreblocks.params import GenParams
 from coreblocks.arch.optypes import OpType, impure_optypes
 from coreblocks.interface.keys import CoreStateKey, RVVIHartCollectorKey
-from coreblocks.telemetry import RobAllocate, SchedulerEnter
+from coreblocks.telemetry import RobAllocate, RsInsert, SchedulerEnter
 
 __all__ = ["Scheduler"]
 
@@ -463,6 +463,8 @@ class RSInsertion(Elaboratable):
                 )
                 rs_datas.append(rs_data)
                 rs_entry_id.append(instr.rs_entry_id)
+
+                evlog.emit(m, RsInsert.hw(rob_id=instr.rob_id), when=i < instrs.count)
                 rs_selected.append(instr.rs_selected)
 
             for j, rs_insert in enumerate(self.rs_insert):
@@ -33,12 +33,12 @@ class ClintPeriph(Component, SocksPeripheral):
         super().__init__(
             {
                 "bus": In(WishboneInterface(wb_params).signature),
-                "mtip": Out(1),
+                "mtip": Out(hart_count),
                 "msip": Out(hart_count),
             }
         )
         self.time_width = 64
-        self.ipi_width = 64
+        self.ipi_width = 32
         self.base_addr = base_addr
         self.addr_space_size = addr_space_size
         self.hart_count = hart_count
@@ -68,8 +68,8 @@ class ClintPeriph(Component, SocksPeripheral):
             m.d.comb += self.bus.ack.eq(0)
 
         for hart in range(self.hart_count):
-            gen_memory_mapped_register(m, self, self.msip_offset + self.ipi_width * hart, self.ipi[hart])
-            gen_memory_mapped_register(m, self, self.mtimecmp_offset + self.time_width * hart, self.mtimecmp[hart])
+            gen_memory_mapped_register(m, self, self.msip_offset + self.ipi_width // 8 * hart, self.ipi[hart])
+            gen_memory_mapped_register(m, self, self.mtimecmp_offset + self.time_width // 8 * hart, self.mtimecmp[hart])
 
         gen_memory_mapped_register(m, self, self.mtime_offset, self.mtime)
 
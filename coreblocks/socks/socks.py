@@ -1,12 +1,28 @@
+from typing import Optional
+
 from amaranth import *
 from amaranth.lib.wiring import Component, In, Out, connect, flipped
+from amaranth.utils import exact_log2
+
+from transactron import TransactronContextComponent
+from transactron.utils import DependencyContext, DependencyManager
 
 from coreblocks.arch.isa_consts import InterruptCauseNumber
+from coreblocks.cache.l2cache import L2Cache
 from coreblocks.core import Core
+from coreblocks.interface.keys import StoreSnoopKey
+from coreblocks.interface.layouts import LSULayouts
 from coreblocks.params import GenParams
-from coreblocks.peripherals.wishbone import WishboneInterface, WishboneMuxer
+from coreblocks.params.core_configuration import CoreConfiguration
+from coreblocks.peripherals.wishbone import (
+    WishboneArbiter,
+    WishboneClassicBridge,
+    WishboneInterface,
+    WishboneMuxer,
+    WishbonePipelineRegister,
+)
 from coreblocks.priv.traps.interrupt_controller import ISA_RESERVED_INTERRUPTS
-from coreblocks.socks.clint import ClintPeriph
+from coreblocks.socks.clint import ClintMtimeKey, ClintPeriph
 from coreblocks.socks.peripheral import bus_in_periph_range
 from coreblocks.socks.plic import PlicPeriph
 
@@ -33,6 +49,11 @@ class Socks(Component):
     In both cases MTI and MSI are ignored and provided from CLINT.
     """
 
+    l2cache: Optional[L2Cache]
+    """ The L2 cache, if enabled in the core configuration.
+    Both core buses are then connected to it, and it accesses the memory through `wb_data`. `wb_instr` is unused.
+    """
+
     def __init__(self, core: Core, core_gen_params: GenParams, with_plic: bool = True):
         super().__init__(
             {
@@ -55,29 +76,64 @@ class Socks(Component):
         else:
             self.plic = None
 
+        if core_gen_params.l2cache_params.enable:
+            self.l2cache = L2Cache(core_gen_params, core_gen_params.l2cache_params, num_masters=2)
+        else:
+            self.l2cache = None
+
         self.core = core
         self.core_gen_params = core_gen_params
 
     def elaborate(self, platform):
         m = Module()
 
+        wb_params = self.core_gen_params.wb_params
+        max_requests = self.core_gen_params.data_bus_max_requests
+
         muxer_ssel = Signal(3)
-        periph_muxer = WishboneMuxer(self.core_gen_params.wb_params, muxer_ssel)
+        periph_muxer = WishboneMuxer(wb_params, muxer_ssel, max_pending=max_requests)
 
-        connect(m, self.core.wb_instr, flipped(self.wb_instr))
+        if max_requests > 1:
+            # The muxer stalls based on the request address, so the requests are registered
+            # to avoid a combinational loop through the readiness of the core's bus master.
+            m.submodules.data_register = data_register = WishbonePipelineRegister(wb_params)
+            connect(m, self.core.wb_data, data_register.master_wb)
+            data_bus = data_register.slave_wb
+        else:
+            data_bus = self.core.wb_data
 
-        connect(m, self.core.wb_data, periph_muxer.master_wb)
-        connect(m, periph_muxer.slaves[0], flipped(self.wb_data))
+        connect(m, data_bus, periph_muxer.master_wb)
 
-        connect(m, periph_muxer.slaves[1], self.clint.bus)
-        if self.plic:
-            connect(m, periph_muxer.slaves[2], self.plic.bus)
+        if self.l2cache:
+            m.submodules.l2cache = self.l2cache
+            connect(m, self.core.wb_instr, self.l2cache.masters[0])
+            if max_requests > 1:
+                m.submodules.l2cache_bridge = l2cache_bridge = WishboneClassicBridge(wb_params)
+                connect(m, periph_muxer.slaves[0], l2cache_bridge.master_wb)
+                connect(m, l2cache_bridge.slave_wb, self.l2cache.masters[1])
+            else:
+                connect(m, periph_muxer.slaves[0], self.l2cache.masters[1])
+            connect(m, self.l2cache.mem_wb, flipped(self.wb_data))
+        else:
+            connect(m, self.core.wb_instr, flipped(self.wb_instr))
+            connect(m, periph_muxer.slaves[0], flipped(self.wb_data))
+
+        periphs = [self.clint] + ([self.plic] if self.plic else [])
+        for i, periph in enumerate(periphs):
+            if max_requests > 1:
+                # The peripherals use standard Wishbone.
+                bridge = WishboneClassicBridge(wb_params)
+                m.submodules[f"bridge{i}"] = bridge
+                connect(m, periph_muxer.slaves[i + 1], bridge.master_wb)
+                connect(m, bridge.slave_wb, periph.bus)
+            else:
+                connect(m, periph_muxer.slaves[i + 1], periph.bus)
 
         clint_addr = Signal()
         plic_addr = Signal()
-        m.d.comb += clint_addr.eq(bus_in_periph_range(self.core.wb_data, self.clint))
+        m.d.comb += clint_addr.eq(bus_in_periph_range(data_bus, self.clint))
         if self.plic:
-            m.d.comb += plic_addr.eq(bus_in_periph_range(self.core.wb_data, self.plic))
+            m.d.comb += plic_addr.eq(bus_in_periph_range(data_bus, self.plic))
         m.d.comb += muxer_ssel.eq(Cat(~(clint_addr | plic_addr), clint_addr, plic_addr))
 
         m.submodules.clint = self.clint
@@ -98,3 +154,153 @@ class Socks(Component):
         m.d.comb += self.core.interrupts[InterruptCauseNumber.MSI].eq(self.clint.msip)
 
         return m
+
+
+class MultiHartSocks(Component):
+    """Socks with multiple harts.
+
+    The harts share the CLINT, the PLIC, the memory buses and the L2 cache (if enabled). The instruction
+    and data buses of the harts are arbitrated by `WishboneArbiter`s, so `wb_instr` and `wb_data` use
+    standard Wishbone, even if the harts use Pipelined Wishbone for data. Every hart has a separate
+    Transactron context, as the harts are independent.
+
+    The harts don't have data caches, so the memory is coherent. The data bus stays granted to a hart
+    for the whole atomic operation (Wishbone LOCK), and the stores of every hart are snooped by the other
+    ones to invalidate their LR/SC reservations. Instruction caches are only flushed by FENCE.I of their
+    own hart, so code written by another hart has to be synchronized by software, as in the RISC-V spec.
+
+    Attributes
+    ----------
+    harts: list of Core
+        The harts, with MHARTID equal to their index.
+    """
+
+    wb_instr: WishboneInterface
+    wb_data: WishboneInterface
+
+    interrupts: Signal
+    """ Interrupts input signal, like in `Socks`.
+    PLIC contexts `2*i` and `2*i+1` are wired to MEI and SEI of hart `i`. Without the PLIC, the interrupts
+    are wired to all harts.
+    """
+
+    l2cache: Optional[L2Cache]
+    """ The L2 cache shared by all harts, if enabled in the core configuration. """
+
+    def __init__(self, core_config: CoreConfiguration, hart_count: int, with_plic: bool = True):
+        """
+        Parameters
+        ----------
+        core_config : CoreConfiguration
+            Configuration of the harts. `hart_id` is set to the index of the hart.
+        hart_count : int
+            Number of harts.
+        with_plic : bool
+            Generate the PLIC.
+        """
+        self.gen_params = gen_params = GenParams(core_config)
+        super().__init__(
+            {
+                "wb_instr": Out(WishboneInterface(gen_params.wb_params).signature),
+                "wb_data": Out(WishboneInterface(gen_params.wb_params).signature),
+                "interrupts": In((1 if with_plic else ISA_RESERVED_INTERRUPTS) + gen_params.interrupt_custom_count),
+            }
+        )
+
+        self.clint = ClintPeriph(base_addr=CLINT_BASE, wb_params=gen_params.wb_params, hart_count=hart_count)
+        if with_plic:
+            self.plic = PlicPeriph(
+                base_addr=PLIC_BASE,
+                wb_params=gen_params.wb_params,
+                interrupt_count=gen_params.interrupt_custom_count,
+                context_count=2 * hart_count,
+            )
+        else:
+            self.plic = None
+
+        if gen_params.l2cache_params.enable:
+            self.l2cache = L2Cache(gen_params, gen_params.l2cache_params, num_masters=2)
+        else:
+            self.l2cache = None
+
+        self.harts: list[Core] = []
+        self.hart_contexts: list[TransactronContextComponent] = []
+        self.store_snoops = []
+        for hart_id in range(hart_count):
+            hart_gen_params = GenParams(core_config.replace(hart_id=hart_id))
+            dm = DependencyManager()
+            dm.add_dependency(ClintMtimeKey(), self.clint.mtime)
+            store_snoop = Signal(hart_gen_params.get(LSULayouts).store_snoop)
+            dm.add_dependency(StoreSnoopKey(), store_snoop)
+            with DependencyContext(dm):
+                core = Core(gen_params=hart_gen_params)
+            self.harts.append(core)
+            self.hart_contexts.append(TransactronContextComponent(core, dependency_manager=dm))
+            self.store_snoops.append(store_snoop)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        wb_params = self.gen_params.wb_params
+        hart_count = len(self.harts)
+
+        m.submodules.instr_arbiter = instr_arbiter = WishboneArbiter(wb_params, hart_count)
+        m.submodules.data_arbiter = data_arbiter = WishboneArbiter(wb_params, hart_count)
+
+        for i, hart in enumerate(self.hart_contexts):
+            m.submodules[f"hart{i}"] = hart
+            connect(m, hart.wb_instr, instr_arbiter.masters[i])
+            if self.gen_params.data_bus_max_requests > 1:
+                bridge = WishboneClassicBridge(wb_params)
+                m.submodules[f"hart{i}_bridge"] = bridge
+                connect(m, hart.wb_data, bridge.master_wb)
+                connect(m, bridge.slave_wb, data_arbiter.masters[i])
+            else:
+                connect(m, hart.wb_data, data_arbiter.masters[i])
+
+        # Stores to the memory invalidate the reservations of the other harts.
+        data_bus = data_arbiter.slave_wb
+        store_done = data_bus.cyc & data_bus.stb & data_bus.we & data_bus.ack
+        for i, store_snoop in enumerate(self.store_snoops):
+            m.d.comb += store_snoop.valid.eq(store_done & (data_arbiter.grant != i))
+            m.d.comb += store_snoop.paddr.eq(data_bus.adr << exact_log2(wb_params.data_width // 8))
+
+        muxer_ssel = Signal(3)
+        m.submodules.periph_muxer = periph_muxer = WishboneMuxer(wb_params, muxer_ssel)
+        connect(m, data_bus, periph_muxer.master_wb)
+
+        if self.l2cache:
+            m.submodules.l2cache = self.l2cache
+            connect(m, instr_arbiter.slave_wb, self.l2cache.masters[0])
+            connect(m, periph_muxer.slaves[0], self.l2cache.masters[1])
+            connect(m, self.l2cache.mem_wb, flipped(self.wb_data))
+        else:
+            connect(m, instr_arbiter.slave_wb, flipped(self.wb_instr))
+            connect(m, periph_muxer.slaves[0], flipped(self.wb_data))
+
+        m.submodules.clint = self.clint
+        connect(m, periph_muxer.slaves[1], self.clint.bus)
+        if self.plic:
+            m.submodules.plic = self.plic
+            connect(m, periph_muxer.slaves[2], self.plic.bus)
+
+        clint_addr = Signal()
+        plic_addr = Signal()
+        m.d.comb += clint_addr.eq(bus_in_periph_range(data_bus, self.clint))
+        if self.plic:
+            m.d.comb += plic_addr.eq(bus_in_periph_range(data_bus, self.plic))
+        m.d.comb += muxer_ssel.eq(Cat(~(clint_addr | plic_addr), clint_addr, plic_addr))
+
+        if self.plic:
+            m.d.comb += self.plic.interrupts.eq(self.interrupts)
+        for i, hart in enumerate(self.hart_contexts):
+            if self.plic:
+                m.d.comb += hart.interrupts[InterruptCauseNumber.MEI].eq(self.plic.eip[2 * i])
+                m.d.comb += hart.interrupts[InterruptCauseNumber.SEI].eq(self.plic.eip[2 * i + 1])
+            else:
+                m.d.comb += hart.interrupts[InterruptCauseNumber.MEI].eq(self.interrupts[InterruptCauseNumber.MEI])
+                m.d.comb += hart.interrupts[ISA_RESERVED_INTERRUPTS:].eq(self.interrupts[ISA_RESERVED_INTERRUPTS:])
+            m.d.comb += hart.interrupts[InterruptCauseNumber.MTI].eq(self.clint.mtip[i])
+            m.d.comb += hart.interrupts[InterruptCauseNumber.MSI].eq(self.clint.msip[i])
+
+        return m
@@ -0,0 +1,341 @@
+"""Compact binary container for event logs.
+
+The JSON-lines format used by `EventLog.save` must be parsed in its
+entirety by every consumer. The binary format instead stores the raw records
+in independently decodable chunks, and ends with an index of the cycle range
+covered by every chunk, so that a reader can seek to a window of cycles
+without decoding the rest of the file.
+
+File layout (all integers little-endian)::
+
+    magic  "CBEVLOG\\0", u32 format version, u32 header length
+    header JSON: {"schema": ..., "compression": null | "zstd"}
+    chunk*
+    index  (u64 offset, u32 stored size, u32 record count,
+            u64 first cycle, u64 last cycle) per chunk
+    u64 index offset, u32 chunk count, magic
+
+A chunk (optionally zstd-compressed as a whole) is columnar: the cycles of
+its records (u32 each, relative to the chunk's first cycle), their site
+indices (u16 each, or u32 if the schema has more sites), and then the
+dynamic field values of the records of every site, in site index order. Values of a
+site are stored as fixed-width records: each field takes the smallest of 1,
+2, 4 or 8 bytes fitting its bit width (or the exact number of bytes, for
+wider fields). Signed fields are decoded sign-extended.
+
+Compression requires the `zstandard` package.
+"""
+
+import json
+import struct
+from collections import Counter
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from typing import BinaryIO, Literal, Optional
+
+from transactron.evlog import DecodedEvent, EventDecoder, EventLog, EventLogReader, EvLogSchema, RawEvent
+
+
+__all__ = [
+    "BinaryEventLogWriter",
+    "BinaryEventLogReader",
+    "save_binary",
+    "is_binary_event_log",
+    "open_event_log",
+]
+
+
+type Compression = Literal["zstd"]
+
+_MAGIC = b"CBEVLOG\0"
+_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_INDEX_ENTRY = struct.Struct("<QIIQQ")
+_TRAILER = struct.Struct("<QI8s")
+
+
+class _SiteCodec:
+    """Fixed-width encoding of the dynamic field values of a single site."""
+
+    def __init__(self, fields: Sequence[tuple[int, bool]]):
+        formats: list[str] = []
+        # Fields needing conversion after unpacking: (index, width, signed, wide).
+        self.fixups: list[tuple[int, int, bool, bool]] = []
+        self.masks: list[int] = []
+        for i, (width, signed) in enumerate(fields):
+            width = max(width, 1)
+            nbytes = next((n for n in [1, 2, 4, 8] if width <= 8 * n), (width + 7) // 8)
+            wide = nbytes > 8
+            formats.append(f"{nbytes}s" if wide else {1: "B", 2: "H", 4: "I", 8: "Q"}[nbytes])
+            self.masks.append((1 << 8 * nbytes) - 1)
+            if signed or wide:
+                self.fixups.append((i, width, signed, wide))
+        self.struct = struct.Struct("<" + "".join(formats))
+        self.wide = [i for i, _, _, wide in self.fixups if wide]
+        self.nbytes = [mask.bit_length() // 8 for mask in self.masks]
+
+    def pack(self, values: Sequence[int]) -> bytes:
+        packed: list[int | bytes] = [value & mask for value, mask in zip(values, self.masks)]
+        for i in self.wide:
+            packed[i] = int(packed[i]).to_bytes(self.nbytes[i], "little")
+        return self.struct.pack(*packed)
+
+    def unpack_from(self, buffer: bytes, offset: int) -> list[int]:
+        values = list(self.struct.unpack_from(buffer, offset))
+        for i, width, signed, wide in self.fixups:
+            value = int.from_bytes(values[i], "little") if wide else values[i]
+            if signed:
+                value &= (1 << width) - 1
+                if value >> (width - 1):
+                    value -= 1 << width
+            values[i] = value
+        return values
+
+
+def _site_codecs(schema: EvLogSchema) -> list[_SiteCodec]:
+    return [_SiteCodec([(field.width, field.signed) for field in site.fields]) for site in schema.sites]
+
+
+def _site_format(schema: EvLogSchema) -> str:
+    return "H" if len(schema.sites) <= 2**16 else "I"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Event log compression requires the 'zstandard' package") from None
+    return zstandard
+
+
+@dataclass(frozen=True)
+class _ChunkInfo:
+    offset: int
+    size: int
+    count: int
+    first_cycle: int
+    last_cycle: int
+
+
+class BinaryEventLogWriter:
+    """Streams raw event records to a binary event log file.
+
+    Records are buffered until a chunk is full, so memory usage is bounded by
+    the chunk size. Can be used as a context manager; the index is written
+    when the writer is closed.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        schema: EvLogSchema,
+        *,
+        chunk_records: int = 65536,
+        compression: Optional[Compression] = None,
+    ):
+        """
+        Parameters
+        ----------
+        filename: str
+            The file to write.
+        schema: EvLogSchema
+            Schema of the written records.
+        chunk_records: int
+            Number of records per chunk. Smaller chunks allow finer-grained
+            seeking, larger ones compress better.
+        compression: Optional[Compression]
+            Compression applied to every chunk.
+        """
+        self.schema = schema
+        self.chunk_records = chunk_records
+        self.compression = compression
+        self._codecs = _site_codecs(schema)
+        self._site_format = _site_format(schema)
+        self._compressor = _zstd().ZstdCompressor() if compression == "zstd" else None
+        self._chunk: list[RawEvent] = []
+        self._chunk_first = self._chunk_last = 0
+        self._index: list[_ChunkInfo] = []
+
+        self._fp: Optional[BinaryIO] = open(filename, "wb")
+        header = json.dumps({"schema": schema.to_dict(), "compression": compression}).encode()  # type: ignore
+        self._fp.write(_PREAMBLE.pack(_MAGIC, _VERSION, len(header)))
+        self._fp.write(header)
+
+    def emit_raw(self, cycle: int, site: int, values: Sequence[int]) -> None:
+        assert self._fp is not None, "Event log writer is closed"
+        # Relative cycles of a chunk must fit in 32 bits.
+        if self._chunk and max(cycle, self._chunk_last) - min(cycle, self._chunk_first) >= 2**32:
+            self._write_chunk()
+        if not self._chunk:
+            self._chunk_first = self._chunk_last = cycle
+        self._chunk_first = min(self._chunk_first, cycle)
+        self._chunk_last = max(self._chunk_last, cycle)
+        self._chunk.append((cycle, site, list(values)))
+        if len(self._chunk) >= self.chunk_records:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        assert self._fp is not None
+        records = self._chunk
+        self._chunk = []
+        if not records:
+            return
+
+        count = len(records)
+        first = self._chunk_first
+        parts = [
+            struct.pack(f"<{count}I", *(cycle - first for cycle, _, _ in records)),
+            struct.pack(f"<{count}{self._site_format}", *(site for _, site, _ in records)),
+        ]
+        per_site: dict[int, list[bytes]] = {}
+        for _, site, values in records:
+            per_site.setdefault(site, []).append(self._codecs[site].pack(values))
+        for site in sorted(per_site):
+            parts.extend(per_site[site])
+        payload = b"".join(parts)
+        if self._compressor is not None:
+            payload = self._compressor.compress(payload)
+
+        self._index.append(_ChunkInfo(self._fp.tell(), len(payload), count, first, self._chunk_last))
+        self._fp.write(payload)
+
+    def close(self):
+        if self._fp is None:
+            return
+        self._write_chunk()
+        index_offset = self._fp.tell()
+        for info in self._index:
+            self._fp.write(_INDEX_ENTRY.pack(info.offset, info.size, info.count, info.first_cycle, info.last_cycle))
+        self._fp.write(_TRAILER.pack(index_offset, len(self._index), _MAGIC))
+        self._fp.close()
+        self._fp = None
+
+    def __enter__(self) -> "BinaryEventLogWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+
+class BinaryEventLogReader:
+    """Reader of binary event log files, with random access by cycle.
+
+    Like `EventLogReader`, decodes events lazily while iterating, one chunk
+    at a time. Additionally, `window` only decodes the chunks which may
+    contain records from a given range of cycles.
+
+    Attributes
+    ----------
+    schema: EvLogSchema
+        The schema read from the event log header.
+    compression: Optional[Compression]
+        Compression of the chunks.
+    """
+
+    def __init__(self, filename: str):
+        self._filename = filename
+        with open(filename, "rb") as fp:
+            magic, version, header_len = _PREAMBLE.unpack(fp.read(_PREAMBLE.size))
+            if magic != _MAGIC:
+                raise ValueError(f"'{filename}' is not a binary event log")
+            if version != _VERSION:
+                raise ValueError(f"Unsupported binary event log version {version}")
+            header = json.loads(fp.read(header_len))
+            self.schema: EvLogSchema = EvLogSchema.from_dict(header["schema"])  # type: ignore
+            self.compression: Optional[Compression] = header["compression"]
+
+            fp.seek(-_TRAILER.size, 2)
+            index_offset, chunk_count, magic = _TRAILER.unpack(fp.read(_TRAILER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"'{filename}' is truncated (missing chunk index)")
+            fp.seek(index_offset)
+            self._index = [_ChunkInfo(*_INDEX_ENTRY.unpack(fp.read(_INDEX_ENTRY.size))) for _ in range(chunk_count)]
+
+        self._codecs = _site_codecs(self.schema)
+        self._site_format = _site_format(self.schema)
+        self._decompressor = _zstd().ZstdDecompressor() if self.compression == "zstd" else None
+
+    def __len__(self) -> int:
+        return sum(info.count for info in self._index)
+
+    @property
+    def cycle_range(self) -> Optional[tuple[int, int]]:
+        """The first and last cycle of the recorded events, `None` if there are none."""
+        if not self._index:
+            return None
+        return min(info.first_cycle for info in self._index), max(info.last_cycle for info in self._index)
+
+    def _read_chunk(self, fp: BinaryIO, info: _ChunkInfo) -> Iterator[RawEvent]:
+        fp.seek(info.offset)
+        payload = fp.read(info.size)
+        if self._decompressor is not None:
+            payload = self._decompressor.decompress(payload)
+
+        count = info.count
+        cycles = struct.unpack_from(f"<{count}I", payload, 0)
+        sites = struct.unpack_from(f"<{count}{self._site_format}", payload, 4 * count)
+
+        # Start offsets of the value records of every site.
+        offsets: dict[int, int] = {}
+        offset = struct.calcsize(f"<{count}I{count}{self._site_format}")
+        for site, site_count in sorted(Counter(sites).items()):
+            offsets[site] = offset
+            offset += site_count * self._codecs[site].struct.size
+
+        for cycle, site in zip(cycles, sites):
+            codec = self._codecs[site]
+            values = codec.unpack_from(payload, offsets[site])
+            offsets[site] += codec.struct.size
+            yield info.first_cycle + cycle, site, values
+
+    def raw(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[RawEvent]:
+        """Iterates over the raw records from cycles `start` (inclusive)
+        through `end` (exclusive), in capture order. Missing bounds are
+        unlimited."""
+        with open(self._filename, "rb") as fp:
+            for info in self._index:
+                if start is not None and info.last_cycle < start:
+                    continue
+                if end is not None and info.first_cycle >= end:
+                    continue
+                for record in self._read_chunk(fp, info):
+                    cycle = record[0]
+                    if (start is None or cycle >= start) and (end is None or cycle < end):
+                        yield record
+
+    def window(self, start: Optional[int] = None, end: Optional[int] = None) -> Iterator[DecodedEvent]:
+        """Decodes the events from cycles `start` (inclusive) through `end`
+        (exclusive), in capture order."""
+        decoder = EventDecoder(self.schema)
+        for cycle, site, values in self.raw(start, end):
+            yield decoder.decode(cycle, site, values)
+
+    def __iter__(self) -> Iterator[DecodedEvent]:
+        return self.window()
+
+    def to_event_log(self) -> EventLog:
+        """Loads all records into an in-memory event log, e.g. for the
+        conversion to JSON lines with `EventLog.save`."""
+        log = EventLog(self.schema)
+        log.raw.extend(self.raw())
+        return log
+
+
+def save_binary(log: EventLog, filename: str, *, chunk_records: int = 65536, compression: Optional[Compression] = None):
+    """Saves an in-memory event log in the binary format."""
+    with BinaryEventLogWriter(filename, log.schema, chunk_records=chunk_records, compression=compression) as writer:
+        for cycle, site, values in log.raw:
+            writer.emit_raw(cycle, site, values)
+
+
+def is_binary_event_log(filename: str) -> bool:
+    """Checks whether a file is a binary event log (as opposed to JSON lines)."""
+    with open(filename, "rb") as fp:
+        return fp.read(len(_MAGIC)) == _MAGIC
+
+
+def open_event_log(filename: str) -> EventLogReader | BinaryEventLogReader:
+    """Opens an event log in either format for streaming decoding."""
+    if is_binary_event_log(filename):
+        return BinaryEventLogReader(filename)
+    return EventLogReader(filename)
@@ -0,0 +1,324 @@
+"""Top-down CPI stack built from captured event logs.
+
+Every cycle offers `retire_width` retire slots. Each slot is attributed to
+exactly one category:
+
+- retiring: an instruction retired in the slot,
+- bad speculation: a wrong-path instruction was flushed in the slot, the
+  ROB head was a wrong-path instruction (later flushed), or the ROB was
+  empty while the core recovered from a misprediction, trap or exception,
+- frontend bound: the ROB was empty and the frontend did not deliver
+  instructions, split into an instruction cache miss, a frontend (BPU)
+  redirect, a stall on an unsafe instruction, or other fetch latency,
+- backend bound: the ROB head did not retire, split by the state of the head
+  instruction: waiting for reservation station insertion (full reservation
+  stations), waiting in a reservation station, executing in the LSU,
+  executing in another functional unit, or other (completed, but not yet
+  retired).
+
+Slots of a stalled ROB head are attributed when the head leaves the ROB,
+as only then it is known whether it was on the wrong path.
+"""
+
+import argparse
+import json
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Optional
+
+from dataclasses_json import dataclass_json
+
+from transactron.evlog import DecodedEvent, EventConsumer, EvLogSchema, handles
+
+from .binlog import open_event_log
+from .events import *
+
+
+__all__ = ["CPIStack", "CPIStackBuilder", "retire_width_from_schema"]
+
+
+FRONTEND_CATEGORIES = ["icache_miss", "bpu_redirect", "unsafe_stall", "other"]
+BACKEND_CATEGORIES = ["rs_full", "rs_wait", "fu_busy", "lsu_wait", "other"]
+
+
+@dataclass_json
+@dataclass
+class CPIStack:
+    """Retire slots of a run, attributed to top-down categories.
+
+    Attributes
+    ----------
+    cycles: int
+        Number of analyzed cycles.
+    instructions: int
+        Number of retired instructions.
+    retire_width: int
+        Number of retire slots per cycle.
+    retiring: int
+        Slots used by retiring instructions.
+    bad_speculation: int
+        Slots lost to wrong-path instructions and misprediction recovery.
+    frontend_bound: dict[str, int]
+        Slots lost to the frontend not delivering instructions, by cause.
+    backend_bound: dict[str, int]
+        Slots lost to the ROB head not being ready to retire, by cause.
+    """
+
+    cycles: int = 0
+    instructions: int = 0
+    retire_width: int = 1
+    retiring: int = 0
+    bad_speculation: int = 0
+    frontend_bound: dict[str, int] = field(default_factory=lambda: dict.fromkeys(FRONTEND_CATEGORIES, 0))
+    backend_bound: dict[str, int] = field(default_factory=lambda: dict.fromkeys(BACKEND_CATEGORIES, 0))
+
+    @property
+    def slots(self) -> int:
+        return self.cycles * self.retire_width
+
+    @property
+    def cpi(self) -> float:
+        return self.cycles / self.instructions if self.instructions else float("inf")
+
+    def fractions(self) -> dict[str, float]:
+        """Fractions of all slots attributed to each category and subcategory."""
+        slots = max(self.slots, 1)
+        ret = {
+            "retiring": self.retiring / slots,
+            "bad_speculation": self.bad_speculation / slots,
+            "frontend_bound": sum(self.frontend_bound.values()) / slots,
+            "backend_bound": sum(self.backend_bound.values()) / slots,
+        }
+        ret |= {f"frontend_bound.{name}": value / slots for name, value in self.frontend_bound.items()}
+        ret |= {f"backend_bound.{name}": value / slots for name, value in self.backend_bound.items()}
+        return ret
+
+
+def retire_width_from_schema(schema: EvLogSchema) -> int:
+    """The retire width of the design which produced an event log: there is
+    a `RobRetire` emission site per retirement lane."""
+    return max(1, sum(site.event_name == RobRetire.event_name for site in schema.sites))
+
+
+@dataclass
+class _RobInstr:
+    inserted: bool = False
+    unit: Optional[str] = None
+    complete: bool = False
+    stalled: Counter[str] = field(default_factory=Counter)
+    """Slots in which the instruction stalled retirement as the ROB head."""
+
+
+class CPIStackBuilder(EventConsumer):
+    """Builds a `CPIStack` from instruction lifetime events.
+
+    The records must be sorted by cycle, as is the case for captured event
+    logs. They are processed in a single pass, with memory usage bounded
+    by the number of in-flight instructions.
+    """
+
+    def __init__(self, retire_width: int):
+        self.stack = CPIStack(retire_width=retire_width)
+        # Live ROB entries, keyed by the ROB id; insertion order is
+        # allocation order, so the first entry is the ROB head.
+        self.rob: dict[int, _RobInstr] = {}
+        # Retire slots used in the current cycle.
+        self.used_slots = 0
+        # When recovering from a misprediction or a trap: FTQ entries
+        # allocated since then, which are on the correct path.
+        self.recovery: Optional[set[int]] = None
+        self.frontend_redirect = False
+        self.icache_miss = False
+        self.stalls: set[str] = set()
+        # The frontend refills after an unsafe instruction was resolved.
+        self.unsafe_refill = False
+        self.unsafe_resumed = False
+
+    def run(self, records: Iterable[DecodedEvent]):
+        last_cycle = None
+        for rec in records:
+            if last_cycle is not None and rec.cycle < last_cycle:
+                raise ValueError(
+                    f"CPI stack analysis requires records sorted by cycle, got cycle {rec.cycle} after {last_cycle}"
+                )
+            if last_cycle is not None and rec.cycle != last_cycle:
+                self._end_cycle()
+                # Nothing happens in the cycles without events.
+                self._account(rec.cycle - last_cycle - 1)
+            last_cycle = rec.cycle
+            self.dispatch(rec)
+        if last_cycle is not None:
+            self._end_cycle()
+
+    def result(self) -> CPIStack:
+        """Returns the stack, attributing the stalls of the instructions still
+        in the ROB to the backend."""
+        for instr in self.rob.values():
+            self._add_backend(instr.stalled)
+            instr.stalled.clear()
+        return self.stack
+
+    def _end_cycle(self):
+        # Resuming from an unsafe instruction redirects the frontend in the
+        # same cycle, which is not a misprediction.
+        if self.unsafe_resumed:
+            self.recovery = None
+            self.unsafe_refill = True
+            self.unsafe_resumed = False
+        self._account(1, self.used_slots)
+        self.used_slots = 0
+
+    def _account(self, cycles: int, used_slots: int = 0):
+        if cycles <= 0:
+            return
+        self.stack.cycles += cycles
+        empty = max(self.stack.retire_width - used_slots, 0) * cycles
+        if not empty:
+            return
+
+        if self.rob:
+            head = next(iter(self.rob.values()))
+            head.stalled[self._backend_category(head)] += empty
+        elif self.recovery is not None or "exception" in self.stalls:
+            self.stack.bad_speculation += empty
+        else:
+            self.stack.frontend_bound[self._frontend_category()] += empty
+
+    def _frontend_category(self) -> str:
+        if "unsafe" in self.stalls or self.unsafe_refill:
+            return "unsafe_stall"
+        if self.icache_miss:
+            return "icache_miss"
+        if self.frontend_redirect:
+            return "bpu_redirect"
+        return "other"
+
+    @staticmethod
+    def _backend_category(instr: _RobInstr) -> str:
+        if instr.complete:
+            return "other"
+        if instr.unit is not None:
+            return "lsu_wait" if instr.unit.startswith("lsu") else "fu_busy"
+        if instr.inserted:
+            return "rs_wait"
+        return "rs_full"
+
+    def _add_backend(self, stalled: Counter[str]):
+        for category, slots in stalled.items():
+            self.stack.backend_bound[category] += slots
+
+    def _start_recovery(self):
+        self.recovery = set()
+        self.frontend_redirect = False
+        self.unsafe_refill = False
+
+    @handles(FTQAlloc)
+    def on_alloc(self, rec: DecodedEvent[FTQAlloc]):
+        if self.recovery is not None:
+            self.recovery.add(rec.event.ftq_ptr)
+
+    @handles(ICacheMiss)
+    def on_icache_miss(self, rec: DecodedEvent[ICacheMiss]):
+        self.icache_miss = True
+
+    @handles(InstrFetched)
+    def on_instr_fetched(self, rec: DecodedEvent[InstrFetched]):
+        self.icache_miss = False
+
+    @handles(FrontendStall)
+    def on_stall(self, rec: DecodedEvent[FrontendStall]):
+        self.stalls.add(rec.event.cause)
+
+    @handles(FrontendResume)
+    def on_resume(self, rec: DecodedEvent[FrontendResume]):
+        self.stalls.discard(rec.event.cause)
+        if rec.event.cause == "unsafe":
+            self.unsafe_resumed = True
+
+    @handles(FTQRollback)
+    def on_rollback(self, rec: DecodedEvent[FTQRollback]):
+        if rec.event.cause == "ifu_writeback":
+            self.frontend_redirect = True
+        else:
+            # Any backend redirect ends an unsafe stall.
+            self.stalls.discard("unsafe")
+            self._start_recovery()
+
+    @handles(RobAllocate)
+    def on_rob_allocate(self, rec: DecodedEvent[RobAllocate]):
+        ev = rec.event
+        self.rob[ev.rob_id] = _RobInstr()
+        self.frontend_redirect = False
+        self.unsafe_refill = False
+        if self.recovery is not None and ev.ftq_ptr in self.recovery:
+            self.recovery = None
+
+    @handles(RsInsert)
+    def on_rs_insert(self, rec: DecodedEvent[RsInsert]):
+        instr = self.rob.get(rec.event.rob_id)
+        if instr is not None:
+            instr.inserted = True
+
+    @handles(FuIssue)
+    def on_fu_issue(self, rec: DecodedEvent[FuIssue]):
+        instr = self.rob.get(rec.event.rob_id)
+        if instr is not None:
+            instr.inserted = True
+            instr.unit = rec.event.unit
+
+    @handles(ExecComplete)
+    def on_exec_complete(self, rec: DecodedEvent[ExecComplete]):
+        instr = self.rob.get(rec.event.rob_id)
+        if instr is not None:
+            instr.complete = True
+
+    @handles(RobRetire)
+    def on_rob_retire(self, rec: DecodedEvent[RobRetire]):
+        self.used_slots += 1
+        self.stack.retiring += 1
+        self.stack.instructions += 1
+        instr = self.rob.pop(rec.event.rob_id, None)
+        if instr is not None:
+            self._add_backend(instr.stalled)
+
+    @handles(RobFlush)
+    def on_rob_flush(self, rec: DecodedEvent[RobFlush]):
+        self.used_slots += 1
+        self.stack.bad_speculation += 1
+        instr = self.rob.pop(rec.event.rob_id, None)
+        if instr is not None:
+            self.stack.bad_speculation += instr.stalled.total()
+
+    @handles(RobBulkFlush)
+    def on_rob_bulk_flush(self, rec: DecodedEvent[RobBulkFlush]):
+        for instr in self.rob.values():
+            self.stack.bad_speculation += instr.stalled.total()
+        self.rob.clear()
+        self._start_recovery()
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Build a top-down CPI stack from a captured event log.")
+    parser.add_argument("path", help="The event log file (JSON lines or binary)")
+    parser.add_argument(
+        "-w", "--retire-width", type=int, help="Retire slots per cycle (default: deduced from the event log)"
+    )
+    parser.add_argument("-o", "--output", help="Output JSON file (default: standard output)")
+    args = parser.parse_args(argv)
+
+    reader = open_event_log(args.path)
+    retire_width = args.retire_width or retire_width_from_schema(reader.schema)
+    builder = CPIStackBuilder(retire_width)
+    builder.run(reader)
+    output = json.dumps(builder.result().to_dict(), indent=4)  # type: ignore
+
+    if args.output is not None:
+        with open(args.output, "w") as out:
+            out.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,17 @@ __all__ = [
     "FetchRequest",
     "InstrFetched",
     "InstrDecoded",
+    "ICacheMiss",
+    "FrontendStall",
+    "FrontendResume",
     "FTQRollback",
     "FTQCommit",
     "SchedulerEnter",
     "RobAllocate",
+    "RsInsert",
     "RobRetire",
     "RobFlush",
+    "RobBulkFlush",
     "FuIssue",
     "ExecComplete",
     "OperandWakeup",
@@ -66,6 +71,34 @@ class InstrDecoded(Event):
     ftq_offset: int
 
 
+@event("frontend.icache_miss")
+class ICacheMiss(Event):
+    """An instruction cache lookup missed and a refill of the cache line at
+    `paddr` was started."""
+
+    paddr: int
+
+
+@event("frontend.stall")
+class FrontendStall(Event):
+    """The frontend was stalled. `cause` is "unsafe" (an unsafe instruction
+    was fetched and must be resolved by the backend first) or "exception"
+    (an exception was reported on the speculative path, or the core is
+    flushing)."""
+
+    cause: Static[str]
+
+
+@event("frontend.resume")
+class FrontendResume(Event):
+    """The frontend stall with the given `cause` ended: the unsafe
+    instruction was resolved, or the exception got invalidated. An unsafe
+    stall also ends silently on any redirect (e.g. a misprediction squashing
+    the unsafe instruction)."""
+
+    cause: Static[str]
+
+
 @event("frontend.ftq_rollback")
 class FTQRollback(Event):
     """FTQ allocation was rolled back: `ftq_ptr` is the new allocation
@@ -104,6 +137,13 @@ class RobAllocate(Event):
     rp_dst: int
 
 
+@event("backend.rs_insert")
+class RsInsert(Event):
+    """The instruction was inserted into a reservation station."""
+
+    rob_id: int
+
+
 @event("backend.rob_retire")
 class RobRetire(Event):
     """The instruction retired."""
@@ -118,6 +158,13 @@ class RobFlush(Event):
     rob_id: int
 
 
+@event("backend.rob_bulk_flush")
+class RobBulkFlush(Event):
+    """All `count` instructions in the ROB were squashed at once."""
+
+    count: int
+
+
 @event("backend.fu_issue")
 class FuIssue(Event):
     """The instruction was issued from a reservation station to a
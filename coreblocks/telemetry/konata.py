@@ -3,13 +3,21 @@ format (https://github.com/shioyadan/Konata).
 
 Since Kanata files are append-only with monotonically increasing time, and
 the concrete instructions of a fetch block are only known when they leave
-the fetch unit, the converter buffers everything: event handlers build
-per-instruction stage timelines, and the log is written out at the end,
-sorted by cycle. This allows backdating an instruction's fetch stages to
-the times its fetch block was allocated and requested.
+the fetch unit, event handlers do not write commands directly: they queue
+them by cycle, which allows backdating an instruction's fetch stages to the
+time its fetch block was requested.
+
+By default, the converter buffers the whole timeline and writes it out at
+the end. In streaming mode, it instead relies on the event log being sorted
+by cycle: commands are written out as soon as their cycle is older than both
+the current event and the fetch request of the oldest live FTQ entry, as no
+later event can produce a command before that point. Memory usage is then
+bounded by the number of in-flight instructions, not by the trace length.
 """
 
 import argparse
+import heapq
+import itertools
 import signal
 import sys
 from collections.abc import Iterable
@@ -17,8 +25,9 @@ from dataclasses import dataclass, field
 from typing import Optional, TextIO
 import capstone
 
-from transactron.evlog import DecodedEvent, EventConsumer, EventLogReader, handles
+from transactron.evlog import DecodedEvent, EventConsumer, handles
 
+from .binlog import open_event_log
 from .events import *
 
 
@@ -53,10 +62,21 @@ class KonataParser(EventConsumer):
 
     The instruction terminates by retiring (`RobRetire`) or being squashed.
     Instructions still in flight when the event log ends are left unterminated.
+
+    Parameters
+    ----------
+    out: TextIO
+        The output stream.
+    streaming: bool
+        Write the log out incrementally, holding only the commands which can
+        still be preceded by commands of later events. Requires the records
+        to be sorted by cycle, as is the case for captured event logs. The
+        output is identical to the buffered mode.
     """
 
-    def __init__(self, out: TextIO):
+    def __init__(self, out: TextIO, *, streaming: bool = False):
         self.out = out
+        self.streaming = streaming
         # Live FTQ entries, keyed by the raw FTQ pointer (with the parity
         # bit, which makes keys unique among live entries); insertion order
         # is allocation order.
@@ -67,11 +87,16 @@ class KonataParser(EventConsumer):
         self.rp_dst: dict[int, int] = {}
         # Kanata instuction ids keyed by target physical register ids.
         self.by_rp_dst: dict[int, int] = {}
-        # Kanata instruction ids with a terminal (retire/flush) record.
+        # Kanata instruction ids of live FTQ entries with a terminal
+        # (retire/flush) record.
         self.terminated: set[int] = set()
-        # (cycle, sequence number, line) command timeline; the sequence
-        # number keeps the append order among commands of the same cycle.
+        # Heap of (cycle, sequence number, line) commands not yet written
+        # out; the sequence number keeps the append order among commands of
+        # the same cycle.
         self.timeline: list[tuple[int, int, str]] = []
+        self.sequence = itertools.count()
+        # Cycle of the last written command, `None` before the first one.
+        self.written_cycle: Optional[int] = None
         self.next_id = 0
         self.next_retire_id = 0
         self.disassembler = None
@@ -87,11 +112,43 @@ class KonataParser(EventConsumer):
         return f"{instr:08x}"
 
     def run(self, records: Iterable[DecodedEvent]):
-        super().run(records)
-        self._write()
+        self.out.write("Kanata\t0004\n")
+        if not self.streaming:
+            super().run(records)
+        else:
+            last_cycle = None
+            for rec in records:
+                if last_cycle is not None and rec.cycle < last_cycle:
+                    raise ValueError(
+                        f"Streaming conversion requires records sorted by cycle, "
+                        f"got cycle {rec.cycle} after {last_cycle}"
+                    )
+                if rec.cycle != last_cycle:
+                    self._flush(min([rec.cycle] + self._fetch_cycles()))
+                    last_cycle = rec.cycle
+                self.dispatch(rec)
+        self._flush()
+
+    def _fetch_cycles(self) -> list[int]:
+        return [block.fetch_cycle for block in self.blocks.values() if block.fetch_cycle is not None]
 
     def _command(self, cycle: int, *columns) -> None:
-        self.timeline.append((cycle, len(self.timeline), "\t".join(str(col) for col in columns)))
+        heapq.heappush(self.timeline, (cycle, next(self.sequence), "\t".join(str(col) for col in columns)))
+
+    def _flush(self, before: Optional[int] = None) -> None:
+        """Writes out the queued commands older than cycle `before`, or all
+        of them if it is `None`."""
+        while self.timeline and (before is None or self.timeline[0][0] < before):
+            cycle, _, line = heapq.heappop(self.timeline)
+            if self.written_cycle is None:
+                self.out.write(f"C=\t{cycle}\n")
+            elif cycle != self.written_cycle:
+                self.out.write(f"C\t{cycle - self.written_cycle}\n")
+            self.written_cycle = cycle
+            self.out.write(line + "\n")
+        if before is None and self.written_cycle is None:
+            self.out.write("C=\t0\n")
+            self.written_cycle = 0
 
     def _forget_dst(self, insn_id: int) -> None:
         """Drops the destination register mapping of a terminated instruction,
@@ -208,6 +265,17 @@ class KonataParser(EventConsumer):
         self.terminated.add(insn_id)
         self._forget_dst(insn_id)
 
+    @handles(RobBulkFlush)
+    def on_rob_bulk_flush(self, rec: DecodedEvent[RobBulkFlush]):
+        # The whole ROB is squashed, in program order.
+        for insn_id in sorted(self.rob.values()):
+            if insn_id in self.terminated:
+                continue
+            self._command(rec.cycle, "R", insn_id, 0, 1)
+            self.terminated.add(insn_id)
+            self._forget_dst(insn_id)
+        self.rob.clear()
+
     @handles(FTQCommit)
     def on_commit(self, rec: DecodedEvent[FTQCommit]):
         ev = rec.event
@@ -215,7 +283,7 @@ class KonataParser(EventConsumer):
         # strictly before it are fully retired (each instruction got its own
         # `RobRetire`); they only need to be dropped from the bookkeeping.
         for key in self._entries_before(ev.ftq_ptr):
-            del self.blocks[key]
+            self.terminated.difference_update(self.blocks.pop(key).instr_ids.values())
 
     @handles(FTQRollback)
     def on_rollback(self, rec: DecodedEvent[FTQRollback]):
@@ -234,6 +302,7 @@ class KonataParser(EventConsumer):
                 self._command(rec.cycle, "R", insn_id, 0, 1)
                 self.terminated.add(insn_id)
         self.rob = {rob_id: insn_id for rob_id, insn_id in self.rob.items() if insn_id not in flushed}
+        self.terminated -= flushed
 
     def _entries_before(self, ftq_ptr: int) -> list[int]:
         """Returns the live entries allocated strictly before `ftq_ptr`."""
@@ -249,18 +318,6 @@ class KonataParser(EventConsumer):
             return []
         return keys[keys.index(ftq_ptr) :]
 
-    def _write(self):
-        self.out.write("Kanata\t0004\n")
-        self.timeline.sort(key=lambda command: command[:2])
-
-        current_cycle = self.timeline[0][0] if self.timeline else 0
-        self.out.write(f"C=\t{current_cycle}\n")
-        for cycle, _, line in self.timeline:
-            if cycle != current_cycle:
-                self.out.write(f"C\t{cycle - current_cycle}\n")
-                current_cycle = cycle
-            self.out.write(line + "\n")
-
 
 def main(argv: Optional[list[str]] = None):
     # Die silently when the output is piped to e.g. `head`.
@@ -268,16 +325,22 @@ def main(argv: Optional[list[str]] = None):
         signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
     parser = argparse.ArgumentParser(description="Convert a captured event log to the Kanata format.")
-    parser.add_argument("path", help="The event log file (JSON lines)")
+    parser.add_argument("path", help="The event log file (JSON lines or binary)")
     parser.add_argument("-o", "--output", help="Output file (default: standard output)")
+    parser.add_argument(
+        "-s",
+        "--streaming",
+        action="store_true",
+        help="Write the output incrementally, with memory usage bounded by the number of in-flight instructions",
+    )
     args = parser.parse_args(argv)
 
-    reader = EventLogReader(args.path)
+    reader = open_event_log(args.path)
     if args.output is not None:
         with open(args.output, "w") as out:
-            KonataParser(out).run(reader)
+            KonataParser(out, streaming=args.streaming).run(reader)
     else:
-        KonataParser(sys.stdout).run(reader)
+        KonataParser(sys.stdout, streaming=args.streaming).run(reader)
 
 
 if __name__ == "__main__":
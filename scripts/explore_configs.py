@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+import argparse
+import copy
+import csv
+import json
+import os
+import re
+import statistics
+import sys
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from importlib.machinery import SourceFileLoader
+from pathlib import Path
+from typing import Any, Optional
+
+import tabulate
+
+topdir = Path(__file__).parent.parent
+sys.path.insert(0, str(topdir))
+
+import parse_benchmark_info  # noqa: E402
+import run_benchmarks  # noqa: E402
+import synthesize  # noqa: E402
+from run_benchmarks import BenchmarkRun  # noqa: E402
+
+from coreblocks.params.core_configuration import CoreConfiguration  # noqa: E402
+from coreblocks.params import configurations  # noqa: E402
+from test.regression.common import START_PC  # noqa: E402
+
+
+FMAX_METRIC = "Max clock frequency (Fmax)"
+AREA_METRICS = {
+    "ecp5": "Device utilisation: (ECP5)",
+    "xc7a200t": "LUT used",
+    "xc7k480t": "LUT used",
+}
+
+
+@dataclass(eq=False)
+class DesignPoint:
+    """A core configuration under evaluation, together with the directory
+    caching its synthesis and benchmark results."""
+
+    name: str
+    config: CoreConfiguration
+    cache_dir: Path
+    ipc: Optional[float] = None
+    fmax: Optional[float] = None
+    luts: Optional[float] = None
+
+    @property
+    def mips(self) -> Optional[float]:
+        if self.ipc is None or self.fmax is None:
+            return None
+        return self.ipc * self.fmax
+
+    @property
+    def mips_per_lut(self) -> Optional[float]:
+        if self.mips is None or not self.luts:
+            return None
+        return self.mips / self.luts
+
+
+def synthesis_results_path(point: DesignPoint, platform: str) -> Path:
+    return point.cache_dir / f"synth-{platform}.json"
+
+
+def synthesize_point(config: CoreConfiguration, platform: str, cache_dir: Path) -> bool:
+    """Synthesizes the core in a private build directory and stores the
+    information parsed from the timing report, as `parse_benchmark_info.py`
+    does. Runs in a worker process."""
+    build_dir = cache_dir / f"build-{platform}"
+    # Synthesized as in the CI synthesis benchmarks.
+    config = config.replace(debug_signals=False, multiport_memory_type=synthesize.memory_types["xor-ilvt"])
+    try:
+        synthesize.synthesize(config, platform, synthesize.core_units["core"], build_dir=str(build_dir))
+    except Exception:
+        traceback.print_exc()
+        return False
+
+    # The information lists are module globals, which are updated in place.
+    information_to_search = copy.deepcopy(parse_benchmark_info.pick_information_to_search(platform))
+    with open(build_dir / "top.tim", "r") as synth_info_file:
+        for line in synth_info_file:
+            parse_benchmark_info.find_synthesis_information(line, information_to_search)
+
+    with open(cache_dir / f"synth-{platform}.json", "w") as synth_file:
+        json.dump(parse_benchmark_info.omit_regex_and_keyword(information_to_search), synth_file, indent=4)
+    return True
+
+
+def load_synthesis_results(point: DesignPoint, platform: str):
+    with open(synthesis_results_path(point, platform), "r") as synth_file:
+        information = {info["name"]: info["value"] for info in json.load(synth_file)}
+    point.fmax = information[FMAX_METRIC]
+    point.luts = information[AREA_METRICS[platform]]
+
+
+def benchmark_run(point: DesignPoint) -> BenchmarkRun:
+    # The benchmarks are linked at the start of RAM.
+    return BenchmarkRun(point.config.replace(start_pc=START_PC), point.cache_dir / "benchmarks")
+
+
+def has_benchmark_results(point: DesignPoint, benchmarks: list[str]) -> bool:
+    run = benchmark_run(point)
+    return all((run.results_dir / f"{name}.json").exists() for name in benchmarks)
+
+
+def load_benchmark_results(point: DesignPoint, benchmarks: list[str]):
+    results = run_benchmarks.load_results(benchmarks, benchmark_run(point))
+    point.ipc = statistics.geometric_mean(result.instr / result.cycles for result in results.values())
+
+
+def pareto_frontier(points: list[DesignPoint]) -> list[DesignPoint]:
+    """Returns the evaluated points not dominated by any other point, that is,
+    such that no other point has both higher performance and lower area.
+    The frontier is sorted by area."""
+    evaluated = sorted(
+        (point for point in points if point.mips is not None and point.luts is not None),
+        key=lambda point: (point.luts, -(point.mips or 0)),
+    )
+    frontier: list[DesignPoint] = []
+    for point in evaluated:
+        assert point.mips is not None
+        if not frontier or point.mips > (frontier[-1].mips or 0):
+            frontier.append(point)
+    return frontier
+
+
+def build_design_points(args: argparse.Namespace, cache_root: Path) -> list[DesignPoint]:
+    configfile = SourceFileLoader("configfile", args.configfile).load_module() if args.configfile else configurations
+
+    grid = run_benchmarks.parse_sweep(args.sweep)
+    points: list[DesignPoint] = []
+    for config_name in args.config or ["basic", "full"]:
+        if config_name not in dir(configfile):
+            raise KeyError(f"Unknown config '{config_name}'")
+
+        base_config = getattr(configfile, config_name)
+        assert isinstance(base_config, CoreConfiguration)
+
+        for run in run_benchmarks.build_sweep_runs(base_config, grid):
+            name = f"{config_name}[{run.name}]" if run.overrides else config_name
+            fingerprint = run.config.fingerprint()
+            points.append(DesignPoint(name, run.config, cache_root / fingerprint))
+    return points
+
+
+def write_results(filename: str, points: list[DesignPoint], frontier: list[DesignPoint]):
+    rows: list[dict[str, Any]] = [
+        {
+            "name": point.name,
+            "fingerprint": point.cache_dir.name,
+            "ipc": point.ipc,
+            "fmax": point.fmax,
+            "luts": point.luts,
+            "mips": point.mips,
+            "mips_per_lut": point.mips_per_lut,
+            "pareto": point in frontier,
+        }
+        for point in points
+    ]
+
+    if filename.endswith(".csv"):
+        with open(filename, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(filename, "w") as json_file:
+            json.dump(rows, json_file, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Synthesize and benchmark core configurations, and report the performance/area Pareto frontier. "
+        "Performance is the geometric mean of the benchmark IPC times Fmax (in MIPS), area is the number of LUTs. "
+        "Results are cached per configuration."
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        action="append",
+        help="Select core configuration. Can be given multiple times. "
+        + f"Available configurations: {', '.join(configurations.__all__)}. Default: basic, full",
+    )
+    parser.add_argument(
+        "-f",
+        "--configfile",
+        action="store",
+        default=None,
+        help="Select custom config file for core configuration. "
+        + "File should contain CoreConfiguration instances as global variables",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="append",
+        default=[],
+        metavar="PARAM=V1,V2,...",
+        help="Evaluate every selected configuration for every value of a configuration parameter. "
+        "See run_benchmarks.py",
+    )
+    parser.add_argument(
+        "-p",
+        "--platform",
+        default="ecp5",
+        choices=list(AREA_METRICS.keys()),
+        help="Selects platform to synthesize the configurations on. Default: %(default)s",
+    )
+    parser.add_argument("-b", "--backend", default="cocotb", choices=["cocotb", "pysim"], help="Simulation backend")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Run `j` synthesis and `j` benchmark jobs in parallel. Use 0 for one job per available CPU. "
+        "Default: %(default)s",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="build/explore",
+        help="Directory caching the results of each configuration. Default: %(default)s",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached results")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="explore.json",
+        help="Selects output file (JSON, or CSV if ending with .csv) to write the results to. Default: %(default)s",
+    )
+    parser.add_argument("benchmark_name", nargs="?", help="Regexp selecting the benchmarks to run")
+
+    args = parser.parse_args()
+
+    if args.jobs < 0:
+        parser.error("the number of jobs must be non-negative")
+    jobs = args.jobs or len(os.sched_getaffinity(0))
+
+    cache_root = Path(args.cache_dir).resolve()
+    try:
+        points = build_design_points(args, cache_root)
+    except (ValueError, KeyError, TypeError) as e:
+        parser.error(str(e))
+
+    benchmarks = run_benchmarks.load_benchmarks()
+    if args.benchmark_name:
+        pattern = re.compile(args.benchmark_name)
+        benchmarks = [name for name in benchmarks if pattern.search(name)]
+        if not benchmarks:
+            print(f"Could not find benchmark '{args.benchmark_name}'")
+            sys.exit(1)
+
+    os.environ.setdefault("__TRANSACTRON_LOG_LEVEL", "WARNING")
+    os.environ.setdefault("__TRANSACTRON_LOG_FILTER", ".*")
+
+    for point in points:
+        os.makedirs(point.cache_dir, exist_ok=True)
+
+    to_synthesize = [
+        point for point in points if args.no_cache or not synthesis_results_path(point, args.platform).exists()
+    ]
+    to_benchmark = [point for point in points if args.no_cache or not has_benchmark_results(point, benchmarks)]
+
+    success = True
+    # Synthesis runs in the background, while the benchmarks are simulated.
+    with ProcessPoolExecutor(jobs) as executor:
+        synth_futures: dict[Future[bool], DesignPoint] = {
+            executor.submit(synthesize_point, point.config, args.platform, point.cache_dir): point
+            for point in to_synthesize
+        }
+
+        if to_benchmark:
+            runs = [benchmark_run(point) for point in to_benchmark]
+            if not run_benchmarks.run_benchmarks(benchmarks, args.backend, False, runs, jobs):
+                print("Benchmark execution failed")
+                success = False
+
+        for future, point in synth_futures.items():
+            if not future.result():
+                print(f"Synthesis of {point.name} failed")
+                success = False
+
+    for point in points:
+        if synthesis_results_path(point, args.platform).exists():
+            load_synthesis_results(point, args.platform)
+        if has_benchmark_results(point, benchmarks):
+            load_benchmark_results(point, benchmarks)
+
+    frontier = pareto_frontier(points)
+
+    header = ["Configuration", "IPC", "Fmax [MHz]", "LUTs", "MIPS", "MIPS/kLUT", "Pareto"]
+    rows = [
+        [
+            point.name,
+            point.ipc,
+            point.fmax,
+            point.luts,
+            point.mips,
+            None if point.mips_per_lut is None else 1000 * point.mips_per_lut,
+            "*" if point in frontier else "",
+        ]
+        for point in sorted(points, key=lambda point: point.luts or 0)
+    ]
+    print(tabulate.tabulate(rows, headers=header, tablefmt="simple_outline"))
+
+    write_results(args.output, points, frontier)
+
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_benchmarks.cd_to_topdir()
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+topdir = Path(__file__).parent.parent
+sys.path.insert(0, str(topdir))
+
+
+from transactron.evlog import Event, EventFieldSchema, EventSiteSchema, EvLogSchema  # noqa: E402
+
+from coreblocks.telemetry.events import *  # noqa: E402
+from coreblocks.telemetry.binlog import open_event_log  # noqa: E402
+from coreblocks.telemetry.konata import KonataParser  # noqa: E402
+
+
+def synthetic_trace(cycles: int, width: int, depth: int, mispredict_period: int) -> Iterator[tuple[int, Event]]:
+    """Generates the events of a simple pipeline: every cycle, a fetch block of
+    `width` instructions is allocated, and its instructions retire `depth`
+    cycles later. Every `mispredict_period` blocks, the blocks still in the
+    fetch unit are squashed by a branch misprediction."""
+    ftq_size = 2 * depth
+    rob_size = 2 * depth * width
+    # Stage offsets, relative to the allocation of the fetch block.
+    fetched, decoded, renamed, dispatched = 2, 3, 4, 5
+    issued, completed, retired = depth - 3, depth - 2, depth
+    squashed: set[int] = set()
+
+    for cycle in range(cycles):
+        block = cycle
+        yield cycle, FTQAlloc(ftq_ptr=block % ftq_size, pc=4 * width * block)
+        yield cycle, FetchRequest(ftq_ptr=block % ftq_size, pc=4 * width * block)
+
+        # The oldest block in flight is committed once its instructions retire.
+        if cycle >= retired:
+            yield cycle, FTQCommit(ftq_ptr=(cycle - retired + 1) % ftq_size)
+
+        for stage, offset in [
+            ("fetched", fetched),
+            ("decoded", decoded),
+            ("renamed", renamed),
+            ("dispatched", dispatched),
+            ("issued", issued),
+            ("completed", completed),
+            ("retired", retired),
+        ]:
+            block = cycle - offset
+            if block < 0 or block in squashed:
+                continue
+            ftq_ptr = block % ftq_size
+            for i in range(width):
+                rob_id = (block * width + i) % rob_size
+                pc = 4 * (width * block + i)
+                match stage:
+                    case "fetched":
+                        yield cycle, InstrFetched(ftq_ptr=ftq_ptr, pc=pc, instr=0x00108093, ftq_offset=i)
+                    case "decoded":
+                        yield cycle, InstrDecoded(ftq_ptr=ftq_ptr, ftq_offset=i)
+                    case "renamed":
+                        yield cycle, SchedulerEnter(ftq_ptr=ftq_ptr, ftq_offset=i)
+                    case "dispatched":
+                        yield cycle, RobAllocate(ftq_ptr=ftq_ptr, ftq_offset=i, rob_id=rob_id, rp_dst=rob_id + 1)
+                    case "issued":
+                        yield cycle, FuIssue(rob_id=rob_id, unit="alu")
+                    case "completed":
+                        yield cycle, ExecComplete(rob_id=rob_id)
+                        yield cycle, OperandWakeup(rob_id=(rob_id + 1) % rob_size, reg_id=rob_id + 1)
+                    case "retired":
+                        yield cycle, RobRetire(rob_id=rob_id)
+
+        if cycle % mispredict_period == mispredict_period - 1 and cycle >= fetched:
+            squashed.update(range(cycle - fetched, cycle + 1))
+            yield cycle, FTQRollback(ftq_ptr=(cycle - fetched) % ftq_size, cause="ifu_writeback")
+
+        squashed.discard(cycle - retired)
+
+
+def write_synthetic_evlog(filename: str, cycles: int, width: int, depth: int, mispredict_period: int):
+    """Writes a synthetic trace as a JSON-lines event log. Sites are registered
+    as they are encountered, so the records are buffered in a temporary file
+    until the schema header is known."""
+    sites: dict[tuple, int] = {}
+    schema = EvLogSchema(sites=[])
+
+    with tempfile.TemporaryFile("w+") as body:
+        for cycle, ev in synthetic_trace(cycles, width, depth, mispredict_period):
+            statics = {name: getattr(ev, name) for name in ev._static_fields}
+            key = (ev.event_name, tuple(statics.items()))
+            if key not in sites:
+                sites[key] = len(schema.sites)
+                schema.sites.append(
+                    EventSiteSchema(
+                        source_name="synthetic",
+                        event_name=ev.event_name,
+                        location=(__file__, 0),
+                        fields=[EventFieldSchema(name=name, width=32) for name in ev._dynamic_fields],
+                        statics=statics,
+                    )
+                )
+            values = [getattr(ev, name) for name in ev._dynamic_fields]
+            body.write(json.dumps([cycle, sites[key], values]) + "\n")
+
+        body.seek(0)
+        with open(filename, "w") as fp:
+            fp.write(json.dumps(schema.to_dict()) + "\n")  # type: ignore
+            shutil.copyfileobj(body, fp)
+
+
+def measure(path: str, streaming: bool, trace_memory: bool) -> tuple[float, Optional[int]]:
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as out:
+        KonataParser(out, streaming=streaming).run(open_event_log(path))
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Kanata converter in buffered and streaming mode on a long event log."
+    )
+    parser.add_argument("path", nargs="?", help="Event log to convert (default: generate a synthetic one)")
+    parser.add_argument("-c", "--cycles", type=int, default=100000, help="Length of the synthetic trace in cycles")
+    parser.add_argument("-w", "--width", type=int, default=2, help="Instructions per synthetic fetch block")
+    parser.add_argument("-d", "--depth", type=int, default=16, help="Synthetic fetch-to-retire latency in cycles")
+    parser.add_argument(
+        "--mispredict-period", type=int, default=50, help="Synthetic fetch blocks per branch misprediction"
+    )
+    parser.add_argument(
+        "-m", "--mode", choices=["buffered", "streaming", "both"], default="both", help="Converter modes to measure"
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Don't trace the peak memory usage (which slows down the conversion)"
+    )
+    args = parser.parse_args()
+
+    modes = ["buffered", "streaming"] if args.mode == "both" else [args.mode]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = args.path
+        if path is None:
+            path = os.path.join(tmpdir, "synthetic.jsonl")
+            write_synthetic_evlog(path, args.cycles, args.width, args.depth, args.mispredict_period)
+        print(f"Event log: {path} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+
+        for mode in modes:
+            elapsed, peak = measure(path, mode == "streaming", not args.no_memory)
+            peak_str = "" if peak is None else f", peak memory {peak / 2**20:.1f} MiB"
+            print(f"{mode:>10}: {elapsed:.2f} s{peak_str}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,16 @@ import sys
 import os
 import subprocess
 import tabulate
-from typing import Literal
+import traceback
+import ast
+import csv
+import dataclasses
+import itertools
+import statistics
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from importlib.machinery import SourceFileLoader
+from typing import Any, Callable, Literal
 from pathlib import Path
 
 topdir = Path(__file__).parent.parent
@@ -17,8 +26,13 @@ sys.path.insert(0, str(topdir))
 
 import test.regression.benchmark  # noqa: E402
 from test.regression.benchmark import BenchmarkResult  # noqa: E402
+from coreblocks.telemetry.cpi_stack import CPIStack  # noqa: E402
+from coreblocks.params.core_configuration import CoreConfiguration  # noqa: E402
+from coreblocks.params import configurations  # noqa: E402
+from test.regression.common import START_PC  # noqa: E402
+from test.regression.memory import parse_timing_model  # noqa: E402
 from test.regression.pysim import PySimulation  # noqa: E402
-from test.regression.cocotb import run_cocotb_entrypoint  # noqa: E402
+from test.regression.cocotb import ensure_cocotb_built, run_cocotb_entrypoint  # noqa: E402
 
 
 def cd_to_topdir():
@@ -57,7 +71,22 @@ def load_benchmarks():
     return ret
 
 
-def run_benchmarks_with_cocotb(benchmarks: list[str], traces: bool) -> bool:
+@dataclass
+class BenchmarkRun:
+    """A core configuration to run the benchmarks on, together with the
+    directory its results are written to. `overrides` are the sweep
+    parameters which produced the configuration."""
+
+    config: CoreConfiguration
+    results_dir: Path
+    overrides: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return ", ".join(f"{name}={value!r}" for name, value in self.overrides.items())
+
+
+def run_benchmarks_with_cocotb(benchmarks: list[str], traces: bool, run: BenchmarkRun) -> bool:
     return run_cocotb_entrypoint(
         "benchmark_entrypoint",
         traces=traces,
@@ -65,10 +94,12 @@ def run_benchmarks_with_cocotb(benchmarks: list[str], traces: bool) -> bool:
             "--no-print-directory",
             f"TESTCASE={','.join(benchmarks)}",
         ],
+        additional_env={"_COREBLOCKS_BENCHMARK_RESULTS": str(run.results_dir)},
+        config=run.config,
     )
 
 
-def run_benchmarks_with_pysim(benchmarks: list[str], traces: bool) -> bool:
+def run_benchmarks_with_pysim(benchmarks: list[str], traces: bool, run: BenchmarkRun) -> bool:
     suite = unittest.TestSuite()
 
     def _gen_test(test_name: str):
@@ -76,7 +107,11 @@ def run_benchmarks_with_pysim(benchmarks: list[str], traces: bool) -> bool:
             traces_file = None
             if traces:
                 traces_file = "benchmark." + test_name
-            asyncio.run(test.regression.benchmark.run_benchmark(PySimulation(traces_file=traces_file), test_name))
+            asyncio.run(
+                test.regression.benchmark.run_benchmark(
+                    PySimulation(traces_file=traces_file, config=run.config), test_name, run.results_dir
+                )
+            )
 
         test_fn.__name__ = test_name
         test_fn.__qualname__ = test_name
@@ -92,12 +127,177 @@ def run_benchmarks_with_pysim(benchmarks: list[str], traces: bool) -> bool:
     return result.wasSuccessful()
 
 
-def run_benchmarks(benchmarks: list[str], backend: Literal["pysim", "cocotb"], traces: bool) -> bool:
-    if backend == "cocotb":
-        return run_benchmarks_with_cocotb(benchmarks, traces)
-    elif backend == "pysim":
-        return run_benchmarks_with_pysim(benchmarks, traces)
-    return False
+def run_single_benchmark_with_cocotb(benchmark: str, traces: bool, run: BenchmarkRun) -> bool:
+    try:
+        return run_cocotb_entrypoint(
+            "benchmark_entrypoint",
+            traces=traces,
+            additional_args=[
+                "--no-print-directory",
+                f"TESTCASE={benchmark}",
+            ],
+            additional_env={"_COREBLOCKS_BENCHMARK_RESULTS": str(run.results_dir)},
+            ensure_built=False,
+            config=run.config,
+        )
+    except subprocess.CalledProcessError:
+        traceback.print_exc()
+        return False
+
+
+def run_single_benchmark_with_pysim(benchmark: str, traces: bool, run: BenchmarkRun) -> bool:
+    traces_file = None
+    if traces:
+        traces_file = "benchmark." + benchmark
+    try:
+        asyncio.run(
+            test.regression.benchmark.run_benchmark(
+                PySimulation(traces_file=traces_file, config=run.config), benchmark, run.results_dir
+            )
+        )
+        return True
+    except Exception:
+        traceback.print_exc()
+        return False
+
+
+def run_benchmarks_in_parallel(
+    benchmarks: list[str],
+    runs: list[BenchmarkRun],
+    executor: Executor,
+    run_single: Callable[[str, bool, BenchmarkRun], bool],
+    traces: bool,
+) -> bool:
+    """Runs every benchmark on every configuration as a separate job. Each job
+    writes its `BenchmarkResult` to the results directory of its run, which
+    are collected after all of them finished."""
+    jobs = [(name, run) for run in runs for name in benchmarks]
+    failed: list[str] = []
+    with executor:
+        futures = {executor.submit(run_single, name, traces, run): (name, run) for name, run in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            name, run = futures[future]
+            if run.overrides:
+                name = f"{name} [{run.name}]"
+            ok = future.result()
+            if not ok:
+                failed.append(name)
+            print(f"[{done}/{len(jobs)}] {name} ... {'ok' if ok else 'FAIL'}", flush=True)
+
+    if failed:
+        print(f"Failed benchmarks: {', '.join(sorted(failed))}")
+    return not failed
+
+
+def run_benchmarks(
+    benchmarks: list[str],
+    backend: Literal["pysim", "cocotb"],
+    traces: bool,
+    runs: list[BenchmarkRun],
+    jobs: int = 1,
+) -> bool:
+    if jobs > 1:
+        if backend == "cocotb":
+            # The simulations run in separate processes started by `make`, so threads suffice.
+            executor = ThreadPoolExecutor(jobs)
+            # All simulations of a configuration share a single Verilator build, which has to be done up front.
+            for future in [executor.submit(ensure_cocotb_built, traces, run.config) for run in runs]:
+                future.result()
+            return run_benchmarks_in_parallel(benchmarks, runs, executor, run_single_benchmark_with_cocotb, traces)
+        elif backend == "pysim":
+            return run_benchmarks_in_parallel(
+                benchmarks, runs, ProcessPoolExecutor(jobs), run_single_benchmark_with_pysim, traces
+            )
+        return False
+
+    success = True
+    for run in runs:
+        if run.overrides:
+            print(f"Configuration: {run.name}", flush=True)
+        if backend == "cocotb":
+            success &= run_benchmarks_with_cocotb(benchmarks, traces, run)
+        elif backend == "pysim":
+            success &= run_benchmarks_with_pysim(benchmarks, traces, run)
+        else:
+            return False
+    return success
+
+
+def parse_sweep(specs: list[str]) -> dict[str, list[Any]]:
+    """Parses `PARAM=V1,V2,...` sweep specifications. Values are Python
+    literals; anything else is taken as a string."""
+    grid: dict[str, list[Any]] = {}
+    for spec in specs:
+        name, sep, values = spec.partition("=")
+        if not sep or not name or not values:
+            raise ValueError(f"Invalid sweep '{spec}', expected PARAM=V1,V2,...")
+
+        def parse_value(value: str) -> Any:
+            try:
+                return ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return value
+
+        grid[name.strip()] = [parse_value(value.strip()) for value in values.split(",")]
+    return grid
+
+
+def apply_overrides(config: CoreConfiguration, overrides: dict[str, Any]) -> CoreConfiguration:
+    """Applies sweep parameters to a configuration. Any `CoreConfiguration`
+    field can be overridden; `rs_entries` sets the size of every reservation
+    station."""
+    fields = {f.name for f in dataclasses.fields(CoreConfiguration)}
+    for name, value in overrides.items():
+        if name == "rs_entries":
+            config = config.replace(
+                func_units_config=[
+                    dataclasses.replace(conf, rs_entries=value) if hasattr(conf, "rs_entries") else conf
+                    for conf in config.func_units_config
+                ]
+            )
+        elif name in fields:
+            config = config.replace(**{name: value})
+        else:
+            raise KeyError(f"Unknown configuration parameter '{name}'")
+    return config
+
+
+def build_sweep_runs(config: CoreConfiguration, grid: dict[str, list[Any]]) -> list[BenchmarkRun]:
+    """Builds a run for every point of the sweep grid. The results of each
+    point are kept apart in a directory named after its configuration."""
+    runs = []
+    for values in itertools.product(*grid.values()):
+        overrides = dict(zip(grid.keys(), values))
+        point_config = apply_overrides(config, overrides)
+        results_dir = test.regression.benchmark.get_results_dir() / "sweep" / point_config.fingerprint()
+        runs.append(BenchmarkRun(point_config, results_dir, overrides))
+    return runs
+
+
+def load_results(benchmarks: list[str], run: BenchmarkRun) -> dict[str, BenchmarkResult]:
+    results: dict[str, BenchmarkResult] = {}
+    for name in benchmarks:
+        with open(f"{str(run.results_dir)}/{name}.json", "r") as f:
+            results[name] = BenchmarkResult.from_json(f.read())  # type: ignore
+    return results
+
+
+def write_sweep_csv(filename: str, benchmarks: list[str], runs: list[BenchmarkRun]):
+    """Writes a CSV with a row per configuration: the sweep parameters, the
+    configuration fingerprint, the IPC of every benchmark and their geometric mean."""
+    param_names = list(runs[0].overrides.keys())
+    with open(filename, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(param_names + ["fingerprint"] + benchmarks + ["geomean"])
+        for run in runs:
+            results = load_results(benchmarks, run)
+            ipcs = [results[name].instr / results[name].cycles for name in benchmarks]
+            writer.writerow(
+                [run.overrides[name] for name in param_names]
+                + [run.config.fingerprint()]
+                + ipcs
+                + [statistics.geometric_mean(ipcs)]
+            )
 
 
 def build_result_table(results: dict[str, BenchmarkResult], tablefmt: str) -> str:
@@ -133,6 +333,21 @@ def build_result_table(results: dict[str, BenchmarkResult], tablefmt: str) -> st
     return tabulate.tabulate(rows, headers="firstrow", tablefmt=tablefmt)
 
 
+def build_cpi_stack_table(cpi_stacks: dict[str, CPIStack], tablefmt: str) -> str:
+    if len(cpi_stacks) == 0:
+        return ""
+
+    categories = list(next(iter(cpi_stacks.values())).fractions().keys())
+    header = ["Testbench name", "CPI"] + categories
+
+    rows = [header]
+    for benchmark_name, cpi_stack in cpi_stacks.items():
+        fractions = cpi_stack.fractions()
+        rows.append([benchmark_name, cpi_stack.cpi] + [f"{100 * fractions[name]:.1f}%" for name in categories])
+
+    return tabulate.tabulate(rows, headers="firstrow", tablefmt=tablefmt)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-l", "--list", action="store_true", help="List all benchmarks")
@@ -141,7 +356,68 @@ def main():
     parser.add_argument("--log-filter", default=".*", action="store", help="Regexp used to filter out logs.")
     parser.add_argument("-p", "--profile", action="store_true", help="Write execution profiles")
     parser.add_argument("--evlog", action="store_true", help="Write captured event logs")
+    parser.add_argument(
+        "--evlog-format",
+        default="binary",
+        choices=["binary", "zstd", "jsonl"],
+        help="Format of the event logs: indexed binary, zstd-compressed indexed binary or JSON lines. "
+        "Default: %(default)s",
+    )
     parser.add_argument("-b", "--backend", default="cocotb", choices=["cocotb", "pysim"], help="Simulation backend")
+    parser.add_argument(
+        "-c",
+        "--config",
+        action="store",
+        default="full",
+        help="Select core configuration. "
+        + f"Available configurations: {', '.join(configurations.__all__)}. Default: %(default)s",
+    )
+    parser.add_argument(
+        "-f",
+        "--configfile",
+        action="store",
+        default=None,
+        help="Select custom config file for core configuration. "
+        + "File should contain CoreConfiguration instances as global variables",
+    )
+    parser.add_argument(
+        "--memory-timing",
+        default="",
+        metavar="MODEL",
+        help="Timing model of the simulated memory: `fixed:CYCLES`, or `dram` optionally followed by "
+        "`:param=value,...` setting t_cl, t_rcd, t_rp (in cycles), row_bytes and banks. Default: no added latency",
+    )
+    parser.add_argument(
+        "--memory-bandwidth",
+        type=float,
+        metavar="BYTES",
+        help="Limit the bandwidth of each memory bus to BYTES per cycle",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="append",
+        default=[],
+        metavar="PARAM=V1,V2,...",
+        help="Run the benchmarks for every value of a configuration parameter. Can be given multiple times "
+        "to sweep the product of the values. PARAM is a CoreConfiguration field or `rs_entries`",
+    )
+    parser.add_argument(
+        "--sweep-output",
+        default="sweep.csv",
+        help="CSV file to write the IPC of every sweep point to. Default: %(default)s",
+    )
+    parser.add_argument(
+        "--reuse-elaboration",
+        action="store_true",
+        help="With the pysim backend, elaborate the core once per process and reuse it for all benchmarks",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Run `j` benchmarks in parallel. Use 0 for one job per available CPU. Default: %(default)s",
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -153,6 +429,36 @@ def main():
 
     args = parser.parse_args()
 
+    if args.jobs < 0:
+        parser.error("the number of jobs must be non-negative")
+    jobs = args.jobs or len(os.sched_getaffinity(0))
+    if jobs > 1 and args.trace and args.backend == "cocotb":
+        # Verilator writes the waveforms to a fixed file in the working directory.
+        parser.error("waveforms can't be dumped with the cocotb backend when running benchmarks in parallel")
+
+    configfile = SourceFileLoader("configfile", args.configfile).load_module() if args.configfile else configurations
+
+    if args.config not in dir(configfile):
+        parser.error(f"unknown config '{args.config}'")
+
+    config = getattr(configfile, args.config)
+    assert isinstance(config, CoreConfiguration)
+    # The benchmarks are linked at the start of RAM.
+    config = config.replace(start_pc=START_PC)
+
+    try:
+        parse_timing_model(args.memory_timing, args.memory_bandwidth)
+    except (ValueError, TypeError) as e:
+        parser.error(str(e))
+
+    if args.sweep:
+        try:
+            runs = build_sweep_runs(config, parse_sweep(args.sweep))
+        except (ValueError, KeyError, TypeError) as e:
+            parser.error(str(e))
+    else:
+        runs = [BenchmarkRun(config, test.regression.benchmark.get_results_dir())]
+
     benchmarks = load_benchmarks()
 
     if args.list:
@@ -174,32 +480,52 @@ def main():
     if args.profile:
         os.environ["__TRANSACTRON_PROFILE"] = "1"
 
+    os.environ["_COREBLOCKS_MEMORY_TIMING"] = args.memory_timing
+    if args.memory_bandwidth is not None:
+        os.environ["_COREBLOCKS_MEMORY_BANDWIDTH"] = str(args.memory_bandwidth)
+
+    if args.reuse_elaboration:
+        os.environ["_COREBLOCKS_PYSIM_REUSE"] = "1"
+
     if args.evlog:
         os.environ["__TRANSACTRON_EVLOG"] = "1"
+        os.environ["_COREBLOCKS_EVLOG_FORMAT"] = args.evlog_format
 
-    success = run_benchmarks(benchmarks, args.backend, args.trace)
+    success = run_benchmarks(benchmarks, args.backend, args.trace, runs, jobs)
     if not success:
         print("Benchmark execution failed")
         sys.exit(1)
 
-    ipcs = []
+    if args.sweep:
+        write_sweep_csv(args.sweep_output, benchmarks, runs)
+        with open(args.sweep_output, "r") as csv_file:
+            rows = list(csv.reader(csv_file))
+        print(tabulate.tabulate(rows, headers="firstrow", tablefmt="simple_outline"))
+        return
 
-    results: dict[str, BenchmarkResult] = {}
+    ipcs = []
 
-    for name in benchmarks:
-        with open(f"{str(test.regression.benchmark.results_dir)}/{name}.json", "r") as f:
-            result = BenchmarkResult.from_json(f.read())  # type: ignore
+    results = load_results(benchmarks, runs[0])
+    cpi_stacks: dict[str, CPIStack] = {}
 
-        results[name] = result
+    for name, result in results.items():
+        cpi_stack_path = f"{str(runs[0].results_dir)}/{name}.cpi.json"
+        if args.evlog and os.path.exists(cpi_stack_path):
+            with open(cpi_stack_path, "r") as f:
+                cpi_stacks[name] = CPIStack.from_json(f.read())  # type: ignore
 
         ipc = result.instr / result.cycles
         ipcs.append({"name": name, "unit": "Instructions Per Cycle", "value": ipc})
 
     print(build_result_table(results, "simple_outline"))
+    if cpi_stacks:
+        print(build_cpi_stack_table(cpi_stacks, "simple_outline"))
 
     if args.summary != "":
         with open(args.summary, "w") as summary_file:
             print(build_result_table(results, "github"), file=summary_file)
+            if cpi_stacks:
+                print(build_cpi_stack_table(cpi_stacks, "github"), file=summary_file)
 
     with open(args.output, "w") as benchmark_file:
         json.dump(ipcs, benchmark_file, indent=4)
@@ -24,6 +24,11 @@ def main():
     parser.add_argument(
         "-b", "--backend", default="cocotb", choices=["cocotb", "pysim"], help="Simulation backend for regression tests"
     )
+    parser.add_argument(
+        "--reuse-elaboration",
+        action="store_true",
+        help="Elaborate the core once per worker and reuse it for pysim regression tests",
+    )
     parser.add_argument("-c", "--count", type=int, help="Start `c` first tests which match regexp")
     parser.add_argument(
         "-j", "--jobs", type=int, default=len(os.sched_getaffinity(0)), help="Start `j` jobs in parallel. Default: all"
@@ -40,6 +45,8 @@ def main():
         pytest_arguments.append("--coreblocks-traces")
     if args.profile:
         pytest_arguments.append("--coreblocks-profile")
+    if args.reuse_elaboration:
+        pytest_arguments.append("--coreblocks-reuse-elaboration")
     if args.test_name:
         pytest_arguments += [f"--coreblocks-test-name={args.test_name}"]
     if args.count:
@@ -29,6 +29,8 @@ from coreblocks.func_blocks.fu.mul_unit import MulComponent, MulType
 from coreblocks.func_blocks.fu.shift_unit import ShiftUnitComponent
 from coreblocks.func_blocks.fu.zbc import ZbcComponent
 from coreblocks.func_blocks.fu.zbs import ZbsComponent
+from coreblocks.func_blocks.fu.fpu.fpu_common import FPUParams
+from coreblocks.func_blocks.fu.fpu.fpu_fma import FPUFMAModule
 from transactron import TransactronContextElaboratable
 from transactron.lib import Adapter, AdapterTrans
 from transactron.utils.amaranth_ext.memory import MultiportXORMemory, MultiportXORILVTMemory, MultiportOneHotILVTMemory
@@ -132,6 +134,30 @@ def unit_fu(unit_params: FunctionalComponentParams):
     return unit
 
 
+def unit_fpu_fma(pipeline_depth: int):
+    def unit(gen_params: GenParams):
+        fma = FPUFMAModule(fpu_params=FPUParams(sig_width=24, exp_width=8), pipeline_depth=pipeline_depth)
+        request_adapter = AdapterTrans.create(fma.fma_request)
+        response_adapter = AdapterTrans.create(fma.fma_response)
+
+        request_connector, request_resources = InterfaceConnector.with_resources(request_adapter, "adapter", 0)
+        response_connector, response_resources = InterfaceConnector.with_resources(response_adapter, "adapter", 1)
+
+        resources = append_resources(request_resources, response_resources)
+
+        module = ModuleConnector(
+            fma=fma,
+            request_connector=request_connector,
+            response_connector=response_connector,
+            request_adapter=request_adapter,
+            response_adapter=response_adapter,
+        )
+
+        return resources, TransactronContextElaboratable(module, dependency_manager=DependencyContext.get())
+
+    return unit
+
+
 core_units = {
     "core": unit_core,
     "alu_basic": unit_fu(ALUComponent(zba_enable=False, zbb_enable=False, zicond_enable=False)),
@@ -145,6 +171,8 @@ core_units = {
     "shift_full": unit_fu(ShiftUnitComponent(zbb_enable=True)),
     "zbs": unit_fu(ZbsComponent()),
     "zbc": unit_fu(ZbcComponent()),
+    "fpu_fma": unit_fpu_fma(pipeline_depth=3),
+    "fpu_fma_deep": unit_fpu_fma(pipeline_depth=5),
 }
 
 
@@ -156,7 +184,7 @@ memory_types = {
 }
 
 
-def synthesize(core_config: CoreConfiguration, platform: str, core: UnitCore):
+def synthesize(core_config: CoreConfiguration, platform: str, core: UnitCore, build_dir: str = "build"):
     with DependencyContext(DependencyManager()):
         gen_params = GenParams(core_config)
         resource_builder, module = core(gen_params)
@@ -171,7 +199,7 @@ def synthesize(core_config: CoreConfiguration, platform: str, core: UnitCore):
         else:
             raise ValueError("Unknown platform")
 
-        plat(resource_builder)().build(module)
+        plat(resource_builder)().build(module, build_dir=build_dir)
 
 
 def main():
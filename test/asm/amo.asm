@@ -0,0 +1,17 @@
+# Data adress space:
+# 0x0 - 0x3 - AMO operand
+# The test is assembled without the A extension, so the AMOs are encoded manually.
+    li x1, 10
+    sw x1, 0(x0)
+    li x2, 5
+    .4byte 0x002021af # amoadd.w x3, x2, (x0)
+    li x5, 7
+    .4byte 0x0850222f # amoswap.w x4, x5, (x0)
+    li x7, 3
+    .4byte 0xe070232f # amomaxu.w x6, x7, (x0)
+    lw x8, 0(x0)
+infloop:
+    j infloop
+
+.section .bss
+.skip 0x4
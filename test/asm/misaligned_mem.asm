@@ -0,0 +1,14 @@
+# Data adress space:
+# 0x0 - 0xB - misaligned accesses
+    li x1, 0x44332211
+    sw x1, 1(x0)
+    lw x2, 1(x0)
+    lhu x3, 3(x0)
+    sh x1, 7(x0)
+    lh x4, 7(x0)
+    lbu x5, 4(x0)
+infloop:
+    j infloop
+
+.section .bss
+.skip 0xC
@@ -0,0 +1,38 @@
+# Data adress space:
+# 0x0 - 0x3 - counter incremented with LR/SC
+# 0x4 - 0x7 - counter incremented with AMOs
+# 0x8 - 0xb - number of harts which have finished
+# 0x10 + 4*hart - MHARTID of the hart
+# The test is assembled without the A extension, so the atomics are encoded manually.
+    csrr x1, mhartid
+    slli x7, x1, 2
+    sw x1, 0x10(x7)
+    li x4, 1
+    li x5, 4
+    li x6, 8
+    li x8, 3
+loop:
+    .4byte 0x1000212f # lr.w x2, (x0)
+    addi x2, x2, 1
+    .4byte 0x182021af # sc.w x3, x2, (x0)
+    bnez x3, loop
+    .4byte 0x0042a02f # amoadd.w x0, x4, (x5)
+    addi x8, x8, -1
+    bnez x8, loop
+    .4byte 0x0043202f # amoadd.w x0, x4, (x6)
+    bnez x1, infloop
+
+    # The first hart waits for the other one and checks the results
+    li x10, 2
+wait:
+    lw x9, 8(x0)
+    bne x9, x10, wait
+    lw x11, 0(x0)
+    lw x12, 4(x0)
+    lw x13, 0x14(x0)
+    csrw 0x8fe, 0x10
+infloop:
+    j infloop
+
+.section .bss
+.skip 0x20
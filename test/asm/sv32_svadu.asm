@@ -0,0 +1,102 @@
+.section .text
+
+_start:
+    # Configure PMP to allow S-mode access if present
+    li x1, 0x1F
+    csrw pmpcfg0, x1
+    li x1, -1
+    csrw pmpaddr0, x1
+
+    # Enable hardware A/D bits updates (menvcfgh.ADUE)
+    li x1, 1 << 29
+    csrs 0x31A, x1
+
+    li x9, 0
+    li x10, 0
+
+    # Set up level 1 page table: PPN = level_0_page_table, V=1
+    # index 0x142
+    li x3, 0x2000  # address of level_1_page_table
+    li x2, (3 << 10) | 0x1
+    sw x2, (0x142 * 4)(x3)
+
+    # Set up level 0 page table: PPN = data_page, V=1, R/W=1, A/D=0
+    # index 0x093
+    li x3, 0x3000  # address of level_0_page_table
+    li x2, (4 << 10) | 0x07
+    sw x2, (0x093 * 4)(x3)
+
+    # Map level 0 page table at index 0x094 with V=1, R=1, A=1, to check the updated PTEs
+    li x2, (3 << 10) | 0x43
+    sw x2, (0x094 * 4)(x3)
+
+    # Set up code page at 0x100 with V=1, X=1, A=0
+    li x2, (1 << 10) | 0x09
+    sw x2, (0x100 * 4)(x3)
+
+    # Set SATP to SV32 mode (mode=1) with root PPN = level_1_page_table
+    li x1, 2  # PPN of level_1_page_table
+    li x2, 1  # mode = 1 for SV32
+    slli x2, x2, 31
+    or x1, x1, x2
+    csrw satp, x1
+
+    # Enter S-mode via MRET
+    # virtual address of s_mode_main
+    li x1, (0x142 << 22) | (0x100 << 12) | 0x000
+    csrw mepc, x1
+    # set MPP to S (01) and MIE to 0
+    li x1, 0b11 << 11
+    csrc mstatus, x1
+    li x1, 0b01 << 11
+    csrs mstatus, x1
+    mret
+
+.org 0x1000
+s_mode_main:
+    # The code page was accessed
+    addi x9, x9, 1
+
+    li x1, (0x142 << 22) | (0x093 << 12) | 0x000
+    li x2, (0x142 << 22) | (0x094 << 12) | 0x000
+
+    # The load sets A
+    lw x3, 0(x1)
+    li x5, 0xDEADBEEF
+    bne x3, x5, fail
+    addi x9, x9, 1
+
+    lw x6, (0x093 * 4)(x2)
+    li x5, (4 << 10) | 0x47
+    bne x6, x5, fail
+    addi x9, x9, 1
+
+    # The store sets D
+    li x5, 0xCAFEBABE
+    sw x5, 0(x1)
+    lw x3, 0(x1)
+    bne x3, x5, fail
+    addi x9, x9, 1
+
+    lw x6, (0x093 * 4)(x2)
+    lw x7, (0x100 * 4)(x2)
+
+    j success
+
+success:
+    li x10, 1
+    csrw 0x8fe, 0x10
+    j success
+
+fail:
+    csrw 0x8fe, 0x12
+    j fail
+
+.section .data
+.org 0x2000
+.space 4096
+.org 0x3000
+.space 4096
+.org 0x4000
+.word 0xDEADBEEF
+.space 4096 - 4
@@ -0,0 +1,103 @@
+import random
+
+from coreblocks.backend.result_collector import ResultCollector
+from coreblocks.params import GenParams
+from coreblocks.params import configurations
+from transactron.testing import CallTrigger, SimpleTestCircuit, TestCaseWithSimulator, TestbenchContext
+from transactron.testing.method_mock import def_method_mock
+from transactron.testing.functions import data_const_to_dict
+
+
+class TestResultCollector(TestCaseWithSimulator):
+    ports = 3
+    lanes = 2
+
+    def setup_circuit(self):
+        self.gen_params = GenParams(configurations.test)
+        self.rob_entries = 2**self.gen_params.rob_entries_bits
+        self.rob_start = 0
+        self.m = SimpleTestCircuit(ResultCollector(gen_params=self.gen_params, ports=self.ports, lanes=self.lanes))
+
+    def age(self, rob_id: int) -> int:
+        return (rob_id - self.rob_start) % self.rob_entries
+
+    def make_result(self, rob_id: int):
+        return {
+            "rob_id": rob_id,
+            "result": random.randrange(2**self.gen_params.isa.xlen),
+            "rp_dst": random.randrange(2**self.gen_params.phys_regs_bits),
+            "exception": 0,
+        }
+
+    @def_method_mock(lambda self: self.m.rob_get_indices)
+    def process_rob_idx_mock(self):
+        return {"start": self.rob_start, "end": 0}
+
+    def test_age_order(self):
+        random.seed(42)
+        self.setup_circuit()
+
+        async def process(sim: TestbenchContext):
+            for _ in range(50):
+                self.rob_start = random.randrange(self.rob_entries)
+                rob_ids = random.sample(range(self.rob_entries), self.ports)
+                results = [self.make_result(rob_id) for rob_id in rob_ids]
+                expected = sorted(results, key=lambda res: self.age(res["rob_id"]))
+                await sim.tick()  # let the mock pick up the new start index
+
+                trigger = CallTrigger(sim)
+                for i in range(self.ports):
+                    trigger = trigger.call(self.m.push_result[i], results[i])
+                for k in range(self.lanes):
+                    trigger = trigger.call(self.m.get_result[k])
+                ret = await trigger
+                assert all(r is not None for r in ret)
+
+                # the oldest results are forwarded in the same cycle, the rest wait in buffers
+                for k in range(self.lanes):
+                    assert data_const_to_dict(ret[self.ports + k]) == expected[k]
+
+                for k in range(self.lanes, self.ports):
+                    assert data_const_to_dict(await self.m.get_result[0].call(sim)) == expected[k]
+
+        with self.run_simulation(self.m) as sim:
+            sim.add_testbench(process)
+
+    def test_random(self):
+        random.seed(14)
+        self.setup_circuit()
+        num_cases = 100
+        # every port produces results with unique rob ids, so the set of received results can be checked
+        rob_ids = random.sample(range(self.rob_entries), self.ports * 4)
+        expected = []
+        received = []
+
+        def producer(port: int):
+            async def process(sim: TestbenchContext):
+                for n in range(num_cases):
+                    result = self.make_result(rob_ids[(n * self.ports + port) % len(rob_ids)])
+                    expected.append(result)
+                    await self.m.push_result[port].call(sim, result)
+                    await self.random_wait_geom(sim, 0.5)
+
+            return process
+
+        def consumer(lane: int):
+            async def process(sim: TestbenchContext):
+                while True:
+                    received.append(data_const_to_dict(await self.m.get_result[lane].call(sim)))
+                    await self.random_wait_geom(sim, 0.7)
+
+            return process
+
+        async def checker(sim: TestbenchContext):
+            while len(received) < num_cases * self.ports:
+                await sim.tick()
+            assert sorted(map(str, expected)) == sorted(map(str, received))
+
+        with self.run_simulation(self.m) as sim:
+            for i in range(self.ports):
+                sim.add_testbench(producer(i))
+            for k in range(self.lanes):
+                sim.add_testbench(consumer(k), background=True)
+            sim.add_testbench(checker)
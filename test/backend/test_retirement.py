@@ -76,6 +76,17 @@ class RetirementTestCircuit(Elaboratable):
         m.submodules.mock_c_rat_restore = self.mock_c_rat_restore = TestbenchIO(
             Adapter.create(self.retirement.c_rat_restore)
         )
+        m.submodules.mock_rob_flush = self.mock_rob_flush = TestbenchIO(Adapter.create(self.retirement.rob_flush))
+        m.submodules.mock_instr_flush = self.mock_instr_flush = TestbenchIO(Adapter.create(self.retirement.instr_flush))
+        m.submodules.mock_free_rf_replace = self.mock_free_rf_replace = TestbenchIO(
+            Adapter.create(self.retirement.free_rf_replace)
+        )
+        m.submodules.mock_rf_free_mask = self.mock_rf_free_mask = TestbenchIO(
+            Adapter.create(self.retirement.rf_free_mask)
+        )
+        m.submodules.mock_checkpoint_tag_free_all = self.mock_checkpoint_tag_free_all = TestbenchIO(
+            Adapter.create(self.retirement.checkpoint_tag_free_all)
+        )
 
         m.submodules.free_rf_fifo_adapter = self.free_rf_adapter = TestbenchIO(AdapterTrans.create(self.free_rf.read))
 
@@ -0,0 +1,106 @@
+from collections import deque
+import random
+import pytest
+
+from amaranth import *
+from amaranth.lib.wiring import connect
+
+from transactron.testing import SimpleTestCircuit, TestCaseWithSimulator, TestbenchContext
+from transactron.utils import ModuleConnector
+
+from coreblocks.cache.l2cache import L2Cache
+from coreblocks.func_blocks.fu.lsu.pma import PMARegion
+from coreblocks.params import GenParams, configurations
+from coreblocks.peripherals.wishbone import WishboneMaster, WishboneMemorySlave
+
+
+class TestL2Cache(TestCaseWithSimulator):
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.gen_params = GenParams(
+            configurations.test.replace(
+                l2cache_enable=True,
+                l2cache_ways=2,
+                l2cache_sets_bits=2,
+                l2cache_line_bytes_log=4,
+                pma=[PMARegion(0x300, 0x3FF, True)],
+            )
+        )
+        self.cp = self.gen_params.l2cache_params
+        self.wb_params = self.gen_params.wb_params
+
+        self.memsize = 256
+        self.mmio_start = 0x300 // self.cp.word_width_bytes
+        self.iters = 300
+
+        random.seed(42)
+        self.mem_state = [random.randrange(2**self.wb_params.data_width) for _ in range(self.memsize)]
+
+        m = Module()
+        self.l2cache = L2Cache(self.gen_params, self.cp, num_masters=2)
+        self.mem_slave = WishboneMemorySlave(self.wb_params, depth=self.memsize, init=self.mem_state)
+        self.masters = [WishboneMaster(self.wb_params) for _ in range(2)]
+        self.tcs = [SimpleTestCircuit(master) for master in self.masters]
+
+        for master, l2cache_master in zip(self.masters, self.l2cache.masters):
+            connect(m, master.wb_master, l2cache_master)
+        connect(m, self.l2cache.mem_wb, self.mem_slave.bus)
+
+        self.m = ModuleConnector(
+            m, l2cache=self.l2cache, mem_slave=self.mem_slave, master0=self.tcs[0], master1=self.tcs[1]
+        )
+
+        self.sel_width = self.wb_params.data_width // self.wb_params.granularity
+
+    def random_addr(self, master: int):
+        # The masters use different lines, which map to the same sets.
+        line = random.randrange(self.memsize // self.cp.words_in_line // 2) * 2 + master
+        return line * self.cp.words_in_line + random.randrange(self.cp.words_in_line)
+
+    def test_randomized(self):
+        def make_processes(master: int):
+            req_queue = deque()
+
+            async def request_process(sim: TestbenchContext):
+                for _ in range(self.iters):
+                    req = {
+                        "addr": self.random_addr(master),
+                        "data": random.randrange(2**self.wb_params.data_width),
+                        "we": random.randint(0, 1),
+                        "sel": random.randrange(2**self.sel_width),
+                    }
+                    req_queue.appendleft(req)
+
+                    await self.random_wait_geom(sim, 0.5)
+                    await self.tcs[master].request.call(sim, req)
+
+            async def result_process(sim: TestbenchContext):
+                for _ in range(self.iters):
+                    await self.random_wait_geom(sim, 0.5)
+                    res = await self.tcs[master].result.call(sim)
+                    req = req_queue.pop()
+                    addr = req["addr"]
+
+                    assert not res["err"]
+                    if not req["we"]:
+                        assert res["data"] == self.mem_state[addr]
+                    else:
+                        for i in range(self.sel_width):
+                            if req["sel"] & (1 << i):
+                                granularity_mask = (2**self.wb_params.granularity - 1) << (
+                                    i * self.wb_params.granularity
+                                )
+                                self.mem_state[addr] &= ~granularity_mask
+                                self.mem_state[addr] |= req["data"] & granularity_mask
+
+                    # Memory which is not cacheable is accessed directly.
+                    if addr >= self.mmio_start:
+                        assert sim.get(Value.cast(self.mem_slave.mem.data[addr])) == self.mem_state[addr]
+
+            return request_process, result_process
+
+        with self.run_simulation(self.m, max_cycles=30000) as sim:
+            for master in range(2):
+                request_process, result_process = make_processes(master)
+                sim.add_testbench(request_process)
+                sim.add_testbench(result_process)
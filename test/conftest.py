@@ -17,6 +17,11 @@ def pytest_addoption(parser: pytest.Parser):
     group.addoption("--coreblocks-traces", action="store_true", help="Generate traces from regression tests")
     group.addoption("--coreblocks-profile", action="store_true", help="Write execution profiles")
     group.addoption("--coreblocks-evlog", action="store_true", help="Write captured event logs")
+    group.addoption(
+        "--coreblocks-reuse-elaboration",
+        action="store_true",
+        help="Elaborate the core once per configuration and reuse it in PySim regression tests.",
+    )
     group.addoption("--coreblocks-list", action="store_true", help="List all tests in flatten format.")
     group.addoption(
         "--coreblocks-test-name",
@@ -125,6 +130,9 @@ def pytest_runtest_setup(item: pytest.Item):
     if item.config.getoption("--coreblocks-evlog", False):  # type: ignore
         os.environ["__TRANSACTRON_EVLOG"] = "1"
 
+    if item.config.getoption("--coreblocks-reuse-elaboration", False):  # type: ignore
+        os.environ["_COREBLOCKS_PYSIM_REUSE"] = "1"
+
     log_filter = item.config.getoption("--coreblocks-log-filter")
     os.environ["__TRANSACTRON_LOG_FILTER"] = ".*" if not isinstance(log_filter, str) else log_filter
 
@@ -163,3 +163,37 @@ class TestFullDoneCase(TestCaseWithSimulator):
         with self.run_simulation(m) as sim:
             sim.add_testbench(self.gen_input)
             sim.add_testbench(self.do_retire)
+
+
+class TestFlush(TestCaseWithSimulator):
+    async def put(self, sim: TestbenchContext) -> int:
+        entries = [{"rob_data": {"rl_dst": 1, "rp_dst": 1}, "pure": 0}]
+        return (await self.m.put.call(sim, count=1, entries=entries)).entries[0].rob_id
+
+    async def process(self, sim: TestbenchContext):
+        for _ in range(3):
+            count = self.rand.randint(1, 2**self.gen_params.rob_entries_bits)
+            rob_ids = [await self.put(sim) for _ in range(count)]
+
+            # the flush waits until all instructions are done
+            self.rand.shuffle(rob_ids)
+            for rob_id in rob_ids:
+                assert await self.m.flush.call_try(sim) is None
+                await self.m.mark_done[0].call(sim, rob_id=rob_id)
+
+            assert (await self.m.flush.call(sim)).count == count
+            assert await self.m.retire.call_try(sim, count=1) is None
+            assert await self.m.flush.call_try(sim) is None
+
+            # the ROB can be used normally after the flush
+            rob_id = await self.put(sim)
+            await self.m.mark_done[0].call(sim, rob_id=rob_id)
+            await self.m.retire.call(sim, count=1)
+
+    def test_flush(self):
+        self.rand = Random(0)
+        self.gen_params = GenParams(configurations.test)
+        self.m = SimpleTestCircuit(ReorderBuffer(self.gen_params, mark_done_ports=1))
+
+        with self.run_simulation(self.m) as sim:
+            sim.add_testbench(self.process)
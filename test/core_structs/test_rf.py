@@ -72,8 +72,9 @@ class TestRegisterFile(TestCaseWithSimulator):
         return tb
 
     @pytest.mark.parametrize("read_ports, write_ports, free_ports", [(2, 1, 1), (4, 2, 2)])
-    def test_randomized(self, read_ports: int, write_ports: int, free_ports: int):
-        self.gen_params = GenParams(configurations.test.replace(phys_regs_bits=4))
+    @pytest.mark.parametrize("fast_trap_flush", [False, True])
+    def test_randomized(self, read_ports: int, write_ports: int, free_ports: int, fast_trap_flush: bool):
+        self.gen_params = GenParams(configurations.test.replace(phys_regs_bits=4, fast_trap_flush=fast_trap_flush))
         self.m = m = SimpleTestCircuit(
             RegisterFile(
                 gen_params=self.gen_params, read_ports=read_ports, write_ports=write_ports, free_ports=free_ports
@@ -98,3 +99,36 @@ class TestRegisterFile(TestCaseWithSimulator):
                 sim.add_testbench(self.tb_write(k))
             for k in range(free_ports):
                 sim.add_testbench(self.tb_free(k), background=True)
+
+    def test_free_mask(self):
+        self.gen_params = GenParams(configurations.test.replace(phys_regs_bits=4))
+        self.m = m = SimpleTestCircuit(
+            RegisterFile(gen_params=self.gen_params, read_ports=1, write_ports=1, free_ports=1)
+        )
+
+        random.seed(42)
+
+        async def tb(sim: TestbenchContext):
+            for _ in range(10):
+                reg_values = {reg_id: random.randrange(2**self.gen_params.isa.xlen) for reg_id in range(1, 16)}
+                for reg_id, reg_val in reg_values.items():
+                    await self.m.write[0].call(sim, reg_id=reg_id, reg_val=reg_val)
+
+                mask = random.randrange(2**self.gen_params.phys_regs)
+                await self.m.free_mask.call(sim, mask=mask)
+
+                for reg_id in range(self.gen_params.phys_regs):
+                    await self.m.read_req[0].call(sim, reg_id=reg_id)
+                    resp = await self.m.read_resp[0].call(sim, reg_id=reg_id)
+                    if reg_id == 0:
+                        assert resp.valid and resp.reg_val == 0
+                    elif mask & (1 << reg_id):
+                        assert not resp.valid
+                    else:
+                        assert resp.valid and resp.reg_val == reg_values[reg_id]
+
+                # leave all registers free for the next iteration
+                await self.m.free_mask.call(sim, mask=-1 % 2**self.gen_params.phys_regs)
+
+        with self.run_simulation(m) as sim:
+            sim.add_testbench(tb)
@@ -0,0 +1,157 @@
+from collections import deque
+from parameterized import parameterized_class
+from coreblocks.func_blocks.fu.fpu.fpu_fma import *
+from coreblocks.func_blocks.fu.fpu.fpu_common import FPUParams, RoundingModes
+from test.func_blocks.fu.fpu.fpu_test_common import (
+    FPUTester,
+    FenvRm,
+    fenv_rm_to_fpu_rm,
+    python_float_tester,
+    python_to_float,
+)
+from transactron.testing import *
+from amaranth import *
+import random
+import struct
+import ctypes
+
+libm = ctypes.CDLL("libm.so.6")
+libm.fmaf.argtypes = [ctypes.c_float, ctypes.c_float, ctypes.c_float]
+libm.fmaf.restype = ctypes.c_float
+
+# (op_1, op_2, op_3, negate_product, negate_addend, result, errors), round to nearest even
+edge_cases_fma = [
+    # (1 + 2^-23) * (1 - 2^-24) - 1 = 2^-24 - 2^-47, zero when the product is rounded first
+    ["3F800001", "3F7FFFFF", "3F800000", 0, 1, "337FFFFE", "00"],
+    # exact cancellation
+    ["40000000", "40400000", "40C00000", 0, 1, "00000000", "00"],
+    # inf * 0 + qNaN
+    ["7F800000", "00000000", "7FC00000", 0, 0, "7FC00000", "10"],
+    # inf * 1 - inf
+    ["7F800000", "3F800000", "7F800000", 0, 1, "7FC00000", "10"],
+    # -(2 * 3) - 1
+    ["40000000", "40400000", "3F800000", 1, 1, "C0E00000", "00"],
+    # overflow
+    ["7F000000", "7F000000", "3F800000", 0, 0, "7F800000", "05"],
+    # subnormal product and subnormal addend
+    ["00000003", "3F000000", "00000001", 0, 0, "00000002", "03"],
+    # tiny product does not change large addend
+    ["00000001", "00000001", "3F800000", 0, 0, "3F800000", "01"],
+]
+
+
+@parameterized_class(("pipeline_depth",), [(1,), (3,), (5,)])
+class TestFMA(TestCaseWithSimulator):
+    pipeline_depth: int
+
+    def test_fma(self):
+        params = FPUParams(sig_width=24, exp_width=8)
+        tester = FPUTester(params)
+        converter = tester.converter
+        m = SimpleTestCircuit(FPUFMAModule(fpu_params=params, pipeline_depth=self.pipeline_depth))
+
+        def to_hex(fl: float) -> str:
+            return hex(struct.unpack("<I", struct.pack("<f", fl))[0])
+
+        def random_float() -> float:
+            sign = random.randint(0, 1)
+            exp = random.choice([0, 1, random.randint(1, 254), random.randint(100, 154)])
+            sig = random.randint(0, 2**23 - 1)
+            return struct.unpack("<f", struct.pack("<I", (sign << 31) | (exp << 23) | sig))[0]
+
+        requests = deque()
+        responses = deque()
+
+        random.seed(42)
+        with python_float_tester():
+            for fenv_rm in FenvRm:
+                libm.fesetround(fenv_rm.value)
+                for i in range(50):
+                    op_1 = random_float()
+                    op_2 = random_float()
+                    # make cancellation likely in half of the cases
+                    op_3 = python_to_float(op_1 * op_2) if i % 2 else random_float()
+                    negate_product = random.randint(0, 1)
+                    negate_addend = random.randint(0, 1)
+                    result = libm.fmaf(-op_1 if negate_product else op_1, op_2, -op_3 if negate_addend else op_3)
+                    requests.append(
+                        {
+                            "op_1": converter.from_float(op_1),
+                            "op_2": converter.from_float(op_2),
+                            "op_3": converter.from_float(op_3),
+                            "rounding_mode": fenv_rm_to_fpu_rm(fenv_rm),
+                            "negate_product": negate_product,
+                            "negate_addend": negate_addend,
+                        }
+                    )
+                    responses.append((converter.from_hex(to_hex(result)), None))
+
+        for op_1, op_2, op_3, negate_product, negate_addend, result, errors in edge_cases_fma:
+            requests.append(
+                {
+                    "op_1": converter.from_hex(op_1),
+                    "op_2": converter.from_hex(op_2),
+                    "op_3": converter.from_hex(op_3),
+                    "rounding_mode": RoundingModes.ROUND_NEAREST_EVEN,
+                    "negate_product": negate_product,
+                    "negate_addend": negate_addend,
+                }
+            )
+            responses.append((converter.from_hex(result), int(errors, 16)))
+
+        async def producer(sim: TestbenchContext):
+            while requests:
+                await m.fma_request.call(sim, requests.popleft())
+                await self.random_wait_geom(sim, 0.8)
+
+        async def consumer(sim: TestbenchContext):
+            while responses:
+                resp = await m.fma_response.call(sim)
+                expected, errors = responses.popleft()
+                assert resp["sign"] == expected["sign"] or expected["is_nan"]
+                assert resp["exp"] == expected["exp"]
+                if expected["is_nan"]:
+                    assert resp["sig"] == tester.converter.cv.canonical_nan_sig
+                else:
+                    assert resp["sig"] == expected["sig"]
+                if errors is not None:
+                    assert resp["errors"] == errors
+                await self.random_wait_geom(sim, 0.8)
+
+        with self.run_simulation(m) as sim:
+            sim.add_testbench(producer)
+            sim.add_testbench(consumer)
+
+    def test_throughput(self):
+        params = FPUParams(sig_width=24, exp_width=8)
+        converter = FPUTester(params).converter
+        m = SimpleTestCircuit(FPUFMAModule(fpu_params=params, pipeline_depth=self.pipeline_depth))
+        count = 20
+
+        async def producer(sim: TestbenchContext):
+            for _ in range(count):
+                await m.fma_request.call(
+                    sim,
+                    op_1=converter.from_float(2.0),
+                    op_2=converter.from_float(3.0),
+                    op_3=converter.from_float(1.0),
+                    rounding_mode=RoundingModes.ROUND_NEAREST_EVEN,
+                )
+
+        async def consumer(sim: TestbenchContext):
+            cycles = 0
+            received = 0
+            while received < count:
+                resp = await m.fma_response.call_try(sim)
+                cycles += 1
+                if resp is not None:
+                    received += 1
+                    assert resp["exp"] == converter.from_float(7.0)["exp"]
+                    assert resp["sig"] == converter.from_float(7.0)["sig"]
+
+            # one result per cycle after the pipeline is filled
+            assert cycles == count + self.pipeline_depth
+
+        with self.run_simulation(m) as sim:
+            sim.add_testbench(producer)
+            sim.add_testbench(consumer)
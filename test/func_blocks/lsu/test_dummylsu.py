@@ -9,12 +9,14 @@ from transactron.testing.method_mock import MethodMock
 from transactron.testing import CallTrigger, TestbenchIO, TestCaseWithSimulator, def_method_mock, TestbenchContext
 from coreblocks.params import GenParams
 from coreblocks.func_blocks.fu.lsu.dummyLsu import LSUDummy
+from coreblocks.func_blocks.fu.lsu.pma import PMARegion
 from coreblocks.params import configurations
 from coreblocks.arch import *
 from coreblocks.interface.keys import ActiveTagsKey, CSRInstancesKey, ExceptionReportKey, SideFxGuardKey
 from coreblocks.priv.csr.csr_instances import CSRInstances
 from coreblocks.interface.layouts import ExceptionInformationRegisterLayouts, RATLayouts, RetirementLayouts
 from ...peripherals.bus_mock import BusMockParameters, MockMasterAdapter
+from .test_lsu_atomic_wrapper import amo_result
 
 
 def generate_aligned_addr(max_reg_val: int) -> int:
@@ -63,8 +65,17 @@ def check_align(addr: int, op: tuple[OpType, Funct3]) -> bool:
 
 
 class DummyLSUTestCircuit(Elaboratable):
-    def __init__(self, gen: GenParams):
+    def __init__(
+        self,
+        gen: GenParams,
+        store_buffer_entries: int = 0,
+        split_misaligned: bool = False,
+        max_outstanding: int = 2,
+    ):
         self.gen = gen
+        self.store_buffer_entries = store_buffer_entries
+        self.split_misaligned = split_misaligned
+        self.max_outstanding = max_outstanding
 
     def elaborate(self, platform):
         m = Module()
@@ -97,7 +108,9 @@ class DummyLSUTestCircuit(Elaboratable):
         )
         DependencyContext.get().add_dependency(ActiveTagsKey(), self.tags_active.adapter.iface)
 
-        m.submodules.func_unit = func_unit = LSUDummy(self.gen, self.bus_master_adapter)
+        m.submodules.func_unit = func_unit = LSUDummy(
+            self.gen, self.bus_master_adapter, self.store_buffer_entries, self.split_misaligned, self.max_outstanding
+        )
 
         m.submodules.issue_mock = self.issue = TestbenchIO(AdapterTrans.create(func_unit.issue))
         m.submodules.push_result_mock = self.push_result = TestbenchIO(Adapter.create(func_unit.push_result))
@@ -343,6 +356,70 @@ class TestDummyLSULoadsCycles(TestCaseWithSimulator):
             sim.add_testbench(self.one_instr_test)
 
 
+class TestDummyLSUOutstandingLoads(TestCaseWithSimulator):
+    outstanding = 4
+
+    def setup_method(self) -> None:
+        random.seed(14)
+        self.gen_params = GenParams(configurations.test.replace(phys_regs_bits=3, rob_entries_bits=3))
+        self.test_module = DummyLSUTestCircuit(self.gen_params, max_outstanding=self.outstanding)
+
+        self.instrs = [
+            {
+                "rp_dst": i,
+                "rob_id": i,
+                "exec_fn": {"op_type": OpType.LOAD, "funct3": Funct3.W, "funct7": 0},
+                "s1_val": 4 * i,
+                "s2_val": 0,
+                "imm": 0,
+                "pc": 0,
+            }
+            for i in range(self.outstanding)
+        ]
+        self.datas = [random.randint(0, 2**32 - 1) for _ in self.instrs]
+
+    async def inserter(self, sim: TestbenchContext):
+        for instr in self.instrs:
+            await self.test_module.issue.call(sim, instr)
+
+    async def bus_process(self, sim: TestbenchContext):
+        # All the loads are sent to the bus before any response arrives.
+        for instr in self.instrs:
+            req = await self.test_module.bus_master_adapter.request_read_mock.call(sim)
+            assert req.addr == instr["s1_val"] >> 2
+
+        for instr, data in zip(self.instrs, self.datas):
+            _, v = (
+                await CallTrigger(sim)
+                .call(self.test_module.bus_master_adapter.get_read_response_mock, data=data, err=0)
+                .call(self.test_module.push_result)
+            )
+            assert v is not None
+            assert v.rob_id == instr["rob_id"]
+            assert v.result == data
+
+    def test(self):
+        @def_method_mock(lambda: self.test_module.exception_report)
+        def exception_consumer(arg):
+            @MethodMock.effect
+            def eff():
+                assert False
+
+        @def_method_mock(
+            lambda: self.test_module.side_fx_guard, validate_arguments=lambda rob_id, tag, require_done: True
+        )
+        def side_fx_guarder(rob_id, tag, require_done):
+            return {}
+
+        @def_method_mock(lambda: self.test_module.tags_active)  # type: ignore
+        def tags_active_mock():
+            return {"active_tags": [1 for _ in range(self.test_module.tags_active.adapter.iface.layout_out.size)]}
+
+        with self.run_simulation(self.test_module) as sim:
+            sim.add_testbench(self.inserter)
+            sim.add_testbench(self.bus_process)
+
+
 class TestDummyLSUStores(TestCaseWithSimulator):
     def generate_instr(self, max_reg_val, max_imm_val):
         ops = {
@@ -515,3 +592,218 @@ class TestDummyLSUFence(TestCaseWithSimulator):
 
         with self.run_simulation(self.test_module) as sim:
             sim.add_testbench(self.process)
+
+
+class TestDummyLSUStoreBuffer(TestCaseWithSimulator):
+    store_buffer_entries = 2
+    split_misaligned = False
+    # Accessed memory window
+    mem_base = 0
+    mem_size = 16
+    pma: list[PMARegion] = []
+
+    def generate_instr(self):
+        ops = {
+            "LB": (OpType.LOAD, Funct3.B),
+            "LBU": (OpType.LOAD, Funct3.BU),
+            "LH": (OpType.LOAD, Funct3.H),
+            "LHU": (OpType.LOAD, Funct3.HU),
+            "LW": (OpType.LOAD, Funct3.W),
+            "SB": (OpType.STORE, Funct3.B),
+            "SH": (OpType.STORE, Funct3.H),
+            "SW": (OpType.STORE, Funct3.W),
+            "FENCE": (OpType.FENCE, Funct3.B),
+            "AMO": (OpType.ATOMIC_MEMORY_OP, Funct3.W),
+        }
+        sizes = {Funct3.B: 1, Funct3.BU: 1, Funct3.H: 2, Funct3.HU: 2, Funct3.W: 4}
+        amo_ops = [
+            Funct7.AMOSWAP,
+            Funct7.AMOADD,
+            Funct7.AMOXOR,
+            Funct7.AMOAND,
+            Funct7.AMOOR,
+            Funct7.AMOMIN,
+            Funct7.AMOMAX,
+            Funct7.AMOMINU,
+            Funct7.AMOMAXU,
+        ]
+
+        # Few words are accessed, so that stores are merged and forwarded.
+        model = bytearray(self.mem)
+        for i in range(self.tests_number):
+            op_type, funct3 = ops[random.choice(list(ops.keys()))]
+            size = sizes[funct3]
+            if self.split_misaligned:
+                offset = random.randrange(0, self.mem_size - size + 1)
+            else:
+                offset = random.randrange(0, self.mem_size, size)
+            addr = self.mem_base + offset
+            s2_val = random.randint(0, 2**32 - 1)
+            funct7 = random.choice(amo_ops) if op_type == OpType.ATOMIC_MEMORY_OP else 0
+
+            # Misaligned MMIO and atomic accesses raise an exception.
+            mmio = any(region.start <= addr + k <= region.end for k in range(size) for region in self.pma)
+            atomic = op_type == OpType.ATOMIC_MEMORY_OP
+            exception = op_type != OpType.FENCE and addr % size != 0 and (mmio or atomic)
+            if exception:
+                cause = (
+                    ExceptionCause.LOAD_ADDRESS_MISALIGNED
+                    if op_type == OpType.LOAD
+                    else ExceptionCause.STORE_ADDRESS_MISALIGNED
+                )
+                self.exceptions.append((cause, addr))
+            elif atomic and mmio:
+                # MMIO regions don't support atomic operations.
+                exception = True
+                self.exceptions.append((ExceptionCause.STORE_ACCESS_FAULT, addr))
+
+            result = 0
+            if exception:
+                pass
+            elif op_type == OpType.STORE:
+                model[offset : offset + size] = s2_val.to_bytes(4, "little")[:size]
+            elif op_type == OpType.LOAD:
+                result = int.from_bytes(model[offset : offset + size], "little")
+                if funct3 in {Funct3.B, Funct3.H}:
+                    result = int_to_signed(signed_to_int(result, size * 8), 32)
+            elif op_type == OpType.ATOMIC_MEMORY_OP:
+                result = int.from_bytes(model[offset : offset + size], "little")
+                model[offset : offset + size] = amo_result(funct7, result, s2_val, 32).to_bytes(4, "little")
+
+            instr = {
+                "rp_dst": 1,
+                "rob_id": i % 2**self.gen_params.rob_entries_bits,
+                "exec_fn": {"op_type": op_type, "funct3": funct3, "funct7": funct7},
+                "s1_val": addr,
+                "s2_val": s2_val,
+                "imm": 0,
+                "pc": 0,
+            }
+            self.instr_queue.appendleft(instr)
+            self.results.setdefault(instr["rob_id"], deque()).appendleft(
+                (exception, result if op_type in {OpType.LOAD, OpType.ATOMIC_MEMORY_OP} else None)
+            )
+        self.final_mem = model
+
+    def setup_method(self) -> None:
+        random.seed(14)
+        self.tests_number = 200
+        self.gen_params = GenParams(configurations.test.replace(phys_regs_bits=3, rob_entries_bits=3, pma=self.pma))
+        self.test_module = DummyLSUTestCircuit(self.gen_params, self.store_buffer_entries, self.split_misaligned)
+        self.mem = bytearray(random.randbytes(self.mem_size))
+        self.instr_queue = deque()
+        self.results: dict[int, deque] = {}
+        self.exceptions = []
+        self.reported_exceptions = []
+        # Responses of the bus are returned in the order of the requests.
+        self.bus_responses = deque()
+        self.generate_instr()
+        self.max_wait = 4
+
+    def bus_ready(self, kind: str) -> bool:
+        # Slow bus, so that the store buffer fills up.
+        return bool(self.bus_responses) and self.bus_responses[0][0] == kind and random.random() < 0.2
+
+    async def inserter(self, sim: TestbenchContext):
+        for i in range(self.tests_number):
+            req = self.instr_queue.pop()
+            while req["rob_id"] in self.in_flight:
+                await sim.tick()
+            self.in_flight.add(req["rob_id"])
+            await self.test_module.issue.call(sim, req)
+            await self.random_wait(sim, self.max_wait)
+
+    async def consumer(self, sim: TestbenchContext):
+        for i in range(self.tests_number):
+            v = await self.test_module.push_result.call(sim)
+            rob_id = v["rob_id"]
+            exception, result = self.results[rob_id].pop()
+            assert v["exception"] == exception
+            if result is not None and not exception:
+                assert v["result"] == result
+            self.in_flight.remove(rob_id)
+            await self.random_wait(sim, self.max_wait)
+
+        # All stores are eventually written to memory.
+        while self.bus_responses or self.mem != self.final_mem:
+            await sim.tick()
+
+        assert self.reported_exceptions == self.exceptions
+
+    def test(self):
+        self.in_flight = set()
+
+        @def_method_mock(lambda: self.test_module.exception_report)
+        def exception_consumer(arg):
+            @MethodMock.effect
+            def eff():
+                self.reported_exceptions.append((arg["cause"], arg["mtval"]))
+
+        @def_method_mock(
+            lambda: self.test_module.side_fx_guard, validate_arguments=lambda rob_id, tag, require_done: True
+        )
+        def side_fx_guarder(rob_id, tag, require_done):
+            return {}
+
+        @def_method_mock(lambda: self.test_module.tags_active)  # type: ignore
+        def tags_active_mock():
+            return {"active_tags": [1 for _ in range(self.test_module.tags_active.adapter.iface.layout_out.size)]}
+
+        @def_method_mock(lambda: self.test_module.bus_master_adapter.request_read_mock)
+        def request_read(addr, sel):
+            @MethodMock.effect
+            def eff():
+                offset = addr * 4 - self.mem_base
+                self.bus_responses.append(("read", int.from_bytes(self.mem[offset : offset + 4], "little")))
+
+        @def_method_mock(
+            lambda: self.test_module.bus_master_adapter.request_write_mock, enable=lambda: random.random() < 0.2
+        )
+        def request_write(addr, data, sel):
+            @MethodMock.effect
+            def eff():
+                for b in range(4):
+                    if sel & (1 << b):
+                        self.mem[addr * 4 - self.mem_base + b] = (data >> (8 * b)) & 0xFF
+                self.bus_responses.append(("write", 0))
+
+        @def_method_mock(
+            lambda: self.test_module.bus_master_adapter.get_read_response_mock,
+            enable=lambda: self.bus_ready("read"),
+        )
+        def read_response():
+            data = self.bus_responses[0][1] if self.bus_responses else 0
+
+            @MethodMock.effect
+            def eff():
+                self.bus_responses.popleft()
+
+            return {"data": data, "err": 0}
+
+        @def_method_mock(
+            lambda: self.test_module.bus_master_adapter.get_write_response_mock,
+            enable=lambda: self.bus_ready("write"),
+        )
+        def write_response():
+            @MethodMock.effect
+            def eff():
+                self.bus_responses.popleft()
+
+            return {"err": 0}
+
+        with self.run_simulation(self.test_module) as sim:
+            sim.add_testbench(self.inserter)
+            sim.add_testbench(self.consumer)
+
+
+class TestDummyLSUMisaligned(TestDummyLSUStoreBuffer):
+    store_buffer_entries = 0
+    split_misaligned = True
+    # Crosses a page boundary, the last two words are MMIO.
+    mem_base = 0xFF8
+    mem_size = 24
+    pma = [PMARegion(0x1008, 0x100F, True)]
+
+
+class TestDummyLSUMisalignedStoreBuffer(TestDummyLSUMisaligned):
+    store_buffer_entries = 2
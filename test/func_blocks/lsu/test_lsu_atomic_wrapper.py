@@ -5,17 +5,49 @@ from amaranth import *
 from amaranth.utils import ceil_log2
 from transactron import Method, TModule
 from transactron.lib import Adapter, AdapterTrans
+from transactron.utils import DependencyContext
 from transactron.testing import MethodMock, SimpleTestCircuit, TestCaseWithSimulator, TestbenchIO, def_method_mock
 
 from coreblocks.arch.isa_consts import Funct3, Funct7
 from coreblocks.arch.optypes import OpType
 from coreblocks.func_blocks.fu.lsu.lsu_atomic_wrapper import LSUAtomicWrapper
 from coreblocks.func_blocks.interface.func_protocols import FuncUnit
-from coreblocks.interface.layouts import FuncUnitLayouts
+from coreblocks.interface.keys import StoreSnoopKey
+from coreblocks.interface.layouts import FuncUnitLayouts, LSULayouts
 from coreblocks.params import configurations
 from coreblocks.params.genparams import GenParams
 
 
+def amo_result(funct7: Funct7, mem: int, val: int, xlen: int) -> int:
+    def twos(x):
+        if x & (1 << (xlen - 1)):
+            x ^= (1 << xlen) - 1
+            x += 1
+            x *= -1
+        return x
+
+    match funct7:
+        case Funct7.AMOSWAP:
+            return val
+        case Funct7.AMOADD:
+            return (mem + val) % 2**xlen
+        case Funct7.AMOAND:
+            return mem & val
+        case Funct7.AMOOR:
+            return mem | val
+        case Funct7.AMOXOR:
+            return mem ^ val
+        case Funct7.AMOMIN:
+            return mem if twos(mem) < twos(val) else val
+        case Funct7.AMOMAX:
+            return mem if twos(mem) > twos(val) else val
+        case Funct7.AMOMINU:
+            return min(mem, val)
+        case Funct7.AMOMAXU:
+            return max(mem, val)
+    assert False
+
+
 class FuncUnitMock(FuncUnit, Elaboratable):
     def __init__(self, gen_params: GenParams):
         layouts = gen_params.get(FuncUnitLayouts)
@@ -69,6 +101,15 @@ class TestLSUAtomicWrapper(TestCaseWithSimulator):
                         self.mem_cell = arg["s2_val"]
                     case OpType.LOAD:
                         res = self.mem_cell
+                    case OpType.ATOMIC_MEMORY_OP if arg["exec_fn"]["funct7"] == Funct7.SC:
+                        # SC with a valid reservation is executed by the LSU as a store.
+                        self.mem_cell = arg["s2_val"]
+                    case OpType.ATOMIC_MEMORY_OP:
+                        # AMOs are executed by the LSU in one pass.
+                        res = self.mem_cell
+                        self.mem_cell = amo_result(
+                            arg["exec_fn"]["funct7"], self.mem_cell, arg["s2_val"], self.gen_params.isa.xlen
+                        )
                     case _:
                         assert False
 
@@ -89,14 +130,19 @@ class TestLSUAtomicWrapper(TestCaseWithSimulator):
         return res
 
     def generate_instrs(self, cnt):
+        def reservation_set(addr: int) -> int:
+            return (addr % 2**12) >> self.gen_params.reservation_set_bytes_log
+
         generation_mem_cell = 0
         generation_reservation_valid = 0
+        generation_reservation_set = 0
         for i in range(cnt):
             optype = random.choice([OpType.LOAD, OpType.STORE, OpType.ATOMIC_MEMORY_OP, OpType.ATOMIC_LR_SC])
             funct7 = 0
 
             imm = random.randint(0, 1)
-            s1_val = random.randrange(0, 2**self.gen_params.isa.xlen - 1)
+            # Reservation sets are compared by the page offset, so 0x1000 and 0x2000 are in the same set
+            s1_val = random.choice([0x1000, 0x1004, 0x1040, 0x2000])
             s2_val = random.randrange(0, 2**self.gen_params.isa.xlen)
             rp_dst = random.randrange(0, 2**self.gen_params.phys_regs_bits)
 
@@ -119,46 +165,11 @@ class TestLSUAtomicWrapper(TestCaseWithSimulator):
                 )
 
                 exception = random.random() < 0.3
-                exception_on_load = exception and random.random() < 0.5
-                self.lsu_except_q.append({"addr": s1_val, "exception": exception_on_load})
+                self.lsu_except_q.append({"addr": s1_val, "exception": exception})
 
                 if not exception:
                     result = generation_mem_cell
-
-                    def twos(x):
-                        if x & (1 << (self.gen_params.isa.xlen - 1)):
-                            x ^= (1 << self.gen_params.isa.xlen) - 1
-                            x += 1
-                            x *= -1
-                        return x
-
-                    match funct7:
-                        case Funct7.AMOSWAP:
-                            generation_mem_cell = s2_val
-                        case Funct7.AMOADD:
-                            generation_mem_cell += s2_val
-                            generation_mem_cell %= 2**self.gen_params.isa.xlen
-                        case Funct7.AMOAND:
-                            generation_mem_cell &= s2_val
-                        case Funct7.AMOOR:
-                            generation_mem_cell |= s2_val
-                        case Funct7.AMOXOR:
-                            generation_mem_cell ^= s2_val
-                        case Funct7.AMOMIN:
-                            generation_mem_cell = (
-                                generation_mem_cell if twos(generation_mem_cell) < twos(s2_val) else s2_val
-                            )
-                        case Funct7.AMOMAX:
-                            generation_mem_cell = (
-                                generation_mem_cell if twos(generation_mem_cell) > twos(s2_val) else s2_val
-                            )
-                        case Funct7.AMOMINU:
-                            generation_mem_cell = min(generation_mem_cell, s2_val)
-                        case Funct7.AMOMAXU:
-                            generation_mem_cell = max(generation_mem_cell, s2_val)
-
-                if not exception_on_load:
-                    self.lsu_except_q.append({"addr": s1_val, "exception": exception})
+                    generation_mem_cell = amo_result(funct7, generation_mem_cell, s2_val, self.gen_params.isa.xlen)
             elif optype == OpType.ATOMIC_LR_SC:
                 is_load = random.random() < 0.5
                 exception = random.random() < 0.3
@@ -166,9 +177,12 @@ class TestLSUAtomicWrapper(TestCaseWithSimulator):
                 if is_load:
                     funct7 = Funct7.LR
                     generation_reservation_valid = not exception
+                    generation_reservation_set = reservation_set(s1_val)
                     result = generation_mem_cell if not exception else 0
                 else:
                     funct7 = Funct7.SC
+                    if generation_reservation_set != reservation_set(s1_val):
+                        generation_reservation_valid = 0
                     if generation_reservation_valid:
                         if not exception:
                             generation_mem_cell = s2_val
@@ -224,3 +238,64 @@ class TestLSUAtomicWrapper(TestCaseWithSimulator):
         with self.run_simulation(self.dut, max_cycles=700) as sim:
             sim.add_testbench(self.issue_process)
             sim.add_testbench(self.accept_process)
+
+
+class TestLSUAtomicWrapperSnoop(TestCaseWithSimulator):
+    @pytest.fixture(autouse=True)
+    def setup(self, fixture_initialize_testing_env):
+        self.gen_params = GenParams(configurations.test)
+        self.snoop = Signal(self.gen_params.get(LSULayouts).store_snoop)
+        DependencyContext.get().add_dependency(StoreSnoopKey(), self.snoop)
+        self.lsu = FuncUnitMock(self.gen_params)
+        self.dut = SimpleTestCircuit(LSUAtomicWrapper(self.gen_params, self.lsu))
+
+        self.issued = []
+        self.lsu_res_q = deque()
+
+    @def_method_mock(lambda self: self.lsu.issue_tb)
+    def lsu_issue_mock(self, arg):
+        @MethodMock.effect
+        def _():
+            self.issued.append(arg["exec_fn"]["op_type"])
+            self.lsu_res_q.append({"rob_id": arg["rob_id"], "result": 0, "rp_dst": 1, "exception": 0})
+
+    @def_method_mock(lambda self: self.lsu.push_result_tb, enable=lambda self: len(self.lsu_res_q) > 0)
+    def lsu_accept_mock(self, arg):
+        res = self.lsu_res_q[0]
+
+        @MethodMock.effect
+        def _():
+            self.lsu_res_q.popleft()
+
+        return res
+
+    async def lr_sc(self, sim, rob_id: int, funct7: Funct7, addr: int) -> int:
+        exec_fn = {"op_type": OpType.ATOMIC_LR_SC, "funct3": Funct3.W, "funct7": funct7}
+        instr = {"rp_dst": 1, "rob_id": rob_id, "exec_fn": exec_fn, "s1_val": addr, "s2_val": 0, "imm": 0, "pc": 0}
+        await self.dut.issue.call(sim, instr)
+        res = await self.dut.push_result.call(sim)
+        assert res["rob_id"] == rob_id
+        return res["result"]
+
+    async def snoop_store(self, sim, paddr: int):
+        sim.set(self.snoop.valid, 1)
+        sim.set(self.snoop.paddr, paddr)
+        await sim.tick()
+        sim.set(self.snoop.valid, 0)
+
+    async def process(self, sim):
+        # A store to the reservation set invalidates the reservation
+        await self.lr_sc(sim, 0, Funct7.LR, 0x1000)
+        await self.snoop_store(sim, 0x3008)
+        assert await self.lr_sc(sim, 1, Funct7.SC, 0x1000) == 1
+        assert self.issued == [OpType.LOAD]
+
+        # Stores to other reservation sets don't
+        await self.lr_sc(sim, 2, Funct7.LR, 0x1000)
+        await self.snoop_store(sim, 0x1040)
+        assert await self.lr_sc(sim, 3, Funct7.SC, 0x1004) == 0
+        assert self.issued == [OpType.LOAD, OpType.LOAD, OpType.ATOMIC_MEMORY_OP]
+
+    def test_snoop(self):
+        with self.run_simulation(self.dut) as sim:
+            sim.add_testbench(self.process)
@@ -1,5 +1,6 @@
 from coreblocks.func_blocks.fu.lsu.pma import PMAChecker, PMARegion
 
+import pytest
 from amaranth import *
 from transactron.lib import Adapter, AdapterTrans
 from coreblocks.params import GenParams
@@ -19,12 +20,14 @@ class TestPMADirect(TestCaseWithSimulator):
     async def verify_region(self, sim: TestbenchContext, region: PMARegion):
         for i in range(region.start, region.end + 1):
             sim.set(self.test_module.paddr, i)
-            mmio = sim.get(self.test_module.result.mmio)
-            assert mmio == region.mmio
+            for name, value in region.attributes().items():
+                assert sim.get(getattr(self.test_module.result, name)) == value
 
     async def process(self, sim: TestbenchContext):
         for r in self.pma_regions:
             await self.verify_region(sim, r)
+        # Memory outside of the regions
+        await self.verify_region(sim, PMARegion(0x131, 0x1FF))
 
     def test_pma_direct(self):
         self.pma_regions = [
@@ -32,7 +35,8 @@ class TestPMADirect(TestCaseWithSimulator):
             PMARegion(0x10, 0xFF, True),
             PMARegion(0x100, 0x10F, False),
             PMARegion(0x110, 0x120, True),
-            PMARegion(0x121, 0x130, False),
+            PMARegion(0x121, 0x12A, True, idempotent=True, write_combining=True),
+            PMARegion(0x12B, 0x130, False, cacheable=False, atomic=False),
         ]
 
         self.gen_params = GenParams(configurations.test.replace(pma=self.pma_regions))
@@ -41,6 +45,26 @@ class TestPMADirect(TestCaseWithSimulator):
         with self.run_simulation(self.test_module) as sim:
             sim.add_testbench(self.process)
 
+    def test_decode_ranges(self):
+        self.gen_params = GenParams(
+            configurations.test.replace(
+                pma=[
+                    PMARegion(0x20, 0x2F, True),
+                    PMARegion(0x0, 0xF, False),
+                    PMARegion(0x10, 0x1F, True),
+                ]
+            )
+        )
+        # Adjacent regions with the same attributes are merged, default regions are omitted.
+        ranges = PMAChecker(self.gen_params).decode_ranges()
+        assert [(start, end) for start, end, _ in ranges] == [(0x10, 0x2F)]
+
+        self.gen_params = GenParams(
+            configurations.test.replace(pma=[PMARegion(0x0, 0xF, True), PMARegion(0x8, 0x1F, False)])
+        )
+        with pytest.raises(ValueError):
+            PMAChecker(self.gen_params).decode_ranges()
+
 
 class PMAIndirectTestCircuit(Elaboratable):
     def __init__(self, gen: GenParams):
@@ -101,12 +125,14 @@ class TestPMAIndirect(TestCaseWithSimulator):
             self.side_fx_guard_enabled = False
             instr = self.get_instr(addr)
             await self.test_module.issue.call(sim, instr)
-            if region.mmio is True:
+            # Loads from memory which isn't idempotent aren't speculative.
+            if not region.idempotent:
                 for i in range(10):  # 10 cycles is more than enough
                     ret = await self.test_module.bus_master_adapter.request_read_mock.call_try(sim)
                     assert ret is None
-            self.side_fx_guard_enabled = True
+                self.side_fx_guard_enabled = True
             await self.test_module.bus_master_adapter.request_read_mock.call(sim)
+            self.side_fx_guard_enabled = True
             _, v = (
                 await CallTrigger(sim)
                 .call(self.test_module.bus_master_adapter.get_read_response_mock, data=addr << (addr % 4) * 8, err=0)
@@ -124,6 +150,7 @@ class TestPMAIndirect(TestCaseWithSimulator):
             PMARegion(0x0, 0xF, True),
             PMARegion(0x10, 0x1F, False),
             PMARegion(0x20, 0x2F, True),
+            PMARegion(0x30, 0x3F, True, idempotent=True),
         ]
         self.gen_params = GenParams(configurations.test.replace(pma=self.pma_regions))
         self.test_module = PMAIndirectTestCircuit(self.gen_params)
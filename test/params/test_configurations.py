@@ -1,7 +1,9 @@
+import pickle
 from dataclasses import dataclass
 from unittest import TestCase
 
 from coreblocks.arch.isa import gen_isa_string
+from coreblocks.arch.isa_consts import SatpMode
 from coreblocks.params.core_configuration import CoreConfiguration
 from coreblocks.params import configurations
 from coreblocks.params.fu_params import extensions_supported
@@ -59,3 +61,19 @@ class TestConfigurationsISAString(TestCase):
 
             assert partial == test.partial_str
             assert full == test.full_str
+
+
+class TestConfigurationFingerprint(TestCase):
+    def test_equal_configurations(self):
+        # Configurations built separately hold distinct decoder objects, but have equal contents.
+        assert CoreConfiguration().fingerprint() == CoreConfiguration().fingerprint()
+        assert configurations.full.replace().fingerprint() == configurations.full.fingerprint()
+        assert pickle.loads(pickle.dumps(configurations.full)).fingerprint() == configurations.full.fingerprint()
+
+    def test_different_configurations(self):
+        fingerprints = {getattr(configurations, name).fingerprint() for name in configurations.__all__}
+        assert len(fingerprints) == len(configurations.__all__)
+
+        base = configurations.basic
+        assert base.replace(rob_entries_bits=base.rob_entries_bits + 1).fingerprint() != base.fingerprint()
+        assert base.replace(supported_vm_schemes=(SatpMode.BARE,)).fingerprint() != base.fingerprint()
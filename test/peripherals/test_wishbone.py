@@ -237,6 +237,39 @@ class TestWishboneArbiter(TestCaseWithSimulator):
         with self.run_simulation(arb) as sim:
             sim.add_testbench(process)
 
+    def test_lock(self):
+        arb = WishboneArbiter(WishboneParameters(), 2)
+        slave = WishboneInterfaceWrapper(arb.slave_wb)
+        masters = [WishboneInterfaceWrapper(master) for master in arb.masters]
+
+        async def process(sim: TestbenchContext):
+            sim.set(masters[0].wb.lock, 1)
+            masters[0].master_set(sim, 1, 0, 0)
+            await slave.slave_wait_and_verify(sim, 1, 0, 0)
+            masters[1].master_set(sim, 2, 5, 1)
+            await slave.slave_respond_master_verify(sim, masters[0].wb, 7)
+            masters[0].master_release(sim)
+            await sim.tick()
+
+            # check if locked bus isn't granted to the other master between the cycles
+            for _ in range(3):
+                assert not sim.get(slave.wb.cyc)
+                await sim.tick()
+            masters[0].master_set(sim, 1, 8, 1)
+            await slave.slave_wait_and_verify(sim, 1, 8, 1)
+            await slave.slave_respond_master_verify(sim, masters[0].wb, 0)
+            assert not sim.get(masters[1].wb.ack)
+            masters[0].master_release(sim)
+            sim.set(masters[0].wb.lock, 0)
+            await sim.tick()
+
+            # check if bus is granted to the other master after unlocking
+            await slave.slave_wait_and_verify(sim, 2, 5, 1)
+            await slave.slave_respond_master_verify(sim, masters[1].wb, 0)
+
+        with self.run_simulation(arb) as sim:
+            sim.add_testbench(process)
+
 
 class TestPipelinedWishboneMaster(TestCaseWithSimulator):
     def test_randomized(self):
@@ -302,17 +335,29 @@ class TestPipelinedWishboneMaster(TestCaseWithSimulator):
 
 
 class TestWishboneMemorySlave(TestCaseWithSimulator):
+    pipelined = False
+    registered = False
+
     def setup_method(self):
         self.memsize = 43  # test some weird depth
         self.iters = 300
 
         self.addr_width = (self.memsize - 1).bit_length()  # nearest log2 >= log2(memsize)
         self.wb_params = WishboneParameters(data_width=32, addr_width=self.addr_width, granularity=16)
-        self.mem_slave = WishboneMemorySlave(self.wb_params, depth=self.memsize, init=[])
-        self.mem_master = WishboneMaster(self.wb_params)
-        self.tc = SimpleTestCircuit(self.mem_master)
+        self.mem_slave = WishboneMemorySlave(self.wb_params, pipelined=self.pipelined, depth=self.memsize, init=[])
         m = Module()
-        connect(m, self.mem_master.wb_master, self.mem_slave.bus)
+        if self.pipelined:
+            self.mem_master = PipelinedWishboneMaster(self.wb_params, max_req=4)
+            if self.registered:
+                m.submodules.register = register = WishbonePipelineRegister(self.wb_params)
+                connect(m, self.mem_master.wb, register.master_wb)
+                connect(m, register.slave_wb, self.mem_slave.bus)
+            else:
+                connect(m, self.mem_master.wb, self.mem_slave.bus)
+        else:
+            self.mem_master = WishboneMaster(self.wb_params)
+            connect(m, self.mem_master.wb_master, self.mem_slave.bus)
+        self.tc = SimpleTestCircuit(self.mem_master)
         self.m = ModuleConnector(m, mem_slave=self.mem_slave, mem_master=self.tc)
 
         self.sel_width = self.wb_params.data_width // self.wb_params.granularity
@@ -351,9 +396,90 @@ class TestWishboneMemorySlave(TestCaseWithSimulator):
                             granularity_mask = (2**self.wb_params.granularity - 1) << (i * self.wb_params.granularity)
                             mem_state[req["addr"]] &= ~granularity_mask
                             mem_state[req["addr"]] |= req["data"] & granularity_mask
-                    val = sim.get(Value.cast(self.mem_slave.mem.data[req["addr"]]))
-                    assert val == mem_state[req["addr"]]
+                    # Pipelined requests can be already executed, so the writes are checked only by the reads.
+                    if not self.pipelined:
+                        val = sim.get(Value.cast(self.mem_slave.mem.data[req["addr"]]))
+                        assert val == mem_state[req["addr"]]
 
         with self.run_simulation(self.m, max_cycles=3000) as sim:
             sim.add_testbench(request_process)
             sim.add_testbench(result_process)
+
+
+class TestPipelinedWishboneMemorySlave(TestWishboneMemorySlave):
+    pipelined = True
+
+    def test_throughput(self):
+        async def request_process(sim: TestbenchContext):
+            for i in range(8):
+                await self.tc.request.call(sim, addr=i, data=0, we=0, sel=0)
+
+        async def result_process(sim: TestbenchContext):
+            await self.tc.result.call(sim)
+            # The responses arrive in consecutive cycles.
+            for _ in range(7):
+                assert await self.tc.result.call_try(sim) is not None
+
+        with self.run_simulation(self.m, max_cycles=100) as sim:
+            sim.add_testbench(request_process)
+            sim.add_testbench(result_process)
+
+
+class TestRegisteredWishboneMemorySlave(TestPipelinedWishboneMemorySlave):
+    registered = True
+
+
+class TestPipelinedWishboneMuxer(TestCaseWithSimulator):
+    def test_hold(self):
+        num_slaves = 2
+        mux = WishboneMuxer(WishboneParameters(), Signal(num_slaves), max_pending=4)
+        slaves = [WishboneInterfaceWrapper(slave) for slave in mux.slaves]
+        wb_master = WishboneInterfaceWrapper(mux.master_wb)
+
+        async def process(sim: TestbenchContext):
+            # two pipelined requests to the first slave
+            wb_master.master_set(sim, 1, 0, 0)
+            sim.set(mux.sselTGA, 0b01)
+            await slaves[0].slave_tick_and_verify(sim, 1, 0, 0)
+            wb_master.master_set(sim, 2, 0, 0)
+            await slaves[0].slave_tick_and_verify(sim, 2, 0, 0)
+
+            # a request to the second slave waits for them
+            wb_master.master_set(sim, 3, 0, 0)
+            sim.set(mux.sselTGA, 0b10)
+            for data in [5, 6]:
+                assert sim.get(mux.master_wb.stall)
+                assert not sim.get(slaves[1].wb.stb)
+                sim.set(slaves[0].wb.dat_r, data)
+                sim.set(slaves[0].wb.ack, 1)
+                *_, ack, dat_r = await sim.tick().sample(mux.master_wb.ack, mux.master_wb.dat_r)
+                assert ack and dat_r == data
+            sim.set(slaves[0].wb.ack, 0)
+
+            assert not sim.get(mux.master_wb.stall)
+            await slaves[1].slave_tick_and_verify(sim, 3, 0, 0)
+
+        with self.run_simulation(mux) as sim:
+            sim.add_testbench(process)
+
+
+class TestWishboneClassicBridge(TestCaseWithSimulator):
+    def test_manual(self):
+        bridge = WishboneClassicBridge(WishboneParameters())
+        slave = WishboneInterfaceWrapper(bridge.slave_wb)
+        master = WishboneInterfaceWrapper(bridge.master_wb)
+
+        async def process(sim: TestbenchContext):
+            master.master_set(sim, 2, 3, 1)
+            await sim.tick()
+            # the request is held after the master releases it
+            master.master_release(sim, release_cyc=False)
+            assert sim.get(bridge.master_wb.stall)
+            await slave.slave_tick_and_verify(sim, 2, 3, 1)
+            assert sim.get(slave.wb.stb)
+            await slave.slave_respond_master_verify(sim, master.wb, 4)
+            assert not sim.get(bridge.master_wb.stall)
+            assert not sim.get(slave.wb.stb)
+
+        with self.run_simulation(bridge) as sim:
+            sim.add_testbench(process)
@@ -57,6 +57,7 @@ class MockTLBBackingDevice(TLBBackingDevice, Elaboratable):
         self.translations = dict()
 
         self.ready = False
+        self.hold = False
         self.translated = []
 
         self.asid = -1
@@ -151,7 +152,7 @@ class MockTLBBackingDevice(TLBBackingDevice, Elaboratable):
                 }
             )
 
-    @def_method_mock(lambda self: self.accept_mock, enable=lambda self: self.ready)
+    @def_method_mock(lambda self: self.accept_mock, enable=lambda self: self.ready and not self.hold)
     def process_accept(self):
         @MethodMock.effect
         def _():
@@ -472,3 +473,84 @@ class TestTLBCache(TestCaseWithSimulator):
             sim.add_mock(self.backing.process_request())
             sim.add_mock(self.backing.process_accept())
             sim.add_testbench(self.single_cycle_process)
+
+
+class TestSetAssociativeTLBPorts(TestCaseWithSimulator):
+    @pytest.fixture(autouse=True)
+    def setup_method(self):
+        self.gen_params = GenParams(
+            configurations.test.replace(
+                supervisor_mode=True,
+                asidlen=4,
+                supported_vm_schemes=(SatpMode.BARE, SatpMode.SV32),
+                fetch_block_bytes_log=3,
+            )
+        )
+        self.csr_instances = CSRInstances(self.gen_params)
+        DependencyContext.get().add_dependency(CSRInstancesKey(), self.csr_instances)
+
+        self.backing = MockTLBBackingDevice(self.gen_params)
+
+        dut = SetAssociativeTLB(
+            self.gen_params,
+            ways=4,
+            entries=16,
+            superpage_ways=2,
+            superpage_entries=4,
+            backing_resolver=self.backing,
+            ports=2,
+        )
+        self.dut = SimpleTestCircuit(dut)
+
+        self.request = [TestbenchIO(AdapterTrans.create(dut.request[port])) for port in range(2)]
+        self.accept = [TestbenchIO(AdapterTrans.create(dut.accept[port])) for port in range(2)]
+
+        self.m = ModuleConnector(
+            dut=self.dut,
+            backing=self.backing,
+            csrs=self.csr_instances,
+            request0=self.request[0],
+            request1=self.request[1],
+            accept0=self.accept[0],
+            accept1=self.accept[1],
+        )
+
+    async def hit_under_miss_process(self, sim: TestbenchContext):
+        asid = 5
+        permissions = Permissions(r=1, w=1, x=0, u=1, d=1)
+        vpn_miss = 0x12345
+        vpn_page = 0x23456
+        vpn_superpage = 0x34400
+
+        self.backing.add_translation(vpn_miss, 0x11111, permissions=permissions, asid=asid)
+        self.backing.add_translation(vpn_page, 0x22222, permissions=permissions, asid=asid)
+        self.backing.add_translation(vpn_superpage, 0x33000, permissions=permissions, size_class=1, asid=asid)
+        sim.set(self.csr_instances.s_mode.satp_asid, asid)
+        await sim.tick()
+
+        for vpn in [vpn_page, vpn_superpage]:
+            await self.request[1].call(sim, vpn=vpn, is_store=0)
+            await self.accept[1].call(sim)
+        assert len(self.backing.translated) == 2
+
+        # The refill for port 0 is stalled, port 1 still hits in both size classes
+        self.backing.hold = True
+        await self.request[0].call(sim, vpn=vpn_miss, is_store=0)
+        for vpn in [vpn_page, vpn_superpage + 0x12]:
+            await self.request[1].call(sim, vpn=vpn, is_store=0)
+            response = await self.accept[1].call(sim)
+            assert response["result"] == AddressTranslationLayouts.TLBResult.HIT
+            assert response["ppn"] == self.backing.lookup(vpn, asid)[0][0]
+        assert await self.accept[0].call_try(sim) is None
+        assert len(self.backing.translated) == 3
+
+        self.backing.hold = False
+        response = await self.accept[0].call(sim)
+        assert response["ppn"] == 0x11111
+
+    def test_hit_under_miss(self):
+        with self.run_simulation(self.m) as sim:
+            sim.add_process(self.backing.asid_get)
+            sim.add_mock(self.backing.process_request())
+            sim.add_mock(self.backing.process_accept())
+            sim.add_testbench(self.hit_under_miss_process)
@@ -29,9 +29,12 @@ class TranslationInfo:
     permissions: Optional[int] = None
     # expected size class is determined by the length of the path
     pmp_failing: Optional[int] = None  # address to cause a PMP violation, if any
+    update: Optional[tuple[int, Optional[int]]] = None  # (PTE address, written PTE value) of the A/D bits update
 
 
 class TestPageTableWalker(TestCaseWithSimulator):
+    hardware_a_d_update = False
+
     @pytest.fixture(autouse=True)
     def setup_method(self):
         self.gen_params = GenParams(
@@ -40,6 +43,7 @@ class TestPageTableWalker(TestCaseWithSimulator):
                 asidlen=4,
                 supported_vm_schemes=(SatpMode.BARE, SatpMode.SV32),
                 pmp_register_count=16,
+                hardware_a_d_update=self.hardware_a_d_update,
             )
         )
         self.layouts = self.gen_params.get(AddressTranslationLayouts)
@@ -58,6 +62,8 @@ class TestPageTableWalker(TestCaseWithSimulator):
         self.mem_ready = False
         self.mem_results = []
         self.mem_expected = []
+        self.write_expected = []
+        self.write_results = []
 
     def gen_random_translation_path(self, mode: SatpMode) -> TranslationInfo:
         """
@@ -203,13 +209,27 @@ class TestPageTableWalker(TestCaseWithSimulator):
         pte_dict["ppn"] = upper_ppn << level_bits
         translation_path.append((leaf_pte, encode_pte(pte_dict)))
 
+        update = None
         if pte_dict["A"] == 0 or (is_write and pte_dict["D"] == 0):
-            # if A=0 or if it's a store and D=0, Svade treats it as a page fault
-            return TranslationInfo(
-                **common,
-                path=translation_path,
-                result=AddressTranslationLayouts.TLBResult.PAGE_FAULT,
-            )
+            if not self.hardware_a_d_update or (is_write and not pte_dict["W"]):
+                # if A=0 or if it's a store and D=0, Svade treats it as a page fault
+                return TranslationInfo(
+                    **common,
+                    path=translation_path,
+                    result=AddressTranslationLayouts.TLBResult.PAGE_FAULT,
+                )
+
+            # Svadu - the bits are set by the walker
+            pte_dict["A"] = 1
+            pte_dict["D"] |= is_write
+            if random.random() < 0.05:  # 5% chance of bus error
+                return TranslationInfo(
+                    **common,
+                    path=translation_path,
+                    result=AddressTranslationLayouts.TLBResult.ACCESS_FAULT,
+                    update=(leaf_pte, None),
+                )
+            update = (leaf_pte, encode_pte(pte_dict))
 
         permissions = {
             "r": pte_dict["R"],
@@ -226,6 +246,7 @@ class TestPageTableWalker(TestCaseWithSimulator):
             result=AddressTranslationLayouts.TLBResult.HIT,
             ppn=pte_dict["ppn"],
             permissions=self.layouts.permissions.const(permissions).as_bits(),  # type: ignore
+            update=update,
         )
 
     @def_method_mock(lambda self: self.bus.request_read_mock, enable=lambda self: not self.mem_ready)
@@ -266,9 +287,36 @@ class TestPageTableWalker(TestCaseWithSimulator):
         if self.mem_results:
             return self.mem_results[-1]
 
+    @def_method_mock(lambda self: self.bus.request_write_mock, enable=lambda self: not self.write_results)
+    def bus_write_req_proc(self, addr, data, sel):
+        @MethodMock.effect
+        def _():
+            assert len(self.write_expected) > 0
+
+            expected_addr, expected_data = self.write_expected.pop(0)
+            off_bits = exact_log2(self.gen_params.isa.xlen // 8)
+
+            assert sel == 0xFF if self.gen_params.isa.xlen == 64 else 0xF
+            assert addr << off_bits == expected_addr
+            if expected_data is not None:
+                assert data == expected_data
+            self.write_results.append({"err": expected_data is None})
+
+    @def_method_mock(lambda self: self.bus.get_write_response_mock, enable=lambda self: bool(self.write_results))
+    def bus_write_resp_proc(self):
+        @MethodMock.effect
+        def _():
+            self.write_results.pop(0)
+
+        if self.write_results:
+            return self.write_results[0]
+
     async def random_translations_process(self, sim: TestbenchContext):
         # allow PMP for S-mode
-        sim.set(self.csr_instances.m_mode.pmpxcfg[6].value, 0b00001001)  # R=1, A=TOR
+        sim.set(self.csr_instances.m_mode.pmpxcfg[6].value, 0b00001011)  # R=1, W=1, A=TOR
+        if self.hardware_a_d_update:
+            assert self.csr_instances.m_mode.menvcfg_adue is not None
+            sim.set(self.csr_instances.m_mode.menvcfg_adue.value, 1)
         sim.set(self.csr_instances.m_mode.pmpaddrx[5].value, 0)
         sim.set(self.csr_instances.m_mode.pmpaddrx[6].value, ~0)
 
@@ -293,11 +341,13 @@ class TestPageTableWalker(TestCaseWithSimulator):
             self.mem_expected = translation_info.path.copy()
             self.mem_results = []
             self.mem_ready = False
+            self.write_expected = [translation_info.update] if translation_info.update is not None else []
 
             await sim.tick()
             await self.dut.request.call(sim, vpn=translation_info.vpn, is_store=translation_info.is_write)
             ret = await self.dut.accept.call(sim)
             assert not self.mem_expected
+            assert not self.write_expected
 
             assert ret.result == translation_info.result
             if translation_info.result == AddressTranslationLayouts.TLBResult.HIT:
@@ -309,4 +359,10 @@ class TestPageTableWalker(TestCaseWithSimulator):
         with self.run_simulation(self.m) as sim:
             sim.add_mock(self.bus_read_req_proc())
             sim.add_mock(self.bus_read_resp_proc())
+            sim.add_mock(self.bus_write_req_proc())
+            sim.add_mock(self.bus_write_resp_proc())
             sim.add_testbench(self.random_translations_process)
+
+
+class TestPageTableWalkerSvadu(TestPageTableWalker):
+    hardware_a_d_update = True
@@ -2,11 +2,16 @@ import os
 from dataclasses import dataclass
 from dataclasses_json import dataclass_json
 from pathlib import Path
+from typing import Optional
+
+from transactron.evlog import EventDecoder
 
 from .memory import *
 from .common import SimulationBackend
 
 from coreblocks.arch import ExceptionCause
+from coreblocks.telemetry.binlog import save_binary
+from coreblocks.telemetry.cpi_stack import CPIStack, CPIStackBuilder, retire_width_from_schema
 
 test_dir = Path(__file__).parent.parent
 embench_dir = test_dir.joinpath("external/embench/build/src")
@@ -15,6 +20,21 @@ profile_dir = test_dir.joinpath("__profiles__")
 evlog_dir = test_dir.joinpath("__evlogs__")
 
 
+def get_results_dir() -> Path:
+    """Directory the benchmark results are written to. It can be overridden by
+    the `_COREBLOCKS_BENCHMARK_RESULTS` environment variable, e.g. to keep the
+    results of different core configurations apart."""
+    return Path(os.environ.get("_COREBLOCKS_BENCHMARK_RESULTS", results_dir))
+
+
+def get_memory_timing() -> Optional[MemoryTimingModel]:
+    """The memory timing model of the benchmarks, selected by the
+    `_COREBLOCKS_MEMORY_TIMING` (see `parse_timing_model`) and
+    `_COREBLOCKS_MEMORY_BANDWIDTH` (bytes per cycle) environment variables."""
+    bandwidth = os.environ.get("_COREBLOCKS_MEMORY_BANDWIDTH")
+    return parse_timing_model(os.environ.get("_COREBLOCKS_MEMORY_TIMING", ""), float(bandwidth) if bandwidth else None)
+
+
 @dataclass_json
 @dataclass
 class BenchmarkResult:
@@ -93,14 +113,14 @@ def get_all_benchmark_names():
     return os.listdir(embench_dir) if os.path.exists(embench_dir) else []
 
 
-async def run_benchmark(sim_backend: SimulationBackend, benchmark_name: str):
+async def run_benchmark(sim_backend: SimulationBackend, benchmark_name: str, out_dir: Optional[Path] = None):
     mmio = MMIO(lambda: sim_backend.stop())
 
     mem_segments: list[MemorySegment] = []
     mem_segments += load_segments_from_elf(str(embench_dir.joinpath(f"{benchmark_name}/{benchmark_name}")))
     mem_segments.append(mmio)
 
-    mem_model = CoreMemoryModel(mem_segments)
+    mem_model = CoreMemoryModel(mem_segments, timing=get_memory_timing())
 
     result = await sim_backend.run(mem_model, timeout_cycles=2000000)
 
@@ -108,9 +128,23 @@ async def run_benchmark(sim_backend: SimulationBackend, benchmark_name: str):
         os.makedirs(profile_dir, exist_ok=True)
         result.profile.encode(f"{profile_dir}/benchmark.{benchmark_name}.json")
 
+    cpi_stack: Optional[CPIStack] = None
     if result.evlog is not None:
+        decoder = EventDecoder(result.evlog.schema)
+        cpi_builder = CPIStackBuilder(retire_width_from_schema(result.evlog.schema))
+        cpi_builder.run(decoder.decode(cycle, site, values) for cycle, site, values in result.evlog.raw)
+        cpi_stack = cpi_builder.result()
+
         os.makedirs(evlog_dir, exist_ok=True)
-        result.evlog.save(f"{evlog_dir}/benchmark.{benchmark_name}.jsonl")
+        evlog_format = os.environ.get("_COREBLOCKS_EVLOG_FORMAT", "binary")
+        if evlog_format == "jsonl":
+            result.evlog.save(f"{evlog_dir}/benchmark.{benchmark_name}.jsonl")
+        else:
+            save_binary(
+                result.evlog,
+                f"{evlog_dir}/benchmark.{benchmark_name}.evlog",
+                compression="zstd" if evlog_format == "zstd" else None,
+            )
 
     if not result.success:
         raise RuntimeError("Simulation timed out")
@@ -131,6 +165,11 @@ async def run_benchmark(sim_backend: SimulationBackend, benchmark_name: str):
         metric_values=result.metric_values,
     )
 
-    os.makedirs(str(results_dir), exist_ok=True)
-    with open(f"{str(results_dir)}/{benchmark_name}.json", "w") as outfile:
+    if out_dir is None:
+        out_dir = get_results_dir()
+    os.makedirs(str(out_dir), exist_ok=True)
+    with open(f"{str(out_dir)}/{benchmark_name}.json", "w") as outfile:
         outfile.write(bench_results.to_json())  # type: ignore
+    if cpi_stack is not None:
+        with open(f"{str(out_dir)}/{benchmark_name}.cpi.json", "w") as outfile:
+            outfile.write(cpi_stack.to_json())  # type: ignore
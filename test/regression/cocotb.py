@@ -1,12 +1,16 @@
+from collections import deque
 from decimal import Decimal
+import hashlib
 import inspect
+import pickle
 import re
 import os
-from typing import Any
+from typing import Any, Optional
 from collections.abc import Coroutine
 from dataclasses import dataclass
 from pathlib import Path
 from filelock import FileLock
+from importlib.metadata import version
 import subprocess
 import tempfile
 import sys
@@ -19,6 +23,7 @@ from cocotb.handle import ModifiableObject
 from cocotb.triggers import FallingEdge, Event, RisingEdge, with_timeout
 from cocotb_bus.bus import Bus
 from cocotb.result import SimTimeoutError
+from cocotb.utils import get_sim_time
 
 from .memory import *
 from .common import SimulationBackend, SimulationExecutionResult, START_PC
@@ -27,14 +32,17 @@ from transactron.evlog import EventLog, GeneratedEvLogSampler, SignalHandle, Sig
 from transactron.profiler import CycleProfile, MethodSamples, Profile, ProfileSamples, TransactionSamples
 from transactron.utils.gen import GenerationInfo
 
+from coreblocks.params import configurations
+from coreblocks.params.core_configuration import CoreConfiguration
+
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 BUILD_ROOT = Path(__file__).resolve().parent / "cocotb" / "build"
 TEST_ROOT = Path(__file__).resolve().parent / "cocotb"
 
 VERILOG_ROOT = BUILD_ROOT / "verilog"
-CORE_V = VERILOG_ROOT / "core.v"
-CORE_V_JSON = VERILOG_ROOT / "core.v.json"
+
+DEFAULT_CONFIG = configurations.full.replace(start_pc=START_PC)
 
 
 @dataclass
@@ -91,6 +99,49 @@ class WishboneSlave:
         self.bus = WishboneBus(entity, name)
         self.bus.drive(WishboneSlaveSignals())
 
+    def access(self) -> tuple[int, WishboneSlaveSignals]:
+        """Performs the request on the bus. Returns its latency and the signals to respond with."""
+        sig_m = WishboneMasterSignals()
+        self.bus.sample(sig_m)
+
+        addr = sig_m.adr << self.word_bits
+
+        sig_s = WishboneSlaveSignals()
+        req: ReadRequest | WriteRequest
+        if sig_m.we:
+            req = WriteRequest(
+                addr=addr,
+                data=sig_m.dat_w,
+                byte_count=self.word_size,
+                byte_sel=sig_m.sel,
+            )
+            resp = self.model.write(req)
+        else:
+            req = ReadRequest(
+                addr=addr,
+                byte_count=self.word_size,
+                byte_sel=sig_m.sel,
+                exec=self.is_instr_bus,
+            )
+            resp = self.model.read(req)
+            sig_s.dat_r = resp.data
+
+        match resp.status:
+            case ReplyStatus.OK:
+                sig_s.ack = 1
+            case ReplyStatus.ERROR:
+                if not self.bus.err:
+                    raise ValueError("Bus doesn't support err")
+                sig_s.err = 1
+            case ReplyStatus.RETRY:
+                if not self.bus.rty:
+                    raise ValueError("Bus doesn't support rty")
+                sig_s.rty = 1
+
+        # The clock period is 1 ns.
+        cycle = int(get_sim_time("ns"))
+        return self.delay + self.model.latency(req, cycle), sig_s
+
     async def start(self):
         clock_edge_event = FallingEdge(self.clock)
 
@@ -98,51 +149,33 @@ class WishboneSlave:
             while not (self.bus.stb.value and self.bus.cyc.value):
                 await clock_edge_event  # type: ignore
 
-            sig_m = WishboneMasterSignals()
-            self.bus.sample(sig_m)
-
-            addr = sig_m.adr << self.word_bits
-
-            sig_s = WishboneSlaveSignals()
-            if sig_m.we:
-                resp = self.model.write(
-                    WriteRequest(
-                        addr=addr,
-                        data=sig_m.dat_w,
-                        byte_count=self.word_size,
-                        byte_sel=sig_m.sel,
-                    )
-                )
-            else:
-                resp = self.model.read(
-                    ReadRequest(
-                        addr=addr,
-                        byte_count=self.word_size,
-                        byte_sel=sig_m.sel,
-                        exec=self.is_instr_bus,
-                    )
-                )
-                sig_s.dat_r = resp.data
-
-            match resp.status:
-                case ReplyStatus.OK:
-                    sig_s.ack = 1
-                case ReplyStatus.ERROR:
-                    if not self.bus.err:
-                        raise ValueError("Bus doesn't support err")
-                    sig_s.err = 1
-                case ReplyStatus.RETRY:
-                    if not self.bus.rty:
-                        raise ValueError("Bus doesn't support rty")
-                    sig_s.rty = 1
-
-            for _ in range(self.delay):
+            latency, sig_s = self.access()
+            for _ in range(latency):
                 await clock_edge_event  # type: ignore
 
             self.bus.drive(sig_s)
             await clock_edge_event  # type: ignore
             self.bus.drive(WishboneSlaveSignals())
 
+    async def start_pipelined(self):
+        """Runs as a Pipelined Wishbone slave. A request is accepted in every cycle,
+        and the requests are responded to in order, each after its latency."""
+        clock_edge_event = FallingEdge(self.clock)
+
+        # Responses to the accepted requests, with the number of cycles they wait for.
+        pending: deque[tuple[int, WishboneSlaveSignals]] = deque()
+        while True:
+            if self.bus.stb.value and self.bus.cyc.value:
+                pending.append(self.access())
+
+            if pending and pending[0][0] == 0:
+                self.bus.drive(pending.popleft()[1])
+            else:
+                self.bus.drive(WishboneSlaveSignals())
+
+            pending = deque((max(wait - 1, 0), sig_s) for wait, sig_s in pending)
+            await clock_edge_event  # type: ignore
+
 
 class CocotbSimulation(SimulationBackend):
     def __init__(self, dut):
@@ -156,6 +189,10 @@ class CocotbSimulation(SimulationBackend):
 
         self.gen_info = GenerationInfo.decode(gen_info_path)
 
+        # The configuration is recorded next to the generated core.
+        with open(Path(gen_info_path).parent / "config.pickle", "rb") as f:
+            self.config: CoreConfiguration = pickle.load(f)
+
         self.log_level = os.environ["__TRANSACTRON_LOG_LEVEL"]
         self.log_filter = os.environ["__TRANSACTRON_LOG_FILTER"]
 
@@ -276,7 +313,10 @@ class CocotbSimulation(SimulationBackend):
         cocotb.start_soon(instr_wb.start())
 
         data_wb = WishboneSlave(self.dut, "wb_data", self.dut.clk, mem_model, is_instr_bus=False)
-        cocotb.start_soon(data_wb.start())
+        if self.config.data_bus_max_requests > 1:
+            cocotb.start_soon(data_wb.start_pipelined())
+        else:
+            cocotb.start_soon(data_wb.start())
 
         if get_interrupt_value is not None:
 
@@ -343,9 +383,49 @@ def generate_tests(test_function: Callable[[Any, Any], Coroutine[Any, Any, None]
         setattr(mod, test_name, _create_test(test_function, test_name, mod, test_name))
 
 
-def get_cocotb_lock_prefix(traces: bool) -> Path:
+def _sources_hash() -> str:
+    """Hash of everything besides the configuration which influences the
+    generated core: the coreblocks sources and the versions of the tools."""
+    h = hashlib.sha256()
+    for name in ["amaranth", "transactron"]:
+        h.update(f"{name}=={version(name)}\n".encode())
+    for path in sorted((REPO_ROOT / "coreblocks").rglob("*.py")):
+        h.update(path.relative_to(REPO_ROOT).as_posix().encode() + b"\0")
+        h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class CocotbBuild:
+    """Locations of a generated core and of its simulator build.
+
+    Both are cached under `BUILD_ROOT`, in directories named by a hash of
+    everything they are built from. This allows switching between
+    configurations, and rerunning after unrelated changes, without
+    rebuilding.
+    """
+
+    verilog_dir: Path
+    sim_build: Path
+
+    @property
+    def core_v(self) -> Path:
+        return self.verilog_dir / "core.v"
+
+    @property
+    def core_v_json(self) -> Path:
+        return self.verilog_dir / "core.v.json"
+
+
+def get_cocotb_build(traces: bool, config: Optional[CoreConfiguration] = None) -> CocotbBuild:
+    if config is None:
+        config = DEFAULT_CONFIG
     sim = os.environ.get("SIM", "verilator")
-    return BUILD_ROOT / f"{sim}{'-traces' if traces else ''}"
+    verilog_hash = hashlib.sha256(f"{config.fingerprint()} {_sources_hash()}".encode()).hexdigest()[:16]
+    return CocotbBuild(
+        verilog_dir=VERILOG_ROOT / verilog_hash,
+        sim_build=BUILD_ROOT / f"{sim}-{verilog_hash}{'-traces' if traces else ''}",
+    )
 
 
 def _extend_env_path_like(value: str, to_add: str) -> str:
@@ -361,15 +441,19 @@ def run_cocotb_entrypoint(
     additional_args: list[str] | None = None,
     additional_env: dict[str, str] | None = None,
     ensure_built: bool = True,
+    config: Optional[CoreConfiguration] = None,
 ) -> bool:
     if ensure_built:
-        ensure_cocotb_built(traces)
+        build = ensure_cocotb_built(traces, config)
+    else:
+        build = get_cocotb_build(traces, config)
 
     arglist = ["make", "-C", str(TEST_ROOT)]
 
     arglist += [f"MODULE={entrypoint_module_name}"]
-    arglist += [f"_COREBLOCKS_GEN_INFO={CORE_V_JSON}"]
-    arglist += [f"VERILOG_SOURCES={CORE_V}"]
+    arglist += [f"_COREBLOCKS_GEN_INFO={build.core_v_json}"]
+    arglist += [f"VERILOG_SOURCES={build.core_v}"]
+    arglist += [f"SIM_BUILD={build.sim_build}"]
     if traces:
         arglist += ["TRACES=1"]
 
@@ -391,31 +475,37 @@ def run_cocotb_entrypoint(
         return len(list(tree.iter("failure"))) == 0
 
 
-def ensure_core_verilog_generated():
-    lock = BUILD_ROOT / "verilog.lock"
-    stamp = BUILD_ROOT / "verilog.stamp"
+def _generate_core_verilog(verilog_dir: Path):
+    from coreblocks.gen_verilog import gen_verilog
+
+    with open(verilog_dir / "config.pickle", "rb") as f:
+        config = pickle.load(f)
+
+    gen_verilog(config, str(verilog_dir / "core.v"), wrap_socks=True)
+
+
+def ensure_core_verilog_generated(config: Optional[CoreConfiguration] = None) -> CocotbBuild:
+    if config is None:
+        config = DEFAULT_CONFIG
+    build = get_cocotb_build(False, config)
+    lock = build.verilog_dir.with_suffix(".lock")
+    stamp = build.verilog_dir.with_suffix(".stamp")
 
-    VERILOG_ROOT.mkdir(parents=True, exist_ok=True)
+    build.verilog_dir.mkdir(parents=True, exist_ok=True)
 
     if stamp.exists():
-        return
+        return build
 
     with FileLock(lock):
         if stamp.exists():
-            return
+            return build
 
-        command = [
-            sys.executable,
-            "-m",
-            "coreblocks.gen_verilog",
-            "--config",
-            "full",
-            "--reset-pc",
-            f"0x{START_PC:x}",
-            "--with-socks",
-            "-o",
-            str(CORE_V),
-        ]
+        # The configuration is passed to a fresh process, so that the state of this one
+        # doesn't influence the generated core. It is also kept as a record of the build.
+        with open(build.verilog_dir / "config.pickle", "wb") as f:
+            pickle.dump(config, f)
+
+        command = [sys.executable, "-m", "test.regression.cocotb", "--generate-verilog", str(build.verilog_dir)]
 
         env = os.environ.copy()
         # always generate evlog interfaces - the choice to output them is made at runtime
@@ -424,36 +514,47 @@ def ensure_core_verilog_generated():
         subprocess.run(command, check=True, cwd=REPO_ROOT, env=env)
         stamp.touch()
 
+    return build
+
 
-def ensure_cocotb_built(traces: bool):
-    ensure_core_verilog_generated()
+def ensure_cocotb_built(traces: bool, config: Optional[CoreConfiguration] = None) -> CocotbBuild:
+    ensure_core_verilog_generated(config)
 
-    path = get_cocotb_lock_prefix(traces)
-    lock = path.with_suffix(".lock")
-    stamp = path.with_suffix(".stamp")
+    build = get_cocotb_build(traces, config)
+    lock = build.sim_build.with_suffix(".lock")
+    stamp = build.sim_build.with_suffix(".stamp")
 
-    path.mkdir(parents=True, exist_ok=True)
+    build.sim_build.mkdir(parents=True, exist_ok=True)
 
     if stamp.exists():
-        return
+        return build
 
     with FileLock(lock):
         if stamp.exists():
-            return
+            return build
 
         assert run_cocotb_entrypoint(
             entrypoint_module_name="empty_module",
             traces=traces,
             ensure_built=False,
+            config=config,
         ), "Failed to build cocotb testbench"
         stamp.touch()
 
+    return build
+
 
 def main():
     parser = argparse.ArgumentParser(description="Prebuild cocotb testbench for coreblocks")
     parser.add_argument("--traces", action="store_true", help="Enable cocotb trace generation")
+    parser.add_argument("--generate-verilog", metavar="DIR", type=Path, help=argparse.SUPPRESS)
     args = parser.parse_args()
 
+    if args.generate_verilog is not None:
+        # Used by `ensure_core_verilog_generated`
+        _generate_core_verilog(args.generate_verilog)
+        return
+
     ensure_cocotb_built(traces=args.traces)
 
 
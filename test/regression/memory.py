@@ -1,8 +1,11 @@
+import math
+import mmap
 from abc import ABC, abstractmethod
+from bisect import bisect_right
 from collections.abc import Callable
 from enum import Enum, IntFlag, auto
 from typing import Optional, TypeVar
-from dataclasses import dataclass, replace
+from dataclasses import dataclass
 from elftools.elf.constants import P_FLAGS
 from elftools.elf.elffile import ELFFile, Segment
 from coreblocks.params.configurations import CoreConfiguration
@@ -17,6 +20,11 @@ all = [
     "MemoryModel",
     "RAMSegment",
     "CoreMemoryModel",
+    "MemoryTimingModel",
+    "FixedLatency",
+    "DRAMRowBufferTiming",
+    "BandwidthLimit",
+    "parse_timing_model",
 ]
 
 
@@ -32,7 +40,7 @@ class SegmentFlags(IntFlag):
     EXECUTABLE = auto()
 
 
-@dataclass
+@dataclass(slots=True)
 class ReadRequest:
     addr: int
     byte_count: int
@@ -40,13 +48,13 @@ class ReadRequest:
     exec: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class ReadReply:
     data: int = 0
     status: ReplyStatus = ReplyStatus.OK
 
 
-@dataclass
+@dataclass(slots=True)
 class WriteRequest:
     addr: int
     data: int
@@ -54,7 +62,7 @@ class WriteRequest:
     byte_sel: int
 
 
-@dataclass
+@dataclass(slots=True)
 class WriteReply:
     status: ReplyStatus = ReplyStatus.OK
 
@@ -73,41 +81,190 @@ class MemorySegment(ABC):
         raise NotImplementedError
 
 
+# Bit masks selecting the bytes enabled by a byte select of up to 8 bytes.
+_BYTE_SEL_MASKS = [sum(0xFF << (8 * i) for i in range(8) if (byte_sel >> i) & 1) for byte_sel in range(256)]
+
+
 class RandomAccessMemory(MemorySegment):
-    def __init__(self, address_range: range, flags: SegmentFlags, data: bytes):
+    """Memory backed by a byte array. A `bytearray` passed as `data` is
+    used directly, without copying."""
+
+    def __init__(self, address_range: range, flags: SegmentFlags, data: bytes | bytearray):
         super().__init__(address_range, flags)
-        self.data = bytearray(data)
+        self.data = data if isinstance(data, bytearray) else bytearray(data)
+        # Slicing a memoryview doesn't copy the data.
+        self.view = memoryview(self.data)
 
         if len(self.data) != len(address_range):
             raise ValueError("Data length must be equal to the length of the address range")
 
     def read(self, req: ReadRequest) -> ReadReply:
-        if self.flags & SegmentFlags.EXECUTABLE:
-            pass  # print("Executing from address %x" % (self.address_range.start + req.addr))
-        return ReadReply(data=int.from_bytes(self.data[req.addr : req.addr + req.byte_count], "little"))
+        return ReadReply(data=int.from_bytes(self.view[req.addr : req.addr + req.byte_count], "little"))
 
     def write(self, req: WriteRequest) -> WriteReply:
-        mask_bytes = [b"\x00", b"\xff"]
-        mask = int.from_bytes(b"".join(mask_bytes[1 & (req.byte_sel >> i)] for i in range(4)), "little")
-        old = int.from_bytes(self.data[req.addr : req.addr + req.byte_count], "little")
-        self.data[req.addr : req.addr + req.byte_count] = (old & ~mask | req.data & mask).to_bytes(4, "little")
+        mask = _BYTE_SEL_MASKS[req.byte_sel & 0xFF]
+        old = int.from_bytes(self.view[req.addr : req.addr + req.byte_count], "little")
+        self.view[req.addr : req.addr + req.byte_count] = (old & ~mask | req.data & mask).to_bytes(
+            req.byte_count, "little"
+        )
         return WriteReply()
 
 
+class MemoryTimingModel(ABC):
+    """Timing of the memory accesses, on top of the minimal latency of a
+    Wishbone transfer. Models may be stateful: the model of a
+    `CoreMemoryModel` observes all of its accesses, in order."""
+
+    @abstractmethod
+    def latency(self, req: ReadRequest | WriteRequest, cycle: int) -> int:
+        """Returns the number of cycles by which the response to an access
+        issued in `cycle` is delayed."""
+        raise NotImplementedError
+
+
+class FixedLatency(MemoryTimingModel):
+    def __init__(self, cycles: int):
+        if cycles < 0:
+            raise ValueError("Latency must be non-negative")
+        self.cycles = cycles
+
+    def latency(self, req: ReadRequest | WriteRequest, cycle: int) -> int:
+        return self.cycles
+
+
+class DRAMRowBufferTiming(MemoryTimingModel):
+    """Open-page DRAM. Consecutive rows are interleaved between the banks.
+    An access to the row open in its bank (a row buffer hit) takes `t_cl`
+    cycles. Otherwise, the open row has to be closed first (`t_rp`) and
+    the new one opened (`t_rcd`)."""
+
+    def __init__(self, t_cl: int = 10, t_rcd: int = 10, t_rp: int = 10, row_bytes: int = 2048, banks: int = 8):
+        if min(t_cl, t_rcd, t_rp) < 0 or row_bytes <= 0 or banks <= 0:
+            raise ValueError("Invalid DRAM timing parameters")
+        self.t_cl = t_cl
+        self.t_rcd = t_rcd
+        self.t_rp = t_rp
+        self.row_bytes = row_bytes
+        self.banks = banks
+        self.open_rows: list[Optional[int]] = [None] * banks
+        self.row_hits = 0
+        self.row_misses = 0
+        self.row_conflicts = 0
+
+    def latency(self, req: ReadRequest | WriteRequest, cycle: int) -> int:
+        row_addr = req.addr // self.row_bytes
+        bank = row_addr % self.banks
+        row = row_addr // self.banks
+
+        open_row = self.open_rows[bank]
+        self.open_rows[bank] = row
+        if open_row == row:
+            self.row_hits += 1
+            return self.t_cl
+        if open_row is None:
+            self.row_misses += 1
+            return self.t_rcd + self.t_cl
+        self.row_conflicts += 1
+        return self.t_rp + self.t_rcd + self.t_cl
+
+
+class BandwidthLimit(MemoryTimingModel):
+    """Limits the throughput of each bus (instruction and data) to
+    `bytes_per_cycle`, on top of the latency of the `inner` model. An access
+    waits until the previous transfers on its bus are finished."""
+
+    def __init__(self, inner: MemoryTimingModel, bytes_per_cycle: float):
+        if bytes_per_cycle <= 0:
+            raise ValueError("Bandwidth must be positive")
+        self.inner = inner
+        self.bytes_per_cycle = bytes_per_cycle
+        self.busy_until = {False: 0.0, True: 0.0}  # keyed by "is instruction bus"
+
+    def latency(self, req: ReadRequest | WriteRequest, cycle: int) -> int:
+        bus = isinstance(req, ReadRequest) and req.exec
+        start = math.ceil(max(cycle, self.busy_until[bus]))
+        self.busy_until[bus] = start + req.byte_count / self.bytes_per_cycle
+        return start - cycle + self.inner.latency(req, start)
+
+
+def parse_timing_model(spec: str, bytes_per_cycle: Optional[float] = None) -> Optional[MemoryTimingModel]:
+    """Creates a timing model from a specification: `fixed:CYCLES`, or
+    `dram` optionally followed by `:param=value,...` overriding the
+    `DRAMRowBufferTiming` parameters. An empty specification means no
+    additional latency. `bytes_per_cycle` limits the bandwidth of the buses."""
+    kind, _, params = spec.partition(":")
+    model: Optional[MemoryTimingModel]
+    match kind:
+        case "" | "none":
+            model = None
+        case "fixed":
+            model = FixedLatency(int(params or 0))
+        case "dram":
+            kwargs: dict[str, int] = {}
+            for param in filter(None, params.split(",")):
+                name, sep, value = param.partition("=")
+                if not sep or name not in ["t_cl", "t_rcd", "t_rp", "row_bytes", "banks"]:
+                    raise ValueError(f"Invalid DRAM timing parameter '{param}'")
+                kwargs[name] = int(value)
+            model = DRAMRowBufferTiming(**kwargs)
+        case _:
+            raise ValueError(f"Unknown memory timing model '{kind}'")
+
+    if bytes_per_cycle is not None:
+        model = BandwidthLimit(model or FixedLatency(0), bytes_per_cycle)
+    return model
+
+
 TReq = TypeVar("TReq", bound=ReadRequest | WriteRequest)
 TRep = TypeVar("TRep", bound=ReadReply | WriteReply)
 
 
 class CoreMemoryModel:
-    def __init__(self, segments: list[MemorySegment], fail_on_undefined_read=False, fail_on_undefined_write=True):
+    def __init__(
+        self,
+        segments: list[MemorySegment],
+        fail_on_undefined_read=False,
+        fail_on_undefined_write=True,
+        timing: Optional[MemoryTimingModel] = None,
+    ):
         self.segments = segments
         self.fail_on_undefined_read = fail_on_undefined_read  # Core may do undefined reads speculatively
         self.fail_on_undefined_write = fail_on_undefined_write
+        self.timing = timing
+        self._build_index()
+
+    def _build_index(self):
+        """Splits the address space into disjoint intervals, each served by
+        at most one segment, so that lookups can use binary search. Where
+        segments overlap, the first one on the list serves the access."""
+        bounds = sorted({addr for seg in self.segments for addr in (seg.address_range.start, seg.address_range.stop)})
+        self._starts: list[int] = []
+        self._intervals: list[tuple[range, Optional[MemorySegment]]] = []
+        for start, stop in zip(bounds, bounds[1:]):
+            seg = next((seg for seg in self.segments if start in seg.address_range), None)
+            if self._intervals and self._intervals[-1][1] is seg:
+                # Merge with the previous interval served by the same segment.
+                start = self._starts.pop()
+                self._intervals.pop()
+            self._starts.append(start)
+            self._intervals.append((range(start, stop), seg))
+        self._last_hit: tuple[range, Optional[MemorySegment]] = (range(0), None)
+
+    def _find_segment(self, addr: int) -> Optional[MemorySegment]:
+        # Consecutive accesses usually hit the same segment.
+        interval, seg = self._last_hit
+        if addr in interval:
+            return seg
+        idx = bisect_right(self._starts, addr) - 1
+        if idx < 0 or addr not in self._intervals[idx][0]:
+            return None
+        self._last_hit = self._intervals[idx]
+        return self._last_hit[1]
 
     def _run_on_range(self, f: Callable[[MemorySegment, TReq], TRep], req: TReq) -> Optional[TRep]:
-        for seg in self.segments:
-            if req.addr in seg.address_range:
-                return f(seg, req)
+        seg = self._find_segment(req.addr)
+        if seg is not None:
+            return f(seg, req)
 
     def _do_read(self, seg: MemorySegment, req: ReadRequest) -> ReadReply:
         if SegmentFlags.READ not in seg.flags:
@@ -115,13 +272,20 @@ class CoreMemoryModel:
         if req.exec and SegmentFlags.EXECUTABLE not in seg.flags:
             raise RuntimeError("Memory is not executable: %x" % req.addr)
 
-        return seg.read(replace(req, addr=req.addr - seg.address_range.start))
+        return seg.read(ReadRequest(req.addr - seg.address_range.start, req.byte_count, req.byte_sel, req.exec))
 
     def _do_write(self, seg: MemorySegment, req: WriteRequest) -> WriteReply:
         if SegmentFlags.WRITE not in seg.flags:
             raise RuntimeError("Tried to write to non-writable memory: %x" % req.addr)
 
-        return seg.write(replace(req, addr=req.addr - seg.address_range.start))
+        return seg.write(WriteRequest(req.addr - seg.address_range.start, req.data, req.byte_count, req.byte_sel))
+
+    def latency(self, req: ReadRequest | WriteRequest, cycle: int) -> int:
+        """Additional cycles the response to an access issued in `cycle`
+        takes, according to the timing model."""
+        if self.timing is None:
+            return 0
+        return self.timing.latency(req, cycle)
 
     def read(self, req: ReadRequest) -> ReadReply:
         rep = self._run_on_range(self._do_read, req)
@@ -148,19 +312,19 @@ def load_segment(
     do_workarounds: bool = True,
     disable_write_protection: bool = False,
     force_executable: bool = False,
+    file_image: Optional[memoryview] = None,
 ) -> RandomAccessMemory:
+    """Creates the memory of an ELF segment. If `file_image` (the contents
+    of the whole ELF file, e.g. memory-mapped) is given, the segment data is
+    copied from it directly into the memory, bypassing the ELF parser."""
     paddr = segment.header["p_paddr"]
     memsz = segment.header["p_memsz"]
+    filesz = segment.header["p_filesz"]
     flags_raw = segment.header["p_flags"]
 
     seg_start = paddr
     seg_end = paddr + memsz
 
-    data = segment.data()
-
-    # fill the rest of the segment with zeroes
-    data = data + b"\x00" * (seg_end - seg_start - len(data))
-
     flags = SegmentFlags(0)
     if flags_raw & P_FLAGS.PF_R:
         flags |= SegmentFlags.READ
@@ -169,6 +333,8 @@ def load_segment(
     if flags_raw & P_FLAGS.PF_X or force_executable:
         flags |= SegmentFlags.EXECUTABLE
 
+    data_offset = 0
+
     if do_workarounds:
         config = CoreConfiguration()
         if flags & SegmentFlags.EXECUTABLE:
@@ -180,14 +346,20 @@ def load_segment(
             align_bits = 0
             extend_end = 0
 
-        align_data_front = seg_start - align_down_to_power_of_two(seg_start, align_bits)
-        align_data_back = align_to_power_of_two(seg_end, align_bits) - seg_end + extend_end
-
-        data = b"\x00" * align_data_front + data + b"\x00" * align_data_back
+        data_offset = seg_start - align_down_to_power_of_two(seg_start, align_bits)
 
         seg_start = align_down_to_power_of_two(seg_start, align_bits)
         seg_end = align_to_power_of_two(seg_end, align_bits) + extend_end
 
+    # The rest of the segment is filled with zeroes.
+    data = bytearray(seg_end - seg_start)
+    if file_image is not None:
+        offset = segment.header["p_offset"]
+        data[data_offset : data_offset + filesz] = file_image[offset : offset + filesz]
+    else:
+        file_data = segment.data()
+        data[data_offset : data_offset + len(file_data)] = file_data
+
     return RandomAccessMemory(range(seg_start, seg_end), flags, data)
 
 
@@ -200,18 +372,22 @@ def load_segments_from_elf(
 ) -> list[RandomAccessMemory]:
     segments: list[RandomAccessMemory] = []
 
-    with open(file_path, "rb") as f:
-        elffile = ELFFile(f)
-        for segment in elffile.iter_segments():
-            if segment.header["p_type"] != "PT_LOAD" and segment.header["p_type"] != "PT_NULL":
-                continue
-            segments.append(
-                load_segment(
-                    segment,
-                    do_workarounds=do_workarounds,
-                    disable_write_protection=disable_write_protection,
-                    force_executable=force_executable,
+    # The file is memory-mapped, so that the segment data is read only once,
+    # straight into the simulated memory.
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+        elffile = ELFFile(image)
+        with memoryview(image) as file_image:
+            for segment in elffile.iter_segments():
+                if segment.header["p_type"] != "PT_LOAD" and segment.header["p_type"] != "PT_NULL":
+                    continue
+                segments.append(
+                    load_segment(
+                        segment,
+                        do_workarounds=do_workarounds,
+                        disable_write_protection=disable_write_protection,
+                        force_executable=force_executable,
+                        file_image=file_image,
+                    )
                 )
-            )
 
     return segments
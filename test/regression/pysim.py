@@ -1,11 +1,14 @@
 import re
 import os
+import sys
 import logging
+from collections import deque
 
 from amaranth.utils import exact_log2
 from amaranth import *
 
 from transactron.core.keys import TransactionManagerKey
+from transactron.evlog import EventLog
 from transactron.profiler import Profile
 from transactron.testing.tick_count import make_tick_count_process
 
@@ -29,81 +32,290 @@ from coreblocks.core import Core
 from coreblocks.socks.socks import Socks
 from coreblocks.params import GenParams
 from coreblocks.params import configurations
+from coreblocks.params.core_configuration import CoreConfiguration
 
 
-class PySimulation(SimulationBackend):
-    def __init__(self, traces_file: Optional[str] = None, with_socks: bool = False, reset_pc: Optional[int] = None):
-        conf = configurations.full
-        if reset_pc is not None:
-            conf = conf.replace(start_pc=reset_pc)
-        self.gp = GenParams(conf)
-        self.running = False
-        self.cycle_cnt = 0
-        self.traces_file = traces_file
-        self.with_socks = with_socks
-
-        self.log_level = parse_logging_level(os.environ["__TRANSACTRON_LOG_LEVEL"])
-        self.log_filter = os.environ["__TRANSACTRON_LOG_FILTER"]
+class _ElaboratedCore:
+    """A core elaborated and compiled for PySim, with its simulation processes.
 
-        self.metrics_manager = HardwareMetricsManager()
+    The processes are added once. `Simulator.reset` restarts them together with
+    the design, and they serve the `PySimulation` which is currently running
+    the model. This allows running many simulations on a single elaboration.
+    """
 
-    def _wishbone_slave(
-        self, mem_model: CoreMemoryModel, wb_ctrl: WishboneInterfaceWrapper, is_instr_bus: bool, delay: int = 0
+    def __init__(
+        self,
+        gp: GenParams,
+        with_socks: bool,
+        traces_file: Optional[str],
+        log_level: int,
+        log_filter: str,
+        profile: bool,
+        evlog: bool,
     ):
+        self.gp = gp
+        self.backend: Optional["PySimulation"] = None
+        self.used = False
+        self.dependency_manager = DependencyManager()
+
+        with DependencyContext(self.dependency_manager):
+            core = Core(gen_params=gp)
+
+            if with_socks:
+                core = Socks(core, core_gen_params=gp)
+
+            self.metrics_manager = HardwareMetricsManager()
+
+            # The timeout of each run is enforced by the waiter.
+            self.sim = PysimSimulator(core, max_cycles=sys.maxsize, traces_file=traces_file)
+
+            wb_instr_ctrl = WishboneInterfaceWrapper(core.wb_instr)
+            wb_data_ctrl = WishboneInterfaceWrapper(core.wb_data)
+
+            async def interrupt_generator_process(sim: ProcessContext):
+                get_interrupt_value = self._backend.get_interrupt_value
+                if get_interrupt_value is None:
+                    return
+                while True:
+                    sim.set(core.interrupts, get_interrupt_value())
+                    await sim.tick()
+
+            self.sim.add_process(interrupt_generator_process)
+
+            self.sim.add_testbench(self._wishbone_slave(wb_instr_ctrl, is_instr_bus=True), background=True)
+            if gp.data_bus_max_requests > 1:
+                self.sim.add_testbench(self._pipelined_wishbone_slave(wb_data_ctrl), background=True)
+            else:
+                self.sim.add_testbench(self._wishbone_slave(wb_data_ctrl, is_instr_bus=False), background=True)
+
+            def on_error():
+                raise RuntimeError("Simulation finished due to an error")
+
+            self.sim.add_process(make_logging_process(log_level, log_filter, on_error))
+            self.sim.add_process(make_tick_count_process())
+
+            self.profile = None
+            if profile:
+                transaction_manager = DependencyContext.get().get_dependency(TransactionManagerKey())
+                self.profile = Profile()
+                self.sim.add_process(profiler_process(transaction_manager, self.profile))
+
+            self.evlog = None
+            if evlog:
+                self.evlog, evlog_process = capture_evlog()
+                if self.evlog.schema.sites:
+                    self.sim.add_process(evlog_process)
+                else:  # the design was elaborated without the event log enabled
+                    self.evlog = None
+
+            self.sim.add_testbench(self._waiter())
+
+    @property
+    def _backend(self) -> "PySimulation":
+        assert self.backend is not None
+        return self.backend
+
+    def _bus_access(
+        self, sim: TestbenchContext, wb_ctrl: WishboneInterfaceWrapper, is_instr_bus: bool
+    ) -> tuple[int, dict[str, int]]:
+        """Performs the request on the bus. Returns its latency and the signals to respond with."""
+        mem_model = self._backend.mem_model
+        word_width_bytes = self.gp.isa.xlen // 8
+
+        # Wishbone is addressing words, so we need to shift it a bit to get the real address.
+        addr = sim.get(wb_ctrl.wb.adr) << exact_log2(word_width_bytes)
+        sel = sim.get(wb_ctrl.wb.sel)
+        dat_w = sim.get(wb_ctrl.wb.dat_w)
+
+        resp_data = 0
+
+        req: ReadRequest | WriteRequest
+        if sim.get(wb_ctrl.wb.we):
+            req = WriteRequest(addr=addr, data=dat_w, byte_count=word_width_bytes, byte_sel=sel)
+            resp = mem_model.write(req)
+        else:
+            req = ReadRequest(
+                addr=addr,
+                byte_count=word_width_bytes,
+                byte_sel=sel,
+                exec=is_instr_bus,
+            )
+            resp = mem_model.read(req)
+            resp_data = resp.data
+
+        ack = err = rty = 0
+        match resp.status:
+            case ReplyStatus.OK:
+                ack = 1
+            case ReplyStatus.ERROR:
+                err = 1
+            case ReplyStatus.RETRY:
+                rty = 1
+
+        latency = mem_model.latency(req, self._backend.cycle_cnt)
+        return latency, {"data": resp_data, "ack": ack, "err": err, "rty": rty}
+
+    def _wishbone_slave(self, wb_ctrl: WishboneInterfaceWrapper, is_instr_bus: bool, delay: int = 0):
         async def f(sim: TestbenchContext):
             while True:
                 await wb_ctrl.slave_wait(sim)
 
-                word_width_bytes = self.gp.isa.xlen // 8
+                latency, resp = self._bus_access(sim, wb_ctrl, is_instr_bus)
 
-                # Wishbone is addressing words, so we need to shift it a bit to get the real address.
-                addr = sim.get(wb_ctrl.wb.adr) << exact_log2(word_width_bytes)
-                sel = sim.get(wb_ctrl.wb.sel)
-                dat_w = sim.get(wb_ctrl.wb.dat_w)
+                for _ in range(delay + latency):
+                    await sim.tick()
 
-                resp_data = 0
+                await wb_ctrl.slave_respond(sim, **resp)
 
-                if sim.get(wb_ctrl.wb.we):
-                    resp = mem_model.write(
-                        WriteRequest(addr=addr, data=dat_w, byte_count=word_width_bytes, byte_sel=sel)
-                    )
-                else:
-                    resp = mem_model.read(
-                        ReadRequest(
-                            addr=addr,
-                            byte_count=word_width_bytes,
-                            byte_sel=sel,
-                            exec=is_instr_bus,
-                        )
-                    )
-                    resp_data = resp.data
-
-                ack = err = rty = 0
-                match resp.status:
-                    case ReplyStatus.OK:
-                        ack = 1
-                    case ReplyStatus.ERROR:
-                        err = 1
-                    case ReplyStatus.RETRY:
-                        rty = 1
-
-                for _ in range(delay):
-                    await sim.tick()
+        return f
 
-                await wb_ctrl.slave_respond(sim, resp_data, ack=ack, err=err, rty=rty)
+    def _pipelined_wishbone_slave(self, wb_ctrl: WishboneInterfaceWrapper, delay: int = 0):
+        """Pipelined Wishbone slave of the data bus. It accepts a request in every cycle,
+        and responds to them in order, each after its latency."""
+
+        async def f(sim: TestbenchContext):
+            # Responses to the accepted requests, with the number of cycles they wait for.
+            pending: deque[tuple[int, dict[str, int]]] = deque()
+            idle = {"data": 0, "ack": 0, "err": 0, "rty": 0}
+            while True:
+                resp = idle
+                if pending and pending[0][0] == 0:
+                    resp = pending.popleft()[1]
+                sim.set(wb_ctrl.wb.dat_r, resp["data"])
+                for name in ["ack", "err", "rty"]:
+                    sim.set(getattr(wb_ctrl.wb, name), resp[name])
+
+                pending = deque((max(wait - 1, 0), resp) for wait, resp in pending)
+
+                if sim.get(wb_ctrl.wb.stb) and sim.get(wb_ctrl.wb.cyc):
+                    latency, resp = self._bus_access(sim, wb_ctrl, is_instr_bus=False)
+                    pending.append((delay + latency, resp))
+
+                await sim.tick()
 
         return f
 
-    def _waiter(self, on_finish: Callable[[TestbenchContext], None]):
+    def _waiter(self):
         async def f(sim: TestbenchContext):
-            while self.running:
-                self.cycle_cnt += 1
+            backend = self._backend
+            while backend.running:
+                assert backend.cycle_cnt < backend.timeout_cycles, "simulation timed out"
+                backend.cycle_cnt += 1
                 await sim.tick()
 
-            on_finish(sim)
+            # Collect metric values before we finish the simulation
+            for metric_name, metric in self.metrics_manager.get_metrics().items():
+                backend.metric_values[metric_name] = {}
+                for reg_name in metric.regs:
+                    backend.metric_values[metric_name][reg_name] = sim.get(
+                        self.metrics_manager.get_register_value(metric_name, reg_name)
+                    )
 
         return f
 
+    def run(self, backend: "PySimulation") -> tuple[Optional[Profile], Optional[EventLog]]:
+        """Runs the simulation for `backend` from the reset state. Returns the
+        execution profile and the event log of the run, if enabled."""
+        if self.used:
+            self.sim.reset()
+        self.used = True
+
+        self.backend = backend
+        try:
+            with DependencyContext(self.dependency_manager):
+                self.sim.run()
+        finally:
+            self.backend = None
+
+        # Detach the captured data, so that the next run starts empty.
+        profile = None
+        if self.profile is not None:
+            profile = Profile(self.profile.transactions_and_methods, self.profile.cycles)
+            self.profile.cycles = []
+
+        evlog = None
+        if self.evlog is not None:
+            evlog = EventLog(self.evlog.schema)
+            evlog.raw, self.evlog.raw = self.evlog.raw, []
+
+        return profile, evlog
+
+
+# Elaborated cores kept for reuse, with the parameters they were built with, see `PySimulation`.
+_elaborated_cores: list[tuple[tuple, _ElaboratedCore]] = []
+
+
+class PySimulation(SimulationBackend):
+    """Simulation backend using the Amaranth Python simulator.
+
+    Elaborating the core and compiling it for the simulator takes a
+    significant part of a short simulation. With `reuse_elaboration`, the
+    compiled model is kept and reused by all simulations with the same
+    configuration in this process, which are then started by resetting it.
+    The models are never reused when dumping waveforms.
+
+    Parameters
+    ----------
+    traces_file: Optional[str]
+        Name of the waveform file to write, if any.
+    with_socks: bool
+        Simulate the core together with its SoC peripherals.
+    reset_pc: Optional[int]
+        Overrides the reset address of the core.
+    reuse_elaboration: Optional[bool]
+        Reuse elaborated models. By default, enabled if the
+        `_COREBLOCKS_PYSIM_REUSE` environment variable is set.
+    config: Optional[CoreConfiguration]
+        Configuration of the simulated core. Default: the full configuration.
+    """
+
+    def __init__(
+        self,
+        traces_file: Optional[str] = None,
+        with_socks: bool = False,
+        reset_pc: Optional[int] = None,
+        reuse_elaboration: Optional[bool] = None,
+        config: Optional[CoreConfiguration] = None,
+    ):
+        conf = config if config is not None else configurations.full
+        if reset_pc is not None:
+            conf = conf.replace(start_pc=reset_pc)
+        self.config = conf
+        self.gp = GenParams(conf)
+        self.running = False
+        self.cycle_cnt = 0
+        self.timeout_cycles = 0
+        self.traces_file = traces_file
+        self.with_socks = with_socks
+        if reuse_elaboration is None:
+            reuse_elaboration = "_COREBLOCKS_PYSIM_REUSE" in os.environ
+        self.reuse_elaboration = reuse_elaboration and traces_file is None
+
+        self.log_level = parse_logging_level(os.environ["__TRANSACTRON_LOG_LEVEL"])
+        self.log_filter = os.environ["__TRANSACTRON_LOG_FILTER"]
+
+        self.metrics_manager = HardwareMetricsManager()
+        self.metric_values: dict[str, dict[str, int]] = {}
+        self.mem_model = CoreMemoryModel([])
+        self.get_interrupt_value: Optional[Callable[[], int]] = None
+
+    def _elaborated_core(self) -> _ElaboratedCore:
+        profile = "__TRANSACTRON_PROFILE" in os.environ
+        evlog = "__TRANSACTRON_EVLOG" in os.environ
+        key = (self.config.fingerprint(), self.with_socks, self.log_level, self.log_filter, profile, evlog)
+
+        if self.reuse_elaboration:
+            for model_key, model in _elaborated_cores:
+                if model_key == key:
+                    return model
+
+        model = _ElaboratedCore(
+            self.gp, self.with_socks, self.traces_file, self.log_level, self.log_filter, profile, evlog
+        )
+        if self.reuse_elaboration:
+            _elaborated_cores.append((key, model))
+        return model
+
     def pretty_dump_metrics(self, metric_values: dict[str, dict[str, int]], filter_regexp: str = ".*"):
         str = "=== Core metrics dump ===\n"
 
@@ -139,74 +351,31 @@ class PySimulation(SimulationBackend):
         timeout_cycles: int = 5000,
         get_interrupt_value: Optional[Callable[[], int]] = None,
     ) -> SimulationExecutionResult:
-        with DependencyContext(DependencyManager()):
-            core = Core(gen_params=self.gp)
-
-            if self.with_socks:
-                core = Socks(core, core_gen_params=self.gp)
-
-            wb_instr_ctrl = WishboneInterfaceWrapper(core.wb_instr)
-            wb_data_ctrl = WishboneInterfaceWrapper(core.wb_data)
-
-            self.running = True
-            self.cycle_cnt = 0
-
-            sim = PysimSimulator(core, max_cycles=timeout_cycles, traces_file=self.traces_file)
-            if get_interrupt_value is not None:
-
-                async def interrupt_generator_process(sim: ProcessContext):
-                    while True:
-                        sim.set(core.interrupts, get_interrupt_value())
-                        await sim.tick()
-
-                sim.add_process(interrupt_generator_process)
-
-            sim.add_testbench(self._wishbone_slave(mem_model, wb_instr_ctrl, is_instr_bus=True), background=True)
-            sim.add_testbench(self._wishbone_slave(mem_model, wb_data_ctrl, is_instr_bus=False), background=True)
-
-            def on_error():
-                raise RuntimeError("Simulation finished due to an error")
-
-            sim.add_process(make_logging_process(self.log_level, self.log_filter, on_error))
-            sim.add_process(make_tick_count_process())
-
-            # This enables logging in benchmarks. TODO: after unifying regression testing, remove.
-            logging.basicConfig()
-            logging.getLogger().setLevel(self.log_level)
-
-            profile = None
-            if "__TRANSACTRON_PROFILE" in os.environ:
-                transaction_manager = DependencyContext.get().get_dependency(TransactionManagerKey())
-                profile = Profile()
-                sim.add_process(profiler_process(transaction_manager, profile))
-
-            evlog = None
-            if "__TRANSACTRON_EVLOG" in os.environ:
-                evlog, evlog_process = capture_evlog()
-                if evlog.schema.sites:
-                    sim.add_process(evlog_process)
-                else:  # the design was elaborated without the event log enabled
-                    evlog = None
-
-            metric_values: dict[str, dict[str, int]] = {}
+        model = self._elaborated_core()
+        self.metrics_manager = model.metrics_manager
+
+        self.mem_model = mem_model
+        self.get_interrupt_value = get_interrupt_value
+        self.timeout_cycles = timeout_cycles
+        self.metric_values = {}
+        self.running = True
+        self.cycle_cnt = 0
 
-            def on_sim_finish(sim: TestbenchContext):
-                # Collect metric values before we finish the simulation
-                for metric_name, metric in self.metrics_manager.get_metrics().items():
-                    metric = self.metrics_manager.get_metrics()[metric_name]
-                    metric_values[metric_name] = {}
-                    for reg_name in metric.regs:
-                        metric_values[metric_name][reg_name] = sim.get(
-                            self.metrics_manager.get_register_value(metric_name, reg_name)
-                        )
+        # This enables logging in benchmarks. TODO: after unifying regression testing, remove.
+        logging.basicConfig()
+        logging.getLogger().setLevel(self.log_level)
 
-            sim.add_testbench(self._waiter(on_finish=on_sim_finish))
-            sim.run()
-            success = True  # timeout throws an exception in sim
+        try:
+            profile, evlog = model.run(self)
+        except BaseException:
+            # The simulation was interrupted in an arbitrary state, don't reuse it.
+            _elaborated_cores[:] = [entry for entry in _elaborated_cores if entry[1] is not model]
+            raise
+        success = True  # timeout throws an exception in sim
 
-            self.pretty_dump_metrics(metric_values)
+        self.pretty_dump_metrics(self.metric_values)
 
-            return SimulationExecutionResult(success, metric_values, profile, evlog)
+        return SimulationExecutionResult(success, self.metric_values, profile, evlog)
 
     def stop(self):
         self.running = False
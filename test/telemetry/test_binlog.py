@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from transactron.evlog import EventFieldSchema, EventLog, EventLogReader, EventSiteSchema, EvLogSchema
+
+from coreblocks.telemetry import *  # noqa: F401 (registers the event types)
+from coreblocks.telemetry.binlog import BinaryEventLogReader, BinaryEventLogWriter, open_event_log, save_binary
+
+
+def make_schema() -> EvLogSchema:
+    def site(event_name: str, fields: list[EventFieldSchema], statics: dict = {}) -> EventSiteSchema:
+        return EventSiteSchema(
+            source_name="test", event_name=event_name, location=("x.py", 1), fields=fields, statics=statics
+        )
+
+    return EvLogSchema(
+        sites=[
+            site("frontend.ftq_alloc", [EventFieldSchema("ftq_ptr", 5), EventFieldSchema("pc", 32)]),
+            site("backend.rob_retire", [EventFieldSchema("rob_id", 7)]),
+            site("backend.rob_bulk_flush", [EventFieldSchema("count", 9, signed=True)]),
+            site("frontend.fetch_request", [EventFieldSchema("ftq_ptr", 5), EventFieldSchema("pc", 80)]),
+        ]
+    )
+
+
+def make_log(n: int, seed: int = 42) -> EventLog:
+    rand = random.Random(seed)
+    log = EventLog(make_schema())
+    cycle = 0
+    for _ in range(n):
+        cycle += rand.randrange(3)
+        match rand.randrange(4):
+            case 0:
+                log.emit_raw(cycle, 0, [rand.randrange(2**5), rand.randrange(2**32)])
+            case 1:
+                log.emit_raw(cycle, 1, [rand.randrange(2**7)])
+            case 2:
+                log.emit_raw(cycle, 2, [rand.randrange(-(2**8), 2**8)])
+            case _:
+                log.emit_raw(cycle, 3, [rand.randrange(2**5), rand.randrange(2**80)])
+    return log
+
+
+class TestBinaryEventLog:
+    @pytest.mark.parametrize("chunk_records", [7, 1000])
+    def test_roundtrip(self, tmp_path, chunk_records: int):
+        log = make_log(300)
+        path = str(tmp_path / "log.evlog")
+        save_binary(log, path, chunk_records=chunk_records)
+
+        reader = BinaryEventLogReader(path)
+        assert reader.schema == log.schema
+        assert len(reader) == len(log.raw)
+        assert list(reader.raw()) == [tuple(record) for record in log.raw]
+        assert [(rec.cycle, rec.event) for rec in reader] == [(rec.cycle, rec.event) for rec in log.decoded()]
+
+    def test_window(self, tmp_path):
+        log = make_log(1000)
+        path = str(tmp_path / "log.evlog")
+        save_binary(log, path, chunk_records=16)
+
+        reader = BinaryEventLogReader(path)
+        first, last = reader.cycle_range or (0, 0)
+        start, end = first + (last - first) // 3, first + (last - first) // 2
+        expected = [record for record in log.raw if start <= record[0] < end]
+        assert expected
+        assert list(reader.raw(start, end)) == [tuple(record) for record in expected]
+        assert [rec.cycle for rec in reader.window(start, end)] == [record[0] for record in expected]
+
+    def test_window_reads_only_overlapping_chunks(self, tmp_path, monkeypatch):
+        log = make_log(1000)
+        path = str(tmp_path / "log.evlog")
+        save_binary(log, path, chunk_records=16)
+
+        reader = BinaryEventLogReader(path)
+        read_chunks = []
+        read_chunk = reader._read_chunk
+        monkeypatch.setattr(reader, "_read_chunk", lambda fp, info: read_chunks.append(info) or read_chunk(fp, info))
+
+        last_cycle = log.raw[-1][0]
+        list(reader.raw(last_cycle, last_cycle + 1))
+        assert len(read_chunks) == 1
+
+    def test_zstd(self, tmp_path):
+        pytest.importorskip("zstandard")
+        log = make_log(300)
+        path = str(tmp_path / "log.evlog")
+        save_binary(log, path, chunk_records=64, compression="zstd")
+
+        reader = BinaryEventLogReader(path)
+        assert reader.compression == "zstd"
+        assert list(reader.raw()) == [tuple(record) for record in log.raw]
+
+    def test_streaming_writer_and_empty_log(self, tmp_path):
+        path = str(tmp_path / "log.evlog")
+        with BinaryEventLogWriter(path, make_schema()):
+            pass
+
+        reader = BinaryEventLogReader(path)
+        assert len(reader) == 0
+        assert reader.cycle_range is None
+        assert list(reader) == []
+
+    def test_long_cycle_gaps(self, tmp_path):
+        # Cycles are stored relative to the chunk start in 32 bits, so a
+        # larger gap must start a new chunk.
+        path = str(tmp_path / "log.evlog")
+        records = [(5, 1, [1]), (2**33, 1, [2]), (2**33 + 1, 1, [3])]
+        with BinaryEventLogWriter(path, make_schema()) as writer:
+            for record in records:
+                writer.emit_raw(*record)
+
+        reader = BinaryEventLogReader(path)
+        assert list(reader.raw()) == records
+        assert list(reader.raw(2**33 + 1)) == records[2:]
+        assert reader.cycle_range == (5, 2**33 + 1)
+
+    def test_open_event_log_detects_format(self, tmp_path):
+        log = make_log(10)
+        jsonl_path = str(tmp_path / "log.jsonl")
+        binary_path = str(tmp_path / "log.evlog")
+        log.save(jsonl_path)
+        save_binary(log, binary_path)
+
+        assert isinstance(open_event_log(jsonl_path), EventLogReader)
+        assert isinstance(open_event_log(binary_path), BinaryEventLogReader)
+        assert BinaryEventLogReader(binary_path).to_event_log().raw == EventLog.load(jsonl_path).raw
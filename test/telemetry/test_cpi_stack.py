@@ -0,0 +1,127 @@
+import pytest
+
+from transactron.evlog import DecodedEvent, Event, EventSiteSchema, EvLogSchema
+
+from coreblocks.telemetry import *
+from coreblocks.telemetry.cpi_stack import CPIStack, CPIStackBuilder, retire_width_from_schema
+
+DUMMY_SITE = EventSiteSchema(source_name="backend", event_name="dummy", location=("x.py", 1), fields=[], statics={})
+
+
+def dec(cycle: int, event: Event) -> DecodedEvent:
+    return DecodedEvent(cycle=cycle, site=DUMMY_SITE, event=event)
+
+
+def build(records: list[DecodedEvent], retire_width: int) -> CPIStack:
+    builder = CPIStackBuilder(retire_width)
+    builder.run(records)
+    stack = builder.result()
+    total = (
+        stack.retiring + stack.bad_speculation + sum(stack.frontend_bound.values()) + sum(stack.backend_bound.values())
+    )
+    assert total == stack.slots
+    return stack
+
+
+class TestCPIStack:
+    def test_instruction_lifetime(self):
+        records = [
+            dec(0, FTQAlloc(ftq_ptr=0, pc=0x100)),
+            dec(1, ICacheMiss(paddr=0x100)),
+            dec(4, InstrFetched(ftq_ptr=0, pc=0x100, instr=0x13, ftq_offset=0)),
+            dec(6, RobAllocate(ftq_ptr=0, ftq_offset=0, rob_id=0, rp_dst=1)),
+            dec(7, RsInsert(rob_id=0)),
+            dec(8, FuIssue(rob_id=0, unit="lsu_dummy")),
+            dec(11, ExecComplete(rob_id=0)),
+            dec(12, RobRetire(rob_id=0)),
+        ]
+
+        stack = build(records, 1)
+
+        assert stack.cycles == 13
+        assert stack.instructions == 1
+        assert stack.retiring == 1
+        assert stack.bad_speculation == 0
+        assert stack.frontend_bound == {"icache_miss": 3, "bpu_redirect": 0, "unsafe_stall": 0, "other": 3}
+        assert stack.backend_bound == {"rs_full": 1, "rs_wait": 1, "fu_busy": 0, "lsu_wait": 3, "other": 1}
+
+    def test_misprediction(self):
+        # ROB id 1 is on the wrong path: the slots it stalls as the ROB head,
+        # its flush, and the refill after it are bad speculation.
+        records = [
+            dec(0, FTQAlloc(ftq_ptr=0, pc=0x100)),
+            dec(0, RobAllocate(ftq_ptr=0, ftq_offset=0, rob_id=0, rp_dst=1)),
+            dec(0, RobAllocate(ftq_ptr=0, ftq_offset=1, rob_id=1, rp_dst=2)),
+            dec(1, FuIssue(rob_id=0, unit="jump_branch")),
+            dec(2, ExecComplete(rob_id=0)),
+            dec(2, FTQRollback(ftq_ptr=1, cause="backend_redirect")),
+            dec(3, RobRetire(rob_id=0)),
+            dec(5, RobFlush(rob_id=1)),
+            dec(6, FTQAlloc(ftq_ptr=1, pc=0x200)),
+            dec(8, RobAllocate(ftq_ptr=1, ftq_offset=0, rob_id=2, rp_dst=3)),
+            dec(9, RobRetire(rob_id=2)),
+        ]
+
+        stack = build(records, 2)
+
+        assert stack.cycles == 10
+        assert stack.retiring == 2
+        assert stack.bad_speculation == 9
+        assert stack.backend_bound == {"rs_full": 4, "rs_wait": 0, "fu_busy": 2, "lsu_wait": 0, "other": 2}
+        assert stack.frontend_bound["other"] == 1
+
+    def test_unsafe_stall(self):
+        # Resolving an unsafe instruction redirects the frontend, which is
+        # not a misprediction: the refill is attributed to the unsafe stall.
+        records = [
+            dec(0, RobAllocate(ftq_ptr=0, ftq_offset=0, rob_id=0, rp_dst=1)),
+            dec(0, FrontendStall(cause="unsafe")),
+            dec(2, ExecComplete(rob_id=0)),
+            dec(3, RobRetire(rob_id=0)),
+            dec(5, FTQRollback(ftq_ptr=1, cause="backend_redirect")),
+            dec(5, FrontendResume(cause="unsafe")),
+            dec(6, FTQAlloc(ftq_ptr=1, pc=0x200)),
+            dec(8, RobAllocate(ftq_ptr=1, ftq_offset=0, rob_id=1, rp_dst=2)),
+            dec(9, RobRetire(rob_id=1)),
+        ]
+
+        stack = build(records, 1)
+
+        assert stack.retiring == 2
+        assert stack.bad_speculation == 0
+        assert stack.frontend_bound["unsafe_stall"] == 4
+        assert stack.backend_bound["rs_full"] == 3
+        assert stack.backend_bound["other"] == 1
+
+    def test_bulk_flush(self):
+        records = [
+            dec(0, RobAllocate(ftq_ptr=0, ftq_offset=0, rob_id=0, rp_dst=1)),
+            dec(2, RobBulkFlush(count=1)),
+            dec(3, FTQRollback(ftq_ptr=1, cause="backend_redirect")),
+            dec(4, FTQAlloc(ftq_ptr=1, pc=0x200)),
+            dec(5, RobAllocate(ftq_ptr=1, ftq_offset=0, rob_id=1, rp_dst=2)),
+            dec(5, RobRetire(rob_id=1)),
+        ]
+
+        stack = build(records, 1)
+
+        assert stack.bad_speculation == 5
+        assert stack.retiring == 1
+
+    def test_rejects_unsorted_records(self):
+        records = [
+            dec(2, FTQAlloc(ftq_ptr=0, pc=0x100)),
+            dec(1, FetchRequest(ftq_ptr=0, pc=0x100)),
+        ]
+
+        with pytest.raises(ValueError):
+            CPIStackBuilder(1).run(records)
+
+    def test_retire_width_from_schema(self):
+        sites = [
+            EventSiteSchema(
+                source_name="backend.retirement", event_name=name, location=("x.py", 1), fields=[], statics={}
+            )
+            for name in ["backend.rob_retire", "backend.rob_flush", "backend.rob_retire"]
+        ]
+        assert retire_width_from_schema(EvLogSchema(sites=sites)) == 2
@@ -1,6 +1,8 @@
 from io import StringIO
 from textwrap import dedent
 
+import pytest
+
 from transactron.evlog import DecodedEvent, Event, EventSiteSchema
 
 from coreblocks.telemetry import *
@@ -14,7 +16,8 @@ def dec(cycle: int, event: Event) -> DecodedEvent:
 
 
 class TestKonataParser:
-    def test_convert(self):
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_convert(self, streaming: bool):
         # Two fetch blocks: block 0 produces two instructions which go all
         # the way through the backend and retire, block 1 produces one
         # instruction which is flushed before reaching the ROB.
@@ -43,7 +46,7 @@ class TestKonataParser:
         ]
 
         out = StringIO()
-        KonataParser(out).run(records)
+        KonataParser(out, streaming=streaming).run(records)
 
         assert out.getvalue() == dedent(
             """\
@@ -94,6 +97,41 @@ class TestKonataParser:
             """
         )
 
+    def test_streaming_window_is_bounded(self):
+        # A long straight-line trace with a few instructions in flight at any
+        # time: the streaming converter only holds the commands of the
+        # in-flight instructions.
+        def records():
+            for i in range(1000):
+                yield dec(4 * i, FTQAlloc(ftq_ptr=i, pc=4 * i))
+                yield dec(4 * i, FetchRequest(ftq_ptr=i, pc=4 * i))
+                yield dec(4 * i, FTQCommit(ftq_ptr=i))
+                yield dec(4 * i + 1, InstrFetched(ftq_ptr=i, pc=4 * i, instr=0x13, ftq_offset=0))
+                yield dec(4 * i + 2, RobAllocate(ftq_ptr=i, ftq_offset=0, rob_id=i % 8, rp_dst=0))
+                yield dec(4 * i + 3, RobRetire(rob_id=i % 8))
+                window.append(len(parser.timeline))
+
+        window: list[int] = []
+        out = StringIO()
+        parser = KonataParser(out, streaming=True)
+        parser.run(records())
+
+        buffered = StringIO()
+        KonataParser(buffered).run(list(records()))
+
+        assert out.getvalue() == buffered.getvalue()
+        assert max(window) <= 10
+        assert len(parser.blocks) == 1 and len(parser.terminated) <= 1
+
+    def test_streaming_rejects_unsorted_records(self):
+        records = [
+            dec(2, FTQAlloc(ftq_ptr=0, pc=0x100)),
+            dec(1, FetchRequest(ftq_ptr=0, pc=0x100)),
+        ]
+
+        with pytest.raises(ValueError):
+            KonataParser(StringIO(), streaming=True).run(records)
+
     def test_rollback_without_instructions(self):
         # A block squashed before any instruction was fetched leaves no
         # trace in the log.
@@ -142,6 +180,23 @@ class TestKonataParser:
         retires = [line for line in out.getvalue().splitlines() if line.startswith("R")]
         assert retires == ["R\t0\t0\t1"]
 
+    def test_rob_bulk_flush_terminates_all_in_order(self):
+        records = [
+            dec(0, FTQAlloc(ftq_ptr=0, pc=0x100)),
+            dec(1, InstrFetched(ftq_ptr=0, pc=0x100, instr=0x13, ftq_offset=0)),
+            dec(1, InstrFetched(ftq_ptr=0, pc=0x104, instr=0x13, ftq_offset=1)),
+            dec(2, RobAllocate(ftq_ptr=0, ftq_offset=1, rob_id=2, rp_dst=2)),
+            dec(2, RobAllocate(ftq_ptr=0, ftq_offset=0, rob_id=7, rp_dst=1)),
+            dec(3, RobBulkFlush(count=2)),
+            dec(4, RobRetire(rob_id=7)),
+        ]
+
+        out = StringIO()
+        KonataParser(out).run(records)
+
+        retires = [line for line in out.getvalue().splitlines() if line.startswith("R")]
+        assert retires == ["R\t0\t0\t1", "R\t1\t0\t1"]
+
     def test_unterminated_instructions(self):
         # Instructions still in flight when the log ends stay unterminated.
         records = [
@@ -12,13 +12,16 @@ from transactron.testing import TestCaseWithSimulator, ProcessContext, Testbench
 
 from coreblocks.arch.isa_consts import PrivilegeLevel
 from coreblocks.core import Core
+from coreblocks.func_blocks.fu.common.fifo_rs import FifoRS
+from coreblocks.func_blocks.fu.common.rs_func_block import RSBlockComponent
+from coreblocks.func_blocks.fu.lsu.dummyLsu import LSUComponent
 from coreblocks.params import GenParams
 from coreblocks.params.instr import *
 from coreblocks.params import configurations
 from coreblocks.params.core_configuration import CoreConfiguration
 from coreblocks.peripherals.wishbone import WishboneMemorySlave
 from coreblocks.priv.traps.interrupt_controller import ISA_RESERVED_INTERRUPTS
-from coreblocks.socks.socks import Socks
+from coreblocks.socks.socks import MultiHartSocks, Socks
 
 import random
 import subprocess
@@ -50,7 +53,11 @@ class CoreTestElaboratable(Elaboratable):
             wb_params=self.gen_params.wb_params, shape=32, depth=instr_mem_depth, init=self.instr_mem
         )
         self.wb_mem_slave_data = WishboneMemorySlave(
-            wb_params=self.gen_params.wb_params, shape=32, depth=len(self.data_mem), init=self.data_mem
+            wb_params=self.gen_params.wb_params,
+            pipelined=self.gen_params.data_bus_max_requests > 1,
+            shape=32,
+            depth=len(self.data_mem),
+            init=self.data_mem,
         )
 
         self.core = Core(gen_params=self.gen_params)
@@ -76,6 +83,38 @@ class CoreTestElaboratable(Elaboratable):
         return m
 
 
+class MultiHartTestElaboratable(Elaboratable):
+    def __init__(self, configuration: CoreConfiguration, hart_count: int, instr_mem: list[int], data_mem: list[int]):
+        self.configuration = configuration
+        self.gen_params = GenParams(configuration)
+        self.hart_count = hart_count
+        self.instr_mem = instr_mem
+        self.data_mem = data_mem
+
+    def elaborate(self, platform):
+        m = Module()
+
+        instr_mem_depth = align_to_power_of_two(len(self.instr_mem), self.gen_params.icache_params.line_bytes_log)
+        self.wb_mem_slave = WishboneMemorySlave(
+            wb_params=self.gen_params.wb_params, shape=32, depth=instr_mem_depth, init=self.instr_mem
+        )
+        self.wb_mem_slave_data = WishboneMemorySlave(
+            wb_params=self.gen_params.wb_params, shape=32, depth=len(self.data_mem), init=self.data_mem
+        )
+
+        self.top = MultiHartSocks(self.configuration, self.hart_count)
+        self.core = self.top.harts[0]
+
+        m.submodules.wb_mem_slave = self.wb_mem_slave
+        m.submodules.wb_mem_slave_data = self.wb_mem_slave_data
+        m.submodules.c = self.top
+
+        connect(m, self.top.wb_instr, self.wb_mem_slave.bus)
+        connect(m, self.top.wb_data, self.wb_mem_slave_data.bus)
+
+        return m
+
+
 class TestCoreBase(TestCaseWithSimulator):
     configuration: CoreConfiguration
     gen_params: GenParams
@@ -180,12 +219,46 @@ class TestCoreAsmSourceBase(TestCoreBase):
             assert self.get_arch_reg_val(sim, reg_id) == val, "Bad register value"
 
 
+tiny_store_buffer = configurations.tiny.replace(
+    func_units_config=(
+        configurations.tiny.func_units_config[0],
+        RSBlockComponent([LSUComponent(store_buffer_entries=4)], rs_entries=2, rs_type=FifoRS),
+    )
+)
+
+tiny_misaligned = configurations.tiny.replace(
+    func_units_config=(
+        configurations.tiny.func_units_config[0],
+        RSBlockComponent([LSUComponent(split_misaligned=True)], rs_entries=2, rs_type=FifoRS),
+    )
+)
+
+tiny_outstanding_loads = configurations.tiny.replace(
+    data_bus_max_requests=4,
+    func_units_config=(
+        configurations.tiny.func_units_config[0],
+        RSBlockComponent([LSUComponent(max_outstanding=4)], rs_entries=4, rs_type=FifoRS),
+    ),
+)
+
+
 @parameterized_class(
     ("name", "source_file", "cycle_count", "expected_regvals", "exit_csr", "configuration"),
     [
         ("fibonacci", "fibonacci.asm", 700, {2: 2971215073}, True, configurations.basic),
         ("fibonacci_mem", "fibonacci_mem.asm", 400, {3: 55}, False, configurations.basic),
         ("fibonacci_mem_tiny", "fibonacci_mem.asm", 250, {3: 55}, False, configurations.tiny),
+        ("amo", "amo.asm", 300, {3: 10, 4: 15, 6: 7, 8: 7}, False, configurations.full),
+        ("fibonacci_mem_store_buffer", "fibonacci_mem.asm", 250, {3: 55}, False, tiny_store_buffer),
+        ("fibonacci_mem_outstanding", "fibonacci_mem.asm", 250, {3: 55}, False, tiny_outstanding_loads),
+        (
+            "misaligned_mem",
+            "misaligned_mem.asm",
+            250,
+            {2: 0x44332211, 3: 0x4433, 4: 0x2211, 5: 0x44},
+            False,
+            tiny_misaligned,
+        ),
         ("csr", "csr.asm", 400, {1: 1, 2: 4}, True, configurations.full),
         ("csr_mmode", "csr_mmode.asm", 1000, {1: 0, 2: 44, 3: 0, 4: 0, 5: 0, 6: 4, 15: 0}, True, configurations.full),
         ("exception", "exception.asm", 200, {1: 1, 2: 2}, False, configurations.basic),
@@ -195,10 +268,26 @@ class TestCoreAsmSourceBase(TestCoreBase):
         ("mtval", "mtval.asm", 2000, {8: 5 * 8}, True, configurations.full),
         ("socks_clint", "socks_clint.asm", 1600, {2: 5, 8: 1}, True, configurations.basic),
         ("socks_plic", "plic.asm", 1000, {31: 0xCAFE}, True, configurations.basic),
+        (
+            "socks_clint_outstanding",
+            "socks_clint.asm",
+            1600,
+            {2: 5, 8: 1},
+            True,
+            configurations.basic.replace(data_bus_max_requests=4),
+        ),
         ("pmp_fetch", "pmp_fetch.asm", 1000, {1: 1}, True, configurations.full),
         ("pmp_lsu", "pmp_lsu.asm", 1000, {1: 1}, True, configurations.full),
         ("smode_exception", "smode_exception.asm", 800, {5: 1, 6: 1, 7: 1, 8: 1}, False, configurations.full),
         ("sv32_translation", "sv32_translation.asm", 500, {9: 5, 10: 1}, True, configurations.full),
+        (
+            "sv32_svadu",
+            "sv32_svadu.asm",
+            800,
+            {6: (4 << 10) | 0xC7, 7: (1 << 10) | 0x49, 9: 4, 10: 1},
+            True,
+            configurations.full.replace(hardware_a_d_update=True),
+        ),
     ],
 )
 @pytest.mark.collection_order(1)
@@ -226,6 +315,32 @@ class TestCoreBasicAsm(TestCoreAsmSourceBase):
             sim.add_testbench(self.run_and_check)
 
 
+@parameterized_class(
+    ("name", "configuration"),
+    [
+        ("multihart", configurations.small_linux),
+        ("multihart_l2_outstanding", configurations.small_linux.replace(l2cache_enable=True, data_bus_max_requests=4)),
+    ],
+)
+@pytest.mark.collection_order(1)
+class TestCoreMultiHart(TestCoreAsmSourceBase):
+    name: str
+    configuration: CoreConfiguration
+    cycle_count = 2000
+    # LR/SC counter, AMO counter, number of finished harts, MHARTID of the second hart
+    expected_regvals = {11: 6, 12: 6, 9: 2, 13: 1}
+
+    def test_asm_source(self):
+        bin_src = self.prepare_source("multihart.asm")
+
+        self.m = MultiHartTestElaboratable(  # type: ignore
+            self.configuration, hart_count=2, instr_mem=bin_src["text"], data_mem=bin_src["data"]
+        )
+
+        with self.run_simulation(self.m) as sim:
+            sim.add_testbench(self.run_and_check)
+
+
 # test interrupts with varying triggering frequency (parametrizable amount of cycles between
 # returning from an interrupt and triggering it again with 'lo' and 'hi' parameters)
 @parameterized_class(